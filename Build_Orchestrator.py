@@ -0,0 +1,372 @@
+import os
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
+from shutil import rmtree
+
+from Licences import Licence_Pool, get_token_demand, simulate_schedule
+from Run_Cache import Run_Cache, release_outputs
+from HazelsAwesomeTheme import red_text,green_text,blue_text,yellow_text
+
+
+class Build_Orchestrator():
+    '''
+    ------------------------------------------------------------
+        ***Build_Orchestrator***
+    ------------------------------------------------------------
+        Builds and runs many models concurrently with asyncio.
+
+        Each model is built in stages (see Model.get_build_stages()),
+        every stage uses one or more resources: "disk" for file staging
+        and text processing, "fluent" for fluent setup sessions and
+        "abaqus" for abaqus jobs. Each resource has its own semaphore so
+        e.g. fluent setups of some models overlap with the file staging
+        of others.
+
+        Stages using a solver also take licence tokens from a
+        Licence_Pool, counted from the number of cores of the solver
+        (see Licences.py), so the licence pools are never exceeded.
+
+        Stages run in worker threads, solver runs are subprocesses.
+        While a solver runs its monitors (see Model.get_monitors()) are
+        polled, and runs that diverge or stall are terminated.
+
+        If the "run_cache" of the builder is enabled, a model whose
+        inputs match a run that already finished links the outputs of
+        that run instead of running the solver (see Run_Cache.py).
+    ------------------------------------------------------------
+        **Attributes**
+    ------------------------------------------------------------
+
+    builder : Modular_Abaqus_Builder
+        The Modular_Abaqus_Builder class containing the models.
+
+    resource_limits : dict, {'disk' : int, 'fluent' : int, 'abaqus' : int}
+        The number of stages that can use each resource at once.
+
+    licences : dict, keys = ["pools", "tokens"]
+        The licence pools and the token expressions of each solver.
+
+    semaphores : dict, {'resource' : asyncio.Semaphore, ...}
+        The semaphores limiting each resource, created for each call of build_models() or run_models().
+
+    licence_pool : Licence_Pool
+        The scheduler of the licence tokens, created for each call of build_models() or run_models().
+
+    monitor_interval : float
+        The number of seconds between polls of the monitors of a running model.
+
+    run_cache : Run_Cache
+        The outputs of completed runs by the hash of their inputs. (NOTE: None if the cache is not used)
+
+    ------------------------------------------------------------
+        **Methods**
+    ------------------------------------------------------------
+
+    build_models(models):
+        Builds the models concurrently, returns a dictionary of which models were built successfully.
+
+    run_models(models):
+        Runs the models concurrently, returns a dictionary of the solver return codes.
+
+    estimate_makespan(models, durations, pools=None):
+        Simulates running the models within the licence pools and resource limits, returns the estimated makespan.
+
+    get_demand(resources, solver_cores):
+        Returns the licence tokens used by a stage.
+
+    build_model(model):
+        Coroutine that runs the build stages of a model, holding the resources of each stage.
+
+    run_model(model):
+        Coroutine that runs the solver command of a model, holding the solver resources.
+
+    watch_process(model, process):
+        Coroutine that waits for a solver to finish, terminating it if a monitor reports it should stop.
+
+    acquire(resources, demand):
+        Async context manager that holds the semaphores of the resources and the licence tokens of the demand.
+
+    ------------------------------------------------------------
+    '''
+
+    def __init__(self, builder, resource_limits=None, licences=None, monitor_interval=30.0, use_cache=True):
+        '''
+        ---------------------------------------------------
+        Initialise the orchestrator, the resource limits and licences of the builder are used if none are given.
+        The run cache is used if use_cache is True and it is enabled in the builder.
+        ---------------------------------------------------
+        '''
+        self.builder = builder
+        self.resource_limits = dict(builder.resource_limits if resource_limits is None else resource_limits)
+        self.licences = builder.licences if licences is None else licences
+        self.semaphores = {}
+        self.licence_pool = None
+        self.monitor_interval = monitor_interval
+
+        settings = getattr(builder, 'run_cache', {})
+        self.run_cache = Run_Cache(builder.fpaths['run_cache'], settings['max_size'], getattr(builder, 'trash', None)) if (use_cache and settings.get('enabled')) else None
+
+
+    def build_models(self, models):
+        '''
+        ---------------------------------------------------
+        Builds the models concurrently. Models that fail to build have their folder removed.
+        ---------------------------------------------------
+        PARAMETERS
+        ---------------------------------------------------
+        models : list of Model
+            Models created with build=False.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        built : dict, {'model_name' : bool, ...}
+            True for each model that was built successfully.
+        ---------------------------------------------------
+        '''
+        return asyncio.run(self.gather(self.build_model, models))
+
+
+    def run_models(self, models):
+        '''
+        ---------------------------------------------------
+        Runs the solvers of the models concurrently.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        return_codes : dict, {'model_name' : int, ...}
+            The return code of the solver of each model, None if the solver could not be started.
+        ---------------------------------------------------
+        '''
+        return asyncio.run(self.gather(self.run_model, models))
+
+
+    async def gather(self, coroutine_function, models):
+        '''
+        ---------------------------------------------------
+        Creates the semaphores in the running event loop and runs the coroutine for every model.
+        ---------------------------------------------------
+        '''
+        self.semaphores = {resource : asyncio.Semaphore(limit) for resource,limit in self.resource_limits.items()}
+        self.licence_pool = Licence_Pool(self.licences['pools'])
+
+        results = await asyncio.gather(*[coroutine_function(model) for model in models])
+
+        return {model.name : result for model,result in zip(models, results)}
+
+
+    async def build_model(self, model):
+        '''
+        ---------------------------------------------------
+        Runs the build stages of a model in order, each in a worker thread while holding its resources.
+        The build options must be set before the build (see Model.prompt_build_options), as the stages never prompt.
+        ---------------------------------------------------
+        '''
+        try:
+            model.check_build_options()
+
+        except ValueError as error:
+            print('-'*60)
+            print(red_text('The model: "{}" was not built. {}'.format(model.name, error)))
+            return False
+
+        try:
+            for resources,stage in model.get_build_stages():
+                
+                # Setup sessions run on a single core
+                demand = self.get_demand(resources, {resource : 1 for resource in resources})
+
+                async with self.acquire(resources, demand):
+                    await asyncio.to_thread(stage)
+
+        except:
+            print('-'*60)
+            print(red_text('An error occurred while building the model: "{}".'.format(model.name)))
+
+            if os.path.exists(model.fpath):
+                rmtree(model.fpath, ignore_errors=True)
+                print(yellow_text('Removed the partially built model folder: "{}".'.format(model.fpath)))
+
+            return False
+
+        print('-'*60)
+        print(green_text('Model "{}" built successfully.'.format(model.name)))
+        return True
+
+
+    async def run_model(self, model):
+        '''
+        ---------------------------------------------------
+        Runs the solver command of a model as a subprocess while holding the solver resources.
+        The solver output is written to "{model.name}.log" in the solver directory.
+        ---------------------------------------------------
+        '''
+        resources, cwd, command = model.get_run_command()
+
+        # Outputs linked from the run cache are shared with other models, they are never written in place
+        try:
+            await asyncio.to_thread(release_outputs, model.fpath)
+        except OSError:
+            print('-'*60)
+            print(red_text('The cached outputs of the model: "{}" could not be unlinked, it is not run.'.format(model.name)))
+            return None
+
+        # Runs with the same inputs as a finished run are not solved again
+        if self.run_cache is not None:
+            try:
+                key, inputs = await asyncio.to_thread(self.run_cache.get_key, model, command)
+
+                if await asyncio.to_thread(self.run_cache.restore, key, model):
+                    return 0
+            except OSError:
+                print(yellow_text('The inputs of the model: "{}" could not be hashed, it is run without the run cache.'.format(model.name)))
+                key = None
+
+        try:
+            demand = self.get_demand(resources, {resource : model.get_solver_cores(resource) for resource in resources})
+            
+        except ValueError as error:
+            print('-'*60)
+            print(red_text('The model: "{}" can not run within the licence pools. {}'.format(model.name, error)))
+            return None
+
+        async with self.acquire(resources, demand):
+            print('-'*60)
+            print('Running model: "{}" with command: "{}", using licence tokens: {}.'.format(blue_text(model.name), ' '.join(command), demand))
+
+            try:
+                with open(os.path.join(cwd, model.name+'.log'),'w') as log:
+                    process = await asyncio.create_subprocess_exec(*command, cwd=cwd, stdout=log, stderr=asyncio.subprocess.STDOUT)
+                    return_code = await self.watch_process(model, process)
+
+            except OSError:
+                print('-'*60)
+                print(red_text('The solver command: "{}" could not be started for the model: "{}".'.format(command[0], model.name)))
+                return None
+
+        print('-'*60)
+        if return_code:
+            print(red_text('Model "{}" finished with return code {}.'.format(model.name, return_code)))
+        else:
+            print(green_text('Model "{}" finished successfully.'.format(model.name)))
+
+            if self.run_cache is not None and key is not None:
+                await asyncio.to_thread(self.run_cache.store, key, model, inputs)
+
+        return return_code
+
+
+    async def watch_process(self, model, process):
+        '''
+        ---------------------------------------------------
+        Waits for the solver process to finish, polling the monitors of the model every monitor_interval seconds.
+        If a monitor reports that the run diverged or stalled the process is terminated, so that no more
+        solver time or licence tokens are wasted on it.
+        ---------------------------------------------------
+        '''
+        try:
+            monitors = await asyncio.to_thread(model.get_monitors)
+        except:
+            monitors = {}
+
+        wait = asyncio.ensure_future(process.wait())
+        terminated = False
+
+        while True:
+            done,_ = await asyncio.wait({wait}, timeout=self.monitor_interval)
+            if done:
+                return wait.result()
+
+            if terminated:
+                continue
+
+            for solver,monitor in monitors.items():
+                # The transcripts are read in a thread, large files do not stall the other stages and runs
+                await asyncio.to_thread(monitor.update)
+                stop_reason = monitor.get_stop_reason()
+
+                if stop_reason:
+                    print('-'*60)
+                    print(red_text('Terminating model: "{}", the {} run has {}. {}'.format(model.name, solver, monitor.status, stop_reason)))
+                    process.terminate()
+                    terminated = True
+                    break
+
+
+    def estimate_makespan(self, models, durations, pools=None):
+        '''
+        ---------------------------------------------------
+        Simulates running the models in order within the licence pools and the resource limits, 
+        without running anything. Used to estimate how long a sweep takes under a licence budget.
+        ---------------------------------------------------
+        PARAMETERS
+        ---------------------------------------------------
+        models : list of Model
+            The models to run.
+
+        durations : list of float
+            The estimated run time of each model.
+
+        pools : dict, {'pool' : int, ...}
+            The licence budget to simulate, the configured licence pools are used if not given.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        start_times : np.ndarray
+            The estimated start time of each model.
+
+        makespan : float
+            The estimated time until every model has finished.
+        ---------------------------------------------------
+        '''
+        pools = dict(self.licences['pools'] if pools is None else pools)
+        demands = []
+
+        for model in models:
+            resources,_,_ = model.get_run_command()
+            demand = get_token_demand(self.licences['tokens'], {resource : model.get_solver_cores(resource) for resource in resources})
+
+            # The resource limits are simulated as pools with one token per stage
+            demand.update({'session:'+resource : 1 for resource in resources if resource in self.resource_limits})
+            demands.append(demand)
+
+        pools.update({'session:'+resource : limit for resource,limit in self.resource_limits.items()})
+
+        start_times, makespan = simulate_schedule(demands, durations, pools)
+
+        print('-'*60)
+        print('Estimated makespan of {} models: {}'.format(blue_text(len(models)), blue_text(makespan)))
+
+        return start_times, makespan
+
+
+    def get_demand(self, resources, solver_cores):
+        '''
+        ---------------------------------------------------
+        Returns the licence tokens used by the solvers of a stage, raises an error if they can never be met.
+        ---------------------------------------------------
+        '''
+        demand = get_token_demand(self.licences['tokens'], {resource : cores for resource,cores in solver_cores.items() if resource in resources})
+
+        for pool,tokens in demand.items():
+            if tokens > self.licences['pools'].get(pool, 0):
+                raise ValueError('{} "{}" tokens are needed but the licence pool only has {}.'.format(tokens, pool, self.licences['pools'].get(pool, 0)))
+
+        return demand
+
+
+    @asynccontextmanager
+    async def acquire(self, resources, demand=None):
+        '''
+        ---------------------------------------------------
+        Async context manager holding the semaphore of each resource and the licence tokens of the demand.
+        Resources are always acquired in sorted order, and the licence tokens are taken all at once, 
+        so that stages using several resources cannot deadlock.
+        ---------------------------------------------------
+        '''
+        async with AsyncExitStack() as stack:
+            for resource in sorted(set(resources)):
+                if resource in self.semaphores:
+                    await stack.enter_async_context(self.semaphores[resource])
+
+            await stack.enter_async_context(self.licence_pool.hold(demand or {}))
+            yield
@@ -0,0 +1,688 @@
+import io
+import os
+import re
+import sys
+import json
+import queue
+import threading
+import time
+import contextvars
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from Build_Orchestrator import Build_Orchestrator
+from Command_Line_Interface import get_parser, apply_json_arguments, Usage_Error
+from Command_Line_Interface import create_object_command, define_model, define_sweep, export_command, get_models, require
+from Command_Line_Interface import EXIT_SUCCESS, EXIT_FAILURE, EXIT_USAGE, EXIT_PARTIAL
+from HazelsAwesomeTheme import red_text,green_text,blue_text,yellow_text
+
+
+'''
+------------------------------------------------------------
+    ***Builder Service***
+------------------------------------------------------------
+    A local HTTP/JSON service wrapping one Modular_Abaqus_Builder, so
+    several people can share one database without racing on
+    "data.pickle". Started with:
+
+        python main.py serve --port 8765
+
+    Requests are queued as jobs and processed by a single worker
+    thread, so database writes are serialized. The worker takes every
+    job waiting in the queue as one batch: the models of all the build
+    jobs in a batch are built together by one Build_Orchestrator (and
+    the models of all the run jobs run together), so sweeps submitted
+    concurrently by different clients are parallelized within the
+    resource limits and licence pools.
+
+    Jobs use the same commands and options as Command_Line_Interface:
+    "create-object", "create-model", "sweep", "build" and "run".
+------------------------------------------------------------
+    **Endpoints**
+------------------------------------------------------------
+
+POST /jobs, body = {"command" : "sweep", "options" : {"analysis" : ..., "sweep" : {...}, ...}}
+    Queues a job, returns 202 and {"job_id" : ...}. Returns 400 if the options are not valid.
+
+GET /jobs
+    The status of every job.
+
+GET /jobs/<job_id>
+    The status, result and progress messages of a job.
+
+GET /jobs/<job_id>/events
+    Streams the progress messages of a job as server-sent events, until the job finishes.
+
+GET /database
+    The objects and models of the database, in the format of the "export" command.
+
+------------------------------------------------------------
+'''
+
+
+# Commands whose models are built together in a batch
+BUILD_COMMANDS = ('create-model', 'sweep', 'build')
+
+ANSI_PATTERN = re.compile(r'\x1b\[[0-9;]*m')
+
+
+class Job():
+    '''
+    ------------------------------------------------------------
+        ***Job***
+    ------------------------------------------------------------
+        A request queued in the Builder_Service.
+    ------------------------------------------------------------
+        **Attributes**
+    ------------------------------------------------------------
+
+    job_id : str
+        The id of the job.
+
+    command : str
+        The Command_Line_Interface command of the job.
+
+    args : argparse.Namespace
+        The options of the command.
+
+    status : str
+        "queued", "running", "finished" or "failed".
+
+    exit_code : int
+        The exit code of the command, see Command_Line_Interface. (NOTE: None until the job ends)
+
+    result : dict
+        The result of the command, e.g. {"built" : {'model_name' : bool, ...}}.
+
+    events : list of str
+        The progress messages of the job.
+
+    ------------------------------------------------------------
+        **Methods**
+    ------------------------------------------------------------
+
+    add_event(message):
+        Adds a progress message and wakes the clients streaming the events.
+
+    finish(exit_code, result=None, error=None):
+        Ends the job.
+
+    wait_for_events(start, timeout):
+        Waits until there are events after start or the job ended, returns the new events.
+
+    get_status(events=True):
+        Returns a dictionary of the status of the job.
+
+    ------------------------------------------------------------
+    '''
+
+    def __init__(self, job_id, command, args):
+        self.job_id = job_id
+        self.command = command
+        self.args = args
+
+        self.status = 'queued'
+        self.exit_code = None
+        self.result = {}
+        self.error = None
+        self.events = []
+
+        self.times = {'queued' : time.time()}
+        self.condition = threading.Condition()
+
+
+    def add_event(self, message):
+        with self.condition:
+            self.events.append(message)
+            self.condition.notify_all()
+
+
+    def start(self):
+        with self.condition:
+            self.status = 'running'
+            self.times['started'] = time.time()
+            self.condition.notify_all()
+
+
+    def finish(self, exit_code, result=None, error=None):
+        '''
+        ---------------------------------------------------
+        Ends the job, it failed unless the exit code is EXIT_SUCCESS or EXIT_PARTIAL.
+        ---------------------------------------------------
+        '''
+        with self.condition:
+            self.exit_code = exit_code
+            self.result = result or {}
+            self.error = error
+            self.status = 'finished' if exit_code in (EXIT_SUCCESS, EXIT_PARTIAL) else 'failed'
+            self.times['finished'] = time.time()
+
+            if error:
+                self.events.append(error)
+
+            self.condition.notify_all()
+
+
+    def wait_for_events(self, start, timeout=15.0):
+        '''
+        ---------------------------------------------------
+        Waits until there are events after index start or the job ended, returns the new events.
+        ---------------------------------------------------
+        '''
+        with self.condition:
+            self.condition.wait_for(lambda: len(self.events) > start or self.status in ('finished', 'failed'), timeout)
+            return self.events[start:]
+
+
+    def get_status(self, events=True):
+        '''
+        ---------------------------------------------------
+        Returns a dictionary of the status of the job.
+        ---------------------------------------------------
+        '''
+        with self.condition:
+            status = {'job_id' : self.job_id,
+                      'command' : self.command,
+                      'status' : self.status,
+                      'exit_code' : self.exit_code,
+                      'result' : self.result,
+                      'error' : self.error,
+                      'times' : dict(self.times)}
+
+            if events:
+                status['events'] = list(self.events)
+
+            return status
+
+
+class Batch_Output(io.TextIOBase):
+    '''
+    ------------------------------------------------------------
+        ***Batch_Output***
+    ------------------------------------------------------------
+        Stream that the output of the builder is redirected to while
+        a batch runs, every complete line is added as an event of the
+        jobs in the batch.
+    ------------------------------------------------------------
+    '''
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.partial_line = ''
+        self.lock = threading.Lock()
+
+
+    def write(self, text):
+        # The stages of a Build_Orchestrator write from several threads
+        with self.lock:
+            self.partial_line += text
+
+            *lines, self.partial_line = self.partial_line.split('\n')
+
+        for line in lines:
+            line = ANSI_PATTERN.sub('', line).strip()
+
+            # Skip the divider lines
+            if line.strip('-'):
+                for job in self.jobs:
+                    job.add_event(line)
+
+        return len(text)
+
+
+class Service_Output(io.TextIOBase):
+    '''
+    ------------------------------------------------------------
+        ***Service_Output***
+    ------------------------------------------------------------
+        Stream installed once as sys.stdout while the service runs. The
+        output of each thread goes to the stream it redirected to, and
+        the output of the other threads to the console, so the worker
+        thread and the request threads never swap sys.stdout under each
+        other. The stream is a context variable, so the threads started
+        by asyncio.to_thread in a Build_Orchestrator write to the stream
+        of the batch.
+    ------------------------------------------------------------
+    '''
+
+    def __init__(self, console):
+        self.console = console
+        self.stream = contextvars.ContextVar('stream', default=None)
+
+
+    def write(self, text):
+        return (self.stream.get() or self.console).write(text)
+
+
+    def flush(self):
+        (self.stream.get() or self.console).flush()
+
+
+    @contextmanager
+    def redirect(self, stream):
+        '''
+        ---------------------------------------------------
+        Writes the output of the current thread to stream until the context exits.
+        ---------------------------------------------------
+        '''
+        token = self.stream.set(stream)
+        try:
+            yield stream
+        finally:
+            self.stream.reset(token)
+
+
+class Builder_Service():
+    '''
+    ------------------------------------------------------------
+        ***Builder_Service***
+    ------------------------------------------------------------
+        Local HTTP/JSON service wrapping a Modular_Abaqus_Builder, see the
+        description of the module.
+    ------------------------------------------------------------
+        **Attributes**
+    ------------------------------------------------------------
+
+    builder : Modular_Abaqus_Builder
+        The builder of the shared database.
+
+    database_lock : threading.Lock
+        Held while the database is read or changed.
+
+    jobs : dict, {'job_id' : Job, ...}
+        Every job submitted to the service.
+
+    queue : queue.Queue
+        The jobs waiting to be processed.
+
+    server : ThreadingHTTPServer
+        The HTTP server, each request is handled in its own thread.
+
+    output : Service_Output
+        Installed as sys.stdout by serve_forever, the output of each thread is redirected through it.
+
+    ------------------------------------------------------------
+        **Methods**
+    ------------------------------------------------------------
+
+    serve_forever():
+        Starts the worker thread and serves requests until interrupted.
+
+    submit(command, options):
+        Checks the options of a command and queues it as a job.
+
+    process_jobs():
+        The worker thread, processes the queued jobs in batches.
+
+    process_batch(jobs):
+        Processes a batch of jobs, building and running their models together.
+
+    get_database():
+        Returns the objects and models of the database.
+
+    ------------------------------------------------------------
+    '''
+
+    def __init__(self, builder, host='127.0.0.1', port=8765):
+        self.builder = builder
+        self.database_lock = threading.Lock()
+        self.jobs = {}
+        self.queue = queue.Queue()
+        self.job_counter = 0
+
+        handler = type('Service_Request_Handler', (Request_Handler,), {'service' : self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+
+        self.output = Service_Output(sys.stdout)
+
+
+    def serve_forever(self):
+        '''
+        ---------------------------------------------------
+        Starts the worker thread and serves requests until interrupted with Ctrl+C.
+        ---------------------------------------------------
+        '''
+        # sys.stdout is swapped once, the threads only redirect their own output
+        self.output.console = sys.stdout
+        sys.stdout = self.output
+
+        worker = threading.Thread(target=self.process_jobs, daemon=True)
+        worker.start()
+
+        host, port = self.server.server_address[:2]
+        print('-'*60)
+        print(green_text('Builder service listening on: "http://{}:{}".'.format(host, port)))
+
+        try:
+            self.server.serve_forever()
+
+        except KeyboardInterrupt:
+            print('-'*60)
+            print(yellow_text('Stopping the builder service.'))
+
+        finally:
+            self.server.server_close()
+
+            # Let the current batch finish, so the database is saved
+            self.queue.put(None)
+            worker.join()
+
+            sys.stdout = self.output.console
+
+
+    def submit(self, command, options):
+        '''
+        ---------------------------------------------------
+        Checks the options of a command and queues it as a job.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        job : Job
+            The queued job.
+        ---------------------------------------------------
+        '''
+        if command not in ('create-object',) + BUILD_COMMANDS + ('run',):
+            raise Usage_Error('The command: "{}" can not be submitted as a job.'.format(command))
+
+        if not isinstance(options, dict):
+            raise Usage_Error('The options must be a dictionary.')
+
+        args = get_parser().parse_args([command])
+        args.json = options
+        args.stdout = io.StringIO()
+        apply_json_arguments(args)
+
+        with self.database_lock:
+            self.job_counter += 1
+            job = Job(str(self.job_counter), command, args)
+            self.jobs[job.job_id] = job
+
+        self.queue.put(job)
+        return job
+
+
+    def process_jobs(self):
+        '''
+        ---------------------------------------------------
+        The worker thread, every job waiting in the queue is processed as one batch.
+        ---------------------------------------------------
+        '''
+        while True:
+            jobs = [self.queue.get()]
+
+            while True:
+                try:
+                    jobs.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in jobs
+            jobs = [job for job in jobs if job is not None]
+
+            if jobs:
+                with self.output.redirect(Batch_Output(jobs)):
+                    try:
+                        self.process_batch(jobs)
+                    except Exception as error:
+                        for job in jobs:
+                            if job.exit_code is None:
+                                job.finish(EXIT_FAILURE, error='The batch failed: {}'.format(error))
+
+            if stop:
+                return
+
+
+    def process_batch(self, jobs):
+        '''
+        ---------------------------------------------------
+        Processes a batch of jobs. Objects are created and models are defined one job at a time while holding
+        the database lock, then the models of every build job are built together, and the models of every run
+        job are run together. Run jobs are resolved after the builds, so they can run models built in the same batch.
+        The database is saved once the batch has finished.
+        ---------------------------------------------------
+        '''
+        builds = {}
+        batch_names = set()
+
+        for job in jobs:
+            job.start()
+            args = job.args
+
+            if job.command == 'run':
+                continue
+
+            try:
+                with self.database_lock:
+                    if job.command == 'create-object':
+                        exit_code = create_object_command(self.builder, args)
+                        job.finish(exit_code, {'created' : args.name if exit_code == EXIT_SUCCESS else None})
+                        continue
+
+                    elif job.command == 'create-model':
+                        require(args, 'analysis', 'geometry', 'name')
+                        models = [define_model(self.builder, args, args.name, args.parameters or {})]
+
+                    elif job.command == 'sweep':
+                        models = define_sweep(self.builder, args)
+
+                    else:
+                        models = get_models(self.builder, args)
+
+                # Models defined by other jobs of the batch are not in the database yet
+                names = [model.name for model in models]
+                if batch_names & set(names):
+                    raise Usage_Error('The model names: "{}" are used by another job.'.format('", "'.join(sorted(batch_names & set(names)))))
+                batch_names.update(names)
+                builds[job] = models
+
+            except Usage_Error as error:
+                job.finish(EXIT_USAGE, error=str(error))
+
+            except Exception as error:
+                job.finish(EXIT_FAILURE, error=str(error))
+
+        try:
+            if builds:
+                self.build_batch(builds)
+
+            runs = {}
+            for job in jobs:
+                if job.command == 'run':
+                    try:
+                        with self.database_lock:
+                            runs[job] = get_models(self.builder, job.args)
+
+                    except Usage_Error as error:
+                        job.finish(EXIT_USAGE, error=str(error))
+
+                    except Exception as error:
+                        job.finish(EXIT_FAILURE, error=str(error))
+
+            if runs:
+                self.run_batch(runs)
+
+        # The models built before a failure are kept
+        finally:
+            with self.database_lock:
+                self.builder.save_database()
+
+
+    def build_batch(self, builds):
+        '''
+        ---------------------------------------------------
+        Builds the models of every build job of a batch together. Models rebuilt by "build" jobs have
+        their folder moved to the trash first, and are removed from the database if they fail to build.
+        ---------------------------------------------------
+        '''
+        for job,models in builds.items():
+            if job.command == 'build':
+                for model in models:
+                    if os.path.exists(model.fpath):
+                        self.builder.trash.move_to_trash(model.fpath)
+
+        models = [model for models in builds.values() for model in models]
+        print('Building {} models of {} jobs.'.format(len(models), len(builds)))
+
+        built = Build_Orchestrator(self.builder).build_models(models)
+
+        with self.database_lock:
+            for job,models in builds.items():
+                for model in models:
+                    if built[model.name]:
+                        self.builder.data['model'][model.name] = model
+                    elif job.command == 'build':
+                        self.builder.data['model'].pop(model.name, None)
+
+        for job,models in builds.items():
+            job_built = {model.name : built[model.name] for model in models}
+            job.finish(get_exit_code(job_built.values(), True), {'built' : job_built})
+
+
+    def run_batch(self, runs):
+        '''
+        ---------------------------------------------------
+        Runs the models of every run job of a batch together, a model requested by several jobs is only run once.
+        ---------------------------------------------------
+        '''
+        models = list({model.name : model for models in runs.values() for model in models}.values())
+        print('Running {} models of {} jobs.'.format(len(models), len(runs)))
+
+        return_codes = Build_Orchestrator(self.builder).run_models(models)
+
+        with self.database_lock:
+            for model in models:
+                model.run_return_code = return_codes[model.name]
+                self.builder.data['model'].mark_changed(model.name)
+
+        for job,models in runs.items():
+            job_return_codes = {model.name : return_codes[model.name] for model in models}
+            job.finish(get_exit_code(job_return_codes.values(), 0), {'return_codes' : job_return_codes})
+
+
+    def get_database(self):
+        '''
+        ---------------------------------------------------
+        Returns the objects and models of the database, in the format of the "export" command.
+        ---------------------------------------------------
+        '''
+        args = get_parser().parse_args(['export'])
+        args.stdout = io.StringIO()
+
+        with self.database_lock:
+            with self.output.redirect(io.StringIO()):
+                export_command(self.builder, args)
+
+        return json.loads(args.stdout.getvalue())
+
+
+def get_exit_code(results, success):
+    '''
+    ---------------------------------------------------
+    Returns EXIT_SUCCESS if every result is a success, EXIT_PARTIAL if some are, otherwise EXIT_FAILURE.
+    ---------------------------------------------------
+    '''
+    n_successful = [result == success for result in results].count(True)
+
+    if n_successful == len(results):
+        return EXIT_SUCCESS
+
+    return EXIT_PARTIAL if n_successful else EXIT_FAILURE
+
+
+class Request_Handler(BaseHTTPRequestHandler):
+    '''
+    ------------------------------------------------------------
+        ***Request_Handler***
+    ------------------------------------------------------------
+        Handles the HTTP requests of the Builder_Service, the service
+        is set as a class attribute by Builder_Service.
+    ------------------------------------------------------------
+    '''
+
+    service = None
+
+    def do_GET(self):
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+
+        if parts == ['database']:
+            return self.send_json(200, self.service.get_database())
+
+        if parts == ['jobs']:
+            return self.send_json(200, [job.get_status(events=False) for job in list(self.service.jobs.values())])
+
+        if len(parts) in (2, 3) and parts[0] == 'jobs' and parts[1] in self.service.jobs:
+            job = self.service.jobs[parts[1]]
+
+            if len(parts) == 2:
+                return self.send_json(200, job.get_status())
+
+            if parts[2] == 'events':
+                return self.stream_events(job)
+
+        self.send_json(404, {'error' : 'Not found: "{}".'.format(self.path)})
+
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/jobs':
+            return self.send_json(404, {'error' : 'Not found: "{}".'.format(self.path)})
+
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            job = self.service.submit(body.get('command'), body.get('options', {}))
+
+        except (ValueError, AttributeError):
+            return self.send_json(400, {'error' : 'The request body must be a JSON dictionary.'})
+
+        except Usage_Error as error:
+            return self.send_json(400, {'error' : str(error)})
+
+        self.send_json(202, {'job_id' : job.job_id})
+
+
+    def stream_events(self, job):
+        '''
+        ---------------------------------------------------
+        Streams the progress messages of a job as server-sent events until the job ends.
+        ---------------------------------------------------
+        '''
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        index = 0
+        try:
+            while True:
+                events = job.wait_for_events(index)
+
+                for message in events:
+                    self.wfile.write('data: {}\n\n'.format(json.dumps({'index' : index, 'message' : message})).encode())
+                    index += 1
+
+                if job.status in ('finished', 'failed') and index >= len(job.events):
+                    self.wfile.write('event: end\ndata: {}\n\n'.format(json.dumps(job.get_status(events=False))).encode())
+                    return
+
+                # Keep the connection open while waiting
+                if not events:
+                    self.wfile.write(b': keep-alive\n\n')
+
+                self.wfile.flush()
+
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+
+    def send_json(self, code, data):
+        body = json.dumps(data, default=str).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args):
+        # Requests are not logged, the service output is the output of the builder
+        pass
@@ -0,0 +1,734 @@
+import os
+import sys
+import math
+import json
+import argparse
+from contextlib import redirect_stdout, nullcontext
+
+from Seekable_Zstd import find_file
+from Parameters import check_parameters_file
+
+
+'''
+------------------------------------------------------------
+    ***Command Line Interface***
+------------------------------------------------------------
+    Headless interface to the database, so objects and models can be
+    created, built and run from the shell, cron or batch jobs without
+    the inquirer dialogs. Used by main.py when it is given arguments:
+
+        python main.py create-object analysis --name vibration --description "Explicit vibration" --source bin/analysis/simple_rigid_vibration
+        python main.py ingest bin --workers 8
+        python main.py create-model --analysis vibration --geometry 30um_grid --name model_1 --parameters '{"vibration_frequency" : 20000}'
+        python main.py sweep --json sweep.json
+        python main.py submodel-sweep --analysis droplet --geometry 50um_grid --materials water silicon --name droplet --global-model global_1
+        python main.py rebuild-stale --all
+        python main.py run model_1 model_2
+        python main.py materialize --all
+        python main.py validate
+        python main.py export --output models.json
+        python main.py bundle --all --output sweep.tar.zst
+        python main.py serve --port 8765
+
+    Every option can also be given in a JSON file with --json (keys are
+    the option names, e.g. "parameters", "solver_cpus"), options given
+    on the command line take precedence. Options that take a dictionary
+    accept JSON text or the path of a .json file. The models written by
+    "export" use the same keys as "create-model", so they can be passed
+    back in with --json.
+
+    The database is only loaded once the arguments are valid, so errors
+    in the arguments are reported without loading it.
+------------------------------------------------------------
+    **Exit Codes**
+------------------------------------------------------------
+
+EXIT_SUCCESS = 0
+    The command finished successfully.
+
+EXIT_FAILURE = 1
+    The command failed, or "validate" found an invalid object or model.
+
+EXIT_USAGE = 2
+    The arguments or JSON input were not valid.
+
+EXIT_PARTIAL = 3
+    Some of the models failed to build or run, or some variants of a sweep were not valid.
+
+------------------------------------------------------------
+    **Functions**
+------------------------------------------------------------
+
+main(argv=None):
+    Runs the command given by the arguments and returns the exit code.
+
+get_parser():
+    Returns the argument parser of the subcommands.
+
+load_builder(read_only=False):
+    Loads the database without deleting anything.
+
+create_object_command(builder, args):
+ingest_command(builder, args):
+create_model_command(builder, args):
+sweep_command(builder, args):
+submodel_sweep_command(builder, args):
+build_command(builder, args):
+rebuild_stale_command(builder, args):
+run_command(builder, args):
+materialize_command(builder, args):
+validate_command(builder, args):
+export_command(builder, args):
+bundle_command(builder, args):
+serve_command(builder, args):
+    The subcommands, each returns an exit code.
+
+------------------------------------------------------------
+'''
+
+
+EXIT_SUCCESS = 0
+EXIT_FAILURE = 1
+EXIT_USAGE = 2
+EXIT_PARTIAL = 3
+
+
+class Usage_Error(Exception):
+    '''
+    ------------------------------------------------------------
+        ***Usage_Error***
+    ------------------------------------------------------------
+        Raised when the arguments or JSON input of a command are not
+        valid, the command exits with EXIT_USAGE.
+    ------------------------------------------------------------
+    '''
+
+
+def json_argument(value):
+    '''
+    ---------------------------------------------------
+    Reads an argument given as JSON text, or as the path of a .json file.
+    ---------------------------------------------------
+    '''
+    try:
+        if os.path.isfile(value):
+            with open(value,'r') as f:
+                return json.load(f)
+
+        return json.loads(value)
+
+    except (OSError, ValueError) as error:
+        raise argparse.ArgumentTypeError('"{}" is not valid JSON or a JSON file: {}'.format(value, error))
+
+
+def get_parser():
+    '''
+    ---------------------------------------------------
+    Returns the argument parser of the subcommands.
+    ---------------------------------------------------
+    '''
+    parser = argparse.ArgumentParser(prog='main.py', description='Headless interface to the Modular Abaqus Builder database.')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Only print the result of the command, not the output of the database.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    create_object = subparsers.add_parser('create-object', help='Create an analysis, geometry or material object from a folder.')
+    create_object.add_argument('object_type', nargs='?', choices=['analysis', 'geometry', 'material'])
+    create_object.add_argument('--name')
+    create_object.add_argument('--description')
+    create_object.add_argument('--source', help='The folder to copy the object files from, it must contain a "parameters.json".')
+
+    ingest = subparsers.add_parser('ingest', help='Create an object from every folder of a library, e.g. "bin" with "analysis", "geometry" and "materials" folders.')
+    ingest.add_argument('library', help='The library folder, or a folder of one object type.')
+    ingest.add_argument('--workers', type=int, help='The number of files copied at once.')
+
+    for name,help_message in (('create-model', 'Create and build a model.'), ('sweep', 'Create and build a sweep of models.'), ('submodel-sweep', 'Create and build a model at every grid position of the geometry where the submodels lie inside the global mesh.')):
+        model_parser = subparsers.add_parser(name, help=help_message)
+        model_parser.add_argument('--analysis')
+        model_parser.add_argument('--geometry')
+        model_parser.add_argument('--materials', nargs='*', help='The names of the material objects.')
+        model_parser.add_argument('--name', help='The model name, or the prefix of the model names of a sweep.')
+        model_parser.add_argument('--description')
+        model_parser.add_argument('--parameters', type=json_argument, help='JSON dictionary of parameter values, parameters not given keep their default value.')
+        model_parser.add_argument('--solver-cpus', type=json_argument, help='JSON dictionary of the cpus of each solver of an MPCCI model.')
+        model_parser.add_argument('--global-model', help='The model to import the global results from for submodel analyses.')
+        model_parser.add_argument('--overlay', action='store_true', help='Link the unmodified object files into the model folder instead of copying them (abaqus models only).')
+
+        if name == 'sweep':
+            model_parser.add_argument('--sweep', type=json_argument, help='JSON dictionary of the list of values of each swept parameter.')
+
+    build = subparsers.add_parser('build', help='Rebuild the folders of models in the database from their objects.')
+    build.add_argument('models', nargs='*')
+    build.add_argument('--all', action='store_true')
+
+    rebuild_stale = subparsers.add_parser('rebuild-stale', help='Rebuild the models whose analysis, geometry or material files changed since they were built.')
+    rebuild_stale.add_argument('models', nargs='*')
+    rebuild_stale.add_argument('--all', action='store_true')
+    rebuild_stale.add_argument('--include-unrecorded', action='store_true', help='Also rebuild the models built before their provenance was recorded.')
+
+    run = subparsers.add_parser('run', help='Run the solvers of models concurrently.')
+    run.add_argument('models', nargs='*')
+    run.add_argument('--all', action='store_true')
+    run.add_argument('--no-cache', action='store_true', help='Run the solvers even if a run with the same inputs is cached.')
+
+    materialize = subparsers.add_parser('materialize', help='Replace the links of overlay models with copies of the object files, e.g. before copying them to a cluster.')
+    materialize.add_argument('models', nargs='*')
+    materialize.add_argument('--all', action='store_true')
+
+    subparsers.add_parser('validate', help='Check the objects and models against their folders, without changing anything.')
+
+    export = subparsers.add_parser('export', help='Write the objects and models of the database as JSON.')
+    export.add_argument('models', nargs='*', help='The models to export, all models if none are given.')
+    export.add_argument('--output', help='The file to write, stdout if not given.')
+
+    bundle = subparsers.add_parser('bundle', help='Pack the folders of models into one compressed bundle to copy to a cluster, see Model_Bundle.py.')
+    bundle.add_argument('models', nargs='*')
+    bundle.add_argument('--all', action='store_true')
+    bundle.add_argument('--output', help='The bundle to write, e.g. "sweep.tar.zst".')
+    bundle.add_argument('--level', type=int, default=10, choices=range(1, 23), metavar='{1-22}', help='The zstd compression level.')
+
+    serve = subparsers.add_parser('serve', help='Serve the database to several clients over HTTP, see Builder_Service.py.')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+
+    for subparser in subparsers.choices.values():
+        subparser.add_argument('--json', type=json_argument, help='JSON dictionary (or file) of options, options given as flags take precedence.')
+
+    return parser
+
+
+def apply_json_arguments(args):
+    '''
+    ---------------------------------------------------
+    Sets the options not given on the command line from the --json dictionary.
+    ---------------------------------------------------
+    '''
+    if args.json is None:
+        return
+
+    if not isinstance(args.json, dict):
+        raise Usage_Error('The --json input must be a dictionary of options.')
+
+    for key,value in args.json.items():
+        key = key.replace('-', '_')
+
+        if key in ('json', 'command', 'stdout') or not hasattr(args, key):
+            raise Usage_Error('The option: "{}" is not used by the "{}" command.'.format(key, args.command))
+
+        if getattr(args, key) in (None, [], False):
+            setattr(args, key, value)
+
+
+def main(argv=None):
+    '''
+    ---------------------------------------------------
+    Runs the command given by the arguments.
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    exit_code : int
+        One of EXIT_SUCCESS, EXIT_FAILURE, EXIT_USAGE or EXIT_PARTIAL.
+    ---------------------------------------------------
+    '''
+    parser = get_parser()
+    args = parser.parse_args(argv)
+
+    commands = {'create-object' : create_object_command,
+                'ingest' : ingest_command,
+                'create-model' : create_model_command,
+                'sweep' : sweep_command,
+                'submodel-sweep' : submodel_sweep_command,
+                'build' : build_command,
+                'rebuild-stale' : rebuild_stale_command,
+                'run' : run_command,
+                'materialize' : materialize_command,
+                'validate' : validate_command,
+                'export' : export_command,
+                'bundle' : bundle_command,
+                'serve' : serve_command}
+
+    # The database is only saved by commands that change it
+    read_only = args.command in ('validate', 'export', 'bundle')
+
+    # The results of the commands are printed to stdout even when the output of the database is hidden
+    args.stdout = sys.stdout
+
+    try:
+        apply_json_arguments(args)
+
+        # JSON exported to stdout is not mixed with the output of the database
+        quiet = args.quiet or (args.command == 'export' and not args.output)
+
+        with open(os.devnull,'w') if quiet else nullcontext() as devnull:
+            with redirect_stdout(devnull) if quiet else nullcontext():
+                builder = load_builder(read_only)
+                exit_code = commands[args.command](builder, args)
+
+                if not read_only:
+                    builder.save_database()
+
+    except Usage_Error as error:
+        print('{}: error: {}'.format(parser.prog, error), file=sys.stderr)
+        return EXIT_USAGE
+
+    except KeyboardInterrupt:
+        print('{}: interrupted'.format(parser.prog), file=sys.stderr)
+        return EXIT_FAILURE
+
+    except Exception as error:
+        print('{}: {} failed: {}'.format(parser.prog, args.command, error), file=sys.stderr)
+        return EXIT_FAILURE
+
+    return exit_code
+
+
+def load_builder(read_only=False):
+    '''
+    ---------------------------------------------------
+    Loads the database without deleting anything. The builder is imported here so the
+    arguments are checked before the solver and numerical libraries are imported.
+    Read only commands load the database without creating any files, and raise a Usage_Error
+    if there is no database.
+    ---------------------------------------------------
+    '''
+    from Modular_Abaqus_Builder import Modular_Abaqus_Builder
+
+    try:
+        return Modular_Abaqus_Builder(delete_database=False, delete_all_models=False, read_only=read_only)
+
+    except FileNotFoundError as error:
+        raise Usage_Error('{} Create an object or model first.'.format(error))
+
+
+def report(args, message):
+    '''
+    ---------------------------------------------------
+    Prints the result of a command to stdout, even with --quiet.
+    ---------------------------------------------------
+    '''
+    print(message, file=args.stdout)
+
+
+def require(args, *names):
+    '''
+    ---------------------------------------------------
+    Raises a Usage_Error if any of the options was not given.
+    ---------------------------------------------------
+    '''
+    missing = ['--'+name.replace('_', '-') for name in names if getattr(args, name) in (None, '')]
+
+    if missing:
+        raise Usage_Error('The "{}" command requires the options: {}.'.format(args.command, ', '.join(missing)))
+
+
+def check_names(builder, object_type, names):
+    '''
+    ---------------------------------------------------
+    Raises a Usage_Error if any of the names is not in the database.
+    ---------------------------------------------------
+    '''
+    missing = [name for name in names if name not in builder.data[object_type]]
+
+    if missing:
+        raise Usage_Error('The {} names: "{}" are not in the database.'.format(object_type, '", "'.join(missing)))
+
+
+def get_models(builder, args):
+    '''
+    ---------------------------------------------------
+    Returns the models named in the arguments, or every model if --all was given.
+    ---------------------------------------------------
+    '''
+    if args.all:
+        return list(builder.data['model'].values())
+
+    if not args.models:
+        raise Usage_Error('Give the names of the models, or --all.')
+
+    check_names(builder, 'model', args.models)
+
+    return [builder.data['model'][model_name] for model_name in args.models]
+
+
+def define_model(builder, args, name, parameter_values):
+    '''
+    ---------------------------------------------------
+    Defines a model from the arguments without building it.
+    ---------------------------------------------------
+    '''
+    from Model import Model
+
+    check_names(builder, 'analysis', [args.analysis])
+    check_names(builder, 'geometry', [args.geometry])
+    check_names(builder, 'material', args.materials or [])
+
+    model = Model(builder,
+                  args.analysis,
+                  args.geometry,
+                  args.materials or [],
+                  name = name,
+                  description = args.description or '',
+                  parameter_values = parameter_values,
+                  solver_cpus = args.solver_cpus,
+                  global_model_name = args.global_model,
+                  overlay = args.overlay or None,
+                  build = False)
+
+    # Nothing is prompted for during the build
+    try:
+        model.check_build_options()
+    except ValueError as error:
+        raise Usage_Error('{} Use the --solver-cpus and --global-model options.'.format(error))
+
+    return model
+
+
+def create_object_command(builder, args):
+    '''
+    ---------------------------------------------------
+    Creates an object from a folder. The folder must contain a "parameters.json" (and a "requirements.json"
+    for analyses) so that nothing is prompted for.
+    ---------------------------------------------------
+    '''
+    require(args, 'object_type', 'name', 'source')
+
+    if not os.path.isfile(os.path.join(args.source, 'parameters.json')):
+        raise Usage_Error('The source folder: "{}" does not contain a "parameters.json".'.format(args.source))
+
+    errors = check_parameters_file(os.path.join(args.source, 'parameters.json'))
+    if errors:
+        raise Usage_Error(' '.join(errors))
+
+    if args.object_type == 'analysis' and not os.path.isfile(os.path.join(args.source, 'requirements.json')):
+        raise Usage_Error('The source folder: "{}" does not contain a "requirements.json".'.format(args.source))
+
+    if not builder.create_object(args.object_type, args.name, args.description or '', args.source):
+        return EXIT_FAILURE
+
+    report(args, 'Created {}: "{}".'.format(args.object_type, args.name))
+    return EXIT_SUCCESS
+
+
+def ingest_command(builder, args):
+    '''
+    ---------------------------------------------------
+    Creates an object from every folder of a library that contains a "parameters.json" and a
+    "requirements.json", the other folders are skipped.
+    ---------------------------------------------------
+    '''
+    if not os.path.isdir(args.library):
+        raise Usage_Error('The library folder: "{}" does not exist.'.format(args.library))
+
+    if args.workers is not None and args.workers < 1:
+        raise Usage_Error('The number of workers must be at least 1.')
+
+    try:
+        ingested = builder.ingest_library(args.library, args.workers)
+    except ValueError as error:
+        raise Usage_Error(str(error))
+
+    report(args, 'Ingested {} objects{}'.format(len(ingested), ': ' + ', '.join(['{} "{}"'.format(object_type, name) for object_type,name in ingested]) + '.' if ingested else '.'))
+    return EXIT_SUCCESS if ingested else EXIT_FAILURE
+
+
+def create_model_command(builder, args):
+    '''
+    ---------------------------------------------------
+    Creates and builds a model.
+    ---------------------------------------------------
+    '''
+    require(args, 'analysis', 'geometry', 'name')
+
+    model = define_model(builder, args, args.name, args.parameters or {})
+
+    if not builder.build_models([model])[model.name]:
+        return EXIT_FAILURE
+
+    report(args, 'Created model: "{}".'.format(model.name))
+    return EXIT_SUCCESS
+
+
+def sweep_command(builder, args):
+    '''
+    ---------------------------------------------------
+    Creates and builds a sweep of models, named "{name}_{index}". Only the valid variants are built, so the
+    exit code is EXIT_PARTIAL if any variant was not valid.
+    ---------------------------------------------------
+    '''
+    models = define_sweep(builder, args)
+    built = builder.build_models(models)
+
+    n_variants = math.prod([len(values) for values in args.sweep.values()])
+    n_invalid = n_variants - len(models)
+
+    report(args, 'Built {} of {} models of the sweep "{}"{}.'.format(sum(built.values()), len(built), args.name, ', {} variants were not valid'.format(n_invalid) if n_invalid else ''))
+
+    if not any(built.values()):
+        return EXIT_FAILURE
+
+    return EXIT_SUCCESS if all(built.values()) and not n_invalid else EXIT_PARTIAL
+
+
+def submodel_sweep_command(builder, args):
+    '''
+    ---------------------------------------------------
+    Creates and builds a model at every grid position of the geometry, named "{name}_{index}". The grid positions
+    where a submodel lies outside of the global mesh are not built.
+    ---------------------------------------------------
+    '''
+    require(args, 'analysis', 'geometry', 'name')
+
+    template = define_model(builder, args, args.name, args.parameters or {})
+
+    try:
+        args.sweep = builder.get_grid_sweep(template)
+    except ValueError as error:
+        raise Usage_Error(str(error))
+
+    return sweep_command(builder, args)
+
+
+def define_sweep(builder, args):
+    '''
+    ---------------------------------------------------
+    Defines the models of the valid variants of a sweep without building them, an error is raised if no variant is valid.
+    ---------------------------------------------------
+    '''
+    require(args, 'analysis', 'geometry', 'name', 'sweep')
+
+    if not (isinstance(args.sweep, dict) and args.sweep and all([isinstance(values, list) and values for values in args.sweep.values()])):
+        raise Usage_Error('--sweep must be a dictionary of a non-empty list of values for each swept parameter.')
+
+    template = define_model(builder, args, args.name, args.parameters or {})
+
+    # Check and convert the swept values with the dtype of each parameter
+    sweep = {}
+    for parameter_name,values in args.sweep.items():
+        if parameter_name not in template.parameters:
+            raise Usage_Error('The parameter: "{}" is not used by the model.'.format(parameter_name))
+
+        dtype = template.parameters[parameter_name]['dtype']
+        if not all([template.validate_parameter_value(dtype, None, str(value)) for value in values]):
+            raise Usage_Error('The values of the parameter: "{}" are not valid, dtype = "{}".'.format(parameter_name, dtype))
+
+        sweep[parameter_name] = [int(value) if dtype == 'int' else float(value) for value in values]
+
+    variants = builder.get_sweep_variants(template, sweep)
+
+    return [define_model(builder, args, model_name, dict(args.parameters or {}, **variant_values)) for model_name,variant_values in variants.items()]
+
+
+def build_command(builder, args):
+    '''
+    ---------------------------------------------------
+    Rebuilds the folders of models in the database from their objects, e.g. after an object was modified.
+    Models that fail to rebuild are removed from the database, as their folder is moved to the trash.
+    ---------------------------------------------------
+    '''
+    models = get_models(builder, args)
+
+    for model in models:
+        if os.path.exists(model.fpath):
+            builder.trash.move_to_trash(model.fpath)
+
+    built = builder.build_models(models)
+
+    for model_name,success in built.items():
+        if not success:
+            builder.data['model'].pop(model_name)
+            print('Model: "{}" failed to build and was removed from the database.'.format(model_name), file=sys.stderr)
+
+    report(args, 'Built {} of {} models.'.format(sum(built.values()), len(built)))
+
+    if not any(built.values()) and built:
+        return EXIT_FAILURE
+
+    return EXIT_SUCCESS if all(built.values()) else EXIT_PARTIAL
+
+
+def rebuild_stale_command(builder, args):
+    '''
+    ---------------------------------------------------
+    Rebuilds the models whose objects changed since they were built. Models that fail to rebuild keep
+    their previous build.
+    ---------------------------------------------------
+    '''
+    built = builder.rebuild_stale_models(get_models(builder, args), args.include_unrecorded)
+
+    report(args, 'Rebuilt {} of {} stale models.'.format(sum(built.values()), len(built)))
+
+    if not any(built.values()) and built:
+        return EXIT_FAILURE
+
+    return EXIT_SUCCESS if all(built.values()) else EXIT_PARTIAL
+
+
+def run_command(builder, args):
+    '''
+    ---------------------------------------------------
+    Runs the solvers of models concurrently within the resource limits and licence pools.
+    ---------------------------------------------------
+    '''
+    from Build_Orchestrator import Build_Orchestrator
+
+    models = get_models(builder, args)
+    return_codes = Build_Orchestrator(builder, use_cache=not args.no_cache).run_models(models)
+
+    for model_name,return_code in return_codes.items():
+        builder.data['model'][model_name].run_return_code = return_code
+        builder.data['model'].mark_changed(model_name)
+
+    n_successful = list(return_codes.values()).count(0)
+    report(args, '{} of {} models finished successfully.'.format(n_successful, len(return_codes)))
+
+    if n_successful == len(return_codes):
+        return EXIT_SUCCESS
+
+    return EXIT_PARTIAL if n_successful else EXIT_FAILURE
+
+
+def materialize_command(builder, args):
+    '''
+    ---------------------------------------------------
+    Replaces the links of overlay models with copies of the object files, so the model folders are standalone.
+    Models that are not overlays are skipped.
+    ---------------------------------------------------
+    '''
+    models = [model for model in get_models(builder, args) if getattr(model, 'overlay', False)]
+
+    materialized = {}
+    for model in models:
+        try:
+            model.materialize()
+            builder.data['model'].mark_changed(model.name)
+            materialized[model.name] = True
+
+        except FileNotFoundError:
+            print('Model: "{}" links object files that no longer exist, rebuild it with "build".'.format(model.name), file=sys.stderr)
+            materialized[model.name] = False
+
+    report(args, 'Materialized {} of {} overlay models.'.format(sum(materialized.values()), len(materialized)))
+
+    if not any(materialized.values()) and materialized:
+        return EXIT_FAILURE
+
+    return EXIT_SUCCESS if all(materialized.values()) else EXIT_PARTIAL
+
+
+def validate_command(builder, args):
+    '''
+    ---------------------------------------------------
+    Checks the objects and models against their folders without changing or deleting anything
+    (unlike validate_database() of the interactive interface).
+    ---------------------------------------------------
+    '''
+    problems = []
+
+    for object_type in ('analysis', 'geometry', 'material'):
+        for object_name,obj in builder.data[object_type].items():
+            if not os.path.isdir(obj.fpath):
+                problems.append('{} "{}": the folder "{}" does not exist.'.format(object_type, object_name, obj.fpath))
+
+            elif not all([find_file(os.path.join(obj.fpath, file_name)) for file_name in obj.files]):
+                problems.append('{} "{}": files are missing from the folder.'.format(object_type, object_name))
+
+    for model_name,model in builder.data['model'].items():
+        if not os.path.isdir(model.fpath):
+            problems.append('model "{}": the folder "{}" does not exist.'.format(model_name, model.fpath))
+
+        missing = [name for object_type,name in [('analysis', model.analysis.name), ('geometry', model.geometry.name)] + [('material', name) for name in model.materials.keys()] if name not in builder.data[object_type]]
+        if missing:
+            problems.append('model "{}": the objects "{}" are not in the database.'.format(model_name, '", "'.join(missing)))
+
+    for problem in problems:
+        print(problem, file=sys.stderr)
+
+    report(args, '{} problems found in {} objects and {} models.'.format(len(problems), sum([len(builder.data[object_type]) for object_type in ('analysis', 'geometry', 'material')]), len(builder.data['model'])))
+
+    return EXIT_FAILURE if problems else EXIT_SUCCESS
+
+
+def export_command(builder, args):
+    '''
+    ---------------------------------------------------
+    Writes the objects and models of the database as JSON. Each model uses the options of "create-model".
+    ---------------------------------------------------
+    '''
+    model_names = args.models or list(builder.data['model'].keys())
+    check_names(builder, 'model', model_names)
+
+    export = {object_type : {object_name : {'description' : obj.description,
+                                            'fpath' : obj.fpath,
+                                            'parameters' : obj.parameters,
+                                            'requirements' : obj.requirements} for object_name,obj in builder.data[object_type].items()} for object_type in ('analysis', 'geometry', 'material')}
+
+    export['model'] = {model_name : export_model(builder.data['model'][model_name]) for model_name in model_names}
+
+    text = json.dumps(export, indent=4, default=str)
+
+    if args.output:
+        with open(args.output,'w') as f:
+            f.write(text)
+        report(args, 'Exported {} models to: "{}".'.format(len(model_names), args.output))
+
+    else:
+        report(args, text)
+
+    return EXIT_SUCCESS
+
+
+def export_model(model):
+    '''
+    ---------------------------------------------------
+    Returns the options of "create-model" that recreate a model.
+    ---------------------------------------------------
+    '''
+    return {'name' : model.name,
+            'description' : model.description,
+            'analysis' : model.analysis.name,
+            'geometry' : model.geometry.name,
+            'materials' : list(model.materials.keys()),
+            'parameters' : {parameter_name : parameter['default_value'] for parameter_name,parameter in model.parameters.items()},
+            'solver_cpus' : getattr(model, 'solver_cpus', None),
+            'global_model' : getattr(model, 'global_model_name', None)}
+
+
+def bundle_command(builder, args):
+    '''
+    ---------------------------------------------------
+    Packs the folders of models into one zstd compressed bundle, each unique file is stored once.
+    The bundle is unpacked on the cluster with "python Model_Bundle.py unpack BUNDLE DESTINATION".
+    ---------------------------------------------------
+    '''
+    from Model_Bundle import write_bundle
+
+    require(args, 'output')
+    models = get_models(builder, args)
+
+    missing = [model.name for model in models if not os.path.isdir(model.fpath)]
+    if missing:
+        raise Usage_Error('The models: "{}" have no model folder, build them first.'.format('", "'.join(missing)))
+
+    bundle = {}
+    for model in models:
+        _, cwd, command = model.get_run_command()
+        bundle[model.name] = {'fpath' : model.fpath,
+                              'model' : export_model(model),
+                              'run' : {'cwd' : os.path.relpath(cwd, model.fpath).replace(os.sep, '/'), 'command' : command}}
+
+    manifest = write_bundle(args.output, bundle, args.level)
+
+    report(args, 'Bundled {} models ({} unique files) to: "{}".'.format(len(models), len(manifest['blobs']), args.output))
+    return EXIT_SUCCESS
+
+
+def serve_command(builder, args):
+    '''
+    ---------------------------------------------------
+    Serves the database over HTTP until interrupted, see Builder_Service.py.
+    ---------------------------------------------------
+    '''
+    from Builder_Service import Builder_Service
+
+    Builder_Service(builder, args.host, args.port).serve_forever()
+
+    return EXIT_SUCCESS
@@ -0,0 +1,230 @@
+import os
+import re
+import hashlib
+import xml.etree.ElementTree as ET
+from xml.parsers import expat
+from xml.sax.saxutils import escape
+
+
+'''
+------------------------------------------------------------
+    ***Csp_Template***
+------------------------------------------------------------
+    Template of an MPCCI project file (.csp) used to write the .csp file of many models.
+
+    The locations of the editable "param" values are found once,
+    each model's .csp file is then written by patching only the
+    bytes of those values. The rest of the file is copied exactly,
+    so the output is deterministic and identical to the original
+    apart from the changed values.
+------------------------------------------------------------
+    **Attributes**
+------------------------------------------------------------
+
+fpath : str
+    The filepath of the template .csp file.
+
+locations : dict, {'key' : 'XPATH', ...}
+    The ElementTree XPath of each editable element, relative to the root element.
+
+data : bytes
+    The contents of the template .csp file.
+
+spans : dict, {'key' : (start, end), ...}
+    The byte span of the "value" attribute of each editable element.
+
+------------------------------------------------------------
+    **Methods**
+------------------------------------------------------------
+
+compile():
+    Parses the template once and finds the byte span of the value of every location.
+
+render(values):
+    Returns the contents of a .csp file with the values of the given keys replaced.
+
+write(fpath, values):
+    Writes a .csp file with the values of the given keys replaced.
+
+------------------------------------------------------------
+    **Functions**
+------------------------------------------------------------
+
+get_value_span(data, start):
+    Returns the byte span of the "value" attribute of the start tag at start.
+
+load_csp_template(fpath, locations):
+    Returns a compiled Csp_Template, templates with the same contents and locations are only compiled once.
+
+------------------------------------------------------------
+'''
+
+
+# Compiled templates, keyed by the hash of the template contents and the locations
+TEMPLATE_CACHE = {}
+
+# Matches the name at the beginning of a start tag, and each attribute after it
+START_TAG_PATTERN = re.compile(rb'<[^\s/>]+')
+ATTRIBUTE_PATTERN = re.compile(rb'\s*([^\s=/>]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
+
+class Csp_Template():
+
+    def __init__(self, fpath, locations, data=None):
+        '''
+        ---------------------------------------------------
+        Reads the template file and compiles the locations of the editable values.
+        ---------------------------------------------------
+        PARAMETERS
+        ---------------------------------------------------
+        fpath : str
+            The filepath of the template .csp file.
+
+        locations : dict, {'key' : 'XPATH', ...}
+            The XPath of each editable element, e.g. {'fluent_cpus' : './code[@name="FLUENT"]//param[@name="NumProcs"]'}.
+
+        data : bytes
+            The contents of the template, read from fpath if not given.
+        ---------------------------------------------------
+        '''
+        self.fpath = fpath
+        self.locations = dict(locations)
+
+        if data is None:
+            with open(fpath,'rb') as f:
+                data = f.read()
+
+        self.data = data
+        self.compile()
+
+
+    def compile(self):
+        '''
+        ---------------------------------------------------
+        Parses the template once, recording the byte offset of every element. Each XPath location
+        is resolved with ElementTree and the span of the "value" attribute of the element is stored.
+        ---------------------------------------------------
+        '''
+        builder = ET.TreeBuilder()
+        offsets = {}
+
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+
+        def start_element(tag, attrib):
+            offsets[id(builder.start(tag, attrib))] = parser.CurrentByteIndex
+
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = builder.end
+        parser.CharacterDataHandler = builder.data
+        parser.Parse(self.data, True)
+
+        root = builder.close()
+
+        self.spans = {}
+        missing = []
+
+        for key,location in self.locations.items():
+            element = root.find(location)
+
+            if element is None:
+                missing.append(key)
+                continue
+
+            span = get_value_span(self.data, offsets[id(element)])
+
+            if span is None:
+                missing.append(key)
+                continue
+
+            self.spans[key] = span
+
+        if missing:
+            raise KeyError('The locations: "{}" do not match an element with a value in "{}".'.format('", "'.join(missing), self.fpath))
+
+        # Spans are patched in file order
+        self.ordered_keys = sorted(self.spans.keys(), key = lambda key: self.spans[key][0])
+
+
+    def render(self, values):
+        '''
+        ---------------------------------------------------
+        Returns the contents of a .csp file with the values of the given keys replaced.
+        ---------------------------------------------------
+        PARAMETERS
+        ---------------------------------------------------
+        values : dict, {'key' : value, ...}
+            The new values, keys that are not given keep the value of the template.
+        ---------------------------------------------------
+        '''
+        unknown = set(values.keys()) - set(self.spans.keys())
+        if unknown:
+            raise KeyError('The keys: "{}" are not locations of the template.'.format('", "'.join(sorted(unknown))))
+
+        pieces = []
+        position = 0
+
+        for key in self.ordered_keys:
+            if key not in values:
+                continue
+
+            start,end = self.spans[key]
+            pieces.append(self.data[position:start])
+            pieces.append(escape(str(values[key]), {'"' : '&quot;', "'" : '&apos;'}).encode('utf-8'))
+            position = end
+
+        pieces.append(self.data[position:])
+
+        return b''.join(pieces)
+
+
+    def write(self, fpath, values):
+        '''
+        ---------------------------------------------------
+        Writes a .csp file with the values of the given keys replaced.
+        ---------------------------------------------------
+        '''
+        with open(fpath,'wb') as f:
+            f.write(self.render(values))
+
+
+def get_value_span(data, start):
+    '''
+    ---------------------------------------------------
+    Returns the byte span of the "value" attribute of the start tag at start, None if it has none. The
+    attributes are read in turn, so a ">" or "value=" inside of another attribute value (which XML does not
+    require to be escaped) is skipped.
+    ---------------------------------------------------
+    '''
+    position = START_TAG_PATTERN.match(data, start).end()
+
+    while True:
+        match = ATTRIBUTE_PATTERN.match(data, position)
+
+        # The end of the start tag
+        if match is None:
+            return None
+
+        if match.group(1) == b'value':
+            group = 2 if match.group(2) is not None else 3
+            return (match.start(group), match.end(group))
+
+        position = match.end()
+
+
+def load_csp_template(fpath, locations):
+    '''
+    ---------------------------------------------------
+    Returns a compiled Csp_Template for the file. Every model of an analysis has an identical copy of the
+    template, so templates are cached by their contents and only compiled once per analysis.
+    ---------------------------------------------------
+    '''
+    with open(fpath,'rb') as f:
+        data = f.read()
+
+    key = (hashlib.sha1(data).hexdigest(), tuple(sorted(locations.items())))
+
+    if key not in TEMPLATE_CACHE:
+        TEMPLATE_CACHE[key] = Csp_Template(fpath, locations, data)
+
+    return TEMPLATE_CACHE[key]
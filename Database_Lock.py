@@ -0,0 +1,364 @@
+import time
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+class Database_Lock():
+    '''
+    ------------------------------------------------------------
+        ***Database_Lock***
+    ------------------------------------------------------------
+        Advisory lock on a lock file next to the "data.pickle", held while
+        a builder reads, merges or writes the database so several
+        sessions (builders, runners, post-processors) can share it.
+
+        The lock is exclusive between processes and reentrant within a
+        process, so a save inside a transaction does not deadlock.
+
+        E.g.
+
+            with builder.data_lock:
+                builder.refresh_database()
+                ...
+                builder.save_database()
+    ------------------------------------------------------------
+        **Attributes**
+    ------------------------------------------------------------
+
+    fpath : str
+        The path of the lock file.
+
+    timeout : float
+        The number of seconds to wait for the lock before a TimeoutError is raised.
+
+    poll_interval : float
+        The number of seconds between attempts to take the lock.
+
+    depth : int
+        The number of times the lock is currently held by this process.
+
+    ------------------------------------------------------------
+        **Methods**
+    ------------------------------------------------------------
+
+    acquire():
+        Takes the lock, waiting up to timeout seconds for other processes to release it.
+
+    release():
+        Releases the lock once every acquire in this process has been released.
+
+    ------------------------------------------------------------
+    '''
+
+    def __init__(self, fpath, timeout=60.0, poll_interval=0.05):
+        self.fpath = fpath
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+
+        self.depth = 0
+        self.lock_file = None
+        self.thread_lock = threading.RLock()
+
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+
+    def __exit__(self, *args):
+        self.release()
+
+
+    def __getstate__(self):
+        # The builder pickles itself, open files and thread locks cannot be pickled
+        return {'fpath' : self.fpath, 'timeout' : self.timeout, 'poll_interval' : self.poll_interval}
+
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+
+    def acquire(self):
+        '''
+        ---------------------------------------------------
+        Takes the lock, waiting up to timeout seconds for other processes to release it.
+        ---------------------------------------------------
+        '''
+        if not self.thread_lock.acquire(timeout=self.timeout):
+            raise TimeoutError('Timed out waiting for the lock: "{}".'.format(self.fpath))
+
+        if self.depth:
+            self.depth += 1
+            return
+
+        lock_file = open(self.fpath, 'a+b')
+        end_time = time.monotonic() + self.timeout
+
+        while True:
+            try:
+                if fcntl:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+                break
+
+            except OSError:
+                if time.monotonic() > end_time:
+                    lock_file.close()
+                    self.thread_lock.release()
+                    raise TimeoutError('Timed out waiting for the lock: "{}", another session is using the database.'.format(self.fpath))
+
+                time.sleep(self.poll_interval)
+
+        self.lock_file = lock_file
+        self.depth = 1
+
+
+    def release(self):
+        '''
+        ---------------------------------------------------
+        Releases the lock once every acquire in this process has been released.
+        ---------------------------------------------------
+        '''
+        self.depth -= 1
+
+        if not self.depth:
+            try:
+                if fcntl:
+                    fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    self.lock_file.seek(0)
+                    msvcrt.locking(self.lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            finally:
+                self.lock_file.close()
+                self.lock_file = None
+
+        self.thread_lock.release()
+
+
+class Tracked_Dict(dict):
+    '''
+    ------------------------------------------------------------
+        ***Tracked_Dict***
+    ------------------------------------------------------------
+        Dictionary that records the keys set or deleted since the last
+        save, so a save can be merged with changes made by other sessions
+        instead of overwriting them.
+
+        Objects modified in place must be marked with mark_changed.
+    ------------------------------------------------------------
+        **Attributes**
+    ------------------------------------------------------------
+
+    changed : set of str
+        The keys set, deleted or marked since the last save.
+
+    ------------------------------------------------------------
+        **Methods**
+    ------------------------------------------------------------
+
+    mark_changed(key):
+        Records that the value of key was modified in place.
+
+    ------------------------------------------------------------
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.changed = set()
+
+
+    def __reduce__(self):
+        # Saved databases have no unsaved changes
+        return (Tracked_Dict, (dict(self),))
+
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.changed.add(key)
+
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.changed.add(key)
+
+
+    def pop(self, key, *default):
+        if key in self:
+            self.changed.add(key)
+        return super().pop(key, *default)
+
+
+    def update(self, *args, **kwargs):
+        for key,value in dict(*args, **kwargs).items():
+            self[key] = value
+
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+
+    def popitem(self):
+        if not self:
+            raise KeyError('popitem(): dictionary is empty')
+
+        key = next(reversed(self))
+        return key, self.pop(key)
+
+
+    def clear(self):
+        self.changed.update(self.keys())
+        super().clear()
+
+
+    def mark_changed(self, key):
+        '''
+        ---------------------------------------------------
+        Records that the value of key was modified in place.
+        ---------------------------------------------------
+        '''
+        self.changed.add(key)
+
+
+class Model_Dict(Tracked_Dict):
+    '''
+    ------------------------------------------------------------
+        ***Model_Dict***
+    ------------------------------------------------------------
+        Tracked_Dict of the models, that keeps a reverse index from each
+        object to the names of the models that use it. The index is
+        updated whenever a model is set or deleted, so the models
+        affected by deleting or modifying an object are found without
+        scanning every model.
+
+        E.g.
+
+            builder.data['model'].get_models('geometry', '30um_grid')
+    ------------------------------------------------------------
+        **Attributes**
+    ------------------------------------------------------------
+
+    users : dict, {('object_type', 'object_name') : set of str, ...}
+        The names of the models that use each object.
+
+    ------------------------------------------------------------
+        **Methods**
+    ------------------------------------------------------------
+
+    get_models(object_type, object_name):
+        Returns the names of the models that use an object.
+
+    rename_object(object_type, object_name, new_name):
+        Moves the models of an object to its new name in the index.
+
+    get_objects(model):
+        Returns the objects a model uses.
+
+    add_users(name, model), remove_users(name, model):
+        Adds or removes a model from the index of each object it uses.
+
+    ------------------------------------------------------------
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.users = {}
+
+        for name,model in self.items():
+            self.add_users(name, model)
+
+
+    def __reduce__(self):
+        # The index is rebuilt when the database is loaded
+        return (Model_Dict, (dict(self),))
+
+
+    def __setitem__(self, key, value):
+        if key in self:
+            self.remove_users(key, self[key])
+        super().__setitem__(key, value)
+        self.add_users(key, value)
+
+
+    def __delitem__(self, key):
+        self.remove_users(key, self[key])
+        super().__delitem__(key)
+
+
+    def pop(self, key, *default):
+        if key in self:
+            self.remove_users(key, self[key])
+        return super().pop(key, *default)
+
+
+    def clear(self):
+        super().clear()
+        self.users = {}
+
+
+    def get_models(self, object_type, object_name):
+        '''
+        ---------------------------------------------------
+        Returns the sorted names of the models that use an object.
+        ---------------------------------------------------
+        '''
+        return sorted(self.users.get((object_type, object_name), ()))
+
+
+    def rename_object(self, object_type, object_name, new_name):
+        '''
+        ---------------------------------------------------
+        Moves the models of an object to its new name in the index, after the object is renamed.
+        ---------------------------------------------------
+        '''
+        models = self.users.pop((object_type, object_name), set())
+
+        if models:
+            self.users.setdefault((object_type, new_name), set()).update(models)
+
+
+    def get_objects(self, model):
+        '''
+        ---------------------------------------------------
+        Returns the (object_type, object_name) of the analysis, geometry and materials of a model.
+        ---------------------------------------------------
+        '''
+        objects = [(object_type, getattr(model, object_type).name) for object_type in ('analysis', 'geometry') if hasattr(getattr(model, object_type, None), 'name')]
+
+        return objects + [('material', getattr(material, 'name', material_name)) for material_name,material in getattr(model, 'materials', {}).items()]
+
+
+    def add_users(self, name, model):
+        for key in self.get_objects(model):
+            self.users.setdefault(key, set()).add(name)
+
+
+    def remove_users(self, name, model):
+        for key in self.get_objects(model):
+            self.users.get(key, set()).discard(name)
+
+            if not self.users.get(key, True):
+                self.users.pop(key)
+
+
+def track_changes(data):
+    '''
+    ---------------------------------------------------
+    Wraps each category of the database in a Tracked_Dict, with no changes recorded. The models are
+    wrapped in a Model_Dict, so the models that use each object are indexed.
+    ---------------------------------------------------
+    '''
+    return {object_type : (Model_Dict if object_type == 'model' else Tracked_Dict)(objects) for object_type,objects in data.items()}
@@ -0,0 +1,155 @@
+import os
+
+from Seekable_Zstd import find_file, open_file
+
+
+'''
+------------------------------------------------------------
+    ***Include Graph Functions***
+------------------------------------------------------------
+    Resolves the files an abaqus input file includes, e.g. the
+    main.inp of an analysis:
+
+        *INCLUDE, INPUT=abaqus_whole-chip_solid.inp
+        *INCLUDE, INPUT=assembly.inp
+        *INCLUDE, INPUT=abaqus_solid.inp
+
+    Included files are searched for in the folder of the file that
+    includes them, then in the search folders (the geometry and
+    material objects of a model), and their own *INCLUDE lines are
+    followed. Only the files in the graph are staged into a model, and
+    included files that cannot be found are reported before the model
+    is built.
+
+    The graph of each input file is cached, and is only scanned again
+    when one of the files read or one of the search folders changes, so
+    the models of a sweep only scan the (large) mesh files once.
+------------------------------------------------------------
+    **Functions**
+------------------------------------------------------------
+
+resolve_includes(fpath, search_fpaths=()):
+    Returns the files included by an input file and the included files that were not found.
+
+walk_includes(including_name, including_fpath, search_fpaths, files, missing):
+    Walks the files included by an input file recursively.
+
+read_includes(fpath):
+    Returns the names of the files included by an input file, in order.
+
+get_stamps(fpaths):
+    Returns the size and modification time of each file or folder.
+
+------------------------------------------------------------
+'''
+
+
+# The include graphs already resolved, {(fpath, search_fpaths) : {'stamps' : dict, 'files' : dict, 'missing' : list}}
+INCLUDE_GRAPH_CACHE = {}
+
+
+def resolve_includes(fpath, search_fpaths=()):
+    '''
+    ---------------------------------------------------
+    Walks the *INCLUDE lines of an input file recursively.
+    ---------------------------------------------------
+    PARAMETERS
+    ---------------------------------------------------
+    fpath : str
+        The path of the input file.
+
+    search_fpaths : list of str
+        The folders searched for included files after the folder of the including file.
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    files : dict, {'include_name' : 'fpath', ...}
+        The path of each included file, by the name it is included with, in the order abaqus reads them.
+        Files compressed at rest are given by their uncompressed path.
+
+    missing : list of tuple, [('including_name', 'include_name'), ...]
+        The included files that were not found, and the file that includes them.
+    ---------------------------------------------------
+    '''
+    key = (os.path.abspath(fpath), tuple([os.path.abspath(search_fpath) for search_fpath in search_fpaths]))
+    cached = INCLUDE_GRAPH_CACHE.get(key)
+
+    if cached is not None and cached['stamps'] == get_stamps(cached['stamps'].keys()):
+        return dict(cached['files']), list(cached['missing'])
+
+    files = {}
+    missing = []
+    walk_includes(os.path.basename(fpath), fpath, search_fpaths, files, missing)
+
+    scanned = [fpath] + list(files.values())
+
+    # A file added to a search folder can resolve a missing include
+    INCLUDE_GRAPH_CACHE[key] = {'stamps' : get_stamps(scanned + list(search_fpaths) + [os.path.dirname(fpath) or '.']),
+                                'files' : dict(files),
+                                'missing' : list(missing)}
+
+    return files, missing
+
+
+def walk_includes(including_name, including_fpath, search_fpaths, files, missing):
+    '''
+    ---------------------------------------------------
+    Adds the files included by an input file to files, and the included files that were not found
+    to missing, each included file is walked before the next line is read, as abaqus does.
+    ---------------------------------------------------
+    '''
+    for include_name in read_includes(including_fpath):
+        if include_name in files:
+            continue
+
+        directories = [os.path.dirname(including_fpath)] + list(search_fpaths)
+        include_fpaths = [os.path.join(directory, include_name) for directory in directories if find_file(os.path.join(directory, include_name))]
+
+        if not include_fpaths:
+            missing.append((including_name, include_name))
+            continue
+
+        files[include_name] = include_fpaths[0]
+        walk_includes(include_name, include_fpaths[0], search_fpaths, files, missing)
+
+
+def read_includes(fpath):
+    '''
+    ---------------------------------------------------
+    Returns the names of the files included by an input file, in order. Only keyword lines are parsed,
+    the data lines of meshes are skipped quickly.
+    ---------------------------------------------------
+    '''
+    include_names = []
+
+    with open_file(fpath,'r') as f:
+        for line in f:
+            if line[:1] != '*' or line[:2] == '**':
+                continue
+
+            options = [option.strip() for option in line[1:].split(',')]
+
+            if options[0].lower() == 'include':
+                include_names += [option.split('=',1)[1].strip().strip('"\'') for option in options[1:] if option.lower().replace(' ','').startswith('input=')]
+
+    return include_names
+
+
+def get_stamps(fpaths):
+    '''
+    ---------------------------------------------------
+    Returns the size and modification time of each file or folder, files compressed at rest are
+    found by their uncompressed path. None is given for paths that do not exist.
+    ---------------------------------------------------
+    '''
+    stamps = {}
+    for fpath in fpaths:
+        found_fpath = find_file(fpath)
+
+        if found_fpath is None:
+            stamps[fpath] = None
+        else:
+            stat = os.stat(found_fpath)
+            stamps[fpath] = (found_fpath, stat.st_size, stat.st_mtime_ns)
+
+    return stamps
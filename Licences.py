@@ -0,0 +1,232 @@
+import asyncio
+import heapq
+from collections import deque
+from contextlib import asynccontextmanager
+
+import numpy as np
+
+from Parameters import evaluate_expression
+
+
+'''
+------------------------------------------------------------
+    ***Licence Functions***
+------------------------------------------------------------
+    Licence token accounting for the solvers.
+
+    Each solver uses tokens from one or more licence pools, the
+    number of tokens is an expression of the number of cores, e.g.
+    abaqus uses floor(5 * cores**0.422) tokens from the "abaqus"
+    pool. The pools and token expressions are set in the
+    "licences" section of base_data.json.
+------------------------------------------------------------
+    **Functions**
+------------------------------------------------------------
+
+get_token_demand(token_expressions, solver_cores):
+    Returns the number of tokens taken from each pool by solvers running on the given number of cores.
+
+simulate_schedule(demands, durations, pools):
+    Simulates running jobs first come first served within the licence pools, returns the start time of each job and the makespan.
+
+check_demands(demands, pools):
+    Raises an error if a job needs more tokens than a pool has.
+
+------------------------------------------------------------
+'''
+
+
+# Used if base_data.json has no "licences" section
+DEFAULT_LICENCES = {'pools' : {'abaqus' : 50, 'fluent' : 4, 'anshpc' : 64, 'mpcci' : 2},
+                    'tokens' : {'abaqus' : {'abaqus' : 'floor(5 * cores**0.422)'},
+                                'fluent' : {'fluent' : '1', 'anshpc' : 'max(cores - 4, 0)'},
+                                'mpcci' : {'mpcci' : '1'}}}
+
+
+def get_token_demand(token_expressions, solver_cores):
+    '''
+    ---------------------------------------------------
+    Returns the number of tokens taken from each licence pool.
+    ---------------------------------------------------
+    PARAMETERS
+    ---------------------------------------------------
+    token_expressions : dict, {'solver' : {'pool' : 'expression', ...}, ...}
+        The tokens each solver takes from each pool, as an expression of "cores".
+
+    solver_cores : dict, {'solver' : int, ...}
+        The number of cores of each solver in the job.
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    demand : dict, {'pool' : int, ...}
+        The number of tokens taken from each pool, pools with no tokens are left out.
+    ---------------------------------------------------
+    '''
+    demand = {}
+
+    for solver,cores in solver_cores.items():
+        for pool,expression in token_expressions.get(solver, {}).items():
+            tokens = int(evaluate_expression(expression, {'cores' : np.array(cores)}))
+
+            if tokens > 0:
+                demand[pool] = demand.get(pool, 0) + tokens
+
+    return demand
+
+
+def simulate_schedule(demands, durations, pools):
+    '''
+    ---------------------------------------------------
+    Simulates running jobs within the licence pools. Jobs start first come first served,
+    in the same order as the Licence_Pool scheduler, each as soon as its tokens are free.
+    ---------------------------------------------------
+    PARAMETERS
+    ---------------------------------------------------
+    demands : list of dict, [{'pool' : int, ...}, ...]
+        The tokens taken by each job.
+
+    durations : list of float
+        The run time of each job.
+
+    pools : dict, {'pool' : int, ...}
+        The number of tokens in each pool.
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    start_times : np.ndarray
+        The time each job starts.
+
+    makespan : float
+        The time the final job finishes.
+    ---------------------------------------------------
+    '''
+    check_demands(demands, pools)
+
+    available = dict(pools)
+    start_times = np.zeros(len(demands))
+    running = []
+    time = 0.0
+
+    for index,demand in enumerate(demands):
+
+        # Wait for running jobs to finish until the next job fits
+        while not all([available.get(pool, 0) >= tokens for pool,tokens in demand.items()]):
+            time,_,finished_demand = heapq.heappop(running)
+            for pool,tokens in finished_demand.items():
+                available[pool] += tokens
+
+        for pool,tokens in demand.items():
+            available[pool] -= tokens
+
+        start_times[index] = time
+        heapq.heappush(running, (time + durations[index], index, demand))
+
+    makespan = max([finish for finish,_,_ in running], default=0.0)
+
+    return start_times, makespan
+
+
+def check_demands(demands, pools):
+    '''
+    ---------------------------------------------------
+    Raises an error if a job needs more tokens than a pool has, as it could never run.
+    ---------------------------------------------------
+    '''
+    for demand in demands:
+        for pool,tokens in demand.items():
+            if tokens > pools.get(pool, 0):
+                raise ValueError('A job needs {} "{}" tokens but the licence pool only has {}.'.format(tokens, pool, pools.get(pool, 0)))
+
+
+class Licence_Pool():
+    '''
+    ------------------------------------------------------------
+        ***Licence_Pool***
+    ------------------------------------------------------------
+        Asyncio scheduler for licence tokens. Jobs take all of their
+        tokens at once (so jobs never hold part of their tokens while
+        waiting) and are served first come first served, so large jobs
+        are not starved by a stream of small ones.
+    ------------------------------------------------------------
+        **Attributes**
+    ------------------------------------------------------------
+
+    pools : dict, {'pool' : int, ...}
+        The number of tokens in each pool.
+
+    available : dict, {'pool' : int, ...}
+        The number of tokens not in use.
+
+    queue : collections.deque
+        The jobs waiting for tokens, in the order they asked for them.
+
+    ------------------------------------------------------------
+        **Methods**
+    ------------------------------------------------------------
+
+    hold(demand):
+        Async context manager that holds the tokens of the demand.
+
+    acquire(demand):
+        Waits until the tokens are free and it is the turn of the job, then takes them.
+
+    release(demand):
+        Returns the tokens to the pools.
+
+    ------------------------------------------------------------
+    '''
+
+    def __init__(self, pools):
+        self.pools = dict(pools)
+        self.available = dict(pools)
+        self.queue = deque()
+        self.condition = asyncio.Condition()
+
+
+    @asynccontextmanager
+    async def hold(self, demand):
+        '''
+        ---------------------------------------------------
+        Async context manager that holds the tokens of the demand.
+        ---------------------------------------------------
+        '''
+        await self.acquire(demand)
+        try:
+            yield
+        finally:
+            await self.release(demand)
+
+
+    async def acquire(self, demand):
+        '''
+        ---------------------------------------------------
+        Waits for the tokens of the demand, raises an error if the demand can never be met.
+        ---------------------------------------------------
+        '''
+        check_demands([demand], self.pools)
+
+        ticket = object()
+
+        async with self.condition:
+            self.queue.append(ticket)
+            try:
+                await self.condition.wait_for(lambda: self.queue[0] is ticket and all([self.available.get(pool, 0) >= tokens for pool,tokens in demand.items()]))
+            finally:
+                self.queue.remove(ticket)
+                self.condition.notify_all()
+
+            for pool,tokens in demand.items():
+                self.available[pool] -= tokens
+
+
+    async def release(self, demand):
+        '''
+        ---------------------------------------------------
+        Returns the tokens of the demand to the pools.
+        ---------------------------------------------------
+        '''
+        async with self.condition:
+            for pool,tokens in demand.items():
+                self.available[pool] += tokens
+
+            self.condition.notify_all()
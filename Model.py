@@ -12,6 +12,7 @@ from importlib.util import module_from_spec
 import warnings
 import sys
 import xml.etree.ElementTree as ET
+import numpy as np
 
 with warnings.catch_warnings():
     warnings.simplefilter('ignore')
@@ -19,6 +20,12 @@ with warnings.catch_warnings():
     
 from HazelsAwesomeTheme import red_text,green_text,blue_text,yellow_text
 from HazelsAwesomeTheme import HazelsAwesomeTheme as Theme
+from Parameters import check_parameter_bounds, read_inp_parameters, evaluate_inp_parameters, print_invalid_variants
+from Submodel_Placement import check_submodel_placements
+from Include_Graph import resolve_includes
+from Solver_Monitor import Abaqus_Monitor, Fluent_Monitor
+from Seekable_Zstd import SUFFIX, find_file, find_compressed_files, decompress_file
+from Object_Store import copy_writable, hash_folder
 
 
 
@@ -61,6 +68,26 @@ class Model:
     parameters : dict
         A dictionary containing the parameters that modify the analysis. 
 
+    derived_parameters : dict
+        A dictionary containing the derived parameters of the analysis, with their values calculated from the parameters.
+
+    solver_cpus : dict, {'fluent' : int, 'abaqus' : int}
+        The number of cpus used by each solver. (NOTE: None if the user is prompted during the build).
+
+    global_model_name : str
+        The model the global .odb and .prt files are imported from. (NOTE: None if the user is prompted during the build).
+
+    run_return_code : int
+        The return code of the last run of the solver. (NOTE: Only set once the model has been run).
+
+    overlay : bool
+        If True the model folder only contains the files modified for this model, the unmodified object files are 
+        symbolic links to the object folders. (NOTE: Only abaqus models can be overlays, see materialize()).
+
+    provenance : dict, {'analysis' : dict, 'geometry' : dict, 'material/name' : dict}
+        The sha256 of each file of the objects the model was built from, by the path relative to the object folder.
+        (NOTE: Only set for models built since provenance was recorded).
+
     ------------------------------------------------------------
         **Methods**
     ------------------------------------------------------------
@@ -95,9 +122,33 @@ class Model:
     print_model_parameter_info():
         Prints the parameter information for each parameter included in each of the objects used in this model.
 
+    copy_parameters():
+        Copies the parameters of the objects used in this model that modify one of the solvers used.
+
     copy_and_modify_parameters():
         Prompts the user to modify parameters from their default values. (NOTE: The parameter values are validated by validate_parameter_value(), dtypes of int and float are currently supported).
 
+    set_parameter_values(parameter_values):
+        Sets the parameter values from a dictionary without prompting the user.
+
+    calculate_derived_parameters():
+        Calculates the derived parameters of the analysis object, raises an error if any are outside of their bounds.
+
+    evaluate_parameter_sweep(values):
+        Validates every variant of a sweep, checks the parameter bounds, the derived parameters and the *Parameter expressions of the abaqus input files.
+
+    get_inp_parameter_definitions():
+        Reads the *Parameter definitions of the abaqus main input file and the object files it includes.
+
+    get_main_inp_fpath():
+        Returns the path of the abaqus main input file of the analysis, or None if it has none.
+
+    resolve_abaqus_includes():
+        Returns the object files included by the abaqus main input file, raises an error listing the included files that do not exist.
+
+    get_script_parameters():
+        Returns the parameters and derived parameters passed to the fluent and mpcci setup scripts.
+
     ----------------------------------------
         Model Assembly
     ----------------------------------------
@@ -105,13 +156,40 @@ class Model:
     move_files_from_objects():
         Copies the analysis object files into the model folder and then based on the software requirements assembles the model.
 
+    get_build_stages():
+        Returns the build stages of the model and the resources ("disk", "fluent", "abaqus") each stage uses, based on the software requirements.
+
+    record_provenance():
+        Records the hashes of the files of the objects the model is built from, the first build stage.
+
+    get_object_hashes():
+        Returns the current hashes of the files of the objects of the model.
+
+    get_stale_objects():
+        Returns the objects whose files changed since the model was built, or None if no provenance was recorded.
+
+    prompt_build_options():
+        Prompts the user for the build options (solver cpus, global model) up front, so the build stages need no user input.
+
+    check_build_options():
+        Raises a ValueError if a build option the build stages need was not set, without prompting.
+
+    copy_analysis_files():
+        Copies the analysis object files into the model folder, or links them if the model is an overlay.
+
+    stage_object_folder(source_fpath, destination_fpath):
+        Recreates the folders of an object folder in the model folder and stages each of its files with stage_file().
+
+    stage_file(source_fpath, destination_fpath):
+        Links an object file into the model folder if the model is an overlay, otherwise copies it. Compressed object files are decompressed.
+
     build_abaqus_model():
         Builds the abaqus model by performing a series of actions:
             - Moves the required geometry files into the model folder
             - Modifies the assembly.inp file based on the geometry requirements
             - Moves the required material files into the model folder
             - Adds the paramter values to the main abaqus input file
-            - If the analysis requires a global model, prompt the user to select one
+            - If the analysis requires a global model, copies the global files of the global model chosen before the build
 
     build_fluent_model():
         Builds the fluent model by performing a series of actions:
@@ -124,8 +202,26 @@ class Model:
         Builds the mpcci model by performing a series of actions:
             - Runs build_fluent_model() method to assemble the fluent model in the fluent solver directory.
             - Runs build_abaqus_model() method to assemble the abaqus model in the abaqus solver directory.
-            - Fetches a python script provided in the analysis, "mpcci_setup.py" with function "mpcci_setup()".
-            - Runs the imported mpcci_setup() script in the mpcci solver directory.
+            - Runs setup_mpcci_model() method to write the .csp file of the model.
+
+    setup_mpcci_model():
+        Fetches a python script provided in the analysis, "mpcci_setup.py" with function "mpcci_setup()", and runs it in the mpcci solver directory.
+        The number of cpus of each solver is taken from solver_cpus, set before the build.
+
+    get_run_command():
+        Returns the resources used to run the model, the solver directory to run in and the solver command.
+
+    get_solver_cores(solver):
+        Returns the number of cores a solver of the model runs on, used to count its licence tokens.
+
+    get_monitors():
+        Returns the monitors used to follow the progress of the solvers of the running model.
+
+    get_target_time(solver):
+        Returns the total time simulated by the solver, or None if it is unknown.
+
+    get_postprocess_script_fpath():
+        Returns the path of the "postprocess.py" script of the analysis in the model folder, or None if there is no script.
 
     get_fluent_script():
         Retrieves the fluent script "fluent_setup()" from the file "fluent_setup.py" in the fluent solver directory.
@@ -155,7 +251,7 @@ class Model:
 
     validate_parameter_value(dtype, _, value):
         Validates the parameter values entered by the user based on the data-type specified.
-            - If dtype = 'int', then checks value.isnumeric() (i.e. string only contains digits).
+            - If dtype = 'int', then checks that int(value) does not raise an exception (negative integers are allowed).
             - if dtype = 'float', then checks that float(value) does not raise an exception.
 
     validate_global_files(fpath): ***TODO***
@@ -168,17 +264,55 @@ class Model:
     move_object_folder(source_fpath, destination_fpath, dirs_exist_ok=False):
         Moves a folder located at "source_fpath" to "destination_fpath". If dirs_exist_ok=True then no error is raised if "destination_fpath" already exists.
 
+    get_linked_files():
+        Returns the files of the model folder that are links to object files.
+
+    get_broken_links():
+        Returns the links of the model folder whose object files no longer exist.
+
+    relink(old_fpath, new_fpath):
+        Points the links to the files of a renamed object folder at its new folder.
+
+    materialize():
+        Replaces the links of an overlay model with copies of the object files, so the model folder is standalone.
+
     ------------------------------------------------------------
     '''
 
-    def __init__(self, builder, analysis_name=None, geometry_name=None, material_names=None):
+    def __init__(self, builder, analysis_name=None, geometry_name=None, material_names=None, name=None, description=None, parameter_values=None, solver_cpus=None, global_model_name=None, overlay=None, build=True):
         '''
         ---------------------------------------------------
-        
+        Creates and builds a new model. Any argument that is not given is prompted for.
         ---------------------------------------------------
         PARAMETERS
         ---------------------------------------------------
-        
+        builder : Modular_Abaqus_Builder
+            The Modular_Abaqus_Builder class used to create this model.
+
+        analysis_name, geometry_name : str
+            The names of the objects used to build the model.
+
+        material_names : list of str
+            The names of the material objects used to build the model.
+
+        name, description : str
+            The name and description of the model.
+
+        parameter_values : dict, {'parameter_name' : value, ...}
+            Values that override the default parameter values. If given the user is not prompted to modify the parameters.
+
+        solver_cpus : dict, {'fluent' : int, 'abaqus' : int}
+            The number of cpus used by each solver of an MPCCI model. If not given the user is prompted during the build.
+
+        global_model_name : str
+            The model to import the global .odb and .prt files from for submodel analyses. If not given the user is prompted during the build.
+
+        overlay : bool
+            If True the unmodified object files are linked into the model folder instead of copied, if not given the 
+            "model_storage" of the builder is used. (NOTE: Ignored for fluent and mpcci models, which are always copied).
+
+        build : bool
+            If False the model is only defined and validated, no files are created.
         ---------------------------------------------------
         '''
         
@@ -187,8 +321,12 @@ class Model:
         
         # Modular_Abaqus_Builder class containing this object 
         self.builder = builder
+
+        # Build options that are otherwise prompted for
+        self.solver_cpus = solver_cpus
+        self.global_model_name = global_model_name
         
-        self.new_model_name()
+        self.new_model_name(name)
 
         # Set destination fpath
         self.fpath = os.path.join(self.builder.fpaths['model'], self.name)
@@ -199,7 +337,7 @@ class Model:
         
         print('File path set to "{}".'.format(blue_text(self.fpath)))
 
-        self.new_description()
+        self.new_description(description)
 
         self.select_analysis(analysis_name)
 
@@ -215,9 +353,24 @@ class Model:
 
         # Get solver fpaths
         self.set_fpaths()
+
+        # The fluent setup scripts write into the model folder, so only abaqus models are overlays
+        if overlay is None:
+            overlay = self.builder.model_storage == 'overlay'
+
+        self.overlay = overlay and not (self.requirements['software']['fluent'] or self.requirements['software']['mpcci'])
             
         # Copy parameters from objects and prompt user to modify their values
-        self.copy_and_modify_parameters()
+        if parameter_values is None:
+            self.copy_and_modify_parameters()
+        else:
+            self.set_parameter_values(parameter_values)
+
+        # Check the parameters before any files are built
+        self.calculate_derived_parameters()
+
+        if not build:
+            return
         
         # Move files from object fpaths to the solver fpaths
         self.move_files_from_objects()
@@ -231,12 +384,19 @@ class Model:
     ----------------------------------------
     '''
     
-    def new_model_name(self):
+    def new_model_name(self, name=None):
         '''
         ---------------------------------------------------
         Gets a new model name, ensures that no model already exists of that type
         ---------------------------------------------------
         '''
+        # Use given name if valid
+        if name is not None:
+            if not (name and self.validate_name(None, name)):
+                raise ValueError('The model name: "{}" is not valid.'.format(name))
+            self.name = name
+            return
+
         # Get current names
         current_names = list(self.builder.data['model'].keys())
         if hasattr(self, 'name'): current_names.remove(self.name)
@@ -275,12 +435,18 @@ class Model:
         return
                 
                 
-    def new_description(self):
+    def new_description(self, description=None):
         '''
         ---------------------------------------------------
         Provide a description for the model added to the database.
         ---------------------------------------------------
         '''
+        # Use given description if valid
+        if description is not None:
+            if not self.validate_description(None, description):
+                raise ValueError('The model description: "{}" is not valid.'.format(description))
+            self.description = description
+            return
 
         print('-'*60)
         print('Please enter a short ' + blue_text('description') + ' of the new model:')
@@ -393,7 +559,7 @@ class Model:
             for material_name in material_names:
                 self.materials[material_name] = self.builder.data['material'][material_name]
                 print(green_text('The material: "{}" has been added to the model.'.format(material_name)))
-                return
+            return
         else:
             # Get the material objects loaded in the database
             potential_materials = self.get_potential_materials()
@@ -518,38 +684,50 @@ class Model:
             raise FileExistsError
 
 
+    def copy_parameters(self):
+        '''
+        ---------------------------------------------------
+        Copies the parameters of the analysis, geometry and material objects that modify a solver used by the model.
+        ---------------------------------------------------
+        '''
+        self.parameters = {}
+
+        for object_used in [self.analysis, self.geometry] + list(self.materials.values()):
+            for parameter_name,parameter in object_used.parameters.items():
+                if any([self.requirements['software'][solver] for solver in parameter['solvers']]):
+                    self.parameters[parameter_name] = deepcopy(parameter)
+
+
     def print_model_parameter_info(self):
         '''
         
         '''
 
-        self.parameters = {}
+        self.copy_parameters()
 
         # Print parameters of the analysis object
         print('-'*60)
         print('The chosen analysis: "{}".'.format(blue_text(self.analysis.name)))
         print('Has the following parameters that can alter the current analysis') if self.analysis.parameters else print('Has no parameters that can be used.')
         for parameter_name,parameter in self.analysis.parameters.items():
-            if any([self.requirements['software'][solver] for solver in parameter['solvers']]):
+            if parameter_name in self.parameters:
                 print('-'*60)
                 print('Name: "{}"'.format(blue_text(parameter_name)))
                 print('\tDescription: {}'.format(parameter['description']))
                 print('\tData-type: {}'.format(parameter['dtype']))
                 print('\tDefault value: {}'.format(blue_text(parameter['default_value'])))  
-                self.parameters[parameter_name] = deepcopy(self.analysis.parameters[parameter_name])
         
         # Print parameters of the geometry object
         print('-'*60)
         print('The chosen geometry: "{}".'.format(blue_text(self.geometry.name)))
         print('Has the following parameters that can be changed: ') if self.geometry.parameters else print('Has no parameters that can be used.')
         for parameter_name,parameter in self.geometry.parameters.items():
-            if any([self.requirements['software'][solver] for solver in parameter['solvers']]):
+            if parameter_name in self.parameters:
                 print('-'*60)
                 print('Name: {}'.format(blue_text(parameter_name)))
                 print('\tDescription: {}'.format(parameter['description']))
                 print('\tData-type: {}'.format(parameter['dtype']))
                 print('\tDefault value: {}'.format(blue_text(parameter['default_value'])))
-                self.parameters[parameter_name] = deepcopy(self.geometry.parameters[parameter_name])
 
         if not len(self.materials):
             print('-'*60)
@@ -561,13 +739,12 @@ class Model:
                 print('The chosen material: "{}" of material type: "{}".'.format(blue_text(material_name),blue_text([requirement[0] for requirement in self.materials[material_name].requirements['material'].items() if requirement[1]][0])))
                 print('Has the following parameters that can be used: ') if self.materials[material_name].parameters else print('Has no parameters that can be used.')
                 for parameter_name,parameter in self.materials[material_name].parameters.items():
-                    if any([self.requirements['software'][solver] for solver in parameter['solvers']]):
+                    if parameter_name in self.parameters:
                         print('-'*60)
                         print('Name: {}'.format(blue_text(parameter_name)))
                         print('\tDescription: {}'.format(parameter['description']))
                         print('\tData-type: {}'.format(parameter['dtype']))
                         print('\tDefault Value: {}'.format(blue_text(parameter['default_value'])))
-                        self.parameters[parameter_name] = deepcopy(self.materials[material_name].parameters[parameter_name])
 
     
     def copy_and_modify_parameters(self):
@@ -598,6 +775,193 @@ class Model:
             print('-'*60)
             
         print(green_text('The parameter values assigned to the model: "{}" have been successfully modified.'.format(self.name)))
+
+
+    def set_parameter_values(self, parameter_values):
+        '''
+        ---------------------------------------------------
+        Copies the parameters from the objects and sets their values without prompting the user.
+        ---------------------------------------------------
+        PARAMETERS
+        ---------------------------------------------------
+        parameter_values : dict, {'parameter_name' : value, ...}
+            The values to assign, parameters not included keep their default value.
+        ---------------------------------------------------
+        '''
+        self.copy_parameters()
+
+        for parameter_name,value in parameter_values.items():
+            if parameter_name not in self.parameters:
+                raise KeyError('The parameter: "{}" is not used by the model: "{}".'.format(parameter_name, self.name))
+
+            if not self.validate_parameter_value(self.parameters[parameter_name]['dtype'], None, str(value)):
+                raise ValueError('The value: "{}" is not valid for the parameter: "{}".'.format(value, parameter_name))
+
+            self.parameters[parameter_name]['default_value'] = int(value) if self.parameters[parameter_name]['dtype'] == 'int' else float(value)
+
+        print('-'*60)
+        print(green_text('The parameter values assigned to the model: "{}" have been set.'.format(self.name)))
+
+
+    def calculate_derived_parameters(self):
+        '''
+        ---------------------------------------------------
+        Calculates the derived parameters of the analysis from the model parameters. 
+        An error is raised if any derived parameter is outside of its bounds, so that no files are built for an invalid model.
+        ---------------------------------------------------
+        '''
+        values = {parameter_name : np.array([parameter['default_value']]) for parameter_name,parameter in self.parameters.items()}
+
+        derived_values, valid = self.evaluate_parameter_sweep(values)
+
+        if not all(valid):
+            print('-'*60)
+            print(red_text('The parameters or input files of the model: "{}" are not valid.'.format(self.name)))
+            raise ValueError('The parameters or input files of the model: "{}" are not valid.'.format(self.name))
+
+        self.derived_parameters = {}
+        for parameter_name,parameter in getattr(self.analysis, 'derived_parameters', {}).items():
+            self.derived_parameters[parameter_name] = deepcopy(parameter)
+            self.derived_parameters[parameter_name]['default_value'] = derived_values[parameter_name][0].item()
+
+        if self.derived_parameters:
+            print('-'*60)
+            print(green_text('Derived parameters calculated for the model: "{}".'.format(self.name)))
+            for parameter_name,parameter in self.derived_parameters.items():
+                print('\t{} = {}'.format(parameter_name, blue_text(parameter['default_value'])))
+
+
+    def evaluate_parameter_sweep(self, values):
+        '''
+        ---------------------------------------------------
+        Validates every variant of a sweep of this model before any files are built:
+            - The parameters are checked against their "min_value" and "max_value".
+            - The derived parameters of the analysis are evaluated and checked against their bounds.
+            - For abaqus models, every file included by the main input file must exist in the objects.
+            - For abaqus models, the *Parameter expressions of the input files are evaluated, 
+              variants where an expression is not finite (e.g. division by zero) are not valid.
+            - For abaqus models, variants where a submodel of the geometry is placed outside of 
+              the global mesh are not valid.
+        ---------------------------------------------------
+        PARAMETERS
+        ---------------------------------------------------
+        values : dict, {'parameter_name' : np.ndarray, ...}
+            The values of every model parameter for each variant in the sweep.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        derived_values : dict, {'derived_parameter_name' : np.ndarray, ...}
+            The values of the derived parameters for each variant.
+
+        valid : np.ndarray, dtype = bool
+            True for the variants that passed every check.
+        ---------------------------------------------------
+        '''
+        valid, errors = check_parameter_bounds(self.parameters, values)
+
+        for error in errors:
+            print(red_text(error))
+
+        derived_values, derived_valid = self.analysis.evaluate_parameter_sweep(values)
+        valid &= derived_valid
+
+        if self.requirements['software']['abaqus']:
+            abaqus_values = {parameter_name : values[parameter_name] for parameter_name,parameter in self.parameters.items() if 'abaqus' in parameter['solvers']}
+
+            try:
+                self.resolve_abaqus_includes()
+                inp_values = evaluate_inp_parameters(self.get_inp_parameter_definitions(), abaqus_values)
+
+            except FileNotFoundError:
+                return derived_values, np.zeros_like(valid)
+                
+            except ValueError as error:
+                print('-'*60)
+                print(red_text(str(error)))
+                return derived_values, np.zeros_like(valid)
+                
+            inp_valid, errors = check_parameter_bounds({parameter_name : {} for parameter_name in inp_values.keys()}, inp_values)
+            valid &= inp_valid
+
+            for error in errors:
+                print(red_text(error.replace('Parameter', 'Input file parameter', 1)))
+
+            placement_valid, errors = check_submodel_placements(self.geometry.fpath, {**abaqus_values, **inp_values})
+            valid &= placement_valid
+
+            for error in errors:
+                print(red_text(error))
+
+        if not all(valid):
+            print_invalid_variants(values, valid)
+
+        return derived_values, valid
+
+
+    def get_inp_parameter_definitions(self):
+        '''
+        ---------------------------------------------------
+        Reads the *Parameter definitions of the abaqus main input file of the analysis. The files included 
+        by the main input file are found in the geometry and material object folders.
+        ---------------------------------------------------
+        '''
+        main_fpath = self.get_main_inp_fpath()
+
+        if main_fpath is None:
+            return []
+
+        return read_inp_parameters(main_fpath, [self.geometry.fpath] + [material.fpath for material in self.materials.values()])
+
+
+    def get_main_inp_fpath(self):
+        '''
+        ---------------------------------------------------
+        Returns the path of the abaqus main input file of the analysis, "main.inp" or "abaqus/main.inp" 
+        for MPCCI analyses, or None if the analysis has none.
+        ---------------------------------------------------
+        '''
+        for main_fpath in (os.path.join(self.analysis.fpath,'main.inp'), os.path.join(self.analysis.fpath,'abaqus','main.inp')):
+            if find_file(main_fpath):
+                return main_fpath
+
+        return None
+
+
+    def resolve_abaqus_includes(self):
+        '''
+        ---------------------------------------------------
+        Resolves the *INCLUDE graph of the abaqus main input file, the included files are found in the analysis,
+        geometry and material object folders. The graph is cached, so the models of a sweep only scan it once.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        included_files : dict, {'include_name' : 'fpath', ...}
+            The object file of each file included by the main input file, directly or through other included files.
+        ---------------------------------------------------
+        '''
+        main_fpath = self.get_main_inp_fpath()
+
+        if main_fpath is None:
+            return {}
+
+        included_files, missing = resolve_includes(main_fpath, [self.geometry.fpath] + [material.fpath for material in self.materials.values()])
+
+        if missing:
+            print('-'*60)
+            for including_name,include_name in missing:
+                print(red_text('The file: "{}", included by "{}", does not exist in the analysis, geometry or material objects.'.format(include_name, including_name)))
+            raise FileNotFoundError('{} files included by the abaqus input files do not exist.'.format(len(missing)))
+
+        return included_files
+
+
+    def get_script_parameters(self):
+        '''
+        ---------------------------------------------------
+        Returns the parameters passed to the fluent and mpcci setup scripts, the derived parameters are included.
+        ---------------------------------------------------
+        '''
+        return {**self.parameters, **getattr(self, 'derived_parameters', {})}
         
     '''
     ----------------------------------------
@@ -607,35 +971,233 @@ class Model:
 
     def move_files_from_objects(self):
         '''
-        
+        ---------------------------------------------------
+        Builds the model by running each of its build stages in order, after prompting for the build options.
+        ---------------------------------------------------
         '''
+        self.prompt_build_options()
 
-        # Copy analysis files to model directory
-        try:
-            self.move_object_folder(self.analysis.fpath, self.fpath)
-            print(green_text('Moved analysis files successfully'))
-        except:
-            print('-'*60)
-            print(red_text('Analysis files could not be moved from object folder to the new model folder.'))
-            raise FileNotFoundError
-        
-        
+        for _,stage in self.get_build_stages():
+            stage()
+
+
+    def get_build_stages(self):
+        '''
+        ---------------------------------------------------
+        Returns the stages used to build the model, and the resources each stage uses. 
+        The Build_Orchestrator runs the stages of many models concurrently, limiting the number of stages using each resource.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        stages : list of tuple, [(['resource', ...], method), ...]
+            The resources are "disk", "fluent" and "abaqus".
+        ---------------------------------------------------
+        '''
         # If mpcci abaqus-fluent coupled analysis
         if all(self.requirements['software'].values()):
-            self.build_mpcci_model()
+            return [(['disk'], self.record_provenance),
+                    (['disk'], self.copy_analysis_files),
+                    (['fluent'], self.build_fluent_model),
+                    (['disk'], self.build_abaqus_model),
+                    (['disk'], self.setup_mpcci_model)]
            
         # If just abaqus analysis
         elif self.requirements['software']['abaqus']:
-            self.build_abaqus_model()
+            return [(['disk'], self.record_provenance),
+                    (['disk'], self.copy_analysis_files),
+                    (['disk'], self.build_abaqus_model)]
 
         # If just fluent analysis
         elif self.requirements['software']['fluent']:
-            self.build_fluent_model()
+            return [(['disk'], self.record_provenance),
+                    (['disk'], self.copy_analysis_files),
+                    (['fluent'], self.build_fluent_model)]
 
         else:
             print('-'*60)
             print(red_text('Software Requirements are not valid.'))
             raise ValueError
+
+
+    def record_provenance(self):
+        '''
+        ---------------------------------------------------
+        Records the hashes of the files of the objects the model is built from, before they are staged,
+        so the models built from objects that were modified later can be found (see get_stale_objects()).
+        ---------------------------------------------------
+        '''
+        self.provenance = self.get_object_hashes()
+
+
+    def get_object_hashes(self):
+        '''
+        ---------------------------------------------------
+        Returns the current hashes of the files of the analysis, geometry and materials of the model. The
+        materials are keyed by the name the model uses, so renaming an object does not change the keys.
+        ---------------------------------------------------
+        '''
+        objects = {'analysis' : self.analysis, 'geometry' : self.geometry}
+        objects.update({'material/{}'.format(material_name) : material for material_name,material in self.materials.items()})
+
+        return {key : hash_folder(obj.fpath) for key,obj in objects.items()}
+
+
+    def get_stale_objects(self):
+        '''
+        ---------------------------------------------------
+        Returns the objects whose files were added, removed or changed since the model was built.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        stale_objects : list of str or None
+            The keys of the changed objects (e.g. "geometry", "material/water"), None if the model has no provenance.
+        ---------------------------------------------------
+        '''
+        if not getattr(self, 'provenance', None):
+            return None
+
+        object_hashes = self.get_object_hashes()
+
+        return sorted([key for key in set(object_hashes) | set(self.provenance) if object_hashes.get(key) != self.provenance.get(key)])
+
+
+    def prompt_build_options(self):
+        '''
+        ---------------------------------------------------
+        Prompts the user for the build options that would otherwise be asked for during the build 
+        (the cpus of an MPCCI model and the global model of a submodel analysis), so that the build stages 
+        can run without any user input. The global files can also be chosen by the user ("choose_directory").
+        ---------------------------------------------------
+        '''
+        if all(self.requirements['software'].values()) and getattr(self, 'solver_cpus', None) is None:
+            print('-'*60)
+            questions = [inquirer.Text('fluent', 'Please enter the number of cpus to use for the fluent simulation', default = 2, validate = lambda _, c : c.isnumeric() and (int(c) > 1)),
+                         inquirer.Text('abaqus', 'Please enter the number of cpus to use for the abaqus simulation', default = 2, validate = lambda _, c : c.isnumeric() and (int(c) > 1))]
+            
+            self.solver_cpus = {solver : int(cpus) for solver,cpus in inquirer.prompt(questions, theme=Theme()).items()}
+
+        if self.requirements['analysis']['abaqus_global_odb'] and self.requirements['analysis']['abaqus_global_prt'] and getattr(self, 'global_model_name', None) is None:
+            potential_models = self.get_global_models()
+
+            if potential_models:
+                print('-'*60)
+                print(blue_text('Select "choose_directory" to specify the files yourself.'))
+                print('-'*60)
+                self.global_model_name = inquirer.prompt([inquirer.List('global_model_name',
+                                                                        'This model requires a global .odb and .prt file to function, please specify the model you would like to import these from', 
+                                                                        choices=potential_models+['choose_directory'], 
+                                                                        carousel=True)], theme=Theme())['global_model_name']
+
+            else:
+                print('-'*60)
+                print(red_text('No models to import global files from'))
+
+                if not self.builder.yes_no_question('Choose global.odb and global.prt files yourself?'):
+                    raise FileNotFoundError
+
+                self.global_model_name = 'choose_directory'
+
+            if self.global_model_name == 'choose_directory':
+                self.pick_global_files()
+
+
+    def check_build_options(self):
+        '''
+        ---------------------------------------------------
+        Raises a ValueError if a build option needed by the build stages was not set, so models built without
+        a user (e.g. by the command line interface or the builder service) fail before their build starts.
+        ---------------------------------------------------
+        '''
+        if all(self.requirements['software'].values()) and getattr(self, 'solver_cpus', None) is None:
+            raise ValueError('The model: "{}" is an MPCCI model, the cpus of each solver must be given.'.format(self.name))
+
+        if self.requirements['analysis']['abaqus_global_odb'] and self.requirements['analysis']['abaqus_global_prt']:
+            global_model_name = getattr(self, 'global_model_name', None)
+
+            if global_model_name is None:
+                raise ValueError('The model: "{}" is a submodel, the global model must be given.'.format(self.name))
+
+            if global_model_name != 'choose_directory' and global_model_name not in self.get_global_models():
+                raise ValueError('The global model: "{}" is not an abaqus model in the database.'.format(global_model_name))
+
+
+    def get_global_models(self):
+        '''
+        ---------------------------------------------------
+        Returns the names of the abaqus models in the database that the global files can be imported from.
+        ---------------------------------------------------
+        '''
+        return [model for model in self.builder.data['model'].keys() if self.builder.data['model'][model].requirements['software']['abaqus'] and model != self.name]
+
+
+    def copy_analysis_files(self):
+        '''
+        ---------------------------------------------------
+        Copies the analysis object files into the model folder.
+        ---------------------------------------------------
+        '''
+        try:
+            if getattr(self, 'overlay', False) or find_compressed_files(self.analysis.fpath):
+                self.stage_object_folder(self.analysis.fpath, self.fpath)
+            else:
+                self.move_object_folder(self.analysis.fpath, self.fpath)
+            print(green_text('Moved analysis files successfully'))
+        except:
+            print('-'*60)
+            print(red_text('Analysis files could not be moved from object folder to the new model folder.'))
+            raise FileNotFoundError
+
+
+    def stage_object_folder(self, source_fpath, destination_fpath):
+        '''
+        ---------------------------------------------------
+        Recreates the folders of an object folder in the model folder, and stages each of its files
+        with stage_file(). Compressed files are staged under their uncompressed name.
+        ---------------------------------------------------
+        '''
+        for folder, _, fnames in os.walk(source_fpath):
+            model_folder = os.path.join(destination_fpath, os.path.relpath(folder, source_fpath))
+            os.makedirs(model_folder, exist_ok=True)
+
+            for fname in fnames:
+                model_fname = fname[:-len(SUFFIX)] if fname.endswith(SUFFIX) else fname
+                self.stage_file(os.path.join(folder, fname), os.path.join(model_folder, model_fname))
+
+        print('-'*60)
+        print(green_text('Successfully {} files from:\n"{}" -> "{}"'.format('linked' if getattr(self, 'overlay', False) else 'copied', source_fpath, destination_fpath)))
+
+
+    def stage_file(self, source_fpath, destination_fpath):
+        '''
+        ---------------------------------------------------
+        Links an object file into the model folder if the model is an overlay, otherwise copies it.
+        The links are relative, so the project folder can be moved. Files that the build modifies 
+        (main.inp, assembly.inp) are rewritten through a temporary file, which replaces the link 
+        and leaves the object file untouched. If links cannot be made (e.g. Windows without 
+        developer mode) the file is copied.
+
+        Object files compressed at rest ("name.inp.zst") are decompressed into the model folder,
+        as the solvers cannot read them, so they are never links.
+        ---------------------------------------------------
+        '''
+        # Never write through a link made earlier in the build, it would modify the object file
+        if os.path.lexists(destination_fpath):
+            os.remove(destination_fpath)
+
+        source_fpath = find_file(source_fpath) or source_fpath
+
+        if source_fpath.endswith(SUFFIX) and not destination_fpath.endswith(SUFFIX):
+            decompress_file(source_fpath, destination_fpath)
+            return
+
+        if getattr(self, 'overlay', False):
+            try:
+                os.symlink(os.path.relpath(source_fpath, os.path.dirname(destination_fpath)), destination_fpath)
+                return
+            except OSError:
+                pass
+
+        copyfile(source_fpath, destination_fpath)
  
 
     def build_abaqus_model(self):
@@ -646,15 +1208,18 @@ class Model:
         print('Assembling abaqus model')
         print('-'*60)
 
-        # Satisfy geometry requirements
-        for requirement_name,requirement_value in self.requirements['geometry'].items():
-            if requirement_value and (('abaqus' in requirement_name) or ('assembly' in requirement_name)):
-                copyfile(os.path.join(self.geometry.fpath,requirement_name+'.inp'), os.path.join(self.solver_fpaths['abaqus'],requirement_name+'.inp'))
-                print(green_text('File: "{}", copied to model path'.format(requirement_name+'.inp')))
+        # Stage the geometry and material files included by the main input file, the analysis files are already in the model folder
+        for include_name,source_fpath in self.resolve_abaqus_includes().items():
+            if os.path.commonpath([os.path.abspath(source_fpath), os.path.abspath(self.analysis.fpath)]) == os.path.abspath(self.analysis.fpath):
+                continue
+
+            os.makedirs(os.path.dirname(os.path.join(self.solver_fpaths['abaqus'],include_name)), exist_ok=True)
+            self.stage_file(source_fpath, os.path.join(self.solver_fpaths['abaqus'],include_name))
+            print(green_text('File: "{}", copied to model path'.format(include_name)))
                 
                 
         # Modify assembly.inp based on geometry requirements       
-        if self.requirements['geometry']['assembly']:
+        if self.requirements['geometry']['assembly'] and os.path.exists(os.path.join(self.solver_fpaths['abaqus'],'assembly.inp')):
             with open(os.path.join(self.solver_fpaths['abaqus'],'assembly.inp'),'r') as inp_read, open(os.path.join(self.solver_fpaths['abaqus'],'temp.inp'),'w') as inp_write:
                 
                 # get the names of the geometry requirements
@@ -683,14 +1248,6 @@ class Model:
             print(green_text('File: "assembly.inp", modified to reflect requirements'))
                                 
 
-        # Satisfy material requirements
-        for material_name in self.materials.keys():
-            for requirement_name, requirement_value in self.materials[material_name].requirements['material'].items():
-                if requirement_value:
-                    copyfile(os.path.join(self.materials[material_name].fpath,requirement_name+'.inp'), os.path.join(self.solver_fpaths['abaqus'],requirement_name+'.inp'))
-                    print(green_text('File: "{}", copied to model path'.format(requirement_name+'.inp')))
-
-
         # Add parameter values to main abaqus input file
         with open(os.path.join(self.solver_fpaths['abaqus'],'main.inp'),'r') as inp_read, open(os.path.join(self.solver_fpaths['abaqus'],'temp.inp'),'w') as inp_write:
 
@@ -720,48 +1277,36 @@ class Model:
             
             
         # If submodel analysis, import global .odb and .prt files (Note: This only works if global analysis has been run, and global script preparation run)
+        # The global model is chosen by prompt_build_options before the build, the build stages run in worker threads and never prompt
         if self.requirements['analysis']['abaqus_global_odb'] and self.requirements['analysis']['abaqus_global_prt']:
 
-            potential_models = [model for model in self.builder.data['model'].keys() if self.builder.data['model'][model].requirements['software']['abaqus']]
-            if self.name in potential_models: potential_models.remove(self.name)
+            try:
+                self.check_build_options()
+            except ValueError as error:
+                print(red_text(str(error)))
+                raise FileNotFoundError
 
-            if potential_models:
-                potential_models.append('choose_directory')
-                print('-'*60)
-                print(blue_text('Select "choose_directory" to specify the files yourself.'))
+            model_to_import_global = self.global_model_name
+
+            # The files chosen by the user are not copied from a model
+            if model_to_import_global != 'choose_directory':
                 print('-'*60)
-                model_to_import_global = inquirer.prompt([inquirer.List('model_to_import_global',
-                                                                        'This model requires a global .odb and .prt file to function, please specify the model you would like to import these from', 
-                                                                        choices=potential_models, 
-                                                                        carousel=True)], theme=Theme())['model_to_import_global']
-                
-                if model_to_import_global == 'choose_directory':
-                    self.pick_global_files()
+                # Copy global .odb 
+                if os.path.exists(os.path.join(self.builder.data['model'][model_to_import_global].solver_fpaths['abaqus'],model_to_import_global+'.odb')):
+                    copyfile(os.path.join(self.builder.data['model'][model_to_import_global].solver_fpaths['abaqus'],model_to_import_global+'.odb'),
+                                os.path.join(self.solver_fpaths['abaqus'],'global.odb'))
+                    print(green_text('Global .odb file copied from model: "{}".'.format(model_to_import_global)))
                 else:
-                    print('-'*60)
-                    # Copy global .odb 
-                    if os.path.exists(os.path.join(self.builder.data['model'][model_to_import_global].solver_fpaths['abaqus'],model_to_import_global+'.odb')):
-                        copyfile(os.path.join(self.builder.data['model'][model_to_import_global].solver_fpaths['abaqus'],model_to_import_global+'.odb'),
-                                    os.path.join(self.solver_fpaths['abaqus'],'global.odb'))
-                        print(green_text('Global .odb file copied from model: "{}".'.format(model_to_import_global)))
-                    else:
-                        print(red_text('{}.odb does not exist in the model: "{}"'.format(model_to_import_global)))
-                        raise FileNotFoundError
-                    
-                    # Copy global .prt
-                    if os.path.exists(os.path.join(self.builder.data['model'][model_to_import_global].solver_fpaths['abaqus'],model_to_import_global+'.prt')):
-                        copyfile(os.path.join(self.builder.data['model'][model_to_import_global].solver_fpaths['abaqus'],model_to_import_global+'.prt'),
-                                    os.path.join(self.solver_fpaths['abaqus'],'global.prt'))
-                        print(green_text('Global .prt file copied from model: "{}".'.format(model_to_import_global)))
-                    else:
-                        print(red_text('{}.prt does not exist in the model: "{}"'.format(model_to_import_global)))
-                        raise FileNotFoundError
-
-            else:
-                print(red_text('No models to import global files from'))
-                if self.builder.yes_no_question('Choose global.odb and global.prt files yourself?'):
-                    self.pick_global_files()
+                    print(red_text('{}.odb does not exist in the model: "{}"'.format(model_to_import_global, model_to_import_global)))
+                    raise FileNotFoundError
+                
+                # Copy global .prt
+                if os.path.exists(os.path.join(self.builder.data['model'][model_to_import_global].solver_fpaths['abaqus'],model_to_import_global+'.prt')):
+                    copyfile(os.path.join(self.builder.data['model'][model_to_import_global].solver_fpaths['abaqus'],model_to_import_global+'.prt'),
+                                os.path.join(self.solver_fpaths['abaqus'],'global.prt'))
+                    print(green_text('Global .prt file copied from model: "{}".'.format(model_to_import_global)))
                 else:
+                    print(red_text('{}.prt does not exist in the model: "{}"'.format(model_to_import_global, model_to_import_global)))
                     raise FileNotFoundError
 
         print('-'*60)
@@ -783,7 +1328,7 @@ class Model:
         # Satisfy geometry requirements
         for requirement_name,requirement_value in self.requirements['geometry'].items():
             if requirement_value and ('fluent' in requirement_name):
-                copyfile(os.path.join(self.geometry.fpath,requirement_name+'.msh'), os.path.join(self.solver_fpaths['fluent'],requirement_name+'.msh'))
+                self.stage_file(os.path.join(self.geometry.fpath,requirement_name+'.msh'), os.path.join(self.solver_fpaths['fluent'],requirement_name+'.msh'))
                 print(green_text('File: "{}", copied to model path'.format(requirement_name+'.msh')))
                 break
 
@@ -798,9 +1343,8 @@ class Model:
         fluent_setup(file_name = fluent_name,
                         mesh_file_name = requirement_name+'.msh',
                         fluent_wd = os.path.join(os.getcwd(),self.solver_fpaths['fluent']),
-                        parameters = self.parameters)
+                        parameters = self.get_script_parameters())
         
-        sys.dont_write_bytecode = False
         print('-'*60)
 
         
@@ -841,20 +1385,28 @@ class Model:
 
         self.build_abaqus_model()
 
+        self.setup_mpcci_model()
+
+
+    def setup_mpcci_model(self):
+        '''
+        ---------------------------------------------------
+        Runs the "mpcci_setup.py" script of the analysis to write the .csp file of the model.
+        ---------------------------------------------------
+        '''
         mpcci_setup = self.get_mpcci_script()
         print(green_text('MPCCI script: "mpcci_setup.py" retrieved successfully'))
 
         print('-'*60)
-        # Prompt user for number of cpus for fluent and number of cpus for abaqus
-        questions = [inquirer.Text('fluent_cpus', 'Please enter the number of cpus to use for the fluent simulation', default = 2, validate = lambda _, c : c.isnumeric() and (int(c) > 1)),
-                     inquirer.Text('abaqus_cpus', 'Please enter the number of cpus to use for the abaqus simulation', default = 2, validate = lambda _, c : c.isnumeric() and (int(c) > 1))]
-        
-        answers = inquirer.prompt(questions, theme=Theme())
-        print('-'*60)
+        # The number of cpus of each solver is prompted for by prompt_build_options, before the build
+        try:
+            self.check_build_options()
+        except ValueError as error:
+            print(red_text(str(error)))
+            raise FileNotFoundError
 
         # Edit mpcci .csp file via script, depending on parameters set for the analysis.
-        mpcci_setup(fpath = self.solver_fpaths['mpcci'], name = self.name, parameters = self.parameters, fluent_cpus = answers['fluent_cpus'], abaqus_cpus = answers['abaqus_cpus'])
-        sys.dont_write_bytecode = False
+        mpcci_setup(fpath = self.solver_fpaths['mpcci'], name = self.name, parameters = self.get_script_parameters(), fluent_cpus = self.solver_cpus['fluent'], abaqus_cpus = self.solver_cpus['abaqus'])
         print('-'*60)
 
         # Delete old main.csp
@@ -865,34 +1417,140 @@ class Model:
         print(green_text('Assembly of MPCCI coupled abaqus-FLUENT model successful'))
 
 
-    def get_fluent_script(self):
+    def get_run_command(self):
         '''
-        
+        ---------------------------------------------------
+        Returns the command used to run the model, built from the "solver_commands" of the builder.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        resources : list of str
+            The solver resources used while the model runs.
+
+        cwd : str
+            The solver directory the command is run in.
+
+        command : list of str
+            The command and its arguments.
+        ---------------------------------------------------
+        '''
+        if all(self.requirements['software'].values()):
+            solver,resources = 'mpcci',['fluent','abaqus','mpcci']
+        elif self.requirements['software']['abaqus']:
+            solver,resources = 'abaqus',['abaqus']
+        else:
+            solver,resources = 'fluent',['fluent']
+
+        command = [argument.format(name=self.name, cpus=self.get_solver_cores(solver)) for argument in self.builder.solver_commands[solver]]
+
+        return resources, self.solver_fpaths[solver], command
+
+
+    def get_solver_cores(self, solver):
+        '''
+        ---------------------------------------------------
+        Returns the number of cores the solver runs on, used to count its licence tokens. Defaults to 1.
+        ---------------------------------------------------
+        '''
+        return int((getattr(self, 'solver_cpus', None) or {}).get(solver, 1))
+
+
+    def get_monitors(self):
+        '''
+        ---------------------------------------------------
+        Returns the monitors used to follow the progress of the solvers of the running model.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        monitors : dict, {'solver' : monitor, ...}
+        ---------------------------------------------------
+        '''
+        monitors = {}
+
+        if self.requirements['software']['abaqus']:
+            job_name = 'main' if self.solver_fpaths['mpcci'] else self.name
+            monitors['abaqus'] = Abaqus_Monitor(job_name, self.solver_fpaths['abaqus'], self.get_target_time('abaqus'))
+
+        if self.requirements['software']['fluent']:
+            # The log is written to the directory the solver command runs in, the mpcci directory for coupled models
+            _, cwd, _ = self.get_run_command()
+            monitors['fluent'] = Fluent_Monitor(self.name, self.solver_fpaths['fluent'], self.get_target_time('fluent'), log_fpath=cwd)
+
+        return monitors
+
+
+    def get_target_time(self, solver):
         '''
-        sys.dont_write_bytecode = True
+        ---------------------------------------------------
+        Returns the total time simulated by the solver, taken from the "total_time" parameter of the 
+        abaqus input file or the derived parameters. The solvers of a coupled analysis can simulate
+        different times, so a "{solver}_total_time" derived parameter (e.g. "fluent_total_time") is
+        used before "total_time". Returns None if the analysis has no total time.
+        ---------------------------------------------------
+        '''
+        if solver == 'abaqus':
+            values = {parameter_name : np.array([parameter['default_value']]) for parameter_name,parameter in self.parameters.items() if 'abaqus' in parameter['solvers']}
+
+            try:
+                inp_values = evaluate_inp_parameters(self.get_inp_parameter_definitions(), values)
+                if 'total_time' in inp_values:
+                    return float(inp_values['total_time'][0])
+            except (ValueError, OSError):
+                pass
+
+        derived_parameters = getattr(self, 'derived_parameters', {})
+        for parameter_name in (solver+'_total_time', 'total_time'):
+            if parameter_name in derived_parameters:
+                return float(derived_parameters[parameter_name]['default_value'])
 
-        # Get setup python script
-        spec = spec_from_file_location('fluent_setup',os.path.join(self.solver_fpaths['fluent'],'fluent_setup.py'))
-        temp = module_from_spec(spec)
-        sys.modules["fluent_setup"] = temp
-        spec.loader.exec_module(temp)
+        return None
 
-        return temp.fluent_setup
+
+    def get_postprocess_script_fpath(self):
+        '''
+        ---------------------------------------------------
+        Returns the path of the "postprocess.py" script provided by the analysis, found in the model folder 
+        or one of the solver folders. Returns None if the analysis has no post-processing script.
+        ---------------------------------------------------
+        '''
+        fpaths = [self.fpath] + [fpath for fpath in self.solver_fpaths.values() if fpath]
+
+        for fpath in fpaths:
+            if os.path.exists(os.path.join(fpath,'postprocess.py')):
+                return os.path.join(fpath,'postprocess.py')
+
+        return None
+
+
+    def get_fluent_script(self):
+        '''
+        
+        '''
+        return self.load_script(os.path.join(self.solver_fpaths['fluent'],'fluent_setup.py'), 'fluent_setup')
         
 
     def get_mpcci_script(self):
         '''
         
         '''
-        sys.dont_write_bytecode = True
+        return self.load_script(os.path.join(self.solver_fpaths['mpcci'],'mpcci_setup.py'), 'mpcci_setup')
+
+
+    def load_script(self, fpath, function_name):
+        '''
+        ---------------------------------------------------
+        Loads a setup script of the analysis into its own module and returns its function. The build stages of
+        many models run in worker threads at once, so the module is not added to sys.modules and the source is
+        compiled directly, instead of setting sys.dont_write_bytecode, to keep bytecode out of the model folder.
+        ---------------------------------------------------
+        '''
+        spec = spec_from_file_location('{}_{}'.format(function_name, self.name), fpath)
+        module = module_from_spec(spec)
 
-        # Get setup python script
-        spec = spec_from_file_location('mpcci_setup',os.path.join(self.solver_fpaths['mpcci'],'mpcci_setup.py'))
-        temp = module_from_spec(spec)
-        sys.modules["mpcci_setup"] = temp
-        spec.loader.exec_module(temp)
+        with open(fpath,'rb') as f:
+            exec(compile(f.read(), fpath, 'exec'), module.__dict__)
 
-        return temp.mpcci_setup
+        return getattr(module, function_name)
 
 
     def pick_global_files(self): # TODO
@@ -985,10 +1643,12 @@ class Model:
         
         # Check parameter value matches entered datatype
         if dtype == 'int':
-            if value.isnumeric():
+            try:
+                int(value)
                 return True
-            else:
+            except ValueError:
                 print(red_text('\nThe entered value is not a valid integer'))
+                return False
         else:
             try:
                 float(value)
@@ -1012,7 +1672,8 @@ class Model:
         '''
         
         '''
-        copytree(source_fpath, destination_fpath, symlinks=True, dirs_exist_ok=dirs_exist_ok)
+        # The files of duplicated objects are read-only while they are shared
+        copytree(source_fpath, destination_fpath, symlinks=True, dirs_exist_ok=dirs_exist_ok, copy_function=copy_writable)
         
         if os.path.isabs(source_fpath):
             source_fpath = os.path.join('...',os.path.join('',*source_fpath.split('/')[-4:]))
@@ -1021,6 +1682,85 @@ class Model:
         print(green_text('Successfully copied files from:\n"{}" -> "{}"'.format(source_fpath, destination_fpath)))
 
 
+    def get_linked_files(self):
+        '''
+        ---------------------------------------------------
+        Returns the paths of the files in the model folder that are links to object files.
+        ---------------------------------------------------
+        '''
+        return [os.path.join(folder, fname) for folder, _, fnames in os.walk(self.fpath) for fname in fnames if os.path.islink(os.path.join(folder, fname))]
+
+
+    def get_broken_links(self):
+        '''
+        ---------------------------------------------------
+        Returns the paths of the links in the model folder whose object files no longer exist.
+        ---------------------------------------------------
+        '''
+        return [fpath for fpath in self.get_linked_files() if not os.path.exists(fpath)]
+
+
+    def relink(self, old_fpath, new_fpath):
+        '''
+        ---------------------------------------------------
+        Points the links to files in the object folder "old_fpath" at the same files in "new_fpath",
+        after the object folder is renamed. The links are relative and contain the object name, so
+        they are broken by the rename.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        n_files : int
+            The number of links replaced.
+        ---------------------------------------------------
+        '''
+        old_fpath = os.path.abspath(old_fpath)
+        n_files = 0
+
+        for fpath in self.get_linked_files():
+            target_fpath = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(fpath)), os.readlink(fpath)))
+
+            if os.path.commonpath([target_fpath, old_fpath]) != old_fpath:
+                continue
+
+            new_target_fpath = os.path.join(os.path.abspath(new_fpath), os.path.relpath(target_fpath, old_fpath))
+
+            os.remove(fpath)
+            os.symlink(os.path.relpath(new_target_fpath, os.path.dirname(os.path.abspath(fpath))), fpath)
+            n_files += 1
+
+        return n_files
+
+
+    def materialize(self):
+        '''
+        ---------------------------------------------------
+        Replaces each link in the model folder with a copy of the object file it links to, so the model
+        folder is standalone (e.g. to copy to a cluster) and no longer changes with its objects.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        n_files : int
+            The number of links replaced.
+        ---------------------------------------------------
+        '''
+        linked_fpaths = self.get_linked_files()
+
+        # Check every link first, so a model is never left partly materialized
+        broken_fpaths = [fpath for fpath in linked_fpaths if not os.path.exists(fpath)]
+        if broken_fpaths:
+            print(red_text('The object files linked by: "{}" no longer exist:'.format('", "'.join(broken_fpaths))))
+            raise FileNotFoundError
+
+        for fpath in linked_fpaths:
+            copyfile(fpath, fpath+'.tmp')
+            os.replace(fpath+'.tmp', fpath)
+
+        self.overlay = False
+
+        print(green_text('Model: "{}" materialized, {} linked files copied.'.format(self.name, len(linked_fpaths))))
+        return len(linked_fpaths)
+
+
     def print_model(self, verbose=False):
         '''
         ----------------------------------------
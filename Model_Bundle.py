@@ -0,0 +1,291 @@
+import io
+import os
+import sys
+import json
+import time
+import stat
+import tarfile
+import hashlib
+from shutil import copyfile, rmtree
+
+import zstandard
+
+
+'''
+------------------------------------------------------------
+    ***Model Bundle Functions***
+------------------------------------------------------------
+    Packs the folders of many models into one zstd compressed bundle,
+    to copy them to a cluster, and unpacks them again.
+
+    Each file is stored once by the sha256 of its contents, so the
+    object files that every model of a sweep shares (meshes, materials,
+    analysis files) are only transferred once, and the size of a bundle
+    grows with the unique content rather than the number of models. Links
+    of overlay models are followed, so their object files are bundled.
+
+    A bundle is a tar stream compressed with zstd:
+
+        manifest.json
+        blobs/<sha256>
+        ...
+
+    The manifest lists the files of each model folder by their blob, the
+    model description (in the format of the "export" command) and the
+    command used to run it. Only the standard library and zstandard are
+    needed to unpack a bundle, so this file can be copied to the cluster:
+
+        python Model_Bundle.py unpack sweep.tar.zst model_files
+------------------------------------------------------------
+    **Functions**
+------------------------------------------------------------
+
+write_bundle(fpath, models, level=10):
+    Writes the folders of the models to a bundle, returns the manifest.
+
+read_manifest(fpath):
+    Reads the manifest of a bundle without unpacking the blobs.
+
+unpack_bundle(fpath, destination_fpath, link=False):
+    Rebuilds the model folders of a bundle in the destination folder.
+
+get_model_files(model_fpath):
+    Returns the relative paths of the files in a model folder.
+
+------------------------------------------------------------
+'''
+
+
+BUNDLE_FORMAT = 1
+MANIFEST_NAME = 'manifest.json'
+BLOB_FOLDER = 'blobs'
+
+
+def write_bundle(fpath, models, level=10):
+    '''
+    ---------------------------------------------------
+    Writes the folders of the models to a bundle, each unique file is stored once.
+    ---------------------------------------------------
+    PARAMETERS
+    ---------------------------------------------------
+    fpath : str
+        The path of the bundle, e.g. "sweep.tar.zst".
+
+    models : dict, {'model_name' : {'fpath' : str, 'model' : dict, 'run' : dict}, ...}
+        The folder of each model, and the description and run command stored in the manifest.
+
+    level : int
+        The zstd compression level, 1-22.
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    manifest : dict
+        The manifest written to the bundle.
+    ---------------------------------------------------
+    '''
+    # Imported here, so unpacking on the cluster only needs this file
+    from Object_Store import hash_file
+
+    manifest = {'format' : BUNDLE_FORMAT,
+                'created' : time.time(),
+                'blobs' : {},
+                'models' : {}}
+
+    # The manifest is the first member of the stream, so every file is hashed before anything is written
+    blob_fpaths = {}
+    hashes = {}
+    total_size = 0
+
+    for model_name,model in models.items():
+        files = {}
+        executables = []
+
+        for relative_fpath in get_model_files(model['fpath']):
+            file_fpath = os.path.join(model['fpath'], relative_fpath)
+            file_stat = os.stat(file_fpath)
+
+            # Files linked by several overlay models are only hashed once
+            key = (os.path.realpath(file_fpath), file_stat.st_size, file_stat.st_mtime_ns)
+            if key not in hashes:
+                hashes[key] = hash_file(file_fpath)
+
+            blob = hashes[key]
+            blob_fpaths.setdefault(blob, file_fpath)
+            manifest['blobs'][blob] = file_stat.st_size
+            total_size += file_stat.st_size
+
+            files[relative_fpath.replace(os.sep, '/')] = blob
+            if file_stat.st_mode & stat.S_IXUSR:
+                executables.append(relative_fpath.replace(os.sep, '/'))
+
+        manifest['models'][model_name] = {'files' : files,
+                                          'executables' : executables,
+                                          'model' : model.get('model', {}),
+                                          'run' : model.get('run', {})}
+
+    manifest_bytes = json.dumps(manifest, indent=4, default=str).encode()
+
+    compressor = zstandard.ZstdCompressor(level=level, threads=-1, write_checksum=True)
+
+    with open(fpath, 'wb') as f, compressor.stream_writer(f) as writer, tarfile.open(fileobj=writer, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+        info = tarfile.TarInfo(MANIFEST_NAME)
+        info.size = len(manifest_bytes)
+        info.mtime = manifest['created']
+        tar.addfile(info, fileobj=io.BytesIO(manifest_bytes))
+
+        for blob,blob_fpath in blob_fpaths.items():
+            info = tarfile.TarInfo('{}/{}'.format(BLOB_FOLDER, blob))
+            info.size = manifest['blobs'][blob]
+            info.mtime = manifest['created']
+
+            with open(blob_fpath, 'rb') as blob_file:
+                tar.addfile(info, fileobj=blob_file)
+
+    unique_size = sum(manifest['blobs'].values())
+    print('Bundled {} models to: "{}".'.format(len(models), fpath))
+    print('{:.1f} MB of model files, {:.1f} MB unique, {:.1f} MB compressed.'.format(total_size/1e6, unique_size/1e6, os.path.getsize(fpath)/1e6))
+
+    return manifest
+
+
+def read_manifest(fpath):
+    '''
+    ---------------------------------------------------
+    Reads the manifest of a bundle without unpacking the blobs.
+    ---------------------------------------------------
+    '''
+    with open(fpath, 'rb') as f, zstandard.ZstdDecompressor().stream_reader(f) as reader, tarfile.open(fileobj=reader, mode='r|') as tar:
+        return read_manifest_member(tar, fpath)
+
+
+def unpack_bundle(fpath, destination_fpath, link=False):
+    '''
+    ---------------------------------------------------
+    Rebuilds the model folders of a bundle in the destination folder, as "destination_fpath/model_name".
+    The contents of each blob are checked against its sha256 while it is unpacked.
+    ---------------------------------------------------
+    PARAMETERS
+    ---------------------------------------------------
+    fpath : str
+        The path of the bundle.
+
+    destination_fpath : str
+        The folder the model folders are created in, model folders that already exist are not overwritten.
+
+    link : bool
+        If True the files shared by several models are hard links to one copy, instead of separate copies.
+        (NOTE: Only use this if the solvers do not modify their input files in place).
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    manifest : dict
+        The manifest of the bundle.
+    ---------------------------------------------------
+    '''
+    blob_fpath = os.path.join(destination_fpath, '.bundle_blobs')
+    os.makedirs(blob_fpath, exist_ok=True)
+
+    try:
+        with open(fpath, 'rb') as f, zstandard.ZstdDecompressor().stream_reader(f) as reader, tarfile.open(fileobj=reader, mode='r|') as tar:
+            manifest = read_manifest_member(tar, fpath)
+
+            invalid = [model_name for model_name in manifest['models'].keys() if model_name in ('', '.', '..') or os.path.basename(model_name) != model_name]
+            if invalid:
+                raise ValueError('The model names: "{}" of the bundle: "{}" are not valid folder names.'.format('", "'.join(invalid), fpath))
+
+            existing = [model_name for model_name in manifest['models'].keys() if os.path.exists(os.path.join(destination_fpath, model_name))]
+            if existing:
+                raise FileExistsError('The model folders: "{}" already exist in: "{}".'.format('", "'.join(existing), destination_fpath))
+
+            for member in tar:
+                blob = os.path.basename(member.name)
+
+                # Only blobs listed in the manifest are written, names are never used as paths
+                if not member.isfile() or blob not in manifest['blobs']:
+                    continue
+
+                digest = hashlib.sha256()
+                member_file = tar.extractfile(member)
+                with open(os.path.join(blob_fpath, blob), 'wb') as blob_file:
+                    for chunk in iter(lambda: member_file.read(1 << 20), b''):
+                        digest.update(chunk)
+                        blob_file.write(chunk)
+
+                if digest.hexdigest() != blob:
+                    raise ValueError('The blob: "{}" of the bundle: "{}" is corrupt.'.format(blob, fpath))
+
+        missing = [blob for blob in manifest['blobs'] if not os.path.exists(os.path.join(blob_fpath, blob))]
+        if missing:
+            raise ValueError('The bundle: "{}" is missing {} blobs.'.format(fpath, len(missing)))
+
+        for model_name,model in manifest['models'].items():
+            model_fpath = os.path.join(destination_fpath, model_name)
+
+            for relative_fpath,blob in model['files'].items():
+                file_fpath = os.path.join(model_fpath, *relative_fpath.split('/'))
+
+                if os.path.relpath(os.path.abspath(file_fpath), os.path.abspath(model_fpath)).startswith('..'):
+                    raise ValueError('The file: "{}" of the model: "{}" is outside of the model folder.'.format(relative_fpath, model_name))
+
+                os.makedirs(os.path.dirname(file_fpath), exist_ok=True)
+
+                if link:
+                    os.link(os.path.join(blob_fpath, blob), file_fpath)
+                else:
+                    copyfile(os.path.join(blob_fpath, blob), file_fpath)
+
+                if relative_fpath in model['executables']:
+                    os.chmod(file_fpath, os.stat(file_fpath).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+            print('Unpacked model: "{}" to: "{}".'.format(model_name, model_fpath))
+
+    finally:
+        rmtree(blob_fpath, ignore_errors=True)
+
+    return manifest
+
+
+def read_manifest_member(tar, fpath):
+    '''
+    ---------------------------------------------------
+    Reads the manifest, the first member of the tar stream of a bundle.
+    ---------------------------------------------------
+    '''
+    member = tar.next()
+
+    if member is None or member.name != MANIFEST_NAME:
+        raise ValueError('The file: "{}" is not a model bundle.'.format(fpath))
+
+    manifest = json.load(tar.extractfile(member))
+
+    if manifest.get('format') != BUNDLE_FORMAT:
+        raise ValueError('The bundle: "{}" has format {}, only format {} can be read.'.format(fpath, manifest.get('format'), BUNDLE_FORMAT))
+
+    return manifest
+
+
+def get_model_files(model_fpath):
+    '''
+    ---------------------------------------------------
+    Returns the relative paths of the files in a model folder, links to files are followed.
+    ---------------------------------------------------
+    '''
+    fpaths = []
+    for folder, _, fnames in os.walk(model_fpath):
+        for fname in sorted(fnames):
+            if os.path.isfile(os.path.join(folder, fname)):
+                fpaths.append(os.path.relpath(os.path.join(folder, fname), model_fpath))
+
+    return sorted(fpaths)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4 or sys.argv[1] != 'unpack':
+        print('Usage: python Model_Bundle.py unpack BUNDLE DESTINATION [--link]')
+        sys.exit(2)
+
+    try:
+        unpack_bundle(sys.argv[2], sys.argv[3], link='--link' in sys.argv[4:])
+    except (OSError, ValueError) as error:
+        print('Unpacking the bundle failed: {}'.format(error))
+        sys.exit(1)
@@ -7,17 +7,39 @@ import pickle as pkl
 from copy import deepcopy
 from sys import exit
 import json
+import time
 from shutil import copyfileobj
+from contextlib import contextmanager, nullcontext
+import numpy as np
 
 from Objects import Analysis_Object
 from Objects import Geometry_Object
 from Objects import Material_Object
 from Model import Model
+from Parameters import expand_sweep, check_parameters_file
+from Build_Orchestrator import Build_Orchestrator
+from Licences import DEFAULT_LICENCES
+from Postprocessing import postprocess_models, split_metrics, load_results, save_results
+from Solver_Monitor import Solver_Monitor
+from Results_Database import Results_Database
+from Database_Lock import Database_Lock, Tracked_Dict, track_changes
+from Object_Store import store_folders, link_folder
+from Trash import Trash_Reaper
 
 from HazelsAwesomeTheme import red_text,green_text,blue_text,yellow_text
 from HazelsAwesomeTheme import HazelsAwesomeTheme as Theme
 
 
+# The number of build stages that can use each resource at once
+DEFAULT_RESOURCE_LIMITS = {'disk' : 4, 'fluent' : 2, 'abaqus' : 1, 'postprocess' : 4}
+
+# The solver commands used to run models
+DEFAULT_SOLVER_COMMANDS = {'abaqus' : ['abaqus', 'job={name}', 'cpus={cpus}', 'interactive'],
+                           'fluent' : ['fluent', '3ddp', '-g', '-t{cpus}', '-i', 'journal.jou'],
+                           'mpcci' : ['mpcci', 'batch', '{name}.csp']}
+
+# The cache of completed solver runs, see Run_Cache.py
+DEFAULT_RUN_CACHE = {'enabled' : True, 'max_size' : 20000000000}
 
 
 class Modular_Abaqus_Builder:
@@ -28,7 +50,7 @@ class Modular_Abaqus_Builder:
         **Attributes**
     ------------------------------------------------------------
     
-    fpaths : dict, keys = ["object", "analysis", "geometry", "material", "model", "data"]
+    fpaths : dict, keys = ["object", "analysis", "geometry", "material", "model", "data", "results", "results_database", "trash", "run_cache"]
         A dictionary containing the important filepaths for the database.
 
     requirements : dict, keys = ["software", "analysis", "geometry", "material"]
@@ -40,11 +62,44 @@ class Modular_Abaqus_Builder:
     inquirer_dialogs : dict, keys = ["object_types", "main_loop", "edit_object_loop", "edit_model_loop"]
         A dictionary containing lists of the possible commands for certain inquirer dialogs
 
+    resource_limits : dict, keys = ["disk", "fluent", "abaqus", "postprocess"]
+        The number of build and run stages that can use each resource at once, used by the Build_Orchestrator. 
+        "postprocess" is the number of worker processes used to post-process models.
+
+    solver_commands : dict, keys = ["abaqus", "fluent", "mpcci"]
+        The command used to run a model with each solver, "{name}" and "{cpus}" are replaced by the model name and number of cpus.
+
+    licences : dict, keys = ["pools", "tokens"]
+        The number of tokens in each licence pool, and the tokens each solver takes from each pool as an expression of "cores".
+
+    model_storage : str, ["copy", "overlay"]
+        How new abaqus models store the object files. "copy" copies every file into the model folder, "overlay" only 
+        writes the files modified for the model and links the rest to the object folders (see Model.materialize()).
+
+    object_compression : dict, keys = ["enabled", "min_size", "level", "frame_size"]
+        If enabled, the .inp and .msh files of new objects of at least min_size bytes are stored compressed in the 
+        seekable zstd format (see Seekable_Zstd.py), and decompressed while models are built.
+
+    run_cache : dict, keys = ["enabled", "max_size"]
+        If enabled, the outputs of completed solver runs are cached by the hash of their inputs, and models with the same
+        inputs link the cached outputs instead of running (see Run_Cache.py). The least recently used runs are evicted 
+        once the cache is larger than max_size bytes.
+
     data : dict, keys = ["analysis", "geometry", "material", "model"]
         A dictionary containing the object classes and model classes stored in the database.
         The main data dictionary has smaller dictionaries for each class type that uses the names of the classes as keys.
         
         E.g. data["analysis"]["analysis_object_1"] will return the analysis object class with name "analysis_object_1" if it exists.
+        Each smaller dictionary is a Tracked_Dict, which records the names changed by this session so saves can be merged.
+
+    data_version : int
+        The version of the data.pickle file last loaded or saved by this session.
+
+    data_lock : Database_Lock
+        The lock on the data.pickle file, held while the database is read, merged or saved.
+
+    trash : Trash_Reaper
+        Deleted model and object folders are renamed into the trash folder and removed by its background thread.
 
     ------------------------------------------------------------
         **Methods**
@@ -66,12 +121,24 @@ class Modular_Abaqus_Builder:
         Loads the database from the data.pickle file
 
     save_database():
-        Saves the database to the data.pickle file
+        Saves the database to the data.pickle file, merging the changes saved by other sessions
+
+    read_data_file():
+        Returns the version and data stored in the data.pickle file
+
+    read_data_version():
+        Returns the version of the data.pickle file
+
+    refresh_database():
+        Loads the changes saved by other sessions, keeping the unsaved changes of this session
+
+    transaction():
+        Context manager that locks and refreshes the database, and saves it on exit
 
     print_database(verbose=False):
         Prints the contents of the database
 
-    validate_database():
+    validate_database(grace_period=3600):
         Validates the contents of the database against the currently stored folders.
 
     help_menu():
@@ -112,14 +179,17 @@ class Modular_Abaqus_Builder:
     get_object_modifications(object_name, object_type):
         Select what attributes to modify of a chosen object
 
-    create_object(object_type):
-        Create a new object class and add it to database
+    create_object(object_type, name=None, description=None, source_fpath=None):
+        Create a new object class and add it to database, any argument not given is prompted for
+
+    ingest_library(library_fpath, workers=None):
+        Create an object for every folder of a library tree, the files are stored in parallel and the objects are added in one transaction
 
     modify_object(object_name, object_type):
         Modify an object already in the database
 
     duplicate_object(object_name, object_type):
-        Duplicate an object already in the database
+        Duplicate an object already in the database, the duplicate shares the files of the object until either is modified
 
     delete_object(object_name, object_type):
         Delete an object in the database
@@ -134,6 +204,27 @@ class Modular_Abaqus_Builder:
     create_model():
         Create a new model and add it to the database
 
+    create_model_sweep():
+        Create a sweep of models over a range of parameter values, every variant is validated before any model is built and the models are built concurrently by the Build_Orchestrator
+
+    create_submodel_sweep():
+        Create a sweep of submodels over every grid position of a geometry, the positions where a submodel lies outside of the global mesh are pruned before any model is built
+
+    get_grid_sweep(template):
+        Returns a sweep over every value of the grid position parameters of a model
+
+    get_sweep_variants(template, sweep):
+        Returns the names and parameter values of the valid variants of a sweep
+
+    build_sweep(template, variants):
+        Asks the build questions once and builds the valid variants of a sweep concurrently
+
+    build_models(models):
+        Builds models concurrently with the Build_Orchestrator, and adds the models built successfully to the database
+
+    rebuild_stale_models(models=None, include_unrecorded=False):
+        Rebuild the models whose objects were modified since they were built, concurrently
+
     modify_model():
         Modify a model already in the database
 
@@ -143,11 +234,24 @@ class Modular_Abaqus_Builder:
     delete_model():
         Delete a model in the database
 
+    remove_models(model_names):
+        Delete models from the database and move their folders to the trash, without prompting
+
+    delete_results(model_names):
+        Remove the stored results of models from both result stores
+
     post_process_model():
-        Run a post processing script on a model
+        Run the "postprocess.py" scripts of the chosen models in a process pool, and store their metrics in the results store and the results database
+
+    monitor_models():
+        Show a live dashboard of the progress, stable time increment and estimated completion time of the chosen running models
+
+    materialize_model():
+        Replace the links of the chosen overlay models with copies of the object files, so their folders are standalone
 
     run_model():
-        Run a simulation from the specified model
+        Run the simulations of the chosen models, using the Build_Orchestrator to run them concurrently within the resource limits and licence pools.
+        Running can also be simulated to estimate the makespan under a licence budget.
 
     ----------------------------------------
         Other
@@ -156,6 +260,9 @@ class Modular_Abaqus_Builder:
     yes_no_question(message):
         Prompt the user with a yes-no question. Yes returns True, no returns False.
 
+    validate_positive_number(value):
+        Returns True if the value is a positive number.
+
     get_relative_fpath(full_fpath,  relative_to_fpath):
         Get the relative path to full_fpath from relative_to_fpath
 
@@ -164,18 +271,29 @@ class Modular_Abaqus_Builder:
     ------------------------------------------------------------
     '''
     
-    def __init__(self, delete_database=False, delete_all_models=False):
+    def __init__(self, delete_database=False, delete_all_models=False, read_only=False):
         '''
         ---------------------------------------------------
         Initialise the class and load the data from the .pkl file.
+        If read_only is True, the database is loaded without creating or saving any files, and
+        a FileNotFoundError is raised if it does not exist.
         ---------------------------------------------------
         '''
         
         # Create base database
-        self.instantiate_database()
+        self.instantiate_database(read_only=read_only)
         
+        # Read only sessions do not create the database, nor take the lock
+        if read_only:
+            if not os.path.exists(self.fpaths['data']):
+                raise FileNotFoundError('The data.pkl file: "{}" does not exist.'.format(self.fpaths['data']))
+
+            self.load_database(lock=False)
+            self.print_database(False)
+            return
+
         # If delete_database flag set to true, delete all files
-        if delete_database:
+        elif delete_database:
             print('-'*60)
             print(red_text('DELETE DATABASE FLAG SET TO TRUE'))
 
@@ -227,10 +345,10 @@ class Modular_Abaqus_Builder:
     ----------------------------------------
     '''
 
-    def instantiate_database(self, base_data_fpath='base_data.json'):
+    def instantiate_database(self, base_data_fpath='base_data.json', read_only=False):
         '''
         ---------------------------------------------------
-        Instantiate an empty database
+        Instantiate an empty database, the storage folders are not created if read_only is True.
         ---------------------------------------------------
         '''
         print('-'*60)
@@ -247,12 +365,31 @@ class Modular_Abaqus_Builder:
             self.fpaths['geometry'] = os.path.join(self.fpaths['object'],self.fpaths['geometry'])
             self.fpaths['material'] = os.path.join(self.fpaths['object'],self.fpaths['material'])
 
+            # Filepaths added after the base_data.json was written use their defaults
+            self.fpaths.setdefault('results', 'results.npz')
+            self.fpaths.setdefault('results_database', 'results.db')
+            self.fpaths.setdefault('trash', 'trash')
+
             self.requirements = base_data['requirements']
 
             self.allowed_characters = {key : set(value) for key, value in base_data['allowed_characters'].items()}
 
             self.inquirer_dialogs = base_data['inquirer_dialogs']
 
+            # Keys added after the base_data.json was written use their defaults
+            self.resource_limits = base_data.get('resource_limits', deepcopy(DEFAULT_RESOURCE_LIMITS))
+
+            self.solver_commands = base_data.get('solver_commands', deepcopy(DEFAULT_SOLVER_COMMANDS))
+
+            self.licences = base_data.get('licences', deepcopy(DEFAULT_LICENCES))
+
+            self.model_storage = base_data.get('model_storage', 'copy')
+
+            self.object_compression = base_data.get('object_compression', {'enabled' : False})
+
+            self.run_cache = {**DEFAULT_RUN_CACHE, **base_data.get('run_cache', {})}
+            self.fpaths.setdefault('run_cache', 'run_cache')
+
             self.data = base_data['data']
 
             print(green_text('Database Instantiated from "{}".'.format(base_data_fpath)))
@@ -270,7 +407,11 @@ class Modular_Abaqus_Builder:
                         'geometry' : os.path.join(objectfiles_fpath, 'geometry'),
                         'material': os.path.join(objectfiles_fpath, 'material'),
                         'model': 'model_files',
-                        'data': 'data.pickle'}
+                        'data': 'data.pickle',
+                        'results': 'results.npz',
+                        'results_database': 'results.db',
+                        'trash': 'trash',
+                        'run_cache': 'run_cache'}
             
             # Set requirements
             self.requirements = {"software": {
@@ -302,11 +443,42 @@ class Modular_Abaqus_Builder:
             # Set inquirer dialog lists
             self.inquirer_dialogs = {'object_types' : ['analysis','geometry','material'],
                                     'main_loop' : ['edit_objects', 'edit_models', 'save_database', 'validate_database', 'help', 'exit'],
-                                    'edit_object_loop' : ['create_object', 'modify_object', 'duplicate_object', 'delete_object', 'help', 'back_to_main'],
-                                    'edit_model_loop' : ['create_model', 'modify_model', 'duplicate_model', 'delete_model', 'post_process_model', 'run_model', 'help', 'back_to_main']}
+                                    'edit_object_loop' : ['create_object', 'ingest_library', 'modify_object', 'duplicate_object', 'delete_object', 'help', 'back_to_main'],
+                                    'edit_model_loop' : ['create_model', 'create_model_sweep', 'create_submodel_sweep', 'modify_model', 'duplicate_model', 'delete_model', 'post_process_model', 'run_model', 'monitor_models', 'materialize_model', 'help', 'back_to_main']}
+
+            # Set the number of build stages that can use each resource at once
+            self.resource_limits = deepcopy(DEFAULT_RESOURCE_LIMITS)
+
+            # Set solver commands used to run models
+            self.solver_commands = deepcopy(DEFAULT_SOLVER_COMMANDS)
+
+            # Set licence pools and solver token expressions
+            self.licences = deepcopy(DEFAULT_LICENCES)
+
+            # Set how new models store the object files
+            self.model_storage = 'copy'
+
+            # Set the compression of large object files at rest
+            self.object_compression = {'enabled' : False, 'min_size' : 1000000, 'level' : 10, 'frame_size' : 1048576}
+
+            # Set the cache of completed solver runs
+            self.run_cache = deepcopy(DEFAULT_RUN_CACHE)
         
             self.data = {'analysis': {}, 'geometry': {}, 'material': {}, 'model': {}}
 
+        # Track the changes of this session, so saves are merged with the saves of other sessions
+        self.data = track_changes(self.data)
+        self.data_version = 0
+        self.data_lock = Database_Lock(self.fpaths['data'] + '.lock')
+
+        # Purge the folders left in the trash by earlier sessions in the background
+        self.trash = Trash_Reaper(self.fpaths['trash'])
+
+        if read_only:
+            print(green_text('Instantiated the Database Successfully, in read only mode.'))
+            return
+
+        self.trash.start()
 
         # Make storage folders if they dont exist
         if not os.path.exists(self.fpaths['analysis']):
@@ -338,42 +510,26 @@ class Modular_Abaqus_Builder:
         print(green_text('Deleting the Database'))
         print('-'*60)
         
-        try:
-            # Delete all analysis object files
-            for analysis in glob.glob(os.path.join(self.fpaths['analysis'], '*', ''), recursive=False):
-                rmtree(analysis)
-                print(red_text('Deleted: "{}"'.format(analysis)))
-
-            # Delete all geometry object files
-            for geometry in glob.glob(os.path.join(self.fpaths['geometry'], '*', ''), recursive=False):
-                rmtree(geometry)
-                print(red_text('Deleted: "{}"'.format(geometry)))
-
-            # Delete all material object files
-            for material in glob.glob(os.path.join(self.fpaths['material'], '*', ''), recursive=False):
-                rmtree(material)
-                print(red_text('Deleted: "{}"'.format(material)))
-
-            # Delete all model files
-            for model in glob.glob(os.path.join(self.fpaths['model'], '*', ''), recursive=False):
-                rmtree(model)
-                print(red_text('Deleted: "{}"'.format(model)))
-
-            if os.path.exists(self.fpaths['data']):
-                # Delete pickle storage file
-                os.remove(self.fpaths['data'])
-                print(red_text('Deleted: "{}"'.format(self.fpaths['data'])))
+        # The folders are moved to the trash and removed in the background
+        not_deleted = []
+        for folder_type in ('analysis', 'geometry', 'material', 'model'):
+            for folder in glob.glob(os.path.join(self.fpaths[folder_type], '*', ''), recursive=False):
+                if self.trash.move_to_trash(folder):
+                    print(red_text('Deleted: "{}"'.format(folder)))
+                else:
+                    not_deleted.append(folder)
+
+        if os.path.exists(self.fpaths['data']):
+            # Delete pickle storage file
+            os.remove(self.fpaths['data'])
+            print(red_text('Deleted: "{}"'.format(self.fpaths['data'])))
 
-            print('-'*60)
+        print('-'*60)
+        if not_deleted:
+            print(red_text('ERROR: {} folders could not be deleted as they are in use by another program, they will be removed by the next validate database.'.format(len(not_deleted))))
+        else:
             print(green_text('The Database was successfully deleted.'))
 
-        except:
-            print(red_text('ERROR: The program cannot delete a file due to another program using a directory.'))
-            print(red_text('Closing the Database.'))
-            print('-'*60)
-
-            exit(0)
-
 
     def delete_all_models(self):
         '''
@@ -393,37 +549,41 @@ class Modular_Abaqus_Builder:
         
         print('-'*60)
 
-        try:
-            for model in directories:
-                rmtree(model)
+        # The folders are moved to the trash and removed in the background
+        not_deleted = []
+        for model in directories:
+            if self.trash.move_to_trash(model):
                 print(red_text('Deleted directory: "{}"'.format(model)))
+            else:
+                not_deleted.append(model)
 
-            for model in model_names:
-                print(red_text('Deleted Model: "{}", from the database.'.format(model)))
-
-            self.data['model'] = {}
-            print('-'*60)
-            print(green_text('Successfully deleted all models from the database.'))
+        for model in model_names:
+            print(red_text('Deleted Model: "{}", from the database.'.format(model)))
 
-        except:
-            print(red_text('ERROR: The program cannot delete a file due to another program using a directory.'))
-            print(red_text('Closing the Database.'))
-            print('-'*60)
+        self.delete_results(list(model_names))
+        self.data['model'].clear()
+        print('-'*60)
 
-            exit(0)
+        if not_deleted:
+            print(red_text('ERROR: {} model folders could not be deleted as they are in use by another program, they will be removed by the next validate database.'.format(len(not_deleted))))
+        else:
+            print(green_text('Successfully deleted all models from the database.'))
 
 
-    def load_database(self): 
+    def load_database(self, lock=True): 
         '''
         ---------------------------------------------------
-        Load the database from the .pkl file
+        Load the database from the .pkl file. The file is replaced atomically by saves, so read only
+        sessions can load it without the lock (lock=False), which creates the lock file.
         ---------------------------------------------------
         '''
         print('-'*60)
 
-        with open(self.fpaths['data'], 'rb') as df:
-            self.data = pkl.load(df).data
-            print(green_text('Loading from: "{}" was successful.'.format(self.fpaths['data'])))
+        with self.data_lock if lock else nullcontext():
+            self.data_version, data = self.read_data_file()
+
+        self.data = track_changes(data)
+        print(green_text('Loading from: "{}" was successful.'.format(self.fpaths['data'])))
             
         # Set builders to point at current builder
         for objects in self.data.values():
@@ -434,25 +594,123 @@ class Modular_Abaqus_Builder:
     def save_database(self):
         '''
         ---------------------------------------------------
-        Saves the database to a .pkl file
+        Saves the database to a .pkl file. If another session has saved since this session last
+        loaded or saved, the objects and models changed by this session are merged into the saved
+        database instead of overwriting it.
         ---------------------------------------------------
         '''
         print('-'*60)
 
-        if not os.path.exists(self.fpaths['data']):
-            print(yellow_text('New "{}" file created'.format(self.fpaths['data'])))
-
         # Save data
         try:
-            with open(self.fpaths['data'], 'wb') as df:
-                pkl.dump(self, df)
+            with self.data_lock:
+                if not os.path.exists(self.fpaths['data']):
+                    print(yellow_text('New "{}" file created'.format(self.fpaths['data'])))
+
+                else:
+                    self.refresh_database()
+
+                # Written to a temporary file first, so sessions never read a partially written database
+                temp_fpath = self.fpaths['data'] + '.tmp'
+                with open(temp_fpath, 'wb') as df:
+                    pkl.dump(self.data_version + 1, df)
+                    pkl.dump(self, df)
+
+                os.replace(temp_fpath, self.fpaths['data'])
+                self.data_version += 1
+
+                for objects in self.data.values():
+                    objects.changed.clear()
+
                 print(green_text('Save to: "{}" was successful.'.format(self.fpaths['data'])))
 
+        except TimeoutError as error:
+            print(red_text('ERROR: Save to: "{}" was unsuccessful. {}'.format(self.fpaths['data'], error)))
+            print('-'*60)
+
         except:
             print(red_text('ERROR: Save to: "{}" was unsuccessful.'.format(self.fpaths['data'])))
             print('-'*60)
 
 
+    def read_data_file(self):
+        '''
+        ---------------------------------------------------
+        Returns the version and data stored in the data.pickle file. Files saved before the
+        database was versioned only contain the builder, and are version 0.
+        ---------------------------------------------------
+        '''
+        with open(self.fpaths['data'], 'rb') as df:
+            version = pkl.load(df)
+
+            if not isinstance(version, int):
+                return 0, version.data
+
+            return version, pkl.load(df).data
+
+
+    def read_data_version(self):
+        '''
+        ---------------------------------------------------
+        Returns the version of the data.pickle file, without loading the data.
+        ---------------------------------------------------
+        '''
+        with open(self.fpaths['data'], 'rb') as df:
+            version = pkl.load(df)
+
+        return version if isinstance(version, int) else 0
+
+
+    def refresh_database(self):
+        '''
+        ---------------------------------------------------
+        Loads the objects and models saved by other sessions since this session last loaded or saved.
+        The objects and models changed by this session, and not yet saved, are kept.
+        ---------------------------------------------------
+        '''
+        with self.data_lock:
+            if not os.path.exists(self.fpaths['data']) or self.read_data_version() == self.data_version:
+                return
+
+            version, data = self.read_data_file()
+            data = track_changes(data)
+
+            for object_type,objects in self.data.items():
+                saved_objects = data.setdefault(object_type, Tracked_Dict())
+
+                # Objects deleted by this session stay deleted, objects set by this session replace the saved ones
+                for name in objects.changed:
+                    if name in objects:
+                        saved_objects[name] = objects[name]
+                    else:
+                        saved_objects.pop(name, None)
+
+                saved_objects.changed = set(objects.changed)
+
+            for objects in data.values():
+                for obj in objects.values():
+                    obj.builder = self
+
+            print(yellow_text('Merged the changes saved by other sessions to: "{}" (version {} to {}).'.format(self.fpaths['data'], self.data_version, version)))
+
+            self.data = data
+            self.data_version = version
+
+
+    @contextmanager
+    def transaction(self):
+        '''
+        ---------------------------------------------------
+        Context manager that locks the database and loads the changes of other sessions, then
+        saves the database on exit. Other sessions wait to save until the transaction is finished.
+        ---------------------------------------------------
+        '''
+        with self.data_lock:
+            self.refresh_database()
+            yield self
+            self.save_database()
+
+
     def print_database(self, verbose=False):
         '''
         ---------------------------------------------------
@@ -489,9 +747,28 @@ class Modular_Abaqus_Builder:
             model.print_model(verbose=verbose)
             
 
-    def validate_database(self): # Move validates to Objects/Models
+    def validate_database(self, grace_period=3600): # Move validates to Objects/Models
         '''
-        
+        ---------------------------------------------------
+        Validates the objects and models, and deletes the folders that are not in the database. The
+        database is locked and refreshed first, so the objects and models of other sessions are kept.
+        ---------------------------------------------------
+        PARAMETERS
+        ---------------------------------------------------
+        grace_period : float
+            Folders modified in the last grace_period seconds are not deleted, as another session may
+            be building them and not yet have saved.
+        ---------------------------------------------------
+        '''
+        with self.transaction():
+            self.validate_contents(grace_period)
+
+
+    def validate_contents(self, grace_period):
+        '''
+        ---------------------------------------------------
+        Validates the objects and models against the folders, called by validate_database with the database locked.
+        ---------------------------------------------------
         '''
         print('-'*60)
         print('Validating the Database.')
@@ -550,6 +827,12 @@ class Modular_Abaqus_Builder:
 
                 print('Validating Model: "{}"'.format(blue_text(model_name)))
                 self.data['model'][model_name].validate_model(self)
+
+                # The links of overlay models break if an object file is removed outside the builder
+                if getattr(self.data['model'].get(model_name), 'overlay', False):
+                    broken_fpaths = self.data['model'][model_name].get_broken_links()
+                    if broken_fpaths:
+                        print(red_text('Model: "{}" has {} links to object files that no longer exist: "{}". Rebuild the model.'.format(model_name, len(broken_fpaths), '", "'.join(broken_fpaths))))
                 
 
             print('-'*60)
@@ -568,6 +851,10 @@ class Modular_Abaqus_Builder:
             for folder in glob.glob(os.path.join(self.fpaths[key],'*',''), recursive=False):
                 
                 if folder not in [os.path.join(object.fpath,'') for object in self.data[key].values()]:
+                    if time.time() - os.path.getmtime(folder) < grace_period:
+                        print(yellow_text('Kept Folder: "{}", that did not exist in the database but was modified recently.'.format(folder)))
+                        continue
+
                     rmtree(folder)
                     print(red_text('Deleted Folder: "{}", that did not exist in the database.'.format(folder)))
                     check_deleted = True
@@ -661,6 +948,8 @@ class Modular_Abaqus_Builder:
 
         while True:
             
+            self.trash.report()
+
             print('-'*60)
             print('Database contains:')
             print('\t{} Analysis Objects'.format(blue_text(len(self.data['analysis']))))
@@ -680,6 +969,10 @@ class Modular_Abaqus_Builder:
             if command == 'exit':
                 if self.yes_no_question('Are you sure you would like to exit?'):
                     self.save_database()
+
+                    if not self.trash.wait(timeout=5):
+                        print(yellow_text('The trash is still being emptied, the rest will be removed by the next session.'))
+                    self.trash.report()
                     break
 
             elif command == 'help':
@@ -716,6 +1009,8 @@ class Modular_Abaqus_Builder:
 
         while command != 'back_to_main':
             
+            self.trash.report()
+
             print('-'*60)
             print('Database contains:')
             print('\t{} Analysis Objects'.format(blue_text(len(self.data['analysis']))))
@@ -744,6 +1039,19 @@ class Modular_Abaqus_Builder:
 
                 self.save_database()
 
+            elif command == 'ingest_library':
+
+                library_fpath = inquirer.prompt([inquirer.Text('library_fpath',
+                                                               'Please enter the ' + blue_text('library folder') + ' to ingest (e.g. bin)',
+                                                               validate = lambda _, fpath: (not fpath) or os.path.isdir(fpath))], theme=Theme())['library_fpath']
+
+                if library_fpath:
+                    try:
+                        self.ingest_library(library_fpath)
+                    except ValueError as error:
+                        print('-'*60)
+                        print(red_text(str(error)))
+
 
             elif command == 'modify_object':
                 
@@ -792,6 +1100,8 @@ class Modular_Abaqus_Builder:
 
         while command != 'back_to_main':
             
+            self.trash.report()
+
             print('-'*60)
             print('Database contains:')
             print('\t{} Analysis Objects'.format(blue_text(len(self.data['analysis']))))
@@ -800,7 +1110,7 @@ class Modular_Abaqus_Builder:
             print('\t{} Models'.format(blue_text(len(self.data['model']))))
             print('-'*60)
             
-            # Commands = ['create_model', 'modify_model', 'duplicate_model', 'delete_model', 'post_process_model', 'run_model', 'help', 'back_to_main']
+            # Commands = ['create_model', 'create_model_sweep', 'create_submodel_sweep', 'modify_model', 'duplicate_model', 'delete_model', 'post_process_model', 'run_model', 'monitor_models', 'materialize_model', 'help', 'back_to_main']
             model_questions = [inquirer.List('command',
                                              'Pick edit model command', 
                                              choices=self.inquirer_dialogs['edit_model_loop'], 
@@ -817,6 +1127,16 @@ class Modular_Abaqus_Builder:
 
                 self.save_database()
 
+            elif command == 'create_model_sweep':
+                self.create_model_sweep()
+
+                self.save_database()
+
+            elif command == 'create_submodel_sweep':
+                self.create_submodel_sweep()
+
+                self.save_database()
+
             elif command == 'modify_model':
                 self.modify_model()
 
@@ -842,6 +1162,14 @@ class Modular_Abaqus_Builder:
 
                 self.save_database()
 
+            elif command == 'monitor_models':
+                self.monitor_models()
+
+            elif command == 'materialize_model':
+                self.materialize_model()
+
+                self.save_database()
+
         print('-'*60)
         print('Returning to the ' + blue_text('main loop'))
 
@@ -926,7 +1254,7 @@ class Modular_Abaqus_Builder:
             
         ---------------------------------------------------
         '''
-        possible_changes = ['name', 'description', 'parameters', 'requirements', 'cancel']
+        possible_changes = ['name', 'description', 'parameters', 'requirements', 'files', 'cancel']
         
         # Get objects to be changed
         questions = [inquirer.Checkbox('modifications','Pick the attributes you would like to modify for object: "{}"'.format(blue_text(object_name)), choices = possible_changes, carousel=True)]
@@ -936,7 +1264,8 @@ class Modular_Abaqus_Builder:
         object_modifications = {'name': False,
                                 'description' : False,
                                 'parameters' : False,
-                                'requirements' : False}
+                                'requirements' : False,
+                                'files' : False}
         
         # If no changes picked or cancelled return to main loop
         if (not modifications) or ('cancel' in modifications):
@@ -950,7 +1279,7 @@ class Modular_Abaqus_Builder:
         return object_modifications
         
 
-    def create_object(self, object_type):
+    def create_object(self, object_type, name=None, description=None, source_fpath=None):
         '''
         ---------------------------------------------------
         Creates a new object in the database with a specified object type
@@ -959,25 +1288,34 @@ class Modular_Abaqus_Builder:
         ---------------------------------------------------
         object_type : str, [analysis/geometry/material]
             The type of object to be added to the database. This can be either of the three types listed above. If the string does not match exactly an error will be thrown.
+
+        name, description, source_fpath : str
+            The name and description of the object and the folder to copy its files from, any not given are prompted for.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        success : bool
+            True if the object was added to the database.
         ---------------------------------------------------
         '''
 
         try:
             if object_type == 'analysis':
-                temp_object = Analysis_Object(self)
+                temp_object = Analysis_Object(self, name=name, description=description, source_fpath=source_fpath)
                 self.data['analysis'][temp_object.name] = temp_object
 
             elif object_type == 'geometry':
-                temp_object = Geometry_Object(self)
+                temp_object = Geometry_Object(self, name=name, description=description, source_fpath=source_fpath)
                 self.data['geometry'][temp_object.name] = temp_object
 
             elif object_type == 'material':
-                temp_object = Material_Object(self)
+                temp_object = Material_Object(self, name=name, description=description, source_fpath=source_fpath)
                 self.data['material'][temp_object.name] = temp_object
 
             if self.data[temp_object.object_type][temp_object.name].validate_requirements_against_database():
                 print('-'*60)
                 print(green_text('Object: "{}" successfully added to the database.'.format(temp_object.name)))
+                return True
 
             else:
                 self.data[object_type].pop(temp_object.name)
@@ -993,6 +1331,124 @@ class Modular_Abaqus_Builder:
                 if object_fpath not in [os.path.join(object.fpath,'') for object in self.data[object_type].values()]:
                     rmtree(object_fpath)
                     print(red_text('Deleted Folder: "{}", that did not exist in the database.'.format(object_fpath)))
+
+        return False
+
+
+    def ingest_library(self, library_fpath, workers=None):
+        '''
+        ---------------------------------------------------
+        Creates an object for every folder of a library tree, e.g. "bin" containing "analysis",
+        "geometry" and "materials" folders. Each folder must contain a "parameters.json" and a
+        "requirements.json", so no object is prompted for, and is named by its lowercase folder name.
+        A ValueError is raised before anything is stored if a "parameters.json" is not valid.
+        The files of every object are copied and hashed in parallel, then all of the objects are
+        added to the database in one transaction.
+        ---------------------------------------------------
+        PARAMETERS
+        ---------------------------------------------------
+        library_fpath : str
+            The library folder, or a folder of a single object type (e.g. "bin/geometry").
+
+        workers : int
+            The number of files copied at once.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        ingested : list of tuple, [('object_type', 'object_name'), ...]
+            The objects added to the database.
+        ---------------------------------------------------
+        '''
+        folder_types = {'analysis' : 'analysis', 'analyses' : 'analysis',
+                        'geometry' : 'geometry', 'geometries' : 'geometry',
+                        'material' : 'material', 'materials' : 'material'}
+
+        # The library folder can be a folder of one object type
+        library_fpath = os.path.normpath(library_fpath)
+        if os.path.basename(library_fpath).lower() in folder_types:
+            type_fpaths = [(folder_types[os.path.basename(library_fpath).lower()], library_fpath)]
+        else:
+            type_fpaths = [(folder_types[folder.lower()], os.path.join(library_fpath, folder)) for folder in sorted(os.listdir(library_fpath)) if folder.lower() in folder_types and os.path.isdir(os.path.join(library_fpath, folder))]
+
+        print('-'*60)
+        print('Ingesting the objects of the library: "{}"'.format(blue_text(library_fpath)))
+        print('-'*60)
+
+        # Find the folders that can be created without prompting
+        candidates = []
+        skipped = []
+        self.refresh_database()
+
+        for object_type, type_fpath in type_fpaths:
+            for folder in sorted(os.listdir(type_fpath)):
+                source_fpath = os.path.join(type_fpath, folder)
+                name = folder.lower()
+
+                if not os.path.isdir(source_fpath) or folder == '__pycache__':
+                    continue
+
+                missing = [fname for fname in ('parameters.json', 'requirements.json') if not os.path.exists(os.path.join(source_fpath, fname))]
+
+                if missing:
+                    skipped.append((object_type, folder, 'no {}'.format(' or '.join(['"{}"'.format(fname) for fname in missing]))))
+                elif not ((len(name) < 30) and (set(name) <= self.allowed_characters['name'])):
+                    skipped.append((object_type, folder, 'the name: "{}" is not valid'.format(name)))
+                elif name in self.data[object_type] or os.path.exists(os.path.join(self.fpaths[object_type], name)):
+                    skipped.append((object_type, folder, 'the {}: "{}" already exists'.format(object_type, name)))
+                elif any([(object_type, name) == (candidate[0], candidate[1]) for candidate in candidates]):
+                    skipped.append((object_type, folder, 'the name: "{}" is used by another folder'.format(name)))
+                else:
+                    candidates.append((object_type, name, folder, source_fpath, os.path.join(self.fpaths[object_type], name)))
+
+        # Reject the library before anything is stored if a parameters file is not valid
+        errors = [error for _, _, _, source_fpath, _ in candidates for error in check_parameters_file(os.path.join(source_fpath, 'parameters.json'))]
+        if errors:
+            raise ValueError('The library has invalid parameter files:\n\t' + '\n\t'.join(errors))
+
+        # Copy and hash the files of every object at once
+        start = time.time()
+        try:
+            file_hashes = store_folders({source_fpath : object_fpath for _, _, _, source_fpath, object_fpath in candidates}, workers)
+        except:
+            for _, _, _, _, object_fpath in candidates:
+                rmtree(object_fpath, ignore_errors=True)
+            print(red_text('ERROR: The files of the library could not be stored, no objects were ingested.'))
+            raise
+
+        print('-'*60)
+        print(green_text('Stored {} files of {} objects in {:.1f} seconds.'.format(sum([len(hashes) for hashes in file_hashes.values()]), len(candidates), time.time() - start)))
+
+        object_classes = {'analysis' : Analysis_Object, 'geometry' : Geometry_Object, 'material' : Material_Object}
+        ingested = []
+
+        with self.transaction():
+            for object_type, name, folder, _, object_fpath in candidates:
+                try:
+                    if name in self.data[object_type]:
+                        raise FileExistsError
+
+                    temp_object = object_classes[object_type](self, name=name, description='Ingested from the library folder ({})'.format(folder), source_fpath=object_fpath, file_hashes=file_hashes[object_fpath])
+
+                    if not temp_object.validate_requirements_against_database():
+                        raise ValueError
+
+                    self.data[object_type][name] = temp_object
+                    ingested.append((object_type, name))
+
+                except:
+                    rmtree(object_fpath)
+                    skipped.append((object_type, folder, 'the object could not be created'))
+
+        print('-'*60)
+        print(green_text('Ingested {} objects into the database.'.format(len(ingested))))
+
+        for object_type, name in ingested:
+            print(green_text('\t{}: "{}"'.format(object_type, name)))
+
+        for object_type, folder, reason in skipped:
+            print(yellow_text('\tSkipped the {} folder: "{}", {}.'.format(object_type, folder, reason)))
+
+        return ingested
         
     
     def modify_object(self, object_name, object_type):
@@ -1030,6 +1486,7 @@ class Modular_Abaqus_Builder:
             new_name = self.data[object_type][object_name].name
 
             self.data[object_type][new_name] = self.data[object_type].pop(object_name)
+            self.data['model'].rename_object(object_type, object_name, new_name)
             
             print(green_text('Object name successfully changed from: "{}" to "{}".'.format(object_name, new_name)))
 
@@ -1040,6 +1497,13 @@ class Modular_Abaqus_Builder:
                 os.rename(fpath, new_fpath)
                 print(green_text('Renaming the filepath: "{}" to "{}" was successful.'.format(fpath,new_fpath)))
 
+                # The links of overlay models contain the old object name
+                for model_name in self.data['model'].get_models(object_type, new_name):
+                    model = self.data['model'][model_name]
+                    if getattr(model, 'overlay', False):
+                        n_files = model.relink(fpath, new_fpath)
+                        print(green_text('Relinked {} files of the overlay model: "{}".'.format(n_files, model_name)))
+
             except:
                 print(red_text('Renaming the filepath: "{}" to "{}" has failed.'.format(fpath,new_fpath)))
 
@@ -1057,30 +1521,46 @@ class Modular_Abaqus_Builder:
         # Change description
         if object_modifications['description']:
             self.data[object_type][object_name].new_description()
+            self.data[object_type].mark_changed(object_name)
             print('-'*60)
             print(green_text('Description modification was successful.'))
 
         # Change parameters
         if object_modifications['parameters']:
             self.data[object_type][object_name].define_parameters()
+            self.data[object_type].mark_changed(object_name)
             print('-'*60)
             print(green_text('Parameters modification was successful.'))
             
         # Change requirements
         if object_modifications['requirements']:
             self.data[object_type][object_name].set_requirements()
+            self.data[object_type].mark_changed(object_name)
             print('-'*60)
             print(green_text('Requirements modification was successful.'))
 
+        # Split the files shared with duplicates, so they can be edited
+        if object_modifications['files']:
+            self.data[object_type][object_name].split_shared_files()
+            print('-'*60)
+            print(green_text('Files modification was prepared, edit the files in: "{}".'.format(self.data[object_type][object_name].fpath)))
+
         if any(object_modifications.values()):
             print('-'*60)
             print(green_text('Modify object operation successful.')) 
 
+        # The models built from the object are not rebuilt automatically
+        affected_models = self.data['model'].get_models(object_type, object_name)
+        if any([object_modifications[key] for key in ('parameters', 'requirements', 'files')]) and affected_models:
+            print(yellow_text('The {} models built from: "{}" may now be out of date: "{}".'.format(len(affected_models), object_name, '", "'.join(affected_models))))
+
 
     def duplicate_object(self, object_name, object_type):
         '''
         ---------------------------------------------------
-        Duplicates an object, both in the local dictionary and into a new filepath. 
+        Duplicates an object, both in the local dictionary and into a new filepath. The new folder
+        shares the stored files of the object through hard links, so no file contents are copied.
+        The shared files are read-only, choose "files" in modify object to split them before editing.
         ---------------------------------------------------
         PARAMETERS
         ---------------------------------------------------
@@ -1119,8 +1599,9 @@ class Modular_Abaqus_Builder:
             self.validate_database()
         else:
             self.data[object_type][new_name] = duplicated_object
-            self.data[object_type][new_name].move_folder(fpath, new_fpath)  
+            n_linked, n_copied = link_folder(fpath, new_fpath)
 
+            print(green_text('Shared {} files of: "{}" with: "{}"{}.'.format(n_linked, object_name, new_name, ', {} files could not be linked and were copied'.format(n_copied) if n_copied else '')))
             print('-'*60)
             print(green_text('Duplicate object operation successful.'))
 
@@ -1140,6 +1621,12 @@ class Modular_Abaqus_Builder:
         ---------------------------------------------------
         '''
 
+        # Report the models built from the object
+        affected_models = self.data['model'].get_models(object_type, object_name)
+        if affected_models:
+            print('-'*60)
+            print(yellow_text('The {}: "{}" is used by {} models: "{}".'.format(object_type, object_name, len(affected_models), '", "'.join(affected_models))))
+
         # Check the user would like to delete the object
         if not self.yes_no_question('Would you like to delete object: "{}" of type: "{}"'.format(object_name, object_type)):
             print('-'*60)
@@ -1151,10 +1638,21 @@ class Modular_Abaqus_Builder:
 
         # Get file path of files
         fpath = os.path.join(self.fpaths[object_type], object_name)
+
+        # The overlay models link to the object files, so they are copied before the folder is removed
+        for model_name in affected_models:
+            model = self.data['model'][model_name]
+            if getattr(model, 'overlay', False):
+                try:
+                    model.materialize()
+                    self.data['model'].mark_changed(model_name)
+                except FileNotFoundError:
+                    print(yellow_text('The overlay model: "{}" could not be materialized, its links to the object will be broken.'.format(model_name)))
         
         # Delete files from filepath
         try:
-            rmtree(fpath)
+            if not self.trash.move_to_trash(fpath):
+                raise PermissionError
             print(green_text('The file path: "{}" and its contents have been successfully removed from the {} folder.'.format(fpath, object_type)))
 
             # Then delete from local dictionary
@@ -1167,6 +1665,15 @@ class Modular_Abaqus_Builder:
         except:
             print(red_text('ERROR: The object could not be deleted.'))
             self.validate_database()
+            return
+
+        # Only the models that used the object are invalid
+        if affected_models:
+            if self.yes_no_question('Delete the {} models that used: "{}"? (Note: keeping the models may cause an error in the future)'.format(len(affected_models), object_name)):
+                self.remove_models(affected_models)
+            else:
+                print('-'*60)
+                print(yellow_text('Kept the models: "{}", that use the deleted object.'.format('", "'.join(affected_models))))
     
     '''
     ----------------------------------------
@@ -1236,6 +1743,343 @@ class Modular_Abaqus_Builder:
             self.validate_database()
         
         
+    def create_model_sweep(self):
+        '''
+        ---------------------------------------------------
+        Create a sweep of models from one analysis, geometry and set of materials. 
+        The user chooses a list of values for each parameter to sweep, and a model is built for every combination of values.
+        Every variant is validated (parameter bounds, derived parameters and input file expressions) before any model is built.
+        ---------------------------------------------------
+        '''
+        print('-'*60)
+        print('Create ' + blue_text('model sweep') + ' operation started')
+
+        try:
+            # Define the models of the sweep without building any files
+            template = Model(self, parameter_values={}, build=False)
+
+        except NameError:
+            print('-'*60)
+            print(yellow_text('Create model sweep cancelled by user.'))
+            return
+        
+        except:
+            print('-'*60)
+            print(red_text('An error occurred while defining the model sweep.'))
+            return
+
+        # Pick the parameters to sweep over
+        print('-'*60)
+        swept_parameters = inquirer.prompt([inquirer.Checkbox('swept_parameters',
+                                                              'Pick the parameters that you would like to sweep over',
+                                                              choices = list(template.parameters.keys()),
+                                                              carousel = True)], theme=Theme())['swept_parameters']
+
+        if not swept_parameters:
+            print('-'*60)
+            print(yellow_text('No parameters chosen, create model sweep cancelled.'))
+            return
+
+        # Get the values of each swept parameter
+        sweep = {}
+        for parameter_name in swept_parameters:
+            dtype = template.parameters[parameter_name]['dtype']
+            print('-'*60)
+            values = inquirer.prompt([inquirer.Text('values',
+                                                    'Enter the comma separated values of: "{}", Note: dtype = "{}"'.format(parameter_name, dtype),
+                                                    default = template.parameters[parameter_name]['default_value'],
+                                                    validate = lambda _,ans: all([template.validate_parameter_value(dtype, _, value.strip()) for value in ans.split(',')]))], theme=Theme())['values']
+
+            sweep[parameter_name] = [int(value) if dtype == 'int' else float(value) for value in values.split(',')]
+
+        try:
+            variants = self.get_sweep_variants(template, sweep)
+
+        except ValueError as error:
+            print('-'*60)
+            print(red_text('{} Create model sweep cancelled.'.format(error)))
+            return
+
+        if not self.yes_no_question('Would you like to build the {} valid models of the sweep?'.format(len(variants))):
+            print('-'*60)
+            print(yellow_text('Create model sweep cancelled by user.'))
+            return
+
+        built = self.build_sweep(template, variants)
+
+        print('-'*60)
+        print(green_text('Create model sweep operation finished, {} of {} models built.'.format(sum(built.values()), len(variants))))
+
+
+    def create_submodel_sweep(self):
+        '''
+        ---------------------------------------------------
+        Create a sweep of submodels from one analysis, geometry and set of materials, with a model for every
+        grid position of the geometry (the "x_grid_position" and "y_grid_position" parameters, between their bounds).
+        The grid positions where a placed submodel lies outside of the global mesh are pruned before any model is built.
+        ---------------------------------------------------
+        '''
+        print('-'*60)
+        print('Create ' + blue_text('submodel sweep') + ' operation started')
+
+        try:
+            # Define the models of the sweep without building any files
+            template = Model(self, parameter_values={}, build=False)
+
+        except NameError:
+            print('-'*60)
+            print(yellow_text('Create submodel sweep cancelled by user.'))
+            return
+        
+        except:
+            print('-'*60)
+            print(red_text('An error occurred while defining the submodel sweep.'))
+            return
+
+        try:
+            sweep = self.get_grid_sweep(template)
+            variants = self.get_sweep_variants(template, sweep)
+
+        except ValueError as error:
+            print('-'*60)
+            print(red_text('{} Create submodel sweep cancelled.'.format(error)))
+            return
+
+        if not self.yes_no_question('Would you like to build the {} models at the valid grid positions?'.format(len(variants))):
+            print('-'*60)
+            print(yellow_text('Create submodel sweep cancelled by user.'))
+            return
+
+        built = self.build_sweep(template, variants)
+
+        print('-'*60)
+        print(green_text('Create submodel sweep operation finished, {} of {} models built.'.format(sum(built.values()), len(variants))))
+
+
+    def get_grid_sweep(self, template):
+        '''
+        ---------------------------------------------------
+        Returns a sweep over every value of the grid position parameters of a model, the integer parameters
+        named "..._grid_position" with a "min_value" and "max_value". An error is raised if the model has none.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        sweep : dict, {'parameter_name' : list, ...}
+            The values of each grid position parameter, between its bounds.
+        ---------------------------------------------------
+        '''
+        sweep = {}
+        for parameter_name,parameter in template.parameters.items():
+            if parameter_name.endswith('grid_position') and parameter['dtype'] == 'int' and (parameter.get('min_value') is not None) and (parameter.get('max_value') is not None):
+                sweep[parameter_name] = list(range(int(parameter['min_value']), int(parameter['max_value'])+1))
+
+        if not sweep:
+            raise ValueError('The geometry: "{}" has no grid position parameters with bounds.'.format(template.geometry.name))
+
+        return sweep
+
+
+    def build_sweep(self, template, variants):
+        '''
+        ---------------------------------------------------
+        Asks the build questions once for the whole sweep, then defines the model of each variant
+        from the template and builds them concurrently.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        built : dict, {'model_name' : bool, ...}
+            True for each model that was built successfully.
+        ---------------------------------------------------
+        '''
+        # Ask the build questions once for the whole sweep
+        try:
+            template.prompt_build_options()
+
+        except:
+            print('-'*60)
+            print(red_text('The build options of the sweep could not be set, the sweep was not built.'))
+            return {model_name : False for model_name in variants.keys()}
+
+        # Define the valid models
+        models = []
+        for model_name,parameter_values in variants.items():
+            try:
+                models.append(Model(self, 
+                                    template.analysis.name, 
+                                    template.geometry.name, 
+                                    list(template.materials.keys()), 
+                                    name = model_name, 
+                                    description = template.description, 
+                                    parameter_values = parameter_values,
+                                    solver_cpus = template.solver_cpus,
+                                    global_model_name = template.global_model_name,
+                                    build = False))
+
+            except:
+                print('-'*60)
+                print(red_text('An error occurred while defining the model: "{}".'.format(model_name)))
+
+        # Build the models concurrently
+        built = self.build_models(models)
+
+        # Models that could not be defined were not built
+        return {model_name : built.get(model_name, False) for model_name in variants.keys()}
+
+
+    def get_sweep_variants(self, template, sweep):
+        '''
+        ---------------------------------------------------
+        Returns the valid variants of a sweep. Every variant is validated (parameter bounds, derived parameters 
+        and input file expressions), an error is raised if no variant is valid or a model name is not valid.
+        ---------------------------------------------------
+        PARAMETERS
+        ---------------------------------------------------
+        template : Model
+            A model defined with build=False, its name is used as the prefix of the model names.
+
+        sweep : dict, {'parameter_name' : list, ...}
+            The values of each swept parameter, a variant is made for every combination of values.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        variants : dict, {'model_name' : {'parameter_name' : value, ...}, ...}
+            The values of the swept parameters of each valid variant.
+        ---------------------------------------------------
+        '''
+        # Get the values of every parameter for every variant
+        values = expand_sweep(sweep)
+        n_variants = len(values[list(sweep.keys())[0]])
+        for parameter_name,parameter in template.parameters.items():
+            if parameter_name not in values:
+                values[parameter_name] = np.full(n_variants, parameter['default_value'])
+
+        print('-'*60)
+        print('Validating the {} variants of the sweep.'.format(blue_text(n_variants)))
+        _, valid = template.evaluate_parameter_sweep(values)
+
+        # Check the names of the models to be built
+        variants = {'{}_{}'.format(template.name, index) : {parameter_name : values[parameter_name][index].item() for parameter_name in sweep.keys()} for index in np.flatnonzero(valid)}
+        invalid_names = [model_name for model_name in variants.keys() if not template.validate_name(None, model_name)]
+
+        if invalid_names:
+            raise ValueError('The model names: "{}" are not valid.'.format('", "'.join(invalid_names)))
+
+        if not len(variants):
+            raise ValueError('No variants of the sweep are valid.')
+
+        return variants
+
+
+    def build_models(self, models):
+        '''
+        ---------------------------------------------------
+        Builds models defined with build=False concurrently, and adds the models built successfully to the database.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        built : dict, {'model_name' : bool, ...}
+            True for each model that was built successfully.
+        ---------------------------------------------------
+        '''
+        built = Build_Orchestrator(self).build_models(models)
+
+        for model in models:
+            if built[model.name]:
+                self.data['model'][model.name] = model
+                print(green_text('Model "{}", successfully added to the database.'.format(model.name)))
+
+        return built
+
+
+    def rebuild_stale_models(self, models=None, include_unrecorded=False):
+        '''
+        ---------------------------------------------------
+        Rebuilds the models whose objects were modified since they were built, found by comparing the
+        provenance of each model with the current hashes of the object files. The stale models are
+        rebuilt concurrently, the folder of each model is kept until its rebuild succeeds. (NOTE: The
+        solver results of a rebuilt model are removed, as they are out of date).
+        ---------------------------------------------------
+        PARAMETERS
+        ---------------------------------------------------
+        models : list of Model
+            The models to check, by default every model in the database.
+
+        include_unrecorded : bool
+            If True the models built before provenance was recorded are rebuilt too.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        built : dict, {'model_name' : bool, ...}
+            True for each stale model that was rebuilt successfully.
+        ---------------------------------------------------
+        '''
+        if models is None:
+            models = list(self.data['model'].values())
+
+        print('-'*60)
+        print('Checking ' + blue_text(len(models)) + ' models for modified objects.')
+        print('-'*60)
+
+        stale_models = []
+        unrecorded = []
+        for model in models:
+            stale_objects = model.get_stale_objects()
+
+            if stale_objects is None:
+                unrecorded.append(model)
+            elif stale_objects:
+                stale_models.append(model)
+                print(yellow_text('Model: "{}" is stale, modified: "{}".'.format(model.name, '", "'.join(stale_objects))))
+
+        if unrecorded:
+            print((yellow_text if include_unrecorded else blue_text)('{} models have no provenance as they were built before it was recorded{}.'.format(len(unrecorded), ', they are rebuilt' if include_unrecorded else '')))
+            if include_unrecorded:
+                stale_models += unrecorded
+
+        if not stale_models:
+            print(green_text('No stale models to rebuild.'))
+            return {}
+
+        # The old folders are kept aside, so a model that fails to rebuild is left as it was
+        provenance = {}
+        for model in stale_models:
+            provenance[model.name] = getattr(model, 'provenance', None)
+
+            if os.path.exists(model.fpath):
+                os.rename(model.fpath, model.fpath + '.stale')
+
+        built = self.build_models(stale_models)
+
+        for model in stale_models:
+            if built[model.name]:
+                if os.path.exists(model.fpath + '.stale'):
+                    self.trash.move_to_trash(model.fpath + '.stale')
+
+                # The model has not been run since it was rebuilt
+                if hasattr(model, 'run_return_code'):
+                    del model.run_return_code
+
+                if model.name in self.data['model']:
+                    self.data['model'].mark_changed(model.name)
+
+            elif os.path.exists(model.fpath + '.stale'):
+                if os.path.exists(model.fpath):
+                    rmtree(model.fpath)
+                os.rename(model.fpath + '.stale', model.fpath)
+
+                # The model is still stale
+                model.provenance = provenance[model.name]
+                print(red_text('Model: "{}" failed to rebuild, the previous build was restored.'.format(model.name)))
+
+        # The results of the old build are out of date
+        self.delete_results([model_name for model_name,success in built.items() if success])
+
+        print('-'*60)
+        print(green_text('Rebuilt {} of {} stale models.'.format(sum(built.values()), len(built))))
+
+        return built
+        
+
     def modify_model(self): # TODO
         '''
         
@@ -1457,35 +2301,256 @@ class Modular_Abaqus_Builder:
             print(yellow_text('Cancelled delete model'))
             return
             
-        try:
-            # Delete folder
-            rmtree(self.data['model'][model_to_delete].fpath)
-            print(green_text('Deleted Folder: "{}"'.format(self.data['model'][model_to_delete].fpath)))
-
-            # Delete from database
-            self.data['model'].pop(model_to_delete)
-            print(green_text('Deleted model: "{}", from the database.'.format(model_to_delete)))
+        if self.remove_models([model_to_delete]):
             print(green_text('{} Model Successfully Deleted.'.format(model_to_delete)))
 
-        except:
+
+    def remove_models(self, model_names):
+        '''
+        ---------------------------------------------------
+        Deletes models from the database and moves their folders to the trash, without prompting.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        removed : list of str
+            The names of the models deleted, models whose folder could not be moved are kept.
+        ---------------------------------------------------
+        '''
+        removed = []
+
+        for model_name in model_names:
+            try:
+                # Move folder to the trash, it is removed in the background
+                if not self.trash.move_to_trash(self.data['model'][model_name].fpath):
+                    raise PermissionError
+                print(green_text('Deleted Folder: "{}"'.format(self.data['model'][model_name].fpath)))
+
+                # Delete from database
+                self.data['model'].pop(model_name)
+                removed.append(model_name)
+
+                print(green_text('Deleted model: "{}", from the database.'.format(model_name)))
+
+            except:
+                print('-'*60)
+                print(red_text('ERROR: Tried to delete the model: "{}", but could not. Check if the directory is open in another application.'.format(model_name)))
+                print(red_text('Try running the validate database command once the error has been rectified to ensure corruption does not occur.'))
+
+        self.delete_results(removed)
+
+        return removed
+
+
+    def delete_results(self, model_names):
+        '''
+        ---------------------------------------------------
+        Removes the stored results of models from both result stores, "results.db" and "results.npz".
+        ---------------------------------------------------
+        '''
+        if not model_names:
+            return
+
+        if os.path.exists(self.fpaths['results_database']):
+            with Results_Database(self.fpaths['results_database']) as results_database:
+                results_database.delete_models(model_names)
+
+        if os.path.exists(self.fpaths['results']):
+            save_results(self.fpaths['results'], {}, removed=model_names)
+
+
+    def postprocess_model(self):
+        '''
+        ---------------------------------------------------
+        Run the "postprocess.py" scripts of the chosen models in a process pool, and store the results
+        ---------------------------------------------------
+        '''
+        model_names = [model_name for model_name,model in self.data['model'].items() if model.get_postprocess_script_fpath()]
+
+        if not model_names:
             print('-'*60)
-            print(red_text('ERROR: Tried to delete the model: "{}", but could not. Check if the directory is open in another application.'.format(model_to_delete)))
-            print(red_text('Try running the validate database command once the error has been rectified to ensure corruption does not occur.'))
-        
+            print(red_text('No models in the database have a "postprocess.py" script.'))
+            return
+
+        # Models that finished running are chosen by default
+        print('-'*60)
+        chosen_models = inquirer.prompt([inquirer.Checkbox('chosen_models',
+                                                           'Pick the models that you would like to post-process',
+                                                           choices = model_names,
+                                                           default = [model_name for model_name in model_names if getattr(self.data['model'][model_name], 'run_return_code', None) == 0],
+                                                           carousel = True)], theme=Theme())['chosen_models']
+
+        if not chosen_models:
+            print('-'*60)
+            print(yellow_text('No models chosen, post-process model cancelled.'))
+            return
+
+        jobs = {}
+        for model_name in chosen_models:
+            model = self.data['model'][model_name]
+            script_fpath = model.get_postprocess_script_fpath()
+            jobs[model_name] = (script_fpath, os.path.dirname(script_fpath), model.get_script_parameters())
+
+        print('-'*60)
+        print('Post-processing {} models.'.format(blue_text(len(jobs))))
+        results = postprocess_models(jobs, self.resource_limits.get('postprocess'))
+
+        # Store scalar metrics with the parameter values of the model, save array metrics in the model folder
+        rows = {}
+        database_rows = {}
+        for model_name,metrics in results.items():
+            model = self.data['model'][model_name]
+            scalars, arrays = split_metrics(metrics)
+
+            rows[model_name] = {'analysis' : model.analysis.name, 'geometry' : model.geometry.name}
+            rows[model_name].update({parameter_name : parameter['default_value'] for parameter_name,parameter in model.get_script_parameters().items()})
+            rows[model_name].update(scalars)
 
-    def postprocess_model(self): # TODO
+            database_rows[model_name] = {'analysis' : model.analysis.name,
+                                         'geometry' : model.geometry.name,
+                                         'materials' : list(model.materials.keys()),
+                                         'parameters' : {parameter_name : parameter['default_value'] for parameter_name,parameter in model.get_script_parameters().items()},
+                                         'metrics' : scalars}
+
+            if arrays:
+                np.savez(os.path.join(model.fpath, model_name+'_postprocess.npz'), **arrays)
+
+        if rows:
+            save_results(self.fpaths['results'], rows)
+
+            with Results_Database(self.fpaths['results_database']) as results_database:
+                results_database.add_models(database_rows)
+
+        print('-'*60)
+        print(green_text('Post-process model operation finished, {} of {} models post-processed.'.format(len(results), len(jobs))))
+        print(green_text('Results saved to: "{}", {} models in the results store.'.format(self.fpaths['results'], len(load_results(self.fpaths['results'])['model_name']))))
+
+
+    def run_model(self):
         '''
-        
+        ---------------------------------------------------
+        Run the solvers of the chosen models, models run concurrently within the resource limits
+        ---------------------------------------------------
         '''
-        pass
+        model_names = list(self.data['model'].keys())
 
+        if not model_names:
+            print('-'*60)
+            print(red_text('No models in the database to run.'))
+            return
 
-    def run_model(self): # TODO
+        print('-'*60)
+        chosen_models = inquirer.prompt([inquirer.Checkbox('chosen_models',
+                                                           'Pick the models that you would like to run',
+                                                           choices = model_names,
+                                                           carousel = True)], theme=Theme())['chosen_models']
+
+        if not chosen_models:
+            print('-'*60)
+            print(yellow_text('No models chosen, run model cancelled.'))
+            return
+
+        models = [self.data['model'][model_name] for model_name in chosen_models]
+        orchestrator = Build_Orchestrator(self)
+
+        print('-'*60)
+        mode = inquirer.prompt([inquirer.List('mode',
+                                              'Run the models, or simulate running them to estimate the makespan under a licence budget',
+                                              choices = ['run', 'simulate'],
+                                              carousel = True)], theme=Theme())['mode']
+
+        # Estimate the makespan without running anything
+        if mode == 'simulate':
+            print('-'*60)
+            questions = [inquirer.Text('duration', 'Estimated run time of each model (hours)', default = 1, validate = lambda _,ans: self.validate_positive_number(ans))]
+            questions += [inquirer.Text(pool, 'Number of "{}" licence tokens'.format(pool), default = tokens, validate = lambda _,ans: ans.isnumeric()) for pool,tokens in self.licences['pools'].items()]
+            answers = inquirer.prompt(questions, theme=Theme())
+
+            try:
+                orchestrator.estimate_makespan(models, [float(answers['duration'])]*len(models), {pool : int(answers[pool]) for pool in self.licences['pools'].keys()})
+            except ValueError as error:
+                print('-'*60)
+                print(red_text(str(error)))
+            return
+
+        return_codes = orchestrator.run_models(models)
+
+        for model_name,return_code in return_codes.items():
+            self.data['model'][model_name].run_return_code = return_code
+            self.data['model'].mark_changed(model_name)
+
+        print('-'*60)
+        print(green_text('Run model operation finished, {} of {} models finished successfully.'.format(list(return_codes.values()).count(0), len(return_codes))))
+
+
+    def monitor_models(self):
         '''
-        
+        ---------------------------------------------------
+        Show a live dashboard of the progress of the chosen running models
+        ---------------------------------------------------
         '''
-        pass 
-        
+        model_names = [model_name for model_name,model in self.data['model'].items() if model.requirements['software']['abaqus'] or model.requirements['software']['fluent']]
+
+        if not model_names:
+            print('-'*60)
+            print(red_text('No models in the database can be monitored.'))
+            return
+
+        print('-'*60)
+        chosen_models = inquirer.prompt([inquirer.Checkbox('chosen_models',
+                                                           'Pick the models that you would like to monitor',
+                                                           choices = model_names,
+                                                           carousel = True)], theme=Theme())['chosen_models']
+
+        if not chosen_models:
+            print('-'*60)
+            print(yellow_text('No models chosen, monitor models cancelled.'))
+            return
+
+        monitors = {}
+        for model_name in chosen_models:
+            for solver,monitor in self.data['model'][model_name].get_monitors().items():
+                monitors['{} ({})'.format(model_name, solver)] = monitor
+
+        Solver_Monitor(monitors).watch()
+
+
+    def materialize_model(self):
+        '''
+        ---------------------------------------------------
+        Replace the links of the chosen overlay models with copies of the object files, e.g. before copying them to a cluster
+        ---------------------------------------------------
+        '''
+        model_names = [model_name for model_name,model in self.data['model'].items() if getattr(model, 'overlay', False)]
+
+        if not model_names:
+            print('-'*60)
+            print(red_text('No overlay models in the database to materialize.'))
+            return
+
+        print('-'*60)
+        chosen_models = inquirer.prompt([inquirer.Checkbox('chosen_models',
+                                                           'Pick the models that you would like to materialize',
+                                                           choices = model_names,
+                                                           carousel = True)], theme=Theme())['chosen_models']
+
+        if not chosen_models:
+            print('-'*60)
+            print(yellow_text('No models chosen, materialize model cancelled.'))
+            return
+
+        print('-'*60)
+        n_materialized = 0
+        for model_name in chosen_models:
+            try:
+                self.data['model'][model_name].materialize()
+                self.data['model'].mark_changed(model_name)
+                n_materialized += 1
+            except FileNotFoundError:
+                print(red_text('Model: "{}" could not be materialized, rebuild it to restore the links.'.format(model_name)))
+
+        print('-'*60)
+        print(green_text('Materialize model operation finished, {} of {} models materialized.'.format(n_materialized, len(chosen_models))))
+
     '''
     ----------------------------------------
         Other
@@ -1507,6 +2572,18 @@ class Modular_Abaqus_Builder:
         return True if command == 'yes' else False
 
 
+    def validate_positive_number(self, value):
+        '''
+        -----------------------------------------------
+        Returns True if the value is a positive number
+        -----------------------------------------------
+        '''
+        try:
+            return float(value) > 0
+        except ValueError:
+            return False
+
+
     def get_relative_fpath(self, full_fpath, relative_to_fpath):
         '''
         
@@ -0,0 +1,275 @@
+import os
+import sys
+import stat
+import hashlib
+from shutil import copy2, copyfile, copystat, rmtree
+from concurrent.futures import ThreadPoolExecutor
+
+
+'''
+------------------------------------------------------------
+    ***Object Store Functions***
+------------------------------------------------------------
+    Copies the files of object folders into the object storage, and
+    records the sha256 of the contents of each file while it is copied,
+    so the file is only read once.
+
+    The files of every folder are copied by a pool of threads, so a
+    library of objects with many large meshes is stored in parallel
+    rather than one file at a time. Links are recreated as links, as by
+    copytree(symlinks=True).
+
+    Duplicated objects share the stored files of the original object
+    through hard links, so duplicating an object is instant and uses no
+    disk space. Shared files are made read-only, so a file is not
+    modified in place for both objects, and are split into a private
+    copy before one side is modified. The content of a shared file is
+    freed once the last object linking it is deleted.
+
+    The files of objects can also be hashed in place, e.g. to check if
+    the objects of a model changed since it was built. The hash of each
+    file is cached with its size and modification time, so unchanged
+    files are only read once per session.
+------------------------------------------------------------
+    **Functions**
+------------------------------------------------------------
+
+store_folders(folders, workers=None):
+    Copies each source folder to its destination folder in parallel, returns the hash of each file.
+
+copy_and_hash(source_fpath, destination_fpath):
+    Copies a file and returns the sha256 of its contents.
+
+link_folder(source_fpath, destination_fpath):
+    Creates a folder that shares the files of another folder through hard links.
+
+split_file(fpath):
+    Replaces a shared file with a private, writable copy.
+
+remove_folder(fpath):
+    Deletes a folder, including its read-only shared files.
+
+copy_writable(source_fpath, destination_fpath):
+    Copies a file with its metadata, the copy is always writable.
+
+hash_folder(fpath, workers=None):
+    Returns the sha256 of each file in a folder.
+
+hash_file(fpath):
+    Returns the sha256 of a file, unchanged files are not read again.
+
+------------------------------------------------------------
+'''
+
+
+CHUNK_SIZE = 1 << 20
+
+# The hashes of the files already read, {'fpath' : ((size, mtime_ns), 'sha256')}
+HASH_CACHE = {}
+
+
+def store_folders(folders, workers=None):
+    '''
+    ---------------------------------------------------
+    Copies each source folder to its destination folder, the files of all folders are copied in parallel.
+    ---------------------------------------------------
+    PARAMETERS
+    ---------------------------------------------------
+    folders : dict, {'source_fpath' : 'destination_fpath', ...}
+        The folders to copy, the destination folders must not exist.
+
+    workers : int
+        The number of files copied at once, by default a few more than the number of cpus.
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    file_hashes : dict, {'destination_fpath' : {'relative_fpath' : 'sha256', ...}, ...}
+        The sha256 of each file copied to each destination folder, by its path relative to the folder.
+    ---------------------------------------------------
+    '''
+    copies = []
+
+    # Create the folders and links first, so the files can be copied in any order
+    for source_fpath,destination_fpath in folders.items():
+        os.makedirs(destination_fpath)
+
+        for folder, subfolders, fnames in os.walk(source_fpath):
+            relative_folder = os.path.relpath(folder, source_fpath)
+
+            for name in subfolders + fnames:
+                source_file = os.path.join(folder, name)
+                destination_file = os.path.normpath(os.path.join(destination_fpath, relative_folder, name))
+
+                if os.path.islink(source_file):
+                    os.symlink(os.readlink(source_file), destination_file)
+                elif os.path.isdir(source_file):
+                    os.makedirs(destination_file)
+                else:
+                    copies.append((destination_fpath, os.path.relpath(destination_file, destination_fpath), source_file, destination_file))
+
+    file_hashes = {destination_fpath : {} for destination_fpath in folders.values()}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        digests = executor.map(lambda copy: copy_and_hash(copy[2], copy[3]), copies)
+
+        for (destination_fpath, relative_fpath, _, _),digest in zip(copies, digests):
+            file_hashes[destination_fpath][relative_fpath] = digest
+
+    return file_hashes
+
+
+def copy_and_hash(source_fpath, destination_fpath):
+    '''
+    ---------------------------------------------------
+    Copies a file with its permissions and modification time, and returns the sha256 of its contents.
+    ---------------------------------------------------
+    '''
+    digest = hashlib.sha256()
+
+    with open(source_fpath, 'rb') as f_read, open(destination_fpath, 'wb') as f_write:
+        for chunk in iter(lambda: f_read.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            f_write.write(chunk)
+
+    stat = os.stat(source_fpath)
+    os.chmod(destination_fpath, stat.st_mode & 0o7777)
+    os.utime(destination_fpath, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    return digest.hexdigest()
+
+
+
+def link_folder(source_fpath, destination_fpath):
+    '''
+    ---------------------------------------------------
+    Creates a folder with a hard link to every file of the source folder, so both folders share the
+    stored contents. The shared files are made read-only. Files that can not be linked (e.g. the
+    folders are on different drives) are copied.
+    ---------------------------------------------------
+    PARAMETERS
+    ---------------------------------------------------
+    source_fpath : str
+        The folder to share the files of.
+
+    destination_fpath : str
+        The new folder, it must not exist.
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    n_linked, n_copied : int
+        The number of files linked and copied.
+    ---------------------------------------------------
+    '''
+    n_linked, n_copied = 0, 0
+    os.makedirs(destination_fpath)
+
+    for folder, subfolders, fnames in os.walk(source_fpath):
+        relative_folder = os.path.relpath(folder, source_fpath)
+
+        for name in subfolders + fnames:
+            source_file = os.path.join(folder, name)
+            destination_file = os.path.normpath(os.path.join(destination_fpath, relative_folder, name))
+
+            if os.path.islink(source_file):
+                os.symlink(os.readlink(source_file), destination_file)
+            elif os.path.isdir(source_file):
+                os.makedirs(destination_file)
+            else:
+                try:
+                    os.link(source_file, destination_file)
+                    os.chmod(source_file, os.stat(source_file).st_mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+                    n_linked += 1
+                except OSError:
+                    copyfile(source_file, destination_file)
+                    copystat(source_file, destination_file)
+                    n_copied += 1
+
+    return n_linked, n_copied
+
+
+def split_file(fpath):
+    '''
+    ---------------------------------------------------
+    Replaces a file that is shared with other objects by a private copy, and makes it writable.
+    Returns True if the file was shared.
+    ---------------------------------------------------
+    '''
+    file_stat = os.stat(fpath)
+
+    if file_stat.st_nlink > 1:
+        copyfile(fpath, fpath + '.tmp')
+        copystat(fpath, fpath + '.tmp')
+        os.replace(fpath + '.tmp', fpath)
+
+    os.chmod(fpath, file_stat.st_mode | stat.S_IWUSR)
+
+    return file_stat.st_nlink > 1
+
+
+def remove_folder(fpath):
+    '''
+    ---------------------------------------------------
+    Deletes a folder. Read-only files that can not be removed (on Windows) are made writable and removed
+    again, the files still shared with other objects keep their contents.
+    ---------------------------------------------------
+    '''
+    def remove_read_only(function, path, _):
+        os.chmod(path, os.stat(path).st_mode | stat.S_IWRITE)
+        function(path)
+
+    # onerror is deprecated from python 3.12
+    rmtree(fpath, **({'onexc' : remove_read_only} if sys.version_info >= (3, 12) else {'onerror' : remove_read_only}))
+
+
+def copy_writable(source_fpath, destination_fpath):
+    '''
+    ---------------------------------------------------
+    Copies a file with its metadata, as copy2, but the copy is writable even if the object file is a
+    read-only shared file. Used as the copy_function of copytree.
+    ---------------------------------------------------
+    '''
+    copy2(source_fpath, destination_fpath)
+    os.chmod(destination_fpath, os.stat(destination_fpath).st_mode | stat.S_IWUSR)
+
+    return destination_fpath
+
+
+def hash_folder(fpath, workers=None):
+    '''
+    ---------------------------------------------------
+    Returns the sha256 of each file in a folder, the files are read in parallel.
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    file_hashes : dict, {'relative_fpath' : 'sha256', ...}
+        The hash of each file by its path relative to the folder, empty if the folder does not exist.
+    ---------------------------------------------------
+    '''
+    fpaths = [os.path.join(folder, fname) for folder, _, fnames in os.walk(fpath) for fname in fnames]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return {os.path.relpath(file_fpath, fpath) : digest for file_fpath,digest in zip(fpaths, executor.map(hash_file, fpaths))}
+
+
+def hash_file(fpath):
+    '''
+    ---------------------------------------------------
+    Returns the sha256 of the contents of a file. The hash is cached with the size and modification
+    time of the file, and only computed again if either changed.
+    ---------------------------------------------------
+    '''
+    file_stat = os.stat(fpath)
+    stamp = (file_stat.st_size, file_stat.st_mtime_ns)
+
+    cached = HASH_CACHE.get(os.path.abspath(fpath))
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    digest = hashlib.sha256()
+    with open(fpath, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+
+    HASH_CACHE[os.path.abspath(fpath)] = (stamp, digest.hexdigest())
+
+    return digest.hexdigest()
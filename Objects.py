@@ -1,5 +1,4 @@
 import os
-from shutil import copytree
 from tkinter import Tk
 from tkinter.filedialog import askdirectory
 import inquirer
@@ -7,6 +6,9 @@ import json
 from glob import glob
 from copy import deepcopy
 
+from Parameters import evaluate_derived_parameters, check_parameter_bounds
+from Seekable_Zstd import SUFFIX, find_file, compress_file
+from Object_Store import store_folders, split_file
 from HazelsAwesomeTheme import red_text,green_text,blue_text,yellow_text
 from HazelsAwesomeTheme import HazelsAwesomeTheme as Theme
 
@@ -33,6 +35,9 @@ class Parent_Object:
     files : list
         A list of all files stored in the filepath. Stored relative to fpath.
 
+    file_hashes : dict
+        The sha256 of the contents of each file when the object was created, by its path relative to fpath.
+
     requirements : dict
         A dictionary containing the requirements dictionary.
 
@@ -94,20 +99,34 @@ class Parent_Object:
 
     move_folder(source_fpath, destination_fpath):
 
+    split_shared_files():
+
+    compress_files():
+
     get_all_files():
 
     ------------------------------------------------------------
     '''
     
-    def __init__(self, builder, object_type = ''):
+    def __init__(self, builder, object_type = '', name=None, description=None, source_fpath=None, file_hashes=None):
         '''
         ---------------------------------------------------
-        Initialise the Object class
+        Initialise the Object class. Any argument that is not given is prompted for.
         ---------------------------------------------------
         PARAMETERS
         ---------------------------------------------------
         builder : Modular_Abaqus_Builder
             The Modular_Abaqus_Builder class used to create this class.
+
+        name, description : str
+            The name and description of the object.
+
+        source_fpath : str
+            The folder to copy the object files from.
+
+        file_hashes : dict
+            Given if the files were already stored in the object folder by ingest_library(), the
+            files are not copied again and source_fpath must be the object folder.
         ---------------------------------------------------
         '''
         self.object_type = object_type
@@ -118,20 +137,21 @@ class Parent_Object:
         # Modular_Abaqus_Builder class containing this object 
         self.builder = builder
         
-        self.new_object_name()
+        self.new_object_name(name)
 
         # Set destination fpath
         self.fpath = os.path.join(self.builder.fpaths[object_type],self.name)
         
-        if os.path.exists(self.fpath):
+        if os.path.exists(self.fpath) and (file_hashes is None):
             print(red_text('File path "{}", already exists.'.format(self.fpath)))
             raise FileExistsError
         
         print('File path set to "{}".'.format(blue_text(self.fpath)))
 
-        self.new_description()
+        self.new_description(description)
         
-        source_fpath = self.get_file_path()
+        if source_fpath is None:
+            source_fpath = self.get_file_path()
         
         # Return error if fpath not specified
         if (not source_fpath) or (not self.validate_fpath(source_fpath)):
@@ -145,7 +165,12 @@ class Parent_Object:
             shortened_fpath = os.path.join('...',os.path.join('',*source_fpath.split('/')[-4:]))
             print('The file path: "{}" to source files from was successfully chosen.'.format(blue_text(shortened_fpath)))
 
-        self.move_folder(source_fpath, self.fpath)
+        if file_hashes is None:
+            self.move_folder(source_fpath, self.fpath)
+        else:
+            self.file_hashes = file_hashes
+
+        self.compress_files()
 
         self.load_parameters() 
 
@@ -157,12 +182,19 @@ class Parent_Object:
     ----------------------------------------
     '''
 
-    def new_object_name(self):
+    def new_object_name(self, name=None):
         '''
         ---------------------------------------------------
         Gets a new Object name, ensures that no object already exists of that type
         ---------------------------------------------------
         '''
+        # Use given name if valid
+        if name is not None:
+            if not (name and self.validate_name(None, name)):
+                raise ValueError('The {} name: "{}" is not valid.'.format(self.object_type, name))
+            self.name = name
+            return
+
         # Get current names
         current_names = list(self.builder.data[self.object_type].keys())
         if hasattr(self, 'name'): current_names.remove(self.name)
@@ -201,12 +233,18 @@ class Parent_Object:
         return
                 
                 
-    def new_description(self):
+    def new_description(self, description=None):
         '''
         ---------------------------------------------------
         Provide a description for the Object added to the database.
         ---------------------------------------------------
         '''
+        # Use given description if valid
+        if description is not None:
+            if not self.validate_description(None, description):
+                raise ValueError('The {} description: "{}" is not valid.'.format(self.object_type, description))
+            self.description = description
+            return
 
         print('-'*60)
         print('Please enter a short ' + blue_text('description') + ' of the new object:')
@@ -577,13 +615,15 @@ class Parent_Object:
         
         # Check parameter value matches entered datatype
         if answers['dtype'] == 'int':
-            if value.isnumeric():
+            try:
+                int(value)
                 print('\n'+'-'*60)
                 print(green_text('Value: "{}" chosen.'.format(value)))
                 print('-'*60)
                 return True
-            else:
+            except ValueError:
                 print(red_text('\nThe entered value is not a valid integer'))
+                return False
         else:
             try:
                 float(value)
@@ -617,10 +657,11 @@ class Parent_Object:
     def move_folder(self, source_fpath, destination_fpath):
         '''
         ---------------------------------------------------
-        Moves a folder from a source path to a destination path
+        Moves a folder from a source path to a destination path, the files are copied in parallel
+        and the hash of each file is recorded.
         ---------------------------------------------------
         '''
-        copytree(source_fpath, destination_fpath, symlinks=True)
+        self.file_hashes = store_folders({source_fpath : destination_fpath})[destination_fpath]
 
         if os.path.isabs(source_fpath):
             source_fpath = os.path.join('...',os.path.join('',*source_fpath.split('/')[-4:]))
@@ -628,6 +669,51 @@ class Parent_Object:
         print(green_text('Successfully copied files from:\n"{}" -> "{}"'.format(source_fpath, destination_fpath)))
 
     
+    def split_shared_files(self):
+        '''
+        ---------------------------------------------------
+        Replaces the files this object shares with its duplicates by private, writable copies, so they
+        can be modified without modifying the other objects.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        n_split : int
+            The number of files that were shared.
+        ---------------------------------------------------
+        '''
+        n_split = 0
+
+        for folder, _, fnames in os.walk(self.fpath):
+            for fname in fnames:
+                if not os.path.islink(os.path.join(folder, fname)):
+                    n_split += split_file(os.path.join(folder, fname))
+
+        print(green_text('Split {} shared files of: "{}", the files in: "{}" can now be modified.'.format(n_split, self.name, self.fpath)))
+        return n_split
+
+    
+    def compress_files(self):
+        '''
+        ---------------------------------------------------
+        Compresses the large input and mesh files of the object at rest, in the seekable zstd format, if
+        "object_compression" is enabled in the builder. The files are decompressed when models are built.
+        ---------------------------------------------------
+        '''
+        settings = getattr(self.builder, 'object_compression', {})
+
+        if not settings.get('enabled'):
+            return
+
+        for folder, _, fnames in os.walk(self.fpath):
+            for fname in fnames:
+                fpath = os.path.join(folder, fname)
+
+                if os.path.splitext(fname)[1] in ('.inp', '.msh') and os.path.getsize(fpath) >= settings['min_size']:
+                    size = os.path.getsize(fpath)
+                    compressed_fpath = compress_file(fpath, settings['level'], settings['frame_size'])
+                    print(green_text('Compressed: "{}", {:.1f} MB -> {:.1f} MB.'.format(fname, size/1e6, os.path.getsize(compressed_fpath)/1e6)))
+
+
     def get_all_files(self):
         '''
         ---------------------------------------------------
@@ -637,7 +723,11 @@ class Parent_Object:
 
         object_files = glob(os.path.join(self.fpath,'**','*.*'), recursive=True)
 
-        self.files = [self.builder.get_relative_fpath(file,self.fpath) for file in object_files if (('requirements.json' not in file) and ('parameters.json' not in file))]
+        # Compressed files are recorded by their uncompressed name
+        self.files = [self.builder.get_relative_fpath(file[:-len(SUFFIX)] if file.endswith(SUFFIX) else file,self.fpath) for file in object_files if (('requirements.json' not in file) and ('parameters.json' not in file))]
+
+        # The json files read when the object was created are removed
+        self.file_hashes = {file : file_hash for file,file_hash in getattr(self, 'file_hashes', {}).items() if file in self.files}
 
     
     def print_object(self, verbose=False):
@@ -669,6 +759,12 @@ class Parent_Object:
                     for solver in self.parameters[parameter]['solvers']:
                             print('\t\t\t\t"{}"'.format(solver))
 
+        if verbose and len(getattr(self, 'derived_parameters', {})):
+            print('\tDerived Parameters: ')
+            for parameter in self.derived_parameters.keys():
+                print('\t\tName: "{}"'.format(self.derived_parameters[parameter]['name']))
+                print('\t\t\tExpression: "{}"'.format(blue_text(self.derived_parameters[parameter]['expression'])))
+
         if verbose:
             print('\tRequirements: ')
             for requirement_type in self.requirements.keys():
@@ -698,7 +794,7 @@ class Parent_Object:
             print(red_text('The directory stored in the object does not exist under the stored name.'))
 
         # Check all files exist in object folder
-        all_files_exist = all([os.path.exists(os.path.join(self.builder.fpaths[self.object_type],self.name,file_to_check)) for file_to_check in self.files])
+        all_files_exist = all([find_file(os.path.join(self.builder.fpaths[self.object_type],self.name,file_to_check)) for file_to_check in self.files])
         if not all_files_exist:
             print(red_text('The files in the object folder do not match those recorded in the object.'))
 
@@ -717,11 +813,64 @@ class Parent_Object:
 
 
 class Analysis_Object(Parent_Object):
-    def __init__(self, builder, object_type='analysis'):
-        super().__init__(builder, object_type)
+    def __init__(self, builder, object_type='analysis', name=None, description=None, source_fpath=None, file_hashes=None):
+        super().__init__(builder, object_type, name, description, source_fpath, file_hashes)
 
         self.load_requirements()
-        
+
+        self.load_derived_parameters()
+
+
+    def load_derived_parameters(self):
+        '''
+        ---------------------------------------------------
+        Try to load the derived parameters for the analysis from "derived_parameters.json".
+        Derived parameters are not set by the user, they are calculated from the other parameters with an expression.
+        ---------------------------------------------------
+        '''
+        self.derived_parameters = {}
+        print('-'*60)
+
+        if os.path.exists(os.path.join(self.fpath,'derived_parameters.json')):
+            with open(os.path.join(self.fpath,'derived_parameters.json'),'r') as f:
+                self.derived_parameters = json.load(f)
+
+            print(green_text('Loaded derived parameters from "derived_parameters.json".'))
+            os.remove(os.path.join(self.fpath,'derived_parameters.json'))
+
+        else:
+            print(yellow_text('No "derived_parameters.json" in directory, the analysis has no derived parameters.'))
+
+
+    def evaluate_parameter_sweep(self, values):
+        '''
+        ---------------------------------------------------
+        Evaluates the derived parameters of the analysis for every variant of a sweep and checks their bounds.
+        ---------------------------------------------------
+        PARAMETERS
+        ---------------------------------------------------
+        values : dict, {'parameter_name' : np.ndarray, ...}
+            The values of every model parameter for each variant in the sweep.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        derived_values : dict, {'derived_parameter_name' : np.ndarray, ...}
+            The values of the derived parameters for each variant.
+
+        valid : np.ndarray, dtype = bool
+            True for the variants where all the derived parameters are within their bounds.
+        ---------------------------------------------------
+        '''
+        derived_parameters = getattr(self, 'derived_parameters', {})
+
+        derived_values = evaluate_derived_parameters(derived_parameters, values)
+        valid, errors = check_parameter_bounds(derived_parameters, derived_values)
+
+        for error in errors:
+            print(red_text(error))
+
+        return derived_values, valid
+
         
     def set_requirements(self, reset_requirements=False):
         '''
@@ -814,8 +963,8 @@ class Analysis_Object(Parent_Object):
 
 
 class Geometry_Object(Parent_Object):
-    def __init__(self, builder, object_type='geometry'):
-        super().__init__(builder, object_type)
+    def __init__(self, builder, object_type='geometry', name=None, description=None, source_fpath=None, file_hashes=None):
+        super().__init__(builder, object_type, name, description, source_fpath, file_hashes)
 
         self.load_requirements()
         
@@ -833,12 +982,12 @@ class Geometry_Object(Parent_Object):
         change_made = False
         for requirement_name in self.requirements[self.object_type].keys():
             if ('abaqus' in requirement_name) or ('assembly' in requirement_name):
-                if os.path.exists(os.path.join(self.fpath,requirement_name+'.inp')):
+                if find_file(os.path.join(self.fpath,requirement_name+'.inp')):
                     self.requirements[self.object_type][requirement_name] = True
                     print(green_text('Automatically detected the file: "{}".'.format(requirement_name+'.inp')))
                     change_made = True
             else:
-                if os.path.exists(os.path.join(self.fpath,requirement_name+'.msh')):
+                if find_file(os.path.join(self.fpath,requirement_name+'.msh')):
                     self.requirements[self.object_type][requirement_name] = True
                     print(green_text('Automatically detected the file: "{}".'.format(requirement_name+'.msh')))
                     change_made = True
@@ -890,8 +1039,8 @@ class Geometry_Object(Parent_Object):
 
 
 class Material_Object(Parent_Object):
-    def __init__(self, builder, object_type='material'):
-        super().__init__(builder, object_type)
+    def __init__(self, builder, object_type='material', name=None, description=None, source_fpath=None, file_hashes=None):
+        super().__init__(builder, object_type, name, description, source_fpath, file_hashes)
 
         self.load_requirements()
  
@@ -909,7 +1058,7 @@ class Material_Object(Parent_Object):
         # Check if files exist in directory
         change_made = False
         for requirement_name in self.requirements[self.object_type].keys():
-            if os.path.exists(os.path.join(self.fpath,requirement_name+'.inp')):
+            if find_file(os.path.join(self.fpath,requirement_name+'.inp')):
                 self.requirements[self.object_type][requirement_name] = True
                 print(green_text('Automatically detected the file: "{}".'.format(requirement_name+'.inp')))
                 change_made = True
@@ -0,0 +1,437 @@
+import os
+import ast
+import json
+import math
+from itertools import product
+
+import numpy as np
+
+from Seekable_Zstd import find_file, open_file
+from HazelsAwesomeTheme import red_text,green_text,blue_text,yellow_text
+
+
+'''
+------------------------------------------------------------
+    ***Parameter Functions***
+------------------------------------------------------------
+    Functions used to evaluate parameter values and parameter
+    expressions over a whole sweep of models at once.
+
+    Every parameter value is stored as a numpy array with one
+    entry per variant in the sweep, a single model is just a
+    sweep with one variant.
+------------------------------------------------------------
+    **Functions**
+------------------------------------------------------------
+
+expand_sweep(sweep):
+    Expands a dictionary of parameter value lists into the full cartesian product of parameter values.
+
+get_expression_names(expression):
+    Returns the set of parameter names referenced by an expression.
+
+evaluate_expression(expression, values):
+    Evaluates an expression string over every variant in values.
+
+evaluate_derived_parameters(derived_parameters, values):
+    Evaluates the expressions of the derived parameters in dependency order.
+
+check_parameter_bounds(parameters, values):
+    Checks each parameter against its "min_value" and "max_value", returns a mask of the valid variants.
+
+check_parameters_file(fpath):
+    Checks a "parameters.json" is a dictionary of parameter definitions, returns a message for each problem.
+
+read_inp_parameters(fpath, search_fpaths=()):
+    Reads the *Parameter definitions of an abaqus input file and the files it includes, in the order abaqus evaluates them.
+
+evaluate_inp_parameters(definitions, values):
+    Evaluates abaqus *Parameter definitions in order over every variant in values.
+
+------------------------------------------------------------
+'''
+
+
+# Functions that can be called inside of an expression
+EXPRESSION_FUNCTIONS = {'sqrt' : np.sqrt,
+                        'exp' : np.exp,
+                        'log' : np.log,
+                        'log10' : np.log10,
+                        'sin' : np.sin,
+                        'cos' : np.cos,
+                        'tan' : np.tan,
+                        'abs' : np.abs,
+                        'min' : np.minimum,
+                        'max' : np.maximum,
+                        'ceil' : np.ceil,
+                        'floor' : np.floor,
+                        'round' : np.round,
+                        'int' : lambda value: np.trunc(value).astype(np.int64),
+                        'float' : lambda value: np.asarray(value, dtype=float),
+                        'str' : lambda value: np.asarray(value).astype(str)}
+
+# Constants that can be used inside of an expression
+EXPRESSION_CONSTANTS = {'pi' : math.pi}
+
+# Operators that can be used inside of an expression
+BINARY_OPERATORS = {ast.Add : np.add,
+                    ast.Sub : np.subtract,
+                    ast.Mult : np.multiply,
+                    ast.Div : np.true_divide,
+                    ast.FloorDiv : np.floor_divide,
+                    ast.Mod : np.mod,
+                    ast.Pow : np.power}
+
+UNARY_OPERATORS = {ast.USub : np.negative,
+                   ast.UAdd : np.positive}
+
+
+def expand_sweep(sweep):
+    '''
+    ---------------------------------------------------
+    Expands a sweep into every combination of its parameter values
+    ---------------------------------------------------
+    PARAMETERS
+    ---------------------------------------------------
+    sweep : dict, {'parameter_name' : [value_1, value_2, ...], ...}
+        The values each parameter should take in the sweep.
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    values : dict, {'parameter_name' : np.ndarray, ...}
+        Arrays of equal length containing the parameter value for each variant.
+    ---------------------------------------------------
+    '''
+    names = list(sweep.keys())
+
+    if not names:
+        return {}
+
+    combinations = list(product(*[list(sweep[name]) for name in names]))
+
+    return {name : np.array([combination[i] for combination in combinations]) for i,name in enumerate(names)}
+
+
+def get_expression_names(expression):
+    '''
+    ---------------------------------------------------
+    Get the names of the parameters referenced in an expression
+    ---------------------------------------------------
+    '''
+    tree = ast.parse(str(expression).strip(), mode='eval')
+
+    called_names = set([node.func.id for node in ast.walk(tree) if isinstance(node, ast.Call) and isinstance(node.func, ast.Name)])
+    names = set([node.id for node in ast.walk(tree) if isinstance(node, ast.Name)])
+
+    return names - called_names - set(EXPRESSION_CONSTANTS.keys())
+
+
+def evaluate_expression(expression, values):
+    '''
+    ---------------------------------------------------
+    Evaluates an expression for every variant in values
+    ---------------------------------------------------
+    PARAMETERS
+    ---------------------------------------------------
+    expression : str
+        A python style arithmetic expression, e.g. "n_cycles / vibration_frequency".
+
+    values : dict, {'parameter_name' : np.ndarray, ...}
+        The parameter values the expression can reference.
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    result : np.ndarray
+        The value of the expression for each variant.
+    ---------------------------------------------------
+    '''
+    tree = ast.parse(str(expression).strip(), mode='eval')
+
+    return np.asarray(evaluate_node(tree.body, values))
+
+
+def evaluate_node(node, values):
+    '''
+    ---------------------------------------------------
+    Recursively evaluates a node of a parsed expression. Only arithmetic,
+    the functions in EXPRESSION_FUNCTIONS and names in values are allowed.
+    ---------------------------------------------------
+    '''
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return node.value
+
+    elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return np.str_(node.value)
+
+    elif isinstance(node, ast.Name):
+        if node.id in values:
+            return values[node.id]
+        elif node.id in EXPRESSION_CONSTANTS:
+            return EXPRESSION_CONSTANTS[node.id]
+        raise NameError('Unknown parameter "{}"'.format(node.id))
+
+    elif isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        left = evaluate_node(node.left, values)
+        right = evaluate_node(node.right, values)
+
+        # Strings can only be concatenated, e.g. 'freq_extract_' + str(int(freq_1))
+        if np.asarray(left).dtype.kind == 'U' or np.asarray(right).dtype.kind == 'U':
+            if isinstance(node.op, ast.Add):
+                return np.strings.add(np.asarray(left), np.asarray(right))
+            raise ValueError('Unsupported string operation: "{}"'.format(ast.unparse(node)))
+
+        # Promote integers so that negative powers and true division behave
+        if isinstance(node.op, (ast.Div, ast.Pow)):
+            left = np.asarray(left, dtype=float)
+
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            return BINARY_OPERATORS[type(node.op)](left, right)
+
+    elif isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+        return UNARY_OPERATORS[type(node.op)](evaluate_node(node.operand, values))
+
+    elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in EXPRESSION_FUNCTIONS and not node.keywords:
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            return EXPRESSION_FUNCTIONS[node.func.id](*[evaluate_node(arg, values) for arg in node.args])
+
+    raise ValueError('Unsupported expression: "{}"'.format(ast.unparse(node)))
+
+
+def evaluate_derived_parameters(derived_parameters, values):
+    '''
+    ---------------------------------------------------
+    Evaluates all derived parameters over every variant in values. Derived
+    parameters can reference each other, they are evaluated in dependency order.
+    ---------------------------------------------------
+    PARAMETERS
+    ---------------------------------------------------
+    derived_parameters : dict
+        A dictionary of derived parameter definitions, each with an "expression" key.
+
+    values : dict, {'parameter_name' : np.ndarray, ...}
+        The values of the input parameters for each variant.
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    derived_values : dict, {'derived_parameter_name' : np.ndarray, ...}
+        The values of the derived parameters for each variant.
+    ---------------------------------------------------
+    '''
+    derived_values = {}
+    remaining = {name : get_expression_names(parameter['expression']) for name,parameter in derived_parameters.items()}
+
+    while remaining:
+
+        available = set(values.keys()) | set(derived_values.keys())
+        ready = [name for name,dependencies in remaining.items() if dependencies <= available]
+
+        if not ready:
+            missing = {name : sorted(dependencies - available) for name,dependencies in remaining.items()}
+            raise ValueError('Derived parameters could not be evaluated, unresolved names: {}'.format(missing))
+
+        for name in ready:
+            result = evaluate_expression(derived_parameters[name]['expression'], {**values, **derived_values})
+
+            if derived_parameters[name].get('dtype') == 'int':
+                result = np.rint(result).astype(np.int64) if np.all(np.isfinite(result)) else result
+
+            derived_values[name] = result
+            remaining.pop(name)
+
+    # Broadcast constant expressions to the length of the sweep
+    n_variants = max([np.size(value) for value in values.values()], default=1)
+    return {name : np.broadcast_to(value, (n_variants,)) for name,value in derived_values.items()}
+
+
+def check_parameter_bounds(parameters, values):
+    '''
+    ---------------------------------------------------
+    Checks every variant against the "min_value" and "max_value" of each parameter.
+    ---------------------------------------------------
+    PARAMETERS
+    ---------------------------------------------------
+    parameters : dict
+        A dictionary of parameter definitions, bounds are optional.
+
+    values : dict, {'parameter_name' : np.ndarray, ...}
+        The values of the parameters for each variant.
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    valid : np.ndarray, dtype = bool
+        True for each variant that satisfies every bound.
+
+    errors : list of str
+        A message for each parameter bound that was violated.
+    ---------------------------------------------------
+    '''
+    n_variants = max([np.size(value) for value in values.values()], default=1)
+    valid = np.ones(n_variants, dtype=bool)
+    errors = []
+
+    for name,parameter in parameters.items():
+        if name not in values:
+            continue
+
+        value = np.broadcast_to(values[name], (n_variants,))
+
+        if value.dtype.kind == 'U':
+            continue
+
+        parameter_valid = np.isfinite(value.astype(float))
+
+        if parameter.get('min_value') is not None:
+            parameter_valid &= value >= parameter['min_value']
+
+        if parameter.get('max_value') is not None:
+            parameter_valid &= value <= parameter['max_value']
+
+        if not np.all(parameter_valid):
+            errors.append('Parameter "{}" is not finite or is outside of its bounds [{}, {}] for {} of {} variants.'.format(name,
+                                                                                                            parameter.get('min_value'),
+                                                                                                            parameter.get('max_value'),
+                                                                                                            np.count_nonzero(~parameter_valid),
+                                                                                                            n_variants))
+        valid &= parameter_valid
+
+    return valid, errors
+
+
+def check_parameters_file(fpath):
+    '''
+    ---------------------------------------------------
+    Checks a "parameters.json" is a dictionary of parameter definitions, and that each definition has a "name".
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    errors : list of str
+        A message for each problem with the file, empty if the file is valid.
+    ---------------------------------------------------
+    '''
+    try:
+        with open(fpath, 'r') as f:
+            parameters = json.load(f)
+    except (OSError, ValueError) as error:
+        return ['"{}" could not be read: {}'.format(fpath, error)]
+
+    if not isinstance(parameters, dict):
+        return ['"{}" must contain a dictionary of parameters.'.format(fpath)]
+
+    return ['The parameter: "{}" of "{}" has no "name".'.format(key, fpath) for key,parameter in parameters.items() if not (isinstance(parameter, dict) and isinstance(parameter.get('name'), str))]
+
+
+def print_invalid_variants(values, valid, max_printed=10):
+    '''
+    ---------------------------------------------------
+    Prints the parameter values of the variants that failed validation
+    ---------------------------------------------------
+    '''
+    invalid_indices = np.flatnonzero(~valid)
+
+    print('-'*60)
+    if not len(invalid_indices):
+        print(green_text('All {} variants are valid.'.format(len(valid))))
+        return
+
+    print(red_text('{} of {} variants are not valid:'.format(len(invalid_indices), len(valid))))
+    for index in invalid_indices[:max_printed]:
+        print('\tVariant {}: '.format(blue_text(index)) + ', '.join(['{} = {}'.format(name, value[index]) for name,value in values.items()]))
+
+    if len(invalid_indices) > max_printed:
+        print(yellow_text('\t... and {} more.'.format(len(invalid_indices) - max_printed)))
+
+
+def read_inp_parameters(fpath, search_fpaths=()):
+    '''
+    ---------------------------------------------------
+    Reads the *Parameter definitions of an abaqus input file. Files referenced with *INCLUDE
+    are read in place, so the definitions are returned in the order abaqus evaluates them.
+    Object files compressed at rest are read without decompressing them to disk.
+    ---------------------------------------------------
+    PARAMETERS
+    ---------------------------------------------------
+    fpath : str
+        The path of the input file.
+
+    search_fpaths : list of str
+        Directories searched for included files after the directory of the input file.
+        Included files that cannot be found are skipped.
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    definitions : list of tuple, [('parameter_name', 'expression'), ...]
+        The parameter definitions in order.
+    ---------------------------------------------------
+    '''
+    definitions = []
+    directories = [os.path.dirname(fpath)] + list(search_fpaths)
+    in_parameter_block = False
+
+    with open_file(fpath,'r') as f:
+        for line in f:
+
+            # Data lines of other keywords (e.g. node coordinates) are skipped quickly
+            if not in_parameter_block and line[:1] != '*':
+                continue
+
+            line = line.strip()
+
+            # Comments
+            if not line or line.startswith('**') or line.startswith('#'):
+                continue
+
+            # Keyword lines
+            if line.startswith('*'):
+                options = [option.strip() for option in line[1:].split(',')]
+                keyword = options[0].lower()
+                in_parameter_block = keyword == 'parameter'
+
+                if keyword == 'include':
+                    include_names = [option.split('=',1)[1].strip().strip('"') for option in options[1:] if option.lower().replace(' ','').startswith('input=')]
+                    include_fpaths = [os.path.join(directory, include_names[0]) for directory in directories if include_names]
+                    include_fpaths = [include_fpath for include_fpath in include_fpaths if find_file(include_fpath)]
+
+                    if include_fpaths:
+                        definitions += read_inp_parameters(include_fpaths[0], search_fpaths)
+                continue
+
+            # Parameter definition lines
+            if '=' in line:
+                name,expression = line.split('=',1)
+                definitions.append((name.strip(), expression.strip()))
+
+    return definitions
+
+
+def evaluate_inp_parameters(definitions, values):
+    '''
+    ---------------------------------------------------
+    Evaluates abaqus *Parameter definitions over every variant in values. Definitions are evaluated
+    in order, as abaqus does, so a definition can only reference parameters defined before it.
+    ---------------------------------------------------
+    PARAMETERS
+    ---------------------------------------------------
+    definitions : list of tuple, [('parameter_name', 'expression'), ...]
+        The parameter definitions, as returned by read_inp_parameters.
+
+    values : dict, {'parameter_name' : np.ndarray, ...}
+        The values of the model parameters for each variant.
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    inp_values : dict, {'parameter_name' : np.ndarray, ...}
+        The values of the parameters defined in the input files for each variant.
+    ---------------------------------------------------
+    '''
+    inp_values = {}
+    n_variants = max([np.size(value) for value in values.values()], default=1)
+
+    for name,expression in definitions:
+        try:
+            result = evaluate_expression(expression, {**values, **inp_values})
+        except (NameError, ValueError, TypeError, SyntaxError) as error:
+            raise ValueError('The input file parameter "{} = {}" could not be evaluated: {}'.format(name, expression, error))
+
+        inp_values[name] = np.broadcast_to(result, (n_variants,))
+
+    return inp_values
@@ -0,0 +1,185 @@
+import os
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from importlib.util import spec_from_file_location
+from importlib.util import module_from_spec
+
+import numpy as np
+
+from HazelsAwesomeTheme import red_text,green_text,blue_text,yellow_text
+
+
+'''
+------------------------------------------------------------
+    ***Post-processing Functions***
+------------------------------------------------------------
+    Runs the post-processing scripts of finished models and stores their results.
+
+    An analysis can provide a "postprocess.py" script with a function:
+
+        postprocess(fpath, name, parameters) -> dict
+
+    which is called in the solver directory of the model and returns
+    a dictionary of metrics. Scalar metrics are stored in a columnar
+    results store (.npz), one row per model, with a column for the
+    model name, every parameter and every metric, so the metrics of a
+    whole sweep are loaded in one read. Array metrics are saved to
+    "{name}_postprocess.npz" in the model folder.
+------------------------------------------------------------
+    **Functions**
+------------------------------------------------------------
+
+run_postprocess_script(script_fpath, fpath, name, parameters):
+    Loads a "postprocess.py" script and runs it, used in the worker processes.
+
+postprocess_models(jobs, max_workers=None):
+    Runs the post-processing scripts of many models in a process pool.
+
+split_metrics(metrics):
+    Splits metrics into scalar metrics and array metrics.
+
+load_results(fpath):
+    Loads the results store as a dictionary of columns.
+
+save_results(fpath, rows, removed=()):
+    Adds or replaces the rows of models in the results store, and removes the rows of deleted models.
+
+------------------------------------------------------------
+'''
+
+
+def run_postprocess_script(script_fpath, fpath, name, parameters):
+    '''
+    ---------------------------------------------------
+    Loads a "postprocess.py" script and runs its postprocess() function. The script is loaded in
+    the worker process, so that only the file path needs to be sent to the worker.
+    ---------------------------------------------------
+    '''
+    spec = spec_from_file_location('postprocess', script_fpath)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module.postprocess(fpath = fpath, name = name, parameters = parameters)
+
+
+def postprocess_models(jobs, max_workers=None):
+    '''
+    ---------------------------------------------------
+    Runs the post-processing scripts of many models in a process pool.
+    ---------------------------------------------------
+    PARAMETERS
+    ---------------------------------------------------
+    jobs : dict, {'model_name' : (script_fpath, fpath, parameters), ...}
+        The script, solver directory and parameters of each model.
+
+    max_workers : int
+        The number of worker processes, defaults to the number of cpus.
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    results : dict, {'model_name' : dict, ...}
+        The metrics returned by the script of each model, models that failed are left out.
+    ---------------------------------------------------
+    '''
+    results = {}
+
+    # The workers are spawned, forking would copy the background threads of the builder (e.g. the trash reaper) mid-operation
+    with ProcessPoolExecutor(max_workers = max_workers, mp_context = get_context('spawn')) as executor:
+        futures = {executor.submit(run_postprocess_script, script_fpath, fpath, name, parameters) : name for name,(script_fpath, fpath, parameters) in jobs.items()}
+
+        for future in as_completed(futures):
+            name = futures[future]
+
+            try:
+                results[name] = dict(future.result())
+                print(green_text('Post-processing of model: "{}" successful.'.format(name)))
+
+            except Exception as error:
+                print(red_text('Post-processing of model: "{}" failed: {}'.format(name, error)))
+
+    return results
+
+
+def split_metrics(metrics):
+    '''
+    ---------------------------------------------------
+    Splits metrics into the scalar metrics kept in the results store, and the array metrics saved per model.
+    ---------------------------------------------------
+    '''
+    scalars = {}
+    arrays = {}
+
+    for metric_name,value in metrics.items():
+        if np.ndim(value) == 0:
+            scalars[metric_name] = value if isinstance(value, str) else float(value)
+        else:
+            arrays[metric_name] = np.asarray(value)
+
+    return scalars, arrays
+
+
+def load_results(fpath):
+    '''
+    ---------------------------------------------------
+    Loads the results store.
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    columns : dict, {'column_name' : np.ndarray, ...}
+        One array per column with one entry per model, the "model_name" column holds the model names.
+        Numeric columns are floats, with NaN where a model has no value.
+    ---------------------------------------------------
+    '''
+    if not os.path.exists(fpath):
+        return {'model_name' : np.array([], dtype=str)}
+
+    with np.load(fpath) as store:
+        return {column_name : store[column_name] for column_name in store.files}
+
+
+def save_results(fpath, rows, removed=()):
+    '''
+    ---------------------------------------------------
+    Adds the rows of models to the results store, rows of models already in the store are replaced.
+    The rows of the models in removed are dropped.
+    ---------------------------------------------------
+    PARAMETERS
+    ---------------------------------------------------
+    fpath : str
+        The path of the results store.
+
+    rows : dict, {'model_name' : {'column_name' : value, ...}, ...}
+        The parameter values and scalar metrics of each model.
+
+    removed : list of str
+        The names of the models whose rows are dropped, e.g. deleted models.
+    ---------------------------------------------------
+    '''
+    columns = load_results(fpath)
+
+    # Convert the stored columns back into rows
+    all_rows = {}
+    for index,model_name in enumerate(columns['model_name']):
+        all_rows[str(model_name)] = {column_name : column[index] for column_name,column in columns.items() if column_name != 'model_name'}
+
+    all_rows.update(rows)
+
+    for model_name in removed:
+        all_rows.pop(model_name, None)
+
+    model_names = list(all_rows.keys())
+    column_names = sorted(set([column_name for row in all_rows.values() for column_name in row.keys()]))
+
+    new_columns = {'model_name' : np.array(model_names, dtype=str)}
+    for column_name in column_names:
+        values = [all_rows[model_name].get(column_name) for model_name in model_names]
+
+        if any([isinstance(value, (str, np.str_)) for value in values]):
+            new_columns[column_name] = np.array(['' if value is None else str(value) for value in values], dtype=str)
+        else:
+            new_columns[column_name] = np.array([np.nan if value is None else value for value in values], dtype=float)
+
+    # Write to a temporary file first so an interrupted save does not corrupt the store
+    temp_fpath = fpath + '.tmp.npz'
+    np.savez(temp_fpath, **new_columns)
+    os.replace(temp_fpath, fpath)
@@ -0,0 +1,291 @@
+import time
+import sqlite3
+
+import numpy as np
+
+
+class Results_Database():
+    '''
+    ------------------------------------------------------------
+        ***Results_Database***
+    ------------------------------------------------------------
+        SQLite index of the parameters and post-processing metrics of
+        every model, so results can be queried across models without
+        unpickling the builder.
+
+        The database has three tables:
+            - models: one row per model, with the analysis, geometry
+              and materials used.
+            - parameters: one row per (model, parameter), indexed by
+              parameter name and value so parameter ranges are found
+              without scanning every model.
+            - metrics: one row per (model, metric), the scalar metrics
+              returned by the "postprocess.py" scripts.
+
+        E.g. peak pressure against vibration frequency for every model
+        of the geometry "30um_grid":
+
+            database.query(['peak_pressure'], ['vibration_frequency'], geometry='30um_grid')
+    ------------------------------------------------------------
+        **Attributes**
+    ------------------------------------------------------------
+
+    fpath : str
+        The path of the SQLite database file.
+
+    connection : sqlite3.Connection
+        The connection to the database.
+
+    ------------------------------------------------------------
+        **Methods**
+    ------------------------------------------------------------
+
+    create_tables():
+        Creates the tables and indexes if they do not exist.
+
+    add_models(rows):
+        Adds the parameters and metrics of models, models already in the database are replaced.
+
+    delete_models(model_names):
+        Removes models from the database.
+
+    query(metrics, parameters=(), filters=None, analysis=None, geometry=None):
+        Returns the metrics and parameters of the models matching the filters as arrays.
+
+    get_parameter_names():
+        Returns the names of the parameters in the database.
+
+    get_metric_names():
+        Returns the names of the metrics in the database.
+
+    close():
+        Closes the connection to the database.
+
+    ------------------------------------------------------------
+    '''
+
+    def __init__(self, fpath):
+        self.fpath = fpath
+        self.connection = sqlite3.connect(fpath)
+
+        # Readers are not blocked while post-processing writes results
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.create_tables()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def create_tables(self):
+        '''
+        ---------------------------------------------------
+        Creates the tables and indexes if they do not exist.
+        ---------------------------------------------------
+        '''
+        with self.connection:
+            self.connection.executescript('''
+                CREATE TABLE IF NOT EXISTS models (
+                    model_name TEXT PRIMARY KEY,
+                    analysis TEXT,
+                    geometry TEXT,
+                    materials TEXT,
+                    updated REAL);
+
+                CREATE TABLE IF NOT EXISTS parameters (
+                    model_name TEXT NOT NULL,
+                    parameter_name TEXT NOT NULL,
+                    value REAL,
+                    text_value TEXT,
+                    PRIMARY KEY (model_name, parameter_name)) WITHOUT ROWID;
+
+                CREATE TABLE IF NOT EXISTS metrics (
+                    model_name TEXT NOT NULL,
+                    metric_name TEXT NOT NULL,
+                    value REAL,
+                    text_value TEXT,
+                    PRIMARY KEY (model_name, metric_name)) WITHOUT ROWID;
+
+                CREATE INDEX IF NOT EXISTS parameter_values ON parameters (parameter_name, value, model_name);
+                CREATE INDEX IF NOT EXISTS metric_names ON metrics (metric_name, model_name);
+                CREATE INDEX IF NOT EXISTS model_objects ON models (geometry, analysis);
+                ''')
+
+
+    def add_models(self, rows):
+        '''
+        ---------------------------------------------------
+        Adds the parameters and metrics of models in one transaction, models already in the database are replaced.
+        ---------------------------------------------------
+        PARAMETERS
+        ---------------------------------------------------
+        rows : dict, {'model_name' : {'analysis' : str, 'geometry' : str, 'materials' : list of str, 'parameters' : dict, 'metrics' : dict}, ...}
+            The objects used by each model, its parameter values and its scalar metrics.
+        ---------------------------------------------------
+        '''
+        with self.connection:
+            self.delete_models(rows.keys(), commit=False)
+
+            for model_name,row in rows.items():
+                self.connection.execute('INSERT INTO models VALUES (?, ?, ?, ?, ?)',
+                                        (model_name, row.get('analysis'), row.get('geometry'), ','.join(row.get('materials', [])), time.time()))
+
+                self.connection.executemany('INSERT INTO parameters VALUES (?, ?, ?, ?)',
+                                            [(model_name, parameter_name) + split_value(value) for parameter_name,value in row.get('parameters', {}).items()])
+
+                self.connection.executemany('INSERT INTO metrics VALUES (?, ?, ?, ?)',
+                                            [(model_name, metric_name) + split_value(value) for metric_name,value in row.get('metrics', {}).items()])
+
+
+    def delete_models(self, model_names, commit=True):
+        '''
+        ---------------------------------------------------
+        Removes models and their parameters and metrics from the database.
+        ---------------------------------------------------
+        '''
+        model_names = [(model_name,) for model_name in model_names]
+
+        for table in ('parameters', 'metrics', 'models'):
+            self.connection.executemany('DELETE FROM {} WHERE model_name = ?'.format(table), model_names)
+
+        if commit:
+            self.connection.commit()
+
+
+    def query(self, metrics, parameters=(), filters=None, analysis=None, geometry=None):
+        '''
+        ---------------------------------------------------
+        Returns the metrics and parameters of the models matching the filters, ordered by the parameters.
+        ---------------------------------------------------
+        PARAMETERS
+        ---------------------------------------------------
+        metrics : list of str
+            The metrics to return.
+
+        parameters : list of str
+            The parameters to return.
+
+        filters : dict, {'parameter_name' : (min_value, max_value) or value, ...}
+            Only models with parameter values in the range (inclusive) or equal to the value are returned.
+            Either end of a range can be None to leave it open.
+
+        analysis, geometry : str
+            Only models using the analysis or geometry are returned.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        columns : dict, {'model_name' : np.ndarray, 'parameter_name' : np.ndarray, 'metric_name' : np.ndarray, ...}
+            One array per column with one entry per model. Numeric columns are floats, with NaN where
+            a model has no value.
+        ---------------------------------------------------
+        '''
+        joins = []
+        arguments = []
+        conditions = []
+
+        # Filters are inner joins on the parameter index, so only the matching models are read
+        for index,(parameter_name,bounds) in enumerate((filters or {}).items()):
+            alias = 'f{}'.format(index)
+            joins.append('JOIN parameters {0} ON {0}.model_name = models.model_name AND {0}.parameter_name = ?'.format(alias))
+            arguments.append(parameter_name)
+
+            if isinstance(bounds, (tuple, list)):
+                min_value, max_value = bounds
+                if min_value is not None:
+                    joins[-1] += ' AND {}.value >= ?'.format(alias)
+                    arguments.append(float(min_value))
+                if max_value is not None:
+                    joins[-1] += ' AND {}.value <= ?'.format(alias)
+                    arguments.append(float(max_value))
+
+            elif isinstance(bounds, str):
+                joins[-1] += ' AND {}.text_value = ?'.format(alias)
+                arguments.append(bounds)
+
+            else:
+                joins[-1] += ' AND {}.value = ?'.format(alias)
+                arguments.append(float(bounds))
+
+        columns = []
+        for index,parameter_name in enumerate(parameters):
+            alias = 'p{}'.format(index)
+            joins.append('LEFT JOIN parameters {0} ON {0}.model_name = models.model_name AND {0}.parameter_name = ?'.format(alias))
+            arguments.append(parameter_name)
+            columns.append('COALESCE({0}.value, {0}.text_value)'.format(alias))
+
+        for index,metric_name in enumerate(metrics):
+            alias = 'm{}'.format(index)
+            joins.append('LEFT JOIN metrics {0} ON {0}.model_name = models.model_name AND {0}.metric_name = ?'.format(alias))
+            arguments.append(metric_name)
+            columns.append('COALESCE({0}.value, {0}.text_value)'.format(alias))
+
+        for column_name,value in (('analysis', analysis), ('geometry', geometry)):
+            if value is not None:
+                conditions.append('models.{} = ?'.format(column_name))
+                arguments.append(value)
+
+        sql = 'SELECT models.model_name{} FROM models {}'.format(''.join([', ' + column for column in columns]), ' '.join(joins))
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY ' + ', '.join(['p{}.value'.format(index) for index in range(len(parameters))] + ['models.model_name'])
+
+        rows = self.connection.execute(sql, arguments).fetchall()
+
+        column_names = ['model_name'] + list(parameters) + list(metrics)
+        return {column_name : to_array([row[index] for row in rows]) for index,column_name in enumerate(column_names)}
+
+
+    def get_parameter_names(self):
+        '''
+        ---------------------------------------------------
+        Returns the names of the parameters in the database.
+        ---------------------------------------------------
+        '''
+        return [row[0] for row in self.connection.execute('SELECT DISTINCT parameter_name FROM parameters ORDER BY parameter_name')]
+
+
+    def get_metric_names(self):
+        '''
+        ---------------------------------------------------
+        Returns the names of the metrics in the database.
+        ---------------------------------------------------
+        '''
+        return [row[0] for row in self.connection.execute('SELECT DISTINCT metric_name FROM metrics ORDER BY metric_name')]
+
+
+    def close(self):
+        '''
+        ---------------------------------------------------
+        Closes the connection to the database.
+        ---------------------------------------------------
+        '''
+        self.connection.close()
+
+
+def split_value(value):
+    '''
+    ---------------------------------------------------
+    Splits a value into the numeric and text columns of the database.
+    ---------------------------------------------------
+    '''
+    if isinstance(value, (str, np.str_)):
+        return (None, str(value))
+
+    return (float(value), None)
+
+
+def to_array(values):
+    '''
+    ---------------------------------------------------
+    Converts a column of query results to an array, a string array if any value is text,
+    otherwise a float array with NaN for missing values.
+    ---------------------------------------------------
+    '''
+    if any([isinstance(value, str) for value in values]):
+        return np.array(['' if value is None else str(value) for value in values], dtype=str)
+
+    return np.array([np.nan if value is None else value for value in values], dtype=float)
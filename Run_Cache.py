@@ -0,0 +1,329 @@
+import os
+import re
+import json
+import time
+import uuid
+import stat
+import hashlib
+from shutil import copy2
+
+from Object_Store import hash_file, remove_folder
+from HazelsAwesomeTheme import red_text,green_text,blue_text,yellow_text
+
+
+class Run_Cache():
+    '''
+    ------------------------------------------------------------
+        ***Run_Cache***
+    ------------------------------------------------------------
+        Stores the outputs of completed solver runs by a hash of their
+        inputs, so a model whose inputs are identical to a run that
+        already finished (e.g. a duplicated or re-created model) links
+        the outputs of that run instead of running the solver again.
+
+        The key of a run is the sha256 of every file in the model folder
+        before the run (the .inp, .cas, .csp, journal and mesh files),
+        the solver command and the model parameters. The name of the
+        model is replaced by "{name}" in the file names, so models that
+        only differ by name share runs.
+
+        Each entry is a folder named by its key, with hard links to the
+        output files and an "entry.json" of their size and when the entry
+        was last used. Once the entries exceed max_size bytes, the least
+        recently used entries are evicted.
+
+        The cached outputs are shared by the entry and every model folder
+        linked to it, so they are made read-only, and release_outputs
+        unlinks them from a model folder before its solver runs again.
+    ------------------------------------------------------------
+        **Attributes**
+    ------------------------------------------------------------
+
+    fpath : str
+        The folder of the cache entries, on the same drive as the model folders so outputs can be linked.
+
+    max_size : int
+        The size budget of the cache in bytes.
+
+    trash : Trash_Reaper
+        Evicted entries are moved to the trash, if not given they are removed at once.
+
+    ------------------------------------------------------------
+        **Methods**
+    ------------------------------------------------------------
+
+    get_key(model, command):
+        Returns the key of a run and the stamps of the input files.
+
+    restore(key, model):
+        Links the outputs of a cached run into the model folder, returns True on a hit.
+
+    store(key, model, inputs):
+        Links the outputs of a completed run into the cache.
+
+    evict():
+        Removes the least recently used entries until the cache is within max_size.
+
+    get_entries():
+        Returns the entry.json of every entry in the cache.
+
+    ------------------------------------------------------------
+    '''
+
+    def __init__(self, fpath, max_size=20000000000, trash=None):
+        self.fpath = fpath
+        self.max_size = max_size
+        self.trash = trash
+
+
+    def get_key(self, model, command):
+        '''
+        ---------------------------------------------------
+        Returns the key of the run of a model, from its input files, the solver command and its parameters.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        key : str
+            The sha256 of the inputs of the run.
+
+        inputs : dict, {'relative_fpath' : (size, mtime_ns), ...}
+            The stamps of the files in the model folder before the run, the files added or changed by the
+            run are its outputs.
+        ---------------------------------------------------
+        '''
+        digest = hashlib.sha256()
+        inputs = {}
+
+        for folder, subfolders, fnames in os.walk(model.fpath):
+            subfolders.sort()
+
+            for fname in sorted(fnames):
+                fpath = os.path.join(folder, fname)
+                relative_fpath = os.path.relpath(fpath, model.fpath)
+
+                file_stat = os.lstat(fpath)
+                inputs[relative_fpath] = (file_stat.st_size, file_stat.st_mtime_ns)
+
+                digest.update(self.get_cache_fpath(relative_fpath, model.name).encode())
+                digest.update(hash_file(fpath).encode())
+
+        # The command with the model name replaced, and the parameters written into the inputs
+        digest.update(json.dumps([argument.replace(model.name, '{name}') for argument in command]).encode())
+        digest.update(json.dumps(getattr(model, 'parameters', {}), sort_keys=True, default=str).encode())
+
+        return digest.hexdigest(), inputs
+
+
+    def restore(self, key, model):
+        '''
+        ---------------------------------------------------
+        Links the outputs of the cached run into the model folder, files of the model folder with the same
+        name are replaced. Returns True if the run was cached.
+        ---------------------------------------------------
+        '''
+        entry_fpath = os.path.join(self.fpath, key)
+
+        try:
+            with open(os.path.join(entry_fpath, 'entry.json'), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        for cache_fpath in entry['files']:
+            fpath = os.path.join(model.fpath, cache_fpath.replace('{name}', model.name))
+            os.makedirs(os.path.dirname(fpath), exist_ok=True)
+
+            if os.path.lexists(fpath):
+                os.remove(fpath)
+
+            link_or_copy(os.path.join(entry_fpath, 'files', cache_fpath), fpath)
+
+        # The entry is the most recently used
+        entry['last_used'] = time.time()
+        entry['hits'] = entry.get('hits', 0) + 1
+        write_entry(entry_fpath, entry)
+
+        print('-'*60)
+        print(green_text('Model: "{}" has the same inputs as the run of: "{}", linked {} cached output files instead of running the solver.'.format(model.name, entry['model'], len(entry['files']))))
+
+        return True
+
+
+    def store(self, key, model, inputs):
+        '''
+        ---------------------------------------------------
+        Links the files added or changed by a completed run into a new cache entry, then evicts the least
+        recently used entries if the cache is larger than max_size. The entry is written to a temporary
+        folder first, so concurrent runs with the same key never see a partial entry.
+        ---------------------------------------------------
+        '''
+        entry_fpath = os.path.join(self.fpath, key)
+        if os.path.exists(entry_fpath):
+            return
+
+        temp_fpath = os.path.join(self.fpath, '{}.{}.tmp'.format(key, uuid.uuid4().hex[:8]))
+        entry = {'model' : model.name, 'files' : [], 'size' : 0, 'created' : time.time(), 'last_used' : time.time(), 'hits' : 0}
+
+        try:
+            for folder, _, fnames in os.walk(model.fpath):
+                for fname in fnames:
+                    fpath = os.path.join(folder, fname)
+                    relative_fpath = os.path.relpath(fpath, model.fpath)
+                    file_stat = os.lstat(fpath)
+
+                    if os.path.islink(fpath) or inputs.get(relative_fpath) == (file_stat.st_size, file_stat.st_mtime_ns):
+                        continue
+
+                    cache_fpath = self.get_cache_fpath(relative_fpath, model.name)
+                    os.makedirs(os.path.dirname(os.path.join(temp_fpath, 'files', cache_fpath)), exist_ok=True)
+                    link_or_copy(fpath, os.path.join(temp_fpath, 'files', cache_fpath))
+
+                    # A solver writing the shared output in place would change the entry
+                    make_read_only(os.path.join(temp_fpath, 'files', cache_fpath))
+
+                    entry['files'].append(cache_fpath)
+                    entry['size'] += file_stat.st_size
+
+            write_entry(temp_fpath, entry)
+            os.rename(temp_fpath, entry_fpath)
+
+        except OSError:
+            # Another run stored the same key first, or the outputs could not be linked
+            try:
+                remove_folder(temp_fpath)
+            except OSError:
+                pass
+            return
+
+        print('-'*60)
+        print(green_text('Cached the {} output files of: "{}" ({:.1f} MB).'.format(len(entry['files']), model.name, entry['size']/1e6)))
+
+        self.evict()
+
+
+    def evict(self):
+        '''
+        ---------------------------------------------------
+        Removes the least recently used entries until the total size of the cache is within max_size.
+        ---------------------------------------------------
+        '''
+        entries = sorted(self.get_entries().items(), key=lambda item: item[1]['last_used'])
+        total_size = sum([entry['size'] for _,entry in entries])
+
+        for key,entry in entries:
+            if total_size <= self.max_size:
+                break
+
+            entry_fpath = os.path.join(self.fpath, key)
+            if self.trash is None or not self.trash.move_to_trash(entry_fpath):
+                try:
+                    remove_folder(entry_fpath)
+                except OSError:
+                    pass
+
+            total_size -= entry['size']
+            print(yellow_text('Evicted the cached run of: "{}" ({:.1f} MB), the cache is larger than {:.1f} MB.'.format(entry['model'], entry['size']/1e6, self.max_size/1e6)))
+
+
+    def get_entries(self):
+        '''
+        ---------------------------------------------------
+        Returns the entry.json of every complete entry in the cache, by its key.
+        ---------------------------------------------------
+        '''
+        entries = {}
+        if not os.path.isdir(self.fpath):
+            return entries
+
+        for key in os.listdir(self.fpath):
+            try:
+                with open(os.path.join(self.fpath, key, 'entry.json'), 'r') as f:
+                    entries[key] = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+        return entries
+
+
+    def get_cache_fpath(self, relative_fpath, model_name):
+        '''
+        ---------------------------------------------------
+        Returns the path of a file of the model folder with the model name replaced by "{name}", in the
+        names of files written for the job (e.g. "abaqus/model_1.odb" -> "abaqus/{name}.odb").
+        ---------------------------------------------------
+        '''
+        folder, fname = os.path.split(relative_fpath)
+        fname = re.sub('^' + re.escape(model_name) + r'(?=[.\-]|$)', '{name}', fname)
+
+        return '/'.join([part for part in folder.split(os.sep) if part] + [fname])
+
+
+def link_or_copy(source_fpath, destination_fpath):
+    '''
+    ---------------------------------------------------
+    Hard links a file, or copies it if it can not be linked (e.g. the folders are on different drives).
+    ---------------------------------------------------
+    '''
+    try:
+        os.link(source_fpath, destination_fpath)
+    except OSError:
+        copy2(source_fpath, destination_fpath)
+
+
+def make_read_only(fpath):
+    '''
+    ---------------------------------------------------
+    Removes the write permissions of a file, and of every hard link to it.
+    ---------------------------------------------------
+    '''
+    os.chmod(fpath, os.stat(fpath).st_mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+
+def release_outputs(model_fpath):
+    '''
+    ---------------------------------------------------
+    Unlinks the outputs of a model folder that are shared with the run cache, before the solver runs
+    again, so the solver writes new files instead of changing the cached run and the other models linked
+    to it. The files of the model folder that are not linked are kept.
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    n_released : int
+        The number of output files unlinked.
+    ---------------------------------------------------
+    '''
+    n_released = 0
+
+    for folder, _, fnames in os.walk(model_fpath):
+        for fname in fnames:
+            fpath = os.path.join(folder, fname)
+            file_stat = os.lstat(fpath)
+
+            if os.path.islink(fpath) or file_stat.st_nlink < 2:
+                continue
+
+            try:
+                os.remove(fpath)
+            except PermissionError:
+                # Read-only files can not be removed on Windows, the solver writes a new file so the
+                # cached contents are kept
+                os.chmod(fpath, file_stat.st_mode | stat.S_IWRITE)
+                os.remove(fpath)
+
+            n_released += 1
+
+    return n_released
+
+
+def write_entry(entry_fpath, entry):
+    '''
+    ---------------------------------------------------
+    Writes the entry.json of a cache entry through a temporary file.
+    ---------------------------------------------------
+    '''
+    os.makedirs(entry_fpath, exist_ok=True)
+
+    with open(os.path.join(entry_fpath, 'entry.json.tmp'), 'w') as f:
+        json.dump(entry, f, indent=4)
+
+    os.replace(os.path.join(entry_fpath, 'entry.json.tmp'), os.path.join(entry_fpath, 'entry.json'))
@@ -0,0 +1,308 @@
+import io
+import os
+import struct
+from bisect import bisect_right
+
+import zstandard
+
+
+'''
+------------------------------------------------------------
+    ***Seekable Zstd Functions***
+------------------------------------------------------------
+    Compression of large object files (e.g. meshes) at rest, in the
+    zstd seekable format: the file is split into frames of frame_size
+    bytes that are compressed independently, followed by a seek table in
+    a skippable frame:
+
+        [frame 0][frame 1]...[frame n-1][seek table]
+
+        seek table = skippable frame magic  (uint32, 0x184D2A5E)
+                     frame size             (uint32)
+                     per frame: compressed size, decompressed size (uint32, uint32)
+                     number of frames       (uint32)
+                     descriptor             (uint8, no checksums)
+                     seekable magic         (uint32, 0x8F92EAB1)
+
+    Any zstd decompressor reads the file (the seek table is skipped), and
+    Seekable_Reader decompresses only the frames needed to read a range,
+    so e.g. the *Node block of a mesh is read without decompressing the
+    whole file.
+
+    A compressed object file is stored as "name.inp.zst" in place of
+    "name.inp". find_file() and open_file() look for either, so object
+    files are read the same way whether they are compressed or not.
+------------------------------------------------------------
+    **Functions**
+------------------------------------------------------------
+
+compress_file(fpath, level=10, frame_size=1048576):
+    Compresses a file to "fpath.zst" in the seekable format and removes the original.
+
+decompress_file(fpath, destination_fpath):
+    Decompresses a seekable file to destination_fpath.
+
+find_file(fpath):
+    Returns the path of a file, or of its compressed version, or None if neither exists.
+
+find_compressed_files(fpath):
+    Returns the compressed files in a folder and its subfolders.
+
+open_file(fpath, mode='r'):
+    Opens a file, or its compressed version, for reading.
+
+read_seek_table(f):
+    Returns the compressed and decompressed size of each frame of a seekable file.
+
+------------------------------------------------------------
+'''
+
+
+SUFFIX = '.zst'
+SKIPPABLE_MAGIC = 0x184D2A5E
+SEEKABLE_MAGIC = 0x8F92EAB1
+FOOTER_SIZE = 9
+
+
+def compress_file(fpath, level=10, frame_size=1048576):
+    '''
+    ---------------------------------------------------
+    Compresses a file to "fpath.zst" in the seekable format and removes the original.
+    ---------------------------------------------------
+    PARAMETERS
+    ---------------------------------------------------
+    fpath : str
+        The file to compress.
+
+    level : int
+        The zstd compression level, 1-22.
+
+    frame_size : int
+        The number of bytes of the file in each frame. Smaller frames make random reads cheaper
+        and compress less well.
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    compressed_fpath : str
+        The path of the compressed file.
+    ---------------------------------------------------
+    '''
+    compressor = zstandard.ZstdCompressor(level=level, write_checksum=True)
+    compressed_fpath = fpath + SUFFIX
+    frames = []
+
+    with open(fpath, 'rb') as f_read, open(compressed_fpath + '.tmp', 'wb') as f_write:
+        for chunk in iter(lambda: f_read.read(frame_size), b''):
+            frame = compressor.compress(chunk)
+            f_write.write(frame)
+            frames.append((len(frame), len(chunk)))
+
+        f_write.write(struct.pack('<II', SKIPPABLE_MAGIC, 8*len(frames) + FOOTER_SIZE))
+        for frame in frames:
+            f_write.write(struct.pack('<II', *frame))
+        f_write.write(struct.pack('<IBI', len(frames), 0, SEEKABLE_MAGIC))
+
+    # The original is only removed once the compressed file is complete
+    os.replace(compressed_fpath + '.tmp', compressed_fpath)
+    os.remove(fpath)
+
+    return compressed_fpath
+
+
+def decompress_file(fpath, destination_fpath):
+    '''
+    ---------------------------------------------------
+    Decompresses a seekable file to destination_fpath, one frame at a time.
+    ---------------------------------------------------
+    '''
+    decompressor = zstandard.ZstdDecompressor()
+
+    with open(fpath, 'rb') as f_read, open(destination_fpath, 'wb') as f_write:
+        for compressed_size, decompressed_size in read_seek_table(f_read):
+            f_write.write(decompressor.decompress(f_read.read(compressed_size), max_output_size=decompressed_size))
+
+
+def find_file(fpath):
+    '''
+    ---------------------------------------------------
+    Returns the path of a file, or of its compressed version, or None if neither exists.
+    ---------------------------------------------------
+    '''
+    if os.path.exists(fpath):
+        return fpath
+
+    if os.path.exists(fpath + SUFFIX):
+        return fpath + SUFFIX
+
+    return None
+
+
+def find_compressed_files(fpath):
+    '''
+    ---------------------------------------------------
+    Returns the compressed files in a folder and its subfolders.
+    ---------------------------------------------------
+    '''
+    return [os.path.join(folder, fname) for folder, _, fnames in os.walk(fpath) for fname in fnames if fname.endswith(SUFFIX)]
+
+
+def open_file(fpath, mode='r'):
+    '''
+    ---------------------------------------------------
+    Opens a file, or its compressed version, for reading in text ("r") or binary ("rb") mode.
+    ---------------------------------------------------
+    '''
+    found_fpath = find_file(fpath)
+
+    if found_fpath is None:
+        raise FileNotFoundError('The file: "{}" does not exist.'.format(fpath))
+
+    if not found_fpath.endswith(SUFFIX) or fpath.endswith(SUFFIX):
+        return open(found_fpath, mode)
+
+    reader = io.BufferedReader(Seekable_Reader(found_fpath), buffer_size=1 << 16)
+
+    return reader if 'b' in mode else io.TextIOWrapper(reader)
+
+
+def read_seek_table(f):
+    '''
+    ---------------------------------------------------
+    Returns the compressed and decompressed size of each frame of a seekable file, and
+    moves the file back to the first frame. A ValueError is raised if the seek table is
+    missing, truncated, or does not match the frames before it.
+    ---------------------------------------------------
+    '''
+    size = f.seek(0, os.SEEK_END)
+    fname = getattr(f, 'name', f)
+
+    if size < FOOTER_SIZE:
+        raise ValueError('The file: "{}" is not in the seekable zstd format.'.format(fname))
+
+    f.seek(-FOOTER_SIZE, os.SEEK_END)
+    n_frames, descriptor, magic = struct.unpack('<IBI', f.read(FOOTER_SIZE))
+
+    if magic != SEEKABLE_MAGIC:
+        raise ValueError('The file: "{}" is not in the seekable zstd format.'.format(fname))
+
+    # Checksums, if the table has them, follow the sizes of each frame
+    entry_size = 12 if descriptor & 0x80 else 8
+    table_size = entry_size*n_frames + FOOTER_SIZE
+
+    if size < table_size + 8:
+        raise ValueError('The seek table of the file: "{}" is truncated or corrupt.'.format(fname))
+
+    # The skippable frame header is before the table, and the frames fill the rest of the file
+    f.seek(-table_size - 8, os.SEEK_END)
+    skippable_magic, frame_size = struct.unpack('<II', f.read(8))
+    table = f.read(entry_size*n_frames)
+    frames = [struct.unpack_from('<II', table, index*entry_size) for index in range(n_frames)]
+
+    if skippable_magic != SKIPPABLE_MAGIC or frame_size != table_size or sum([compressed_size for compressed_size,_ in frames]) != size - table_size - 8:
+        raise ValueError('The seek table of the file: "{}" is truncated or corrupt.'.format(fname))
+
+    f.seek(0)
+
+    return frames
+
+
+class Seekable_Reader(io.RawIOBase):
+    '''
+    ------------------------------------------------------------
+        ***Seekable_Reader***
+    ------------------------------------------------------------
+        Read only file object over a seekable zstd file, only the frames
+        holding the bytes read are decompressed. Wrap it in an
+        io.BufferedReader or io.TextIOWrapper (see open_file()).
+    ------------------------------------------------------------
+        **Attributes**
+    ------------------------------------------------------------
+
+    fpath : str
+        The path of the compressed file.
+
+    frame_offsets : list of int
+        The offset of each frame in the compressed file.
+
+    frame_sizes : list of int
+        The compressed size of each frame.
+
+    frame_starts : list of int
+        The offset of the first decompressed byte of each frame.
+
+    size : int
+        The size of the decompressed file.
+
+    ------------------------------------------------------------
+    '''
+
+    def __init__(self, fpath):
+        super().__init__()
+
+        self.fpath = fpath
+        self.file = open(fpath, 'rb')
+        self.decompressor = zstandard.ZstdDecompressor()
+
+        frames = read_seek_table(self.file)
+
+        self.frame_sizes = [compressed_size for compressed_size,_ in frames]
+        self.frame_offsets = [0]
+        self.frame_starts = [0]
+        for compressed_size, decompressed_size in frames:
+            self.frame_offsets.append(self.frame_offsets[-1] + compressed_size)
+            self.frame_starts.append(self.frame_starts[-1] + decompressed_size)
+
+        self.size = self.frame_starts.pop()
+        self.frame_offsets.pop()
+
+        self.position = 0
+        self.frame_index = None
+        self.frame = b''
+
+
+    def readable(self):
+        return True
+
+
+    def seekable(self):
+        return True
+
+
+    def tell(self):
+        return self.position
+
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.position
+        elif whence == os.SEEK_END:
+            offset += self.size
+
+        self.position = max(offset, 0)
+        return self.position
+
+
+    def readinto(self, buffer):
+        if self.position >= self.size:
+            return 0
+
+        frame_index = bisect_right(self.frame_starts, self.position) - 1
+
+        # The last frame read is kept, reads are usually sequential
+        if frame_index != self.frame_index:
+            self.file.seek(self.frame_offsets[frame_index])
+            self.frame = self.decompressor.decompress(self.file.read(self.frame_sizes[frame_index]))
+            self.frame_index = frame_index
+
+        start = self.position - self.frame_starts[frame_index]
+        data = self.frame[start:start + len(buffer)]
+        buffer[:len(data)] = data
+        self.position += len(data)
+
+        return len(data)
+
+
+    def close(self):
+        if not self.closed:
+            self.file.close()
+        super().close()
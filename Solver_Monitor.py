@@ -0,0 +1,764 @@
+import os
+import re
+import time
+from collections import deque
+from glob import glob
+
+import numpy as np
+
+from HazelsAwesomeTheme import red_text,green_text,blue_text,yellow_text
+
+
+class File_Tail():
+    '''
+    ------------------------------------------------------------
+        ***File_Tail***
+    ------------------------------------------------------------
+        Follows a file that is being written by a solver. The offset
+        of the last complete line read is kept, so each call of
+        read_lines() only reads the bytes written since the last call,
+        the file is never read from the start again.
+    ------------------------------------------------------------
+        **Attributes**
+    ------------------------------------------------------------
+
+    fpath : str
+        The path of the file, it does not need to exist yet.
+
+    offset : int
+        The byte offset of the end of the last complete line read.
+
+    ------------------------------------------------------------
+        **Methods**
+    ------------------------------------------------------------
+
+    read_lines():
+        Returns the complete lines written since the last call.
+
+    ------------------------------------------------------------
+    '''
+
+    def __init__(self, fpath):
+        self.fpath = fpath
+        self.offset = 0
+
+
+    def read_lines(self):
+        '''
+        ---------------------------------------------------
+        Returns the complete lines written since the last call. A partially written
+        final line is left for the next call. If the file was truncated or replaced
+        (e.g. the model was rerun) it is read again from the start.
+        ---------------------------------------------------
+        '''
+        try:
+            size = os.path.getsize(self.fpath)
+        except OSError:
+            return []
+
+        if size < self.offset:
+            self.offset = 0
+
+        if size == self.offset:
+            return []
+
+        with open(self.fpath,'rb') as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+
+        end = data.rfind(b'\n') + 1
+        self.offset += end
+
+        return data[:end].decode('utf-8', errors='replace').splitlines()
+
+
+class Parent_Monitor():
+    '''
+    ------------------------------------------------------------
+        ***Parent Monitor Class***
+    ------------------------------------------------------------
+        The progress tracking shared by the solver monitors.
+    ------------------------------------------------------------
+        **Attributes**
+    ------------------------------------------------------------
+
+    name : str
+        The job name of the model.
+
+    target_time : float
+        The total time of the analysis, used to calculate the progress. (NOTE: None if unknown)
+
+    total_time : float
+        The simulated time reached by the solver.
+
+    status : str
+        "waiting", "running", "completed", "failed", "diverged" or "stalled".
+
+    tails : list of tuple, [(File_Tail, parse_line), ...]
+        The solver files followed by the monitor, and the method parsing each of their lines.
+
+    warnings, errors : int
+        The number of warnings and errors written by the solver.
+
+    messages : list of str
+        The most recent warning and error messages.
+
+    ------------------------------------------------------------
+        **Methods**
+    ------------------------------------------------------------
+
+    update():
+        Parses the lines written to the files in tails since the last update.
+
+    record_observation(total_time):
+        Records the simulated time reached at the current wall clock time.
+
+    start_observations():
+        Sets the first observation used for the estimated completion time, called after each update.
+
+    add_message(line, error=False):
+        Counts a warning or error message and keeps it if it is recent.
+
+    get_progress():
+        Returns the fraction of the target time completed.
+
+    get_eta():
+        Returns the estimated wall clock time in seconds until the job is complete.
+
+    get_stop_reason():
+        Returns the reason the run should be stopped early, or None.
+
+    get_status():
+        Returns a dictionary of the progress of the job.
+
+    ------------------------------------------------------------
+    '''
+
+    # Number of recent messages kept
+    n_messages = 5
+
+    solver = None
+
+    def __init__(self, name, target_time=None):
+        self.name = name
+        self.target_time = target_time
+
+        self.total_time = 0.0
+        self.status = 'waiting'
+        self.warnings = 0
+        self.errors = 0
+        self.messages = []
+        self.tails = []
+
+        # Wall clock time and total time of the first and latest observation, used for the estimated completion time
+        self.first_observation = None
+        self.last_observation = None
+
+
+    def update(self):
+        '''
+        ---------------------------------------------------
+        Parses the lines written to the solver files since the last update, in the order of tails.
+        ---------------------------------------------------
+        '''
+        for tail, parse_line in self.tails:
+            for line in tail.read_lines():
+                parse_line(line)
+
+        self.start_observations()
+
+
+    def record_observation(self, total_time):
+        '''
+        ---------------------------------------------------
+        Records the simulated time reached at the current wall clock time.
+        ---------------------------------------------------
+        '''
+        self.total_time = total_time
+        self.last_observation = (time.time(), total_time)
+
+        if self.status == 'waiting':
+            self.status = 'running'
+
+
+    def start_observations(self):
+        '''
+        ---------------------------------------------------
+        Output written before monitoring started has no wall clock time, so the rate is measured from the latest of it.
+        ---------------------------------------------------
+        '''
+        if self.first_observation is None:
+            self.first_observation = self.last_observation
+
+
+    def add_message(self, line, error=False):
+        '''
+        ---------------------------------------------------
+        Counts a warning or error message and keeps it if it is recent.
+        ---------------------------------------------------
+        '''
+        if error:
+            self.errors += 1
+        else:
+            self.warnings += 1
+
+        self.messages = (self.messages + [line.strip()])[-self.n_messages:]
+
+
+    def get_progress(self):
+        '''
+        ---------------------------------------------------
+        Returns the fraction of the target time completed, None if the target time is unknown.
+        ---------------------------------------------------
+        '''
+        if self.status == 'completed':
+            return 1.0
+
+        if not self.target_time:
+            return None
+
+        return min(self.total_time / self.target_time, 1.0)
+
+
+    def get_eta(self):
+        '''
+        ---------------------------------------------------
+        Returns the estimated wall clock time in seconds until the job is complete, from the rate
+        the total time has advanced since monitoring started. None if it can not be estimated yet.
+        ---------------------------------------------------
+        '''
+        if self.status == 'completed':
+            return 0.0
+
+        if not self.target_time or self.first_observation is None:
+            return None
+
+        (first_wall_time, first_total_time), (last_wall_time, last_total_time) = self.first_observation, self.last_observation
+
+        if last_total_time <= first_total_time or last_wall_time <= first_wall_time:
+            return None
+
+        rate = (last_total_time - first_total_time) / (last_wall_time - first_wall_time)
+
+        return max(max(self.target_time - last_total_time, 0.0) / rate - (time.time() - last_wall_time), 0.0)
+
+
+    def get_stop_reason(self):
+        '''
+        ---------------------------------------------------
+        Returns the reason the run should be stopped early, or None if it should continue.
+        ---------------------------------------------------
+        '''
+        return None
+
+
+    def get_status(self):
+        '''
+        ---------------------------------------------------
+        Returns a dictionary of the progress of the job.
+        ---------------------------------------------------
+        '''
+        return {'name' : self.name,
+                'solver' : self.solver,
+                'status' : self.status,
+                'total_time' : self.total_time,
+                'progress' : self.get_progress(),
+                'eta' : self.get_eta(),
+                'warnings' : self.warnings,
+                'errors' : self.errors,
+                'messages' : list(self.messages)}
+
+
+class Abaqus_Monitor(Parent_Monitor):
+    '''
+    ------------------------------------------------------------
+        ***Abaqus_Monitor***
+    ------------------------------------------------------------
+        Monitors a running abaqus job by following its status file
+        (.sta) and message file (.msg). Both Abaqus/Explicit and
+        Abaqus/Standard increment lines are parsed.
+    ------------------------------------------------------------
+        **Attributes**
+    ------------------------------------------------------------
+
+    increment : int
+        The number of the latest increment.
+
+    stable_increment : float
+        The stable time increment of the latest increment (the time increment for abaqus/standard).
+
+    ------------------------------------------------------------
+    '''
+
+    solver = 'abaqus'
+
+    def __init__(self, name, fpath, target_time=None):
+        super().__init__(name, target_time)
+
+        self.sta_tail = File_Tail(os.path.join(fpath, name+'.sta'))
+        self.msg_tail = File_Tail(os.path.join(fpath, name+'.msg'))
+        self.tails = [(self.sta_tail, self.parse_sta_line), (self.msg_tail, self.parse_msg_line)]
+
+        self.increment = 0
+        self.stable_increment = None
+
+
+    def parse_sta_line(self, line):
+        '''
+        ---------------------------------------------------
+        Parses a line of the .sta file.
+            - Explicit: INCREMENT, STEP TIME, TOTAL TIME, CPU TIME (hh:mm:ss), STABLE INCREMENT, ...
+            - Standard: STEP, INCREMENT, ATTEMPT, SEVERE ITERS, EQUIL ITERS, TOTAL ITERS, TOTAL TIME, STEP TIME, TIME INCREMENT
+        ---------------------------------------------------
+        '''
+        if 'COMPLETED SUCCESSFULLY' in line:
+            self.status = 'completed'
+            return
+
+        if 'HAS NOT BEEN COMPLETED' in line:
+            self.status = 'failed'
+            return
+
+        values = line.split()
+
+        try:
+            if len(values) >= 5 and values[0].isdigit() and ':' in values[3]:
+                increment, total_time, stable_increment = int(values[0]), float(values[2]), float(values[4])
+
+            elif len(values) >= 9 and values[0].isdigit() and values[1].isdigit():
+                increment, total_time, stable_increment = int(values[1]), float(values[6]), float(values[8])
+
+            else:
+                return
+
+        except ValueError:
+            return
+
+        self.increment = increment
+        self.stable_increment = stable_increment
+        self.record_observation(total_time)
+
+
+    def parse_msg_line(self, line):
+        '''
+        ---------------------------------------------------
+        Counts the warnings and errors of the .msg file and keeps the most recent ones.
+        ---------------------------------------------------
+        '''
+        line = line.strip()
+
+        if line.startswith('***WARNING'):
+            self.add_message(line)
+        elif line.startswith('***ERROR'):
+            self.add_message(line, error=True)
+
+
+    def get_status(self):
+        '''
+        ---------------------------------------------------
+        Returns a dictionary of the progress of the job.
+        ---------------------------------------------------
+        '''
+        status = super().get_status()
+        status.update({'increment' : self.increment,
+                       'stable_increment' : self.stable_increment})
+        return status
+
+
+class Fluent_Monitor(Parent_Monitor):
+    '''
+    ------------------------------------------------------------
+        ***Fluent_Monitor***
+    ------------------------------------------------------------
+        Monitors a running fluent job by following its transcript,
+        the first of "{name}.log" (written by Build_Orchestrator to the
+        directory the solver command runs in, log_fpath), or
+        "outFluent.out" (written by slurm) or a "*.trn" transcript in
+        the solver directory.
+
+        The residuals of every iteration are kept in a ring buffer,
+        and the run is flagged as "diverged" or "stalled" so it can be
+        stopped early:
+            - diverged: fluent reports divergence or a floating point
+              error, or a residual is NaN or above divergence_residual.
+            - stalled: stall_time_steps time steps in a row used all of
+              max_iterations without reaching the residual criteria, or
+              no time step finished for stall_seconds.
+    ------------------------------------------------------------
+        **Attributes**
+    ------------------------------------------------------------
+
+    time_step : int
+        The number of the latest finished time step.
+
+    iteration : int
+        The number of the latest iteration.
+
+    stable_increment : float
+        The size of the latest time step.
+
+    residual_names : list of str
+        The names of the residual columns of the transcript.
+
+    residuals : dict, {'residual_name' : float, ...}
+        The residuals of the latest iteration.
+
+    history : collections.deque
+        Ring buffer of the latest buffer_size iterations, each (time_step, flow_time, iteration, residuals).
+
+    unconverged_time_steps : int
+        The number of time steps in a row that used all of max_iterations without reaching the criteria.
+
+    stop_reason : str
+        Why the run was flagged as diverged or stalled. (NOTE: None if it was not)
+
+    ------------------------------------------------------------
+        **Methods**
+    ------------------------------------------------------------
+
+    find_transcript():
+        Returns the path of the transcript being written, None if there is none yet.
+
+    parse_line(line):
+        Parses a line of the transcript.
+
+    get_history():
+        Returns the iterations in the ring buffer as arrays.
+
+    ------------------------------------------------------------
+    '''
+
+    solver = 'fluent'
+
+    # The residual criteria set by fluent_setup.py
+    criteria = {'continuity' : 1e-05, 'x-velocity' : 1e-05, 'y-velocity' : 1e-05, 'z-velocity' : 1e-05}
+
+    flow_time_pattern = re.compile(r'Flow time\s*=\s*([-+0-9.eE]+)\s*s?\s*,\s*time step\s*=\s*(\d+)')
+
+    divergence_messages = ('divergence detected', 'floating point exception', 'floating point error')
+
+    def __init__(self, name, fpath, target_time=None, max_iterations=65, stall_time_steps=5, stall_seconds=3600.0, divergence_residual=1e3, buffer_size=1000, log_fpath=None):
+        super().__init__(name, target_time)
+
+        self.fpath = fpath
+        self.log_fpath = log_fpath or fpath
+        self.max_iterations = max_iterations
+        self.stall_time_steps = stall_time_steps
+        self.stall_seconds = stall_seconds
+        self.divergence_residual = divergence_residual
+
+        self.tail = None
+        self.time_step = 0
+        self.iteration = 0
+        self.stable_increment = None
+        self.residual_names = []
+        self.residuals = {}
+        self.history = deque(maxlen=buffer_size)
+        self.unconverged_time_steps = 0
+        self.stop_reason = None
+
+        # Iteration number at the end of the previous time step, and the wall clock time a time step last finished
+        self.time_step_start_iteration = 0
+        self.last_time_step_time = None
+
+
+    def find_transcript(self):
+        '''
+        ---------------------------------------------------
+        Returns the path of the transcript being written, None if there is none yet.
+        ---------------------------------------------------
+        '''
+        fpaths = [os.path.join(self.log_fpath, self.name+'.log'), os.path.join(self.fpath, 'outFluent.out')] + sorted(glob(os.path.join(self.fpath, '*.trn')))
+
+        for fpath in fpaths:
+            if os.path.exists(fpath):
+                return fpath
+
+        return None
+
+
+    def update(self):
+        '''
+        ---------------------------------------------------
+        Parses the lines written to the transcript since the last update.
+        ---------------------------------------------------
+        '''
+        if self.tail is None:
+            fpath = self.find_transcript()
+            if fpath is None:
+                return
+            self.tail = File_Tail(fpath)
+            self.tails = [(self.tail, self.parse_line)]
+
+        super().update()
+
+        if self.status == 'running':
+            if self.last_time_step_time is None:
+                self.last_time_step_time = time.time()
+
+            elif self.stall_seconds and time.time() - self.last_time_step_time > self.stall_seconds:
+                self.flag('stalled', 'No time step finished in {:.0f} seconds.'.format(time.time() - self.last_time_step_time))
+
+
+    def parse_line(self, line):
+        '''
+        ---------------------------------------------------
+        Parses a line of the transcript, either the residual header, an iteration, 
+        the end of a time step or a divergence message.
+        ---------------------------------------------------
+        '''
+        values = line.split()
+
+        if not values:
+            return
+
+        if any([message in line.lower() for message in self.divergence_messages]):
+            self.add_message(line, error=True)
+            self.flag('diverged', line.strip())
+            return
+
+        if line.lstrip().startswith('Warning'):
+            self.add_message(line)
+            return
+
+        # Residual header: iter  continuity  x-velocity  y-velocity  z-velocity ...  time/iter
+        if values[0] == 'iter':
+            self.residual_names = values[1:values.index('time/iter')] if 'time/iter' in values else values[1:]
+            return
+
+        match = self.flow_time_pattern.search(line)
+        if match:
+            self.end_time_step(float(match.group(1)), int(match.group(2)))
+            return
+
+        if self.residual_names and values[0].isdigit() and len(values) > len(self.residual_names):
+            try:
+                residuals = [parse_residual(value) for value in values[1:len(self.residual_names)+1]]
+            except ValueError:
+                return
+
+            self.iteration = int(values[0])
+            self.residuals = dict(zip(self.residual_names, residuals))
+            self.history.append((self.time_step, self.total_time, self.iteration, tuple(residuals)))
+
+            if self.status == 'waiting':
+                self.status = 'running'
+
+            if any([not residual < self.divergence_residual for residual in residuals]):
+                self.flag('diverged', 'Residuals diverged at iteration {}: {}'.format(self.iteration, self.format_residuals()))
+
+
+    def end_time_step(self, flow_time, time_step):
+        '''
+        ---------------------------------------------------
+        Records a finished time step, and checks whether it reached the residual criteria.
+        ---------------------------------------------------
+        '''
+        if time_step > self.time_step and flow_time > self.total_time:
+            self.stable_increment = (flow_time - self.total_time) / (time_step - self.time_step)
+
+        iterations = self.iteration - self.time_step_start_iteration
+        converged = all([self.residuals.get(residual_name, 0.0) <= criterion for residual_name,criterion in self.criteria.items()])
+
+        if iterations >= self.max_iterations and not converged:
+            self.unconverged_time_steps += 1
+        else:
+            self.unconverged_time_steps = 0
+
+        self.time_step = time_step
+        self.time_step_start_iteration = self.iteration
+        self.last_time_step_time = time.time()
+        self.record_observation(flow_time)
+
+        if self.stall_time_steps and self.unconverged_time_steps >= self.stall_time_steps:
+            self.flag('stalled', '{} time steps in a row did not converge in {} iterations.'.format(self.unconverged_time_steps, self.max_iterations))
+
+        elif self.target_time and flow_time >= self.target_time * (1 - 1e-9) and self.status == 'running':
+            self.status = 'completed'
+
+
+    def flag(self, status, reason):
+        '''
+        ---------------------------------------------------
+        Flags the run as diverged or stalled, the first reason found is kept.
+        ---------------------------------------------------
+        '''
+        if self.stop_reason is None:
+            self.status = status
+            self.stop_reason = reason
+
+
+    def format_residuals(self):
+        '''
+        ---------------------------------------------------
+        Returns the residuals of the latest iteration as text.
+        ---------------------------------------------------
+        '''
+        return ', '.join(['{} {:.2e}'.format(residual_name, residual) for residual_name,residual in self.residuals.items()])
+
+
+    def get_stop_reason(self):
+        '''
+        ---------------------------------------------------
+        Returns the reason the run should be stopped early, or None if it should continue.
+        ---------------------------------------------------
+        '''
+        return self.stop_reason
+
+
+    def get_history(self):
+        '''
+        ---------------------------------------------------
+        Returns the iterations in the ring buffer as arrays.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        history : dict, {'time_step' : np.ndarray, 'flow_time' : np.ndarray, 'iteration' : np.ndarray, 'residual_name' : np.ndarray, ...}
+        ---------------------------------------------------
+        '''
+        rows = list(self.history)
+        history = {'time_step' : np.array([row[0] for row in rows], dtype=int),
+                   'flow_time' : np.array([row[1] for row in rows], dtype=float),
+                   'iteration' : np.array([row[2] for row in rows], dtype=int)}
+
+        for index,residual_name in enumerate(self.residual_names):
+            history[residual_name] = np.array([row[3][index] if index < len(row[3]) else np.nan for row in rows], dtype=float)
+
+        return history
+
+
+    def get_status(self):
+        '''
+        ---------------------------------------------------
+        Returns a dictionary of the progress of the job.
+        ---------------------------------------------------
+        '''
+        status = super().get_status()
+        status.update({'increment' : self.time_step,
+                       'stable_increment' : self.stable_increment,
+                       'time_step' : self.time_step,
+                       'iteration' : self.iteration,
+                       'residuals' : dict(self.residuals),
+                       'stop_reason' : self.stop_reason})
+        return status
+
+
+def parse_residual(value):
+    '''
+    ---------------------------------------------------
+    Converts a residual of the transcript to a float, fluent writes NaN as e.g. "nan", "-nan(ind)" or "1.#QNAN".
+    ---------------------------------------------------
+    '''
+    try:
+        return float(value)
+    except ValueError:
+        if 'nan' in value.lower() or 'ind' in value.lower():
+            return np.nan
+        raise
+
+
+class Solver_Monitor():
+    '''
+    ------------------------------------------------------------
+        ***Solver_Monitor***
+    ------------------------------------------------------------
+        Monitors many running models at once, with a live dashboard.
+    ------------------------------------------------------------
+        **Attributes**
+    ------------------------------------------------------------
+
+    monitors : dict, {'model_name' : monitor, ...}
+        The monitor of each model, see Model.get_monitors().
+
+    ------------------------------------------------------------
+        **Methods**
+    ------------------------------------------------------------
+
+    update():
+        Updates every monitor and returns the status of each model.
+
+    print_dashboard(statuses):
+        Prints the progress of every model.
+
+    watch(interval=5.0):
+        Redraws the dashboard every interval seconds until every model has finished, or the user presses Ctrl+C.
+
+    ------------------------------------------------------------
+    '''
+
+    def __init__(self, monitors):
+        self.monitors = dict(monitors)
+
+
+    def update(self):
+        '''
+        ---------------------------------------------------
+        Updates every monitor and returns the status of each model.
+        ---------------------------------------------------
+        '''
+        statuses = {}
+
+        for model_name,monitor in self.monitors.items():
+            monitor.update()
+            statuses[model_name] = monitor.get_status()
+
+        return statuses
+
+
+    def print_dashboard(self, statuses):
+        '''
+        ---------------------------------------------------
+        Prints the progress of every model.
+        ---------------------------------------------------
+        '''
+        print('-'*60)
+        print('{:<24}{:<8}{:<11}{:>8}{:>12}{:>10}'.format('Model', 'Solver', 'Status', 'Progress', 'Increment', 'ETA'))
+        print('-'*60)
+
+        for monitor_name,status in statuses.items():
+            progress = '' if status['progress'] is None else '{:.1%}'.format(status['progress'])
+            increment = '' if status['stable_increment'] is None else '{:.3e}'.format(status['stable_increment'])
+            eta = '' if status['eta'] is None else time.strftime('%H:%M:%S', time.gmtime(max(status['eta'], 0)))
+
+            colour = {'completed' : green_text, 'failed' : red_text, 'diverged' : red_text, 'stalled' : red_text, 'running' : blue_text}.get(status['status'], yellow_text)
+            print('{:<24}{:<8}'.format(monitor_name[:23], status['solver']) + colour('{:<11}'.format(status['status'])) + '{:>8}{:>12}{:>10}'.format(progress, increment, eta))
+
+            if status.get('residuals'):
+                print('\t' + ', '.join(['{} {:.2e}'.format(residual_name, residual) for residual_name,residual in status['residuals'].items()]))
+
+            if status.get('stop_reason'):
+                print(red_text('\t' + status['stop_reason'][:80]))
+
+            if status['warnings'] or status['errors']:
+                print(yellow_text('\t{} warnings'.format(status['warnings'])) + ', ' + red_text('{} errors'.format(status['errors'])))
+                for message in status['messages'][-2:]:
+                    print('\t\t' + message[:80])
+
+        print('-'*60)
+
+
+    def watch(self, interval=5.0):
+        '''
+        ---------------------------------------------------
+        Redraws the dashboard every interval seconds until every model has finished, or the user presses Ctrl+C.
+        ---------------------------------------------------
+        '''
+        try:
+            while True:
+                statuses = self.update()
+
+                # Clear the terminal and redraw
+                print('\033[2J\033[H', end='')
+                self.print_dashboard(statuses)
+                print('Press Ctrl+C to stop monitoring.')
+
+                if all([status['status'] in ('completed', 'failed', 'diverged', 'stalled') for status in statuses.values()]):
+                    print(green_text('All monitored models have finished.'))
+                    return statuses
+
+                time.sleep(interval)
+
+        except KeyboardInterrupt:
+            print('-'*60)
+            print(yellow_text('Stopped monitoring.'))
+            return self.update()
@@ -0,0 +1,537 @@
+import os
+
+import numpy as np
+
+from Seekable_Zstd import find_file, open_file
+from Parameters import evaluate_expression
+
+
+'''
+------------------------------------------------------------
+    ***Submodel Placement Functions***
+------------------------------------------------------------
+    Checks where the submodels of a geometry are placed relative to
+    the global mesh they are driven by, over every variant of a sweep
+    at once.
+
+    The assembly.inp of a geometry places each submodel instance with
+    a translation that depends on the model parameters, e.g.
+
+        *Instance, name=abaqus_submodel_solid_1, part=abaqus_submodel_solid
+          <solid_submodel_x_position>, <solid_submodel_y_position>, 0.
+        *End Instance
+        *Submodel, type=NODE, exteriorTolerance=0.05, globalelset=abaqus_whole-chip_solid_1.solid
+          abaqus_submodel_solid_1.driven_nodes,
+
+    The part of each instance is read from "part_name.inp" in the
+    geometry folder. A variant is only valid if, for every submodel:
+
+        - The bounding box of the placed submodel lies inside the
+          bounding box of its placed global part (a cheap first pass).
+        - Every driven node lies inside an element of the global
+          element set, within the exterior tolerance, as abaqus requires
+          when the submodel is run. The elements are found with a
+          Mesh_Index, so all driven nodes of all variants are tested at
+          once.
+
+    Submodels whose parts are not in the geometry folder are not
+    checked. Instance rotations are not supported, only translations.
+------------------------------------------------------------
+    **Functions**
+------------------------------------------------------------
+
+read_part_mesh(fpath):
+    Reads the nodes, elements and sets of each part defined in an abaqus input file.
+
+read_assembly(fpath):
+    Reads the instances and submodels of an abaqus assembly.
+
+get_part_mesh(geometry_fpath, part_name):
+    Returns the mesh of a part of a geometry, or None if the part file does not exist.
+
+get_mesh_index(geometry_fpath, part_name, element_set, exterior_tolerance):
+    Returns the Mesh_Index of an element set of a part of a geometry.
+
+get_instance_translations(instance, values):
+    Evaluates the translation of an instance for every variant in values.
+
+check_submodel_placements(geometry_fpath, values):
+    Checks that every submodel of a geometry lies inside its global mesh, returns a mask of the valid variants.
+
+------------------------------------------------------------
+'''
+
+
+# The meshes of part files already read, {fpath : (size, mtime, meshes)}
+PART_MESH_CACHE = {}
+
+# The indexes of element sets already built, {(fpath, part_name, element_set, exterior_tolerance) : Mesh_Index}
+MESH_INDEX_CACHE = {}
+
+
+def read_part_mesh(fpath):
+    '''
+    ---------------------------------------------------
+    Reads the *Node, *Element, *Nset and *Elset blocks of each *Part defined in an abaqus input file.
+    ---------------------------------------------------
+    PARAMETERS
+    ---------------------------------------------------
+    fpath : str
+        The path of the input file, it can be compressed at rest.
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    meshes : dict, {'part_name' : dict, ...}
+        The mesh of each part:
+            'nodes' : (np.ndarray, np.ndarray), the node labels (n_nodes,) and coordinates (n_nodes, n_dimensions).
+            'elements' : list of (np.ndarray, np.ndarray), the element labels (n_elements,) and
+                         node labels (n_elements, n_element_nodes) of each *Element block.
+            'node_sets' : dict, {'set_name' : np.ndarray, ...}, the node labels of each set.
+            'element_sets' : dict, {'set_name' : np.ndarray, ...}, the element labels of each set.
+    ---------------------------------------------------
+    '''
+    blocks = {}
+    part_name = None
+    block = None
+
+    with open_file(fpath,'r') as f:
+        for line in f:
+
+            # Keyword lines
+            if line[:1] == '*':
+                if line[:2] == '**':
+                    continue
+
+                options = [option.strip() for option in line[1:].split(',')]
+                keyword = options[0].lower()
+                settings = {option.split('=',1)[0].strip().lower() : option.split('=',1)[1].strip() for option in options[1:] if '=' in option}
+                flags = [option.lower() for option in options[1:] if '=' not in option]
+
+                if keyword == 'part':
+                    part_name = settings['name']
+                    blocks[part_name] = {'node' : [], 'element' : [], 'nset' : {}, 'elset' : {}}
+                elif keyword == 'end part':
+                    part_name = None
+
+                block = None
+                if part_name is not None and keyword in ('node', 'element'):
+                    block = []
+                    blocks[part_name][keyword].append(block)
+
+                elif part_name is not None and keyword in ('nset', 'elset'):
+                    block = blocks[part_name][keyword].setdefault(settings[keyword], [])
+                    if 'generate' in flags:
+                        block.append('generate')
+                continue
+
+            line = line.strip()
+            if block is None or not line:
+                continue
+
+            # Data lines ending with a comma are continued on the next line (e.g. elements with many nodes)
+            if block and block[-1].endswith(','):
+                block[-1] += line
+            else:
+                block.append(line)
+
+    meshes = {}
+    for part_name,part_blocks in blocks.items():
+        mesh = {'nodes' : (np.zeros(0, dtype=np.int64), np.zeros((0, 3))),
+                'elements' : [],
+                'node_sets' : {},
+                'element_sets' : {}}
+
+        node_tables = [read_table(lines, float) for lines in part_blocks['node'] if lines]
+        if node_tables:
+            nodes = np.concatenate(node_tables)
+            mesh['nodes'] = (nodes[:,0].astype(np.int64), nodes[:,1:])
+
+        mesh['elements'] = [(table[:,0], table[:,1:]) for table in [read_table(lines, np.int64) for lines in part_blocks['element'] if lines]]
+
+        for keyword,set_key in (('nset', 'node_sets'), ('elset', 'element_sets')):
+            for set_name,lines in part_blocks[keyword].items():
+                mesh[set_key][set_name] = read_set(lines)
+
+        meshes[part_name] = mesh
+
+    return meshes
+
+
+def read_table(lines, dtype):
+    '''
+    ---------------------------------------------------
+    Converts the data lines of a *Node or *Element block to an array with a row per line.
+    ---------------------------------------------------
+    '''
+    lines = [line.rstrip(',') for line in lines]
+    n_columns = len(lines[0].split(','))
+
+    return np.array(','.join(lines).split(','), dtype=float).astype(dtype).reshape(-1, n_columns)
+
+
+def read_set(lines):
+    '''
+    ---------------------------------------------------
+    Converts the data lines of a *Nset or *Elset block to an array of labels. Sets referenced by
+    name inside other sets are not expanded.
+    ---------------------------------------------------
+    '''
+    generate = lines[:1] == ['generate']
+    values = [value.strip() for value in ','.join(lines[1:] if generate else lines).split(',')]
+    values = np.array([int(value) for value in values if value.lstrip('-').isdigit()], dtype=np.int64)
+
+    if not generate:
+        return values
+
+    # Each line of a generated set is "first, last, increment"
+    return np.concatenate([np.zeros(0, dtype=np.int64)] + [np.arange(first, last+1, increment) for first,last,increment in values[:len(values)//3*3].reshape(-1, 3)])
+
+
+def read_assembly(fpath):
+    '''
+    ---------------------------------------------------
+    Reads the instances and submodels of an abaqus assembly.
+    ---------------------------------------------------
+    PARAMETERS
+    ---------------------------------------------------
+    fpath : str
+        The path of the assembly input file, it can be compressed at rest.
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    instances : dict, {'instance_name' : {'part' : str, 'translation' : list of str}, ...}
+        The part of each instance and the expressions of its translation, "<parameter>" references
+        are replaced by the parameter name.
+
+    submodels : list of dict, [{'instance' : str, 'node_set' : str, 'global_instance' : str, 'global_element_set' : str, 'exterior_tolerance' : float}, ...]
+        The submodel instance driven by each *Submodel, and the global instance it is driven by.
+    ---------------------------------------------------
+    '''
+    instances = {}
+    submodels = []
+    keyword = None
+    data_lines = 0
+
+    with open_file(fpath,'r') as f:
+        for line in f:
+            line = line.strip()
+
+            # Comments
+            if not line or line.startswith('**'):
+                continue
+
+            # Keyword lines
+            if line.startswith('*'):
+                options = [option.strip() for option in line[1:].split(',')]
+                keyword = options[0].lower()
+                settings = {option.split('=',1)[0].strip().lower() : option.split('=',1)[1].strip() for option in options[1:] if '=' in option}
+                data_lines = 0
+
+                if keyword == 'instance':
+                    instance_name = settings['name']
+                    instances[instance_name] = {'part' : settings['part'], 'translation' : ['0', '0', '0']}
+
+                elif keyword == 'submodel':
+                    global_instance, global_element_set = settings['globalelset'].split('.',1)
+                    submodels.append({'instance' : None,
+                                      'node_set' : None,
+                                      'global_instance' : global_instance,
+                                      'global_element_set' : global_element_set,
+                                      'exterior_tolerance' : float(settings.get('exteriortolerance', 0.05))})
+                continue
+
+            data_lines += 1
+
+            # The first data line of an instance is its translation
+            if keyword == 'instance' and data_lines == 1:
+                instances[instance_name]['translation'] = [value.strip().replace('<','').replace('>','') for value in line.split(',') if value.strip()]
+
+            # The data lines of a submodel are the driven node sets
+            elif keyword == 'submodel' and submodels[-1]['instance'] is None:
+                submodels[-1]['instance'], submodels[-1]['node_set'] = line.split(',')[0].strip().split('.',1)
+
+    return instances, submodels
+
+
+def get_part_mesh(geometry_fpath, part_name):
+    '''
+    ---------------------------------------------------
+    Returns the mesh of a part from "part_name.inp" in the geometry folder (see read_part_mesh()),
+    or None if the file does not define the part. Each file is only read once.
+    ---------------------------------------------------
+    '''
+    fpath = find_file(os.path.join(geometry_fpath, part_name+'.inp'))
+
+    if fpath is None:
+        return None
+
+    stat = os.stat(fpath)
+    if PART_MESH_CACHE.get(fpath, (None, None))[:2] != (stat.st_size, stat.st_mtime_ns):
+        PART_MESH_CACHE[fpath] = (stat.st_size, stat.st_mtime_ns, read_part_mesh(fpath))
+
+    return PART_MESH_CACHE[fpath][2].get(part_name)
+
+
+def get_mesh_index(geometry_fpath, part_name, element_set, exterior_tolerance):
+    '''
+    ---------------------------------------------------
+    Returns the Mesh_Index of an element set of a part of a geometry, or of every element of the part if
+    the set is not defined. Returns None if the part has no elements. Each index is only built once.
+    ---------------------------------------------------
+    '''
+    mesh = get_part_mesh(geometry_fpath, part_name)
+
+    if mesh is None or not mesh['elements']:
+        return None
+
+    fpath = find_file(os.path.join(geometry_fpath, part_name+'.inp'))
+    key = (fpath, PART_MESH_CACHE[fpath][1], part_name, element_set, exterior_tolerance)
+
+    if key not in MESH_INDEX_CACHE:
+        element_labels = np.concatenate([labels for labels,_ in mesh['elements']])
+        in_set = np.isin(element_labels, mesh['element_sets'][element_set]) if element_set in mesh['element_sets'] else np.ones(len(element_labels), dtype=bool)
+
+        # The node coordinates of each element are looked up by label
+        node_labels, coordinates = mesh['nodes']
+        order = np.argsort(node_labels)
+        lower, upper = [], []
+        for _,connectivity in mesh['elements']:
+            element_coordinates = coordinates[order[np.searchsorted(node_labels, connectivity, sorter=order)]]
+            lower.append(element_coordinates.min(axis=1))
+            upper.append(element_coordinates.max(axis=1))
+
+        MESH_INDEX_CACHE[key] = Mesh_Index(np.concatenate(lower)[in_set], np.concatenate(upper)[in_set], exterior_tolerance)
+
+    return MESH_INDEX_CACHE[key]
+
+
+def get_instance_translations(instance, values):
+    '''
+    ---------------------------------------------------
+    Evaluates the translation of an instance for every variant in values.
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    translations : np.ndarray, shape = (n_variants, 3)
+    ---------------------------------------------------
+    '''
+    n_variants = max([np.size(value) for value in values.values()], default=1)
+    translation = (instance['translation'] + ['0']*3)[:3]
+
+    return np.stack([np.broadcast_to(np.asarray(evaluate_expression(expression, values), dtype=float), (n_variants,)) for expression in translation], axis=1)
+
+
+def check_submodel_placements(geometry_fpath, values):
+    '''
+    ---------------------------------------------------
+    Checks that every placed submodel of a geometry lies inside the global mesh it is driven by, for
+    every variant at once:
+        - The bounding box of each submodel part, moved by the translation of its instance, must lie
+          inside the bounding box of the moved global part.
+        - For the variants that pass, every driven node must lie inside an element of the global
+          element set (within the exterior tolerance), otherwise abaqus stops the submodel analysis.
+        - A submodel whose translation cannot be evaluated (e.g. an unknown parameter) is not valid
+          in any variant.
+    ---------------------------------------------------
+    PARAMETERS
+    ---------------------------------------------------
+    geometry_fpath : str
+        The geometry folder, containing the "assembly.inp" and the part files.
+
+    values : dict, {'parameter_name' : np.ndarray, ...}
+        The values of the model and input file parameters for each variant.
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    valid : np.ndarray, dtype = bool
+        True for the variants where every submodel lies inside its global mesh.
+
+    errors : list of str
+        A message for each submodel that is outside of its global mesh in any variant.
+    ---------------------------------------------------
+    '''
+    n_variants = max([np.size(value) for value in values.values()], default=1)
+    valid = np.ones(n_variants, dtype=bool)
+    errors = []
+
+    assembly_fpath = os.path.join(geometry_fpath, 'assembly.inp')
+    if not find_file(assembly_fpath):
+        return valid, errors
+
+    instances, submodels = read_assembly(assembly_fpath)
+
+    for submodel in submodels:
+        if submodel['instance'] not in instances or submodel['global_instance'] not in instances:
+            continue
+
+        instance = instances[submodel['instance']]
+        global_instance = instances[submodel['global_instance']]
+
+        mesh = get_part_mesh(geometry_fpath, instance['part'])
+        global_mesh = get_part_mesh(geometry_fpath, global_instance['part'])
+
+        if mesh is None or global_mesh is None or not len(mesh['nodes'][0]) or not len(global_mesh['nodes'][0]):
+            continue
+
+        # Bounding boxes of the parts, padded to 3 dimensions
+        lower, upper = [np.pad(bound, (0, 3 - len(bound))) for bound in (mesh['nodes'][1].min(axis=0), mesh['nodes'][1].max(axis=0))]
+        global_lower, global_upper = [np.pad(bound, (0, 3 - len(bound))) for bound in (global_mesh['nodes'][1].min(axis=0), global_mesh['nodes'][1].max(axis=0))]
+
+        # Nodes on the boundary of the global mesh are inside it
+        tolerance = 1e-6*np.max(global_upper - global_lower)
+
+        # The position of the submodel in the coordinates of the global part
+        try:
+            translations = get_instance_translations(instance, values) - get_instance_translations(global_instance, values)
+
+        except (NameError, ValueError, SyntaxError) as error:
+            errors.append('The translation of the submodel: "{}" could not be evaluated: {}.'.format(submodel['instance'], error))
+            valid[:] = False
+            continue
+
+        inside = np.all(lower + translations >= global_lower - tolerance, axis=1) & np.all(upper + translations <= global_upper + tolerance, axis=1)
+
+        if not np.all(inside):
+            errors.append('The submodel: "{}" lies outside of the global mesh: "{}" in {} variants.'.format(submodel['instance'], submodel['global_instance'], np.count_nonzero(~inside)))
+
+        # Test the driven nodes of the variants that passed, against the elements of the global element set
+        mesh_index = get_mesh_index(geometry_fpath, global_instance['part'], submodel['global_element_set'], submodel['exterior_tolerance'])
+        node_labels, coordinates = mesh['nodes']
+        driven = np.isin(node_labels, mesh['node_sets'].get(submodel['node_set'], node_labels))
+        variants = np.flatnonzero(inside & valid)
+
+        if mesh_index is not None and len(variants) and np.any(driven):
+            driven_coordinates = np.pad(coordinates[driven], ((0, 0), (0, 3 - coordinates.shape[1])))
+            points = (driven_coordinates[None,:,:] + translations[variants][:,None,:]).reshape(-1, 3)
+
+            driven_inside = mesh_index.contains(points).reshape(len(variants), -1).all(axis=1)
+            inside[variants[~driven_inside]] = False
+
+            if not np.all(driven_inside):
+                errors.append('The driven nodes: "{}" of the submodel: "{}" are outside of the element set: "{}" in {} variants.'.format(submodel['node_set'], submodel['instance'], submodel['global_element_set'], np.count_nonzero(~driven_inside)))
+
+        valid &= inside
+
+    return valid, errors
+
+
+class Mesh_Index():
+    '''
+    ------------------------------------------------------------
+        ***Mesh_Index***
+    ------------------------------------------------------------
+        Uniform grid over the bounding boxes of the elements of a mesh,
+        to find the elements that contain many points at once. Each grid
+        cell lists the elements whose (padded) bounding box overlaps it,
+        so a point is only compared with the elements of its cell.
+
+        A point is inside the mesh if it lies inside the bounding box of
+        an element, padded by exterior_tolerance times the average
+        element size (as the exteriorTolerance of an abaqus *Submodel).
+        This is exact for meshes of axis aligned hexahedra, as the grid
+        geometries are, and slightly generous for other elements.
+    ------------------------------------------------------------
+        **Attributes**
+    ------------------------------------------------------------
+
+    lower : np.ndarray, shape = (n_elements, 3)
+    upper : np.ndarray, shape = (n_elements, 3)
+        The padded bounding box of each element.
+
+    origin : np.ndarray, shape = (3,)
+        The lower corner of the grid.
+
+    cell_size : np.ndarray, shape = (3,)
+        The size of each grid cell.
+
+    shape : tuple of int
+        The number of cells along each axis.
+
+    cell_starts : np.ndarray
+        The position of the first element of each cell in cell_elements.
+
+    cell_elements : np.ndarray
+        The elements of each cell, sorted by cell.
+
+    ------------------------------------------------------------
+        **Methods**
+    ------------------------------------------------------------
+
+    contains(points):
+        Returns True for each point inside an element of the mesh.
+
+    ------------------------------------------------------------
+    '''
+
+    def __init__(self, lower, upper, exterior_tolerance=0.0):
+        lower = np.pad(lower, ((0, 0), (0, 3 - lower.shape[1])))
+        upper = np.pad(upper, ((0, 0), (0, 3 - upper.shape[1])))
+
+        # Pad the elements by the exterior tolerance, relative to the average element size
+        sizes = np.max(upper - lower, axis=1)
+        padding = exterior_tolerance*np.mean(sizes) if len(sizes) else 0.0
+        padding = max(padding, 1e-9*np.max(upper.max(axis=0) - lower.min(axis=0), initial=1.0))
+
+        self.lower = lower - padding
+        self.upper = upper + padding
+
+        # Cells about the size of an element, so each element overlaps a few cells,
+        # with at most a few cells per element for meshes with very uneven elements
+        self.origin = self.lower.min(axis=0) if len(lower) else np.zeros(3)
+        extent = (self.upper.max(axis=0) - self.origin) if len(lower) else np.ones(3)
+        self.cell_size = np.median(self.upper - self.lower, axis=0) if len(lower) else extent
+        self.cell_size = self.cell_size*max(1.0, (np.prod(extent/self.cell_size)/(8*max(len(lower), 1)))**(1/3))
+        self.shape = tuple(np.maximum(np.ceil(extent/self.cell_size).astype(np.int64), 1))
+
+        # The cells overlapped by each element
+        first = self.get_cells(self.lower)
+        last = self.get_cells(self.upper)
+        counts = np.prod(last - first + 1, axis=1)
+
+        elements = np.repeat(np.arange(len(lower)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        widths = (last - first + 1)[elements]
+        cells = first[elements] + np.stack([offsets % widths[:,0], (offsets // widths[:,0]) % widths[:,1], offsets // (widths[:,0]*widths[:,1])], axis=1)
+
+        cell_ids = np.ravel_multi_index(cells.T, self.shape) if len(cells) else np.zeros(0, dtype=np.int64)
+        order = np.argsort(cell_ids, kind='stable')
+
+        self.cell_elements = elements[order]
+        self.cell_starts = np.searchsorted(cell_ids[order], np.arange(np.prod(self.shape) + 1))
+
+
+    def get_cells(self, points):
+        '''
+        ---------------------------------------------------
+        Returns the grid cell of each point, clipped to the grid.
+        ---------------------------------------------------
+        '''
+        return np.clip(np.floor((points - self.origin)/self.cell_size).astype(np.int64), 0, np.array(self.shape) - 1)
+
+
+    def contains(self, points):
+        '''
+        ---------------------------------------------------
+        Returns True for each point inside the padded bounding box of an element of the mesh.
+        ---------------------------------------------------
+        PARAMETERS
+        ---------------------------------------------------
+        points : np.ndarray, shape = (n_points, 3)
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        inside : np.ndarray, dtype = bool, shape = (n_points,)
+        ---------------------------------------------------
+        '''
+        points = np.pad(np.asarray(points, dtype=float), ((0, 0), (0, 3 - np.shape(points)[1])))
+        cell_ids = np.ravel_multi_index(self.get_cells(points).T, self.shape)
+
+        # Compare each point with every element of its cell
+        counts = self.cell_starts[cell_ids + 1] - self.cell_starts[cell_ids]
+        point_indices = np.repeat(np.arange(len(points)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        elements = self.cell_elements[np.repeat(self.cell_starts[cell_ids], counts) + offsets]
+
+        hits = np.all((points[point_indices] >= self.lower[elements]) & (points[point_indices] <= self.upper[elements]), axis=1)
+
+        return np.bincount(point_indices[hits], minlength=len(points)) > 0
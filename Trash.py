@@ -0,0 +1,254 @@
+import os
+import sys
+import stat
+import time
+import uuid
+import threading
+from collections import deque
+from shutil import rmtree
+
+from HazelsAwesomeTheme import red_text,green_text,blue_text,yellow_text
+
+
+class Trash_Reaper():
+    '''
+    ------------------------------------------------------------
+        ***Trash_Reaper***
+    ------------------------------------------------------------
+        Deletes folders in the background. A deleted folder is renamed
+        into the trash folder, which is instant and atomic, so the model
+        or object is gone from the project at once, and a background
+        thread then removes the contents of the trash.
+
+        Files that cannot be removed yet (e.g. a ".odb" still open in
+        Abaqus/CAE on Windows) are left in the trash and retried every
+        retry_interval seconds, instead of aborting the delete. The trash
+        is shared by every session, anything left when a session closes
+        is purged by the next session.
+
+        E.g.
+
+            builder.trash.move_to_trash(model.fpath)
+            ...
+            builder.trash.report()
+    ------------------------------------------------------------
+        **Attributes**
+    ------------------------------------------------------------
+
+    fpath : str
+        The trash folder, it must be on the same drive as the folders that are deleted.
+
+    retry_interval : float
+        The number of seconds between attempts to remove the files that could not be removed.
+
+    reclaimed : int
+        The number of bytes removed from the trash by this session.
+
+    messages : deque of str
+        The results of the purges since the last report.
+
+    ------------------------------------------------------------
+        **Methods**
+    ------------------------------------------------------------
+
+    start():
+        Starts the background thread that purges the trash.
+
+    move_to_trash(fpath):
+        Renames a folder into the trash, returns True if it was moved.
+
+    purge():
+        Removes every folder in the trash, the files that cannot be removed are kept for the next purge.
+
+    report():
+        Prints the results of the purges since the last report.
+
+    wait(timeout=None):
+        Waits for the trash to be empty, returns True if it is.
+
+    get_size(fpath):
+        Returns the total size of the files in a folder.
+
+    ------------------------------------------------------------
+    '''
+
+    def __init__(self, fpath, retry_interval=30.0):
+        self.fpath = fpath
+        self.retry_interval = retry_interval
+
+        self.reclaimed = 0
+        self.messages = deque()
+        self.thread = None
+        self.wake = threading.Event()
+        self.idle = threading.Event()
+
+
+    def __getstate__(self):
+        # The builder pickles itself, threads cannot be pickled
+        return {'fpath' : self.fpath, 'retry_interval' : self.retry_interval}
+
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+
+    def start(self):
+        '''
+        ---------------------------------------------------
+        Starts the background thread that purges the trash, the thread does not keep the program open.
+        ---------------------------------------------------
+        '''
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self.run, name='Trash_Reaper', daemon=True)
+            self.thread.start()
+
+
+    def run(self):
+        '''
+        ---------------------------------------------------
+        Purges the trash whenever a folder is moved into it, and retries the files that could not be
+        removed every retry_interval seconds.
+        ---------------------------------------------------
+        '''
+        while True:
+            self.idle.clear()
+            self.wake.clear()
+            remaining = self.purge()
+
+            self.idle.set()
+            self.wake.wait(self.retry_interval if remaining else None)
+
+
+    def move_to_trash(self, fpath):
+        '''
+        ---------------------------------------------------
+        Renames a folder into the trash and wakes the background thread to remove it.
+        ---------------------------------------------------
+        PARAMETERS
+        ---------------------------------------------------
+        fpath : str
+            The folder to delete.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        moved : bool
+            True if the folder was moved, False if it could not be renamed (e.g. a file in it is open
+            on Windows), the folder is left in place.
+        ---------------------------------------------------
+        '''
+        os.makedirs(self.fpath, exist_ok=True)
+
+        # Folders of the same name deleted by several sessions do not clash
+        trash_fpath = os.path.join(self.fpath, '{}_{}_{}'.format(time.strftime('%Y%m%d-%H%M%S'), uuid.uuid4().hex[:8], os.path.basename(os.path.normpath(fpath))))
+
+        try:
+            os.rename(fpath, trash_fpath)
+        except OSError as error:
+            print(red_text('ERROR: The folder: "{}" could not be moved to the trash. {}'.format(fpath, error)))
+            return False
+
+        self.start()
+        self.wake.set()
+
+        return True
+
+
+    def purge(self):
+        '''
+        ---------------------------------------------------
+        Removes every folder in the trash. Read-only files are made writable, and the files that cannot
+        be removed are kept for the next purge.
+        ---------------------------------------------------
+        RETURNS
+        ---------------------------------------------------
+        remaining : int
+            The number of folders left in the trash.
+        ---------------------------------------------------
+        '''
+        if not os.path.isdir(self.fpath):
+            return 0
+
+        remaining = 0
+        for name in sorted(os.listdir(self.fpath)):
+            trash_fpath = os.path.join(self.fpath, name)
+            size = self.get_size(trash_fpath)
+            locked = []
+
+            def retry_writable(function, path, _):
+                try:
+                    os.chmod(path, os.stat(path).st_mode | stat.S_IWRITE)
+                    function(path)
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    locked.append(path)
+
+            try:
+                # onerror is deprecated from python 3.12
+                rmtree(trash_fpath, **({'onexc' : retry_writable} if sys.version_info >= (3, 12) else {'onerror' : retry_writable}))
+            except FileNotFoundError:
+                pass
+
+            reclaimed = size - self.get_size(trash_fpath)
+            self.reclaimed += reclaimed
+
+            if os.path.lexists(trash_fpath):
+                remaining += 1
+                self.messages.append(yellow_text('Trash: {} files of: "{}" are in use, retrying in {:.0f} seconds.'.format(len(locked), name, self.retry_interval)))
+
+            if reclaimed:
+                self.messages.append(green_text('Trash: reclaimed {:.1f} MB from: "{}".'.format(reclaimed/1e6, name)))
+
+        return remaining
+
+
+    def report(self):
+        '''
+        ---------------------------------------------------
+        Prints the results of the purges since the last report, and the total space reclaimed.
+        ---------------------------------------------------
+        '''
+        if not self.messages:
+            return
+
+        print('-'*60)
+        while self.messages:
+            print(self.messages.popleft())
+
+        print('Trash: {} MB reclaimed this session.'.format(blue_text('{:.1f}'.format(self.reclaimed/1e6))))
+
+
+    def wait(self, timeout=None):
+        '''
+        ---------------------------------------------------
+        Waits for the background thread to empty the trash, returns True if it is empty.
+        ---------------------------------------------------
+        '''
+        end_time = None if timeout is None else time.monotonic() + timeout
+
+        # The thread is idle once the sizes of the last purge are counted
+        while (os.path.isdir(self.fpath) and os.listdir(self.fpath)) or not self.idle.is_set():
+            if end_time is not None and time.monotonic() > end_time:
+                return False
+
+            self.start()
+            time.sleep(0.05)
+
+        return True
+
+
+    def get_size(self, fpath):
+        '''
+        ---------------------------------------------------
+        Returns the total size of the files in a folder, links are not followed.
+        ---------------------------------------------------
+        '''
+        size = 0
+        for folder, _, fnames in os.walk(fpath):
+            for fname in fnames:
+                try:
+                    size += os.lstat(os.path.join(folder, fname)).st_size
+                except OSError:
+                    pass
+
+        return size
@@ -32,12 +32,12 @@ def fluent_setup(file_name = 'fluent_model.cas.h5',
     X_TRANSLATION = GRID_SPACING*(x_grid_position-3)
     Y_TRANSLATION = GRID_SPACING*(y_grid_position-3)
 
-    # Calculate Total Time and other time stepping parameters
-    TOTAL_TIME = (n_cycles / vibration_frequency) - (0.2/vibration_frequency)
-    MINIMUM_STEP_SIZE = 1/(1000*vibration_frequency)
-    MAXIMUM_STEP_SIZE = 1/(50*vibration_frequency)
-    INITIAL_STEP_SIZE = 1/(50*vibration_frequency)
-    SAVE_FREQUENCY = 1/(10*vibration_frequency)
+    # Get Total Time and other time stepping parameters from the derived parameters, otherwise calculate them
+    TOTAL_TIME = parameters['fluent_total_time']['default_value'] if 'fluent_total_time' in parameters else (n_cycles / vibration_frequency) - (0.2/vibration_frequency)
+    MINIMUM_STEP_SIZE = parameters['minimum_step_size']['default_value'] if 'minimum_step_size' in parameters else 1/(1000*vibration_frequency)
+    MAXIMUM_STEP_SIZE = parameters['maximum_step_size']['default_value'] if 'maximum_step_size' in parameters else 1/(50*vibration_frequency)
+    INITIAL_STEP_SIZE = parameters['initial_step_size']['default_value'] if 'initial_step_size' in parameters else 1/(50*vibration_frequency)
+    SAVE_FREQUENCY = parameters['save_frequency']['default_value'] if 'save_frequency' in parameters else 1/(10*vibration_frequency)
 
     # ----------------------------------------------------------------
     # Setup of Model
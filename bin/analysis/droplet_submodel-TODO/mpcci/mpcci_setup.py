@@ -1,5 +1,15 @@
 import os
-import xml.etree.ElementTree as ET
+
+from Csp_Template import load_csp_template
+
+
+# Locations of the values in "main.csp" that are changed for each model
+CSP_LOCATIONS = {'fluent_cpus' : './code[@name="FLUENT"]//param[@name="NumProcs"]',
+                 'abaqus_constant_step_size' : './code[@name="Abaqus"]//param[@name="CouplingSteps"]/param[@name="StepSize"]',
+                 'abaqus_cpus' : './code[@name="Abaqus"]//param[@name="NumProcs"]',
+                 'abaqus_domains' : './code[@name="Abaqus"]//param[@name="NumDomains"]',
+                 'total_time' : './mpcciserver//param[@name="TotalTime"]',
+                 'jobname' : './mpcciserver//param[@name="Jobname"]'}
 
 def mpcci_setup(fpath, name, parameters, fluent_cpus = 2, abaqus_cpus = 2):
     '''
@@ -18,42 +28,23 @@ def mpcci_setup(fpath, name, parameters, fluent_cpus = 2, abaqus_cpus = 2):
     print('n_cycles = "{}"'.format(n_cycles))
     print('-'*60)
 
-    # Calculate Parameter values
-    total_time = n_cycles / vibration_frequency
-    abaqus_constant_step_size = 1 / (10 * vibration_frequency)
-
-    tree = ET.parse(os.path.join(fpath,'main.csp'))
-    root = tree.getroot()
-
-    # Change fluent parameters
-    try:
-        fluent_child = root.find('./code[@name="FLUENT"]')
-        fluent_child.find('.//param[@name = "NumProcs"]').attrib['value'] = str(fluent_cpus)
-        print('Fluent CPUS changed to: "{}"'.format(fluent_cpus))
-    except:
-        print('Fluent Parameters could not be changed.')
-
-    # Chanage abaqus parameters
-    try:
-        abaqus_child = root.find('./code[@name="Abaqus"]')
-        abaqus_child.find('.//param[@name = "CouplingSteps"]/param[@name = "StepSize"]').attrib['value'] = str(abaqus_constant_step_size)
-        print('Abaqus constant step size changed to: "{}"'.format(abaqus_constant_step_size))
-        abaqus_child.find('.//param[@name = "NumProcs"]').attrib['value'] = str(abaqus_cpus)
-        abaqus_child.find('.//param[@name = "NumDomains"]').attrib['value'] = str(abaqus_cpus)
-        print('Abaqus CPUS changed to: "{}"'.format(abaqus_cpus))
-    except:
-        print('Abaqus Parameters could not be changed.')
-
-    # Change mpcci paramters
-    try:
-        mpcci_child = root.find('./mpcciserver')
-        mpcci_child.find('.//param[@name = "TotalTime"]').attrib['value'] = str(total_time)
-        print('Total Coupling Time changed to "{}"'.format(total_time))
-        mpcci_child.find('.//param[@name = "Jobname"]').attrib['value'] = name
-        print('MPCCI Job Name changed to "{}"'.format(name))
-    except:
-        print('MPCCI Parameters could not be changed.')
-
-    # Write updated file
-    tree.write(os.path.join(fpath, name+'.csp'))
+    # Get Parameter values from the derived parameters, otherwise calculate them
+    total_time = parameters['total_time']['default_value'] if 'total_time' in parameters else n_cycles / vibration_frequency
+    abaqus_constant_step_size = parameters['abaqus_constant_step_size']['default_value'] if 'abaqus_constant_step_size' in parameters else 1 / (10 * vibration_frequency)
+
+    # Write the .csp file of the model by patching the values of the template
+    template = load_csp_template(os.path.join(fpath,'main.csp'), CSP_LOCATIONS)
+
+    template.write(os.path.join(fpath, name+'.csp'), {'fluent_cpus' : fluent_cpus,
+                                                     'abaqus_constant_step_size' : abaqus_constant_step_size,
+                                                     'abaqus_cpus' : abaqus_cpus,
+                                                     'abaqus_domains' : abaqus_cpus,
+                                                     'total_time' : total_time,
+                                                     'jobname' : name})
+    
+    print('Fluent CPUS changed to: "{}"'.format(fluent_cpus))
+    print('Abaqus constant step size changed to: "{}"'.format(abaqus_constant_step_size))
+    print('Abaqus CPUS changed to: "{}"'.format(abaqus_cpus))
+    print('Total Coupling Time changed to "{}"'.format(total_time))
+    print('MPCCI Job Name changed to "{}"'.format(name))
     print('Saving update MPCCI .csp file as "{}"'.format(name+'.csp'))
\ No newline at end of file
@@ -0,0 +1,37 @@
+import os
+
+def postprocess(fpath, name, parameters):
+    '''
+    Reads the status file of the explicit vibration run and returns the solution progress metrics.
+    '''
+    print('-'*60)
+    print('"postprocess.py" launched')
+
+    total_time = parameters['n_cycles']['default_value'] / parameters['vibration_frequency']['default_value']
+
+    metrics = {'completed' : 0.0,
+               'n_increments' : 0.0,
+               'final_total_time' : 0.0,
+               'cpu_time' : 0.0,
+               'stable_increment' : 0.0}
+
+    with open(os.path.join(fpath, name+'.sta'),'r') as f:
+        for line in f:
+            values = line.split()
+
+            # Increment lines: INCREMENT, STEP TIME, TOTAL TIME, CPU TIME (hh:mm:ss), STABLE INCREMENT, ...
+            if len(values) >= 5 and values[0].isdigit():
+                try:
+                    metrics['n_increments'] = float(values[0])
+                    metrics['final_total_time'] = float(values[2])
+                    metrics['cpu_time'] = sum([float(value) * 60**i for i,value in enumerate(reversed(values[3].split(':')))])
+                    metrics['stable_increment'] = float(values[4])
+                except ValueError:
+                    pass
+
+            elif 'COMPLETED SUCCESSFULLY' in line:
+                metrics['completed'] = 1.0
+
+    metrics['fraction_complete'] = metrics['final_total_time'] / total_time
+
+    return metrics
@@ -58,12 +58,12 @@ def fluent_setup(
     print('Number of complete Vibration Cycles = {}'.format(n_cycles))
     print('-'*60)
 
-    # Calculate Time stepping values from frequency and number of cycles
-    TOTAL_TIME = (n_cycles / vibration_frequency)
-    MINIMUM_STEP_SIZE = 1/(1000*vibration_frequency)
-    MAXIMUM_STEP_SIZE = 1/(50*vibration_frequency)
-    INITIAL_STEP_SIZE = 1/(50*vibration_frequency)
-    SAVE_FREQUENCY = 1/(10*vibration_frequency)
+    # Get Time stepping values from the derived parameters, otherwise calculate them from frequency and number of cycles
+    TOTAL_TIME = parameters['total_time']['default_value'] if 'total_time' in parameters else (n_cycles / vibration_frequency)
+    MINIMUM_STEP_SIZE = parameters['minimum_step_size']['default_value'] if 'minimum_step_size' in parameters else 1/(1000*vibration_frequency)
+    MAXIMUM_STEP_SIZE = parameters['maximum_step_size']['default_value'] if 'maximum_step_size' in parameters else 1/(50*vibration_frequency)
+    INITIAL_STEP_SIZE = parameters['initial_step_size']['default_value'] if 'initial_step_size' in parameters else 1/(50*vibration_frequency)
+    SAVE_FREQUENCY = parameters['save_frequency']['default_value'] if 'save_frequency' in parameters else 1/(10*vibration_frequency)
 
     # ----------------------------------------------------------------
     # Setup of Model
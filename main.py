@@ -1,8 +1,15 @@
-from Modular_Abaqus_Builder import Modular_Abaqus_Builder
+import sys
 
 
 def main():
 
+    # Run a single command headlessly if arguments are given, see Command_Line_Interface.py
+    if len(sys.argv) > 1:
+        from Command_Line_Interface import main as command_line_main
+        sys.exit(command_line_main(sys.argv[1:]))
+
+    from Modular_Abaqus_Builder import Modular_Abaqus_Builder
+
     # Instantiate class
     builder = Modular_Abaqus_Builder(delete_database=True, delete_all_models=True)
     
@@ -22,7 +29,6 @@ IMPORTANT STUFF
 - write test suite (also update methods to call with )
 - clean up model class and finish methods
 - licence shit guhh, including uni signature
-- create small commandline launcher for script
 - look at better way to layout imports
 - if cant delete directories on reset prompt user
 - modify model parameters
@@ -0,0 +1,288 @@
+'''
+--------------------------------------------------------------------------------
+--------------------------------------------------------------------------------
+This script computes the partition planes of the CAE partition scripts
+(Grid_Partition_Script.py, Fork_Partition_Script.py and
+Straight_Channel_Partition_Script.py) outside of Abaqus/CAE, and writes a plan
+and a replay script that applies the planes without any dialogs.
+
+The planes of each layout are merged where they are closer than the tolerance
+(e.g. a channel wall that lands on a grid line) and sorted. The plan is a JSON
+file named by the hash of its layout and inputs, so plans that already exist
+are reused, and plans of different chip layouts can be compared with "diff".
+
+The replay script is run in Abaqus/CAE on the model that contains the part
+(File > Run Script, or abaqus cae noGUI=replay.py). It creates one datum plane
+per partition plane and partitions the cells of the set with it.
+--------------------------------------------------------------------------------
+    INPUTS
+--------------------------------------------------------------------------------
+layout : str
+    The partition layout: "grid", "fork" or "straight_channel", or "diff" to
+    compare two plans.
+
+--initial-x-coord : float : 0.0
+    The X coordinate of the first partition. (mm)
+
+--initial-y-coord : float : 0.0
+    The Y coordinate of the first partition, not used by "straight_channel". (mm)
+
+--n-partitions : int : 15
+    The number of cells to be partitioned in each direction.
+
+--channel-width : float : 0.02
+    The width of the channels of the PALM chip to be partitioned, not used by "fork". (mm)
+
+--grid-spacing : float : 0.5
+    The width of each grid cell. (mm)
+
+--model-name : str : Vibrating_Chip_Model
+    The name of the model that contains the part to be partitioned.
+
+--part-name : str : SOLID_GEOMETRY
+    The name of the part to be partitioned.
+
+--set-name : str : PARTITION_CELLS
+    The name of the set that contains the cells to be partitioned.
+
+--tolerance : float : 1e-6
+    Planes closer than the tolerance are merged. (mm)
+
+--output : str : partition_plans
+    The folder the plan and replay script are written to.
+--------------------------------------------------------------------------------
+    EXAMPLES
+--------------------------------------------------------------------------------
+python scripts/Partition_Plan.py grid --n-partitions 15 --channel-width 0.02
+python scripts/Partition_Plan.py straight_channel --channel-width 0.015 --output plans
+python scripts/Partition_Plan.py diff plans/grid_0f3a9c1e.json plans/grid_77b2d410.json
+--------------------------------------------------------------------------------
+--------------------------------------------------------------------------------
+'''
+import os
+import sys
+import json
+import hashlib
+import argparse
+
+import numpy as np
+
+
+PLAN_FORMAT = 1
+
+# The axes the planes are normal to, the "x" planes are datum planes offset from the YZ plane in CAE
+AXES = ('x', 'y')
+
+REPLAY_TEMPLATE = """'''
+--------------------------------------------------------------------------------
+--------------------------------------------------------------------------------
+Replay of the partition plan: "{plan_name}", generated by scripts/Partition_Plan.py.
+Partitions the cells of the set "{set_name}" of the part "{part_name}" of the
+model "{model_name}" with {n_planes} planes, without any dialogs.
+--------------------------------------------------------------------------------
+    INPUTS
+--------------------------------------------------------------------------------
+{inputs}
+--------------------------------------------------------------------------------
+--------------------------------------------------------------------------------
+'''
+from abaqus import *
+from abaqusConstants import *
+
+Model_Name = {model_name!r}
+Part_Name = {part_name!r}
+Set_Name = {set_name!r}
+
+# The offset of each plane from the origin, along the axis normal to it (mm)
+Planes = {planes}
+
+# Get Part object
+Part_To_Partition = mdb.models[Model_Name].parts[Part_Name]
+
+# Create a datum plane for every partition plane
+Datum_Planes = []
+for Principal_Plane, Offsets in ((YZPLANE, Planes['x']), (XZPLANE, Planes['y'])):
+    for Offset in Offsets:
+        Datum_Planes.append(Part_To_Partition.DatumPlaneByPrincipalPlane(principalPlane=Principal_Plane, offset=Offset).id)
+
+# Partition geometry, the cells of the set are fetched again after each partition
+for Datum_Plane in Datum_Planes:
+    Part_To_Partition.PartitionCellByDatumPlane(datumPlane=Part_To_Partition.datums[Datum_Plane], cells=Part_To_Partition.allSets[Set_Name].cells)
+
+print('--------------------')
+print('Applied {n_planes} partition planes')
+print('--------------------')
+"""
+
+
+def get_planes(layout, initial_x_coord=0.0, initial_y_coord=0.0, n_partitions=15, channel_width=0.02, grid_spacing=0.5):
+    '''
+    ---------------------------------------------------
+    Returns the planes created by the loop of the CAE partition script of a layout.
+    ---------------------------------------------------
+    RETURNS
+    ---------------------------------------------------
+    planes : dict, {'x' : np.ndarray, 'y' : np.ndarray}
+        The coordinate of each plane normal to the x and y axes, in the order the script creates them.
+    ---------------------------------------------------
+    '''
+    i = np.arange(n_partitions)
+
+    if layout == 'grid':
+        return {'x' : np.stack([initial_x_coord + (i+1)*grid_spacing, initial_x_coord + i*grid_spacing + channel_width], axis=1).ravel(),
+                'y' : np.stack([initial_y_coord + (i+1)*grid_spacing, initial_y_coord + i*grid_spacing + channel_width], axis=1).ravel()}
+
+    if layout == 'fork':
+        return {'x' : initial_x_coord + i*grid_spacing,
+                'y' : initial_y_coord + i*grid_spacing}
+
+    if layout == 'straight_channel':
+        return {'x' : np.stack([initial_x_coord + i*grid_spacing, initial_x_coord + i*grid_spacing + channel_width], axis=1).ravel(),
+                'y' : np.zeros(0)}
+
+    raise ValueError('The layout: "{}" is not one of "grid", "fork" or "straight_channel".'.format(layout))
+
+
+def merge_planes(coordinates, tolerance):
+    '''
+    ---------------------------------------------------
+    Sorts the plane coordinates and merges each run of planes closer than the tolerance to the next one.
+    ---------------------------------------------------
+    '''
+    coordinates = np.sort(np.asarray(coordinates, dtype=float))
+
+    if not len(coordinates):
+        return coordinates
+
+    # The first plane of each run is kept
+    cluster_starts = np.concatenate([[True], np.diff(coordinates) > tolerance])
+
+    return coordinates[cluster_starts]
+
+
+def make_plan(args):
+    '''
+    ---------------------------------------------------
+    Returns the plan of the layout and inputs of the arguments.
+    ---------------------------------------------------
+    '''
+    inputs = {'initial_x_coord' : args.initial_x_coord,
+              'initial_y_coord' : args.initial_y_coord,
+              'n_partitions' : args.n_partitions,
+              'channel_width' : args.channel_width,
+              'grid_spacing' : args.grid_spacing}
+
+    planes = get_planes(args.layout, **inputs)
+
+    plan = {'format' : PLAN_FORMAT,
+            'layout' : args.layout,
+            'inputs' : inputs,
+            'names' : {'model_name' : args.model_name, 'part_name' : args.part_name, 'set_name' : args.set_name},
+            'tolerance' : args.tolerance,
+            'n_planes_created' : sum([len(coordinates) for coordinates in planes.values()]),
+            'planes' : {axis : [round(float(coordinate), 12) for coordinate in merge_planes(coordinates, args.tolerance)] for axis,coordinates in planes.items()}}
+
+    # Plans of the same layout and inputs have the same name
+    key = json.dumps({key : plan[key] for key in ('format', 'layout', 'inputs', 'names', 'tolerance')}, sort_keys=True)
+    plan['name'] = '{}_{}'.format(args.layout, hashlib.sha256(key.encode()).hexdigest()[:8])
+
+    return plan
+
+
+def write_replay_script(plan, fpath):
+    '''
+    ---------------------------------------------------
+    Writes the Abaqus/CAE script that applies the planes of a plan.
+    ---------------------------------------------------
+    '''
+    inputs = '\n'.join(['{} : {}'.format(name, value) for name,value in sorted(plan['inputs'].items())])
+    planes = '{\n' + ',\n'.join(["    '{}' : [{}]".format(axis, ', '.join([repr(coordinate) for coordinate in plan['planes'][axis]])) for axis in AXES]) + '\n}'
+
+    with open(fpath, 'w') as f:
+        f.write(REPLAY_TEMPLATE.format(plan_name = plan['name'],
+                                       inputs = inputs,
+                                       planes = planes,
+                                       n_planes = sum([len(coordinates) for coordinates in plan['planes'].values()]),
+                                       **plan['names']))
+
+
+def generate(args):
+    '''
+    ---------------------------------------------------
+    Writes the plan and replay script of the arguments, unless the plan already exists.
+    ---------------------------------------------------
+    '''
+    plan = make_plan(args)
+    plan_fpath = os.path.join(args.output, plan['name'] + '.json')
+    replay_fpath = os.path.join(args.output, plan['name'] + '_replay.py')
+
+    print('-'*60)
+    if os.path.exists(plan_fpath) and os.path.exists(replay_fpath):
+        print('The plan: "{}" already exists, it was not regenerated.'.format(plan_fpath))
+        return plan_fpath
+
+    os.makedirs(args.output, exist_ok=True)
+
+    with open(plan_fpath, 'w') as f:
+        json.dump(plan, f, indent=4, sort_keys=True)
+
+    write_replay_script(plan, replay_fpath)
+
+    n_planes = sum([len(coordinates) for coordinates in plan['planes'].values()])
+    print('Wrote the plan: "{}", {} planes ({} duplicates merged).'.format(plan_fpath, n_planes, plan['n_planes_created'] - n_planes))
+    print('Run the replay script in Abaqus/CAE: "{}".'.format(replay_fpath))
+
+    return plan_fpath
+
+
+def diff(fpaths, tolerance):
+    '''
+    ---------------------------------------------------
+    Prints the planes that are only in one of two plans. Returns True if the planes match.
+    ---------------------------------------------------
+    '''
+    plans = []
+    for fpath in fpaths:
+        with open(fpath, 'r') as f:
+            plans.append(json.load(f))
+
+    match = True
+    for axis in AXES:
+        first, second = [np.array(plan['planes'].get(axis, []), dtype=float) for plan in plans]
+
+        only_first = first[~np.any(np.abs(first[:,None] - second[None,:]) <= tolerance, axis=1)] if len(second) else first
+        only_second = second[~np.any(np.abs(second[:,None] - first[None,:]) <= tolerance, axis=1)] if len(first) else second
+
+        for coordinates, fpath in ((only_first, fpaths[0]), (only_second, fpaths[1])):
+            if len(coordinates):
+                match = False
+                print('Planes normal to {} only in "{}": {}'.format(axis, fpath, ', '.join(['{:g}'.format(coordinate) for coordinate in coordinates])))
+
+    if match:
+        print('The plans have the same planes.')
+
+    return match
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compute the partition planes of a chip layout and write a replay script for Abaqus/CAE.')
+    parser.add_argument('layout', choices=['grid', 'fork', 'straight_channel', 'diff'])
+    parser.add_argument('plans', nargs='*', help='The two plans to compare with "diff".')
+    parser.add_argument('--initial-x-coord', type=float, default=0.0)
+    parser.add_argument('--initial-y-coord', type=float, default=0.0)
+    parser.add_argument('--n-partitions', type=int, default=15)
+    parser.add_argument('--channel-width', type=float, default=0.02)
+    parser.add_argument('--grid-spacing', type=float, default=0.5)
+    parser.add_argument('--model-name', default='Vibrating_Chip_Model')
+    parser.add_argument('--part-name', default='SOLID_GEOMETRY')
+    parser.add_argument('--set-name', default='PARTITION_CELLS')
+    parser.add_argument('--tolerance', type=float, default=1e-6)
+    parser.add_argument('--output', default='partition_plans')
+    args = parser.parse_args()
+
+    if args.layout == 'diff':
+        if len(args.plans) != 2:
+            parser.error('"diff" compares two plans.')
+        sys.exit(0 if diff(args.plans, args.tolerance) else 1)
+
+    generate(args)
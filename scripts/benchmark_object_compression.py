@@ -0,0 +1,118 @@
+'''
+--------------------------------------------------------------------------------
+--------------------------------------------------------------------------------
+This script measures the trade-off of storing object files compressed at rest
+(see Seekable_Zstd.py): the disk space saved against the extra time taken to
+stage the files into a model folder while it is built.
+
+For each file, level and frame size it reports:
+    - the compressed size and the fraction of the original size,
+    - the time to compress the file (once, when the object is created),
+    - the time to stage it into a model folder, against copying the plain file,
+    - the time of 100 random 4 kB reads, as used to read parts of a mesh.
+--------------------------------------------------------------------------------
+    INPUTS
+--------------------------------------------------------------------------------
+fpaths : str
+    The files to benchmark, by default the meshes of the 50um grid geometry.
+
+--levels : int
+    The zstd compression levels to compare. (1 3 10 19)
+
+--frame-sizes : int
+    The frame sizes to compare in bytes. (262144 1048576 4194304)
+--------------------------------------------------------------------------------
+    EXAMPLES
+--------------------------------------------------------------------------------
+python scripts/benchmark_object_compression.py
+python scripts/benchmark_object_compression.py object_files/geometry/30um_grid/abaqus_whole-chip_solid.inp --levels 3 10
+--------------------------------------------------------------------------------
+--------------------------------------------------------------------------------
+'''
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from shutil import copyfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Seekable_Zstd import compress_file, decompress_file, open_file
+
+
+REPOSITORY_FPATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_FPATHS = [os.path.join(REPOSITORY_FPATH, 'bin', 'geometry', '50um_grid-TODO', fname) for fname in ('abaqus_whole-chip_acoustic.inp', 'abaqus_submodel_acoustic.inp', 'fluent_submodel_fluid.msh')]
+
+
+def time_call(function, *args, repeats=3):
+    '''
+    Returns the fastest time of a few calls of function
+    '''
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def random_reads(fpath, size, n_reads=100, read_size=4096):
+    '''
+    Reads n_reads blocks of read_size bytes at random offsets of a (possibly compressed) file
+    '''
+    offsets = random.Random(0).sample(range(max(size - read_size, 1)), min(n_reads, max(size - read_size, 1)))
+
+    with open_file(fpath, 'rb') as f:
+        for offset in offsets:
+            f.seek(offset)
+            f.read(read_size)
+
+
+def benchmark_file(fpath, levels, frame_sizes, folder):
+    '''
+    Prints the sizes and times of a file stored plain and compressed with each level and frame size
+    '''
+    size = os.path.getsize(fpath)
+    plain_fpath = os.path.join(folder, os.path.basename(fpath))
+    copyfile(fpath, plain_fpath)
+
+    copy_time = time_call(copyfile, plain_fpath, os.path.join(folder, 'staged'))
+    read_time = time_call(random_reads, plain_fpath, size)
+
+    print('-'*100)
+    print('"{}", {:.2f} MB'.format(os.path.basename(fpath), size/1e6))
+    print('-'*100)
+    print('{:>6} {:>11} {:>10} {:>8} {:>13} {:>12} {:>16}'.format('level', 'frame size', 'size (MB)', 'ratio', 'compress (s)', 'stage (s)', 'random reads (s)'))
+    print('{:>6} {:>11} {:>10.2f} {:>8.3f} {:>13} {:>12.4f} {:>16.4f}'.format('plain', '-', size/1e6, 1.0, '-', copy_time, read_time))
+
+    for level in levels:
+        for frame_size in frame_sizes:
+            source_fpath = os.path.join(folder, 'source')
+            copyfile(fpath, source_fpath)
+
+            start = time.perf_counter()
+            compressed_fpath = compress_file(source_fpath, level, frame_size)
+            compress_time = time.perf_counter() - start
+
+            compressed_size = os.path.getsize(compressed_fpath)
+            stage_time = time_call(decompress_file, compressed_fpath, os.path.join(folder, 'staged'))
+            read_time = time_call(random_reads, source_fpath, size)
+
+            print('{:>6} {:>11} {:>10.2f} {:>8.3f} {:>13.3f} {:>12.4f} {:>16.4f}'.format(level, frame_size, compressed_size/1e6, compressed_size/size, compress_time, stage_time, read_time))
+
+            os.remove(compressed_fpath)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the compression of object files at rest.')
+    parser.add_argument('fpaths', nargs='*', default=DEFAULT_FPATHS)
+    parser.add_argument('--levels', nargs='+', type=int, default=[1, 3, 10, 19])
+    parser.add_argument('--frame-sizes', nargs='+', type=int, default=[262144, 1048576, 4194304])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        for fpath in args.fpaths:
+            benchmark_file(fpath, args.levels, args.frame_sizes, folder)
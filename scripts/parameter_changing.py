@@ -26,21 +26,10 @@ if False:
         copyfileobj(f_orig,f_new)
 
 if True:
-    mpcci_time = 45e-3
-
-    # THIS IS THE EXACT LINE THAT NEEDS TO BE CHANGED
-    line = '\t\t\t\t<param name="TotalTime" modified="true" type="float" value="{}" />\n'.format(mpcci_time)
-
-    # LINE NUMBER -1
-    line_n = 316
-
-    
-    with open('test.csp', 'r') as f_orig, open('new.csp','w') as f_new:
+    # Uses the Csp_Template from the repository root, which finds the value by its XPath rather than its line number
+    from Csp_Template import Csp_Template
 
-        for _ in range(line_n):
-            f_new.write(f_orig.readline())
-
-        f_orig.readline()
-        f_new.write(line)
+    mpcci_time = 45e-3
 
-        copyfileobj(f_orig,f_new)
\ No newline at end of file
+    template = Csp_Template('test.csp', {'total_time' : './mpcciserver//param[@name="TotalTime"]'})
+    template.write('new.csp', {'total_time' : mpcci_time})
\ No newline at end of file
@@ -1,3 +1,42 @@
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import struct
+import hashlib
+import tarfile
+import argparse
+import threading
+import shutil
+import multiprocessing
+from importlib.util import spec_from_file_location, module_from_spec
+
+import numpy as np
+import pytest
+import zstandard
+
+from Database_Lock import Database_Lock, Tracked_Dict, Model_Dict
+from Submodel_Placement import check_submodel_placements, Mesh_Index
+from Include_Graph import resolve_includes
+from Object_Store import link_folder, split_file, remove_folder, hash_folder
+from Trash import Trash_Reaper
+from Seekable_Zstd import compress_file, decompress_file, find_file, open_file, read_seek_table, Seekable_Reader
+from Run_Cache import Run_Cache, release_outputs
+from Command_Line_Interface import main, EXIT_SUCCESS, EXIT_USAGE
+from Postprocessing import postprocess_models, split_metrics, load_results, save_results
+from Results_Database import Results_Database
+from Parameters import expand_sweep, evaluate_expression, get_expression_names, evaluate_derived_parameters, check_parameter_bounds, read_inp_parameters, evaluate_inp_parameters
+from Csp_Template import Csp_Template
+from Modular_Abaqus_Builder import DEFAULT_RESOURCE_LIMITS, DEFAULT_SOLVER_COMMANDS, DEFAULT_RUN_CACHE
+from Licences import DEFAULT_LICENCES, Licence_Pool, simulate_schedule, get_token_demand
+from Model import Model
+from Build_Orchestrator import Build_Orchestrator
+from Solver_Monitor import Abaqus_Monitor, Fluent_Monitor
+from Model_Bundle import write_bundle, read_manifest, unpack_bundle
+
+
 def BRUH():
     '''
     YOU GOTTA WRITE THIS HAZEL
@@ -6,3 +45,1310 @@ def BRUH():
     pass
 
 
+REPOSITORY_FPATH = os.path.dirname(os.path.abspath(__file__))
+
+
+class Stub_Model():
+    '''
+    Picklable stand-in for a Model, so sessions can share a database without building anything
+    '''
+
+    def __init__(self, name, builder, description=''):
+        self.name = name
+        self.builder = builder
+        self.description = description
+
+    def print_model(self, verbose=False):
+        pass
+
+    def validate_model(self, builder):
+        pass
+
+
+def load_builder(directory):
+    os.chdir(directory)
+    from Modular_Abaqus_Builder import Modular_Abaqus_Builder
+    return Modular_Abaqus_Builder()
+
+
+def add_models(directory, worker, n_models, barrier):
+    # Each session loads once, then saves after every model like the edit models loop
+    builder = load_builder(directory)
+    barrier.wait()
+
+    for index in range(n_models):
+        model_name = 'worker_{}_model_{}'.format(worker, index)
+        builder.data['model'][model_name] = Stub_Model(model_name, builder)
+        builder.save_database()
+
+
+def take_lock(directory):
+    os.chdir(directory)
+
+    try:
+        with Database_Lock('data.pickle.lock', timeout=0.2):
+            pass
+    except TimeoutError:
+        raise SystemExit(1)
+
+
+@pytest.fixture
+def database_directory(tmp_path, monkeypatch):
+    shutil.copy(os.path.join(REPOSITORY_FPATH, 'base_data.json'), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    load_builder(tmp_path)
+    return tmp_path
+
+
+'''
+----------------------------------------
+    Database
+----------------------------------------
+'''
+
+
+def test_concurrent_sessions_do_not_lose_updates(database_directory):
+    n_workers, n_models = 4, 10
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(n_workers)
+
+    processes = [context.Process(target=add_models, args=(str(database_directory), worker, n_models, barrier)) for worker in range(n_workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(120)
+
+    assert [process.exitcode for process in processes] == [0]*n_workers
+
+    builder = load_builder(database_directory)
+    assert set(builder.data['model'].keys()) == {'worker_{}_model_{}'.format(worker, index) for worker in range(n_workers) for index in range(n_models)}
+
+
+def test_stale_session_merges_changes(database_directory):
+    first = load_builder(database_directory)
+    first.data['model']['kept'] = Stub_Model('kept', first)
+    first.data['model']['deleted'] = Stub_Model('deleted', first)
+    first.save_database()
+
+    # Both sessions load the same version, then change different models
+    first = load_builder(database_directory)
+    second = load_builder(database_directory)
+
+    first.data['model'].pop('deleted')
+    first.data['model']['kept'].description = 'modified'
+    first.data['model'].mark_changed('kept')
+    first.save_database()
+
+    second.data['model']['added'] = Stub_Model('added', second)
+    second.save_database()
+
+    builder = load_builder(database_directory)
+    assert set(builder.data['model'].keys()) == {'kept', 'added'}
+    assert builder.data['model']['kept'].description == 'modified'
+
+
+def test_validate_keeps_folders_of_other_sessions(database_directory):
+    builder = load_builder(database_directory)
+    other = load_builder(database_directory)
+
+    # A model saved by another session since this session loaded, and a folder still being built
+    model_fpath = os.path.join(builder.fpaths['model'], 'saved')
+    os.makedirs(model_fpath)
+    other.data['model']['saved'] = Stub_Model('saved', other)
+    other.data['model']['saved'].fpath = model_fpath
+    other.save_database()
+
+    building_fpath = os.path.join(builder.fpaths['model'], 'building')
+    os.makedirs(building_fpath)
+
+    builder.validate_database()
+
+    assert os.path.exists(model_fpath)
+    assert os.path.exists(building_fpath)
+    assert 'saved' in load_builder(database_directory).data['model']
+
+
+def test_lock_times_out(database_directory):
+    lock = Database_Lock('data.pickle.lock')
+    context = multiprocessing.get_context('spawn')
+
+    with lock:
+        # Reentrant in the same session
+        with lock:
+            pass
+
+        process = context.Process(target=take_lock, args=(str(database_directory),))
+        process.start()
+        process.join(60)
+        assert process.exitcode == 1
+
+    process = context.Process(target=take_lock, args=(str(database_directory),))
+    process.start()
+    process.join(60)
+    assert process.exitcode == 0
+
+
+def test_models_are_indexed_by_the_objects_they_use():
+    class Stub_Object():
+        def __init__(self, name):
+            self.name = name
+
+    geometry, water = Stub_Object('30um_grid'), Stub_Object('water')
+
+    models = Model_Dict()
+    for model_name in ('model_1', 'model_2'):
+        model = Stub_Model(model_name, None)
+        model.geometry, model.materials = geometry, {'water' : water}
+        models[model_name] = model
+
+    assert models.get_models('geometry', '30um_grid') == ['model_1', 'model_2']
+
+    models.pop('model_1')
+    assert models.get_models('material', 'water') == ['model_2']
+
+    # Renamed objects keep their models, and a loaded database is indexed again
+    geometry.name = '30um_grid_v2'
+    models.rename_object('geometry', '30um_grid', '30um_grid_v2')
+
+    assert Model_Dict(dict(models)).get_models('geometry', '30um_grid_v2') == ['model_2']
+    assert models.get_models('geometry', '30um_grid') == []
+
+
+def test_read_only_commands_do_not_create_the_database(tmp_path, monkeypatch):
+    shutil.copy(os.path.join(REPOSITORY_FPATH, 'base_data.json'), tmp_path)
+    monkeypatch.chdir(tmp_path)
+
+    assert main(['--quiet', 'validate']) == EXIT_USAGE
+    assert os.listdir(tmp_path) == ['base_data.json']
+
+    # An existing database is loaded without saving it or taking the lock
+    load_builder(tmp_path)
+    os.remove(tmp_path / 'data.pickle.lock')
+    modified = os.stat(tmp_path / 'data.pickle').st_mtime_ns
+
+    assert main(['--quiet', 'validate']) == EXIT_SUCCESS
+    assert os.stat(tmp_path / 'data.pickle').st_mtime_ns == modified
+    assert not os.path.exists(tmp_path / 'data.pickle.lock')
+
+
+def test_tracked_dict_records_every_change():
+    data = Tracked_Dict({'kept' : 1})
+
+    data.setdefault('added', 2)
+    data.setdefault('kept', 3)
+    data |= {'merged' : 4}
+    data.popitem()
+
+    assert data == {'kept' : 1, 'added' : 2}
+    assert data.changed == {'added', 'merged'}
+
+
+def test_base_data_written_before_new_keys_is_used(tmp_path, monkeypatch):
+    with open(os.path.join(REPOSITORY_FPATH, 'base_data.json')) as f:
+        base_data = json.load(f)
+
+    for key in ('resource_limits', 'solver_commands', 'licences'):
+        base_data.pop(key)
+    base_data['run_cache'] = {'enabled' : True}
+    for key in ('results', 'results_database', 'trash', 'run_cache'):
+        base_data['fpaths'].pop(key)
+    base_data['fpaths']['model'] = 'my_model_files'
+
+    with open(tmp_path / 'base_data.json', 'w') as f:
+        json.dump(base_data, f)
+
+    builder = load_builder(tmp_path)
+
+    # The fpaths of the user are kept, the missing keys use their defaults
+    assert builder.fpaths['model'] == 'my_model_files'
+    assert builder.resource_limits == DEFAULT_RESOURCE_LIMITS
+    assert builder.solver_commands == DEFAULT_SOLVER_COMMANDS
+    assert builder.licences == DEFAULT_LICENCES
+    assert builder.run_cache == DEFAULT_RUN_CACHE
+    assert [builder.fpaths[key] for key in ('results', 'results_database', 'trash', 'run_cache')] == ['results.npz', 'results.db', 'trash', 'run_cache']
+
+
+'''
+----------------------------------------
+    Parameters and Templates
+----------------------------------------
+'''
+
+
+def test_csp_values_are_found_after_unescaped_attributes():
+    data = b'<project><param name="a>b" note=\'value="x"\' value="1"/><param name="c" value=\'2\'/></project>'
+    template = Csp_Template('test.csp', {'a' : './param[@name="a>b"]', 'c' : './param[@name="c"]'}, data)
+
+    assert template.render({'a' : 10, 'c' : 20}) == data.replace(b'value="1"', b'value="10"').replace(b"value='2'", b"value='20'")
+
+
+def test_derived_parameters_are_evaluated_in_dependency_order():
+    values = expand_sweep({'vibration_frequency' : [1e6, 2e6], 'n_cycles' : [10, 20]})
+    derived_parameters = {'total_time' : {'expression' : 'n_cycles * period'},
+                          'period' : {'expression' : '1 / vibration_frequency'},
+                          'n_frames' : {'expression' : 'total_time / 1e-7', 'dtype' : 'int'},
+                          'cycles_per_frame' : {'expression' : '4'}}
+
+    derived_values = evaluate_derived_parameters(derived_parameters, values)
+
+    assert np.allclose(derived_values['total_time'], [1e-5, 2e-5, 5e-6, 1e-5])
+    assert list(derived_values['n_frames']) == [100, 200, 50, 100]
+    assert derived_values['n_frames'].dtype == np.int64
+    assert list(derived_values['cycles_per_frame']) == [4]*4
+
+    with pytest.raises(ValueError, match='unresolved'):
+        evaluate_derived_parameters({'a' : {'expression' : 'b + 1'}, 'b' : {'expression' : 'a + 1'}}, values)
+
+    # Variants where a derived parameter is not finite are not valid
+    derived_values = evaluate_derived_parameters({'period' : {'expression' : '1 / vibration_frequency'}}, {'vibration_frequency' : np.array([0.0, 2.0])})
+    valid, errors = check_parameter_bounds({'period' : {'min_value' : 0.0}}, derived_values)
+    assert list(valid) == [False, True]
+    assert len(errors) == 1
+
+
+def test_inp_parameters_are_read_through_includes(tmp_path):
+    os.makedirs(tmp_path / 'analysis')
+    os.makedirs(tmp_path / 'geometry')
+
+    with open(tmp_path / 'analysis' / 'main.inp', 'w') as f:
+        f.write('*Heading\n'
+                '** *Parameter definitions in comments are ignored\n'
+                '*Parameter\n'
+                ' period = 1 / vibration_frequency\n'
+                '*Include, input="geometry.inp"\n'
+                '*Parameter\n'
+                ' total_time = n_cycles * period\n'
+                ' n_elements = int(width / element_size)\n'
+                '*Include, input=missing.inp\n')
+
+    with open(tmp_path / 'geometry' / 'geometry.inp', 'w') as f:
+        f.write('*Node\n  1, 0., 0., 0.\n*PARAMETER\n width = 30e-6\n element_size = 1e-6\n')
+
+    # Included files compressed at rest are read in place
+    compress_file(str(tmp_path / 'geometry' / 'geometry.inp'))
+
+    definitions = read_inp_parameters(str(tmp_path / 'analysis' / 'main.inp'), [str(tmp_path / 'geometry')])
+
+    assert [name for name,_ in definitions] == ['period', 'width', 'element_size', 'total_time', 'n_elements']
+
+    inp_values = evaluate_inp_parameters(definitions, {'vibration_frequency' : np.array([1e6, 2e6]), 'n_cycles' : np.array([10, 10])})
+
+    assert np.allclose(inp_values['total_time'], [1e-5, 5e-6])
+    assert list(inp_values['n_elements']) == [30, 30]
+
+    # A definition can only use the parameters defined before it
+    with pytest.raises(ValueError, match='total_time'):
+        evaluate_inp_parameters([('total_time', 'n_cycles * period'), ('period', '1e-6')], {'n_cycles' : np.array([10])})
+
+
+def test_parameter_expressions_are_evaluated_over_every_variant():
+    values = {'vibration_frequency' : np.array([1.5e6, 2e6]), 'n_cycles' : np.array([10, 20])}
+
+    assert np.allclose(evaluate_expression('vibration_frequency*2*pi', values), 2*np.pi*values['vibration_frequency'])
+    assert np.allclose(evaluate_expression('n_cycles / max(vibration_frequency, 1.8e6)', values), [10/1.8e6, 20/2e6])
+    assert list(evaluate_expression('-n_cycles // 3', values)) == [-4, -7]
+
+    # Step names are built from the parameters with str() and int()
+    assert list(evaluate_expression("'freq_extract_' + str(int(vibration_frequency / 1e3))", values)) == ['freq_extract_1500', 'freq_extract_2000']
+
+    assert get_expression_names('n_cycles / sqrt(vibration_frequency) + pi') == {'n_cycles', 'vibration_frequency'}
+
+
+def test_unsafe_or_unknown_expressions_are_rejected():
+    values = {'width' : np.array([1.0])}
+
+    with pytest.raises(NameError):
+        evaluate_expression('width * height', values)
+
+    for expression in ('__import__("os").getcwd()', 'width.real', '[width]', 'width if width else 0', "'mesh_' * 2", 'open("main.inp")'):
+        with pytest.raises(ValueError):
+            evaluate_expression(expression, values)
+
+    with pytest.raises(SyntaxError):
+        evaluate_expression('width *', values)
+
+
+def test_parameter_values_are_checked_against_their_dtype_and_bounds():
+    assert Model.validate_parameter_value(None, 'int', None, '-3')
+    assert not Model.validate_parameter_value(None, 'int', None, '1.5')
+    assert Model.validate_parameter_value(None, 'float', None, '-1.5e-6')
+    assert not Model.validate_parameter_value(None, 'float', None, '1.5 MHz')
+
+    parameters = {'x_grid_position' : {'dtype' : 'int', 'min_value' : 3, 'max_value' : 14},
+                  'vibration_frequency' : {'dtype' : 'float', 'min_value' : 0.0},
+                  'step_name' : {'dtype' : 'str'}}
+    values = {'x_grid_position' : np.array([2, 3, 14, 15]),
+              'vibration_frequency' : np.array([1e6, np.nan, 1e6, 1e6]),
+              'step_name' : np.array(['a', 'b', 'c', 'd'])}
+
+    valid, errors = check_parameter_bounds(parameters, values)
+
+    assert list(valid) == [False, False, True, False]
+    assert len(errors) == 2
+
+
+'''
+----------------------------------------
+    Results
+----------------------------------------
+'''
+
+
+def test_results_of_deleted_models_are_dropped(tmp_path):
+    fpath = str(tmp_path / 'results.npz')
+    save_results(fpath, {'model_1' : {'frequency' : 1.0}, 'model_2' : {'frequency' : 2.0}})
+
+    save_results(fpath, {}, removed=['model_1'])
+
+    columns = load_results(fpath)
+    assert list(columns['model_name']) == ['model_2']
+    assert list(columns['frequency']) == [2.0]
+
+
+def test_results_database_query_filters_and_orders_models(tmp_path):
+    with Results_Database(str(tmp_path / 'results.db')) as results_database:
+        results_database.add_models({'model_{}'.format(index) : {'analysis' : 'vibration',
+                                                                  'geometry' : '30um_grid' if index < 3 else '50um_grid',
+                                                                  'materials' : ['acoustic_water'],
+                                                                  'parameters' : {'vibration_frequency' : 4.0 - index, 'fluid' : 'water' if index % 2 else 'oil'},
+                                                                  'metrics' : {'peak_pressure' : 10.0*index} if index else {}} for index in range(4)})
+
+        columns = results_database.query(['peak_pressure'], ['vibration_frequency'], filters={'vibration_frequency' : (2.0, None)}, geometry='30um_grid')
+
+        # Ordered by the parameter, with NaN for the model without the metric
+        assert list(columns['model_name']) == ['model_2', 'model_1', 'model_0']
+        assert list(columns['vibration_frequency']) == [2.0, 3.0, 4.0]
+        assert np.isnan(columns['peak_pressure'][2])
+
+        columns = results_database.query(['peak_pressure'], ['fluid'], filters={'fluid' : 'water'})
+        assert list(columns['model_name']) == ['model_1', 'model_3']
+        assert list(columns['fluid']) == ['water', 'water']
+
+        # Adding a model again replaces its rows
+        results_database.add_models({'model_3' : {'parameters' : {'vibration_frequency' : 1.0}, 'metrics' : {'peak_pressure' : 0.0}}})
+        assert list(results_database.query(['peak_pressure'], filters={'vibration_frequency' : 1.0})['peak_pressure']) == [0.0]
+
+        assert results_database.get_parameter_names() == ['fluid', 'vibration_frequency']
+
+
+def test_removed_models_are_dropped_from_both_result_stores(database_directory):
+    builder = load_builder(database_directory)
+
+    rows = {}
+    for model_name in ('kept', 'removed'):
+        builder.data['model'][model_name] = Stub_Model(model_name, builder)
+        builder.data['model'][model_name].fpath = os.path.join(builder.fpaths['model'], model_name)
+        os.makedirs(builder.data['model'][model_name].fpath)
+        rows[model_name] = {'parameters' : {'vibration_frequency' : 1.0}, 'metrics' : {'peak_pressure' : 2.0}}
+
+    save_results(builder.fpaths['results'], {model_name : row['metrics'] for model_name,row in rows.items()})
+    with Results_Database(builder.fpaths['results_database']) as results_database:
+        results_database.add_models(rows)
+
+    assert builder.remove_models(['removed']) == ['removed']
+
+    with Results_Database(builder.fpaths['results_database']) as results_database:
+        assert list(results_database.query(['peak_pressure'])['model_name']) == ['kept']
+
+    assert list(load_results(builder.fpaths['results'])['model_name']) == ['kept']
+
+
+def test_postprocess_scripts_run_in_worker_processes(tmp_path):
+    with open(tmp_path / 'postprocess.py', 'w') as f:
+        f.write('import os\n'
+                'import numpy as np\n\n'
+                'def postprocess(fpath, name, parameters):\n'
+                '    if name == "failed":\n'
+                '        raise FileNotFoundError("No odb")\n'
+                '    return {"peak_pressure" : parameters["vibration_frequency"]["default_value"] / 1e6,\n'
+                '            "folder" : os.path.basename(fpath),\n'
+                '            "pressure_history" : np.arange(3)}\n')
+
+    jobs = {model_name : (str(tmp_path / 'postprocess.py'), str(tmp_path), {'vibration_frequency' : {'default_value' : frequency}}) for model_name,frequency in (('model_1', 1e6), ('model_2', 2e6), ('failed', 3e6))}
+    results = postprocess_models(jobs, max_workers=2)
+
+    # Models whose script failed are left out
+    assert sorted(results.keys()) == ['model_1', 'model_2']
+    assert results['model_2']['peak_pressure'] == 2.0
+
+    scalars, arrays = split_metrics(results['model_1'])
+
+    assert scalars == {'peak_pressure' : 1.0, 'folder' : tmp_path.name}
+    assert list(arrays['pressure_history']) == [0, 1, 2]
+
+    scalars, arrays = split_metrics({'count' : np.int64(3), 'mean' : np.array(2.5), 'profile' : [1.0, 2.0]})
+    assert scalars == {'count' : 3.0, 'mean' : 2.5}
+    assert type(scalars['count']) == float
+    assert list(arrays) == ['profile']
+
+
+def test_results_store_replaces_rows_and_fills_missing_columns(tmp_path):
+    fpath = str(tmp_path / 'results.npz')
+
+    assert list(load_results(fpath)['model_name']) == []
+
+    save_results(fpath, {'model_1' : {'vibration_frequency' : 1e6, 'peak_pressure' : 1.0, 'geometry' : '30um_grid'}})
+    save_results(fpath, {'model_2' : {'vibration_frequency' : 2e6, 'max_temperature' : 300.0}})
+    save_results(fpath, {'model_1' : {'vibration_frequency' : 1e6, 'peak_pressure' : 1.5, 'geometry' : '30um_grid'}})
+
+    columns = load_results(fpath)
+
+    assert list(columns['model_name']) == ['model_1', 'model_2']
+    assert list(columns['peak_pressure'][:1]) == [1.5]
+    assert np.isnan(columns['peak_pressure'][1])
+    assert np.isnan(columns['max_temperature'][0])
+    assert list(columns['geometry']) == ['30um_grid', '']
+    assert not os.path.exists(fpath + '.tmp.npz')
+
+
+'''
+----------------------------------------
+    Submodels and Includes
+----------------------------------------
+'''
+
+
+def test_submodels_outside_global_mesh_are_pruned(tmp_path):
+    with open(tmp_path / 'assembly.inp', 'w') as f:
+        f.write('*Assembly, name=Assembly\n'
+                '*Instance, name=global_1, part=global\n'
+                '  1., 0., 0.\n'
+                '*End Instance\n'
+                '*Instance, name=submodel_1, part=submodel\n'
+                '  <x_grid_position>, 0., 0.\n'
+                '*End Instance\n'
+                '*Submodel, type=NODE, exteriorTolerance=0.05, globalelset=global_1.solid\n'
+                '  submodel_1.driven_nodes,\n'
+                '*End Assembly\n')
+
+    for part_name,upper in (('global', 10.), ('submodel', 2.)):
+        with open(tmp_path / (part_name+'.inp'), 'w') as f:
+            f.write('*Part, name={0}\n*Node\n  1, 0., 0., 0.\n  2, {1}, {1}, {1}\n*End Part\n'.format(part_name, upper))
+
+    x_grid_positions = np.arange(-1, 12)
+    valid, errors = check_submodel_placements(str(tmp_path), {'x_grid_position' : x_grid_positions})
+
+    assert list(x_grid_positions[valid]) == list(range(1, 10))
+    assert len(errors) == 1
+
+
+def test_mesh_index_matches_brute_force():
+    generator = np.random.default_rng(0)
+    lower = generator.uniform(0, 10, (500, 3))
+    upper = lower + generator.uniform(0.1, 2, (500, 3))
+    points = generator.uniform(-1, 13, (2000, 3))
+
+    expected = np.any(np.all((points[:,None,:] >= lower[None]) & (points[:,None,:] <= upper[None]), axis=2), axis=1)
+
+    assert np.array_equal(Mesh_Index(lower, upper).contains(points), expected)
+
+
+def test_include_graph_is_resolved_recursively(tmp_path):
+    analysis_fpath, geometry_fpath = tmp_path / 'analysis', tmp_path / 'geometry'
+    os.makedirs(analysis_fpath)
+    os.makedirs(geometry_fpath)
+
+    (analysis_fpath / 'main.inp').write_text('*INCLUDE, INPUT=part.inp\n*INCLUDE, INPUT=assembly.inp\n')
+    (geometry_fpath / 'part.inp').write_text('*INCLUDE, INPUT=nodes.inp\n')
+    (geometry_fpath / 'nodes.inp').write_text('*Node\n  1, 0., 0., 0.\n')
+
+    files, missing = resolve_includes(str(analysis_fpath / 'main.inp'), [str(geometry_fpath)])
+
+    assert list(files.keys()) == ['part.inp', 'nodes.inp']
+    assert missing == [('main.inp', 'assembly.inp')]
+
+    # The cached graph is updated once the missing file exists
+    (geometry_fpath / 'assembly.inp').write_text('*Assembly, name=Assembly\n')
+
+    files, missing = resolve_includes(str(analysis_fpath / 'main.inp'), [str(geometry_fpath)])
+
+    assert list(files.keys()) == ['part.inp', 'nodes.inp', 'assembly.inp']
+    assert missing == []
+
+
+def test_submodels_with_unknown_translations_are_invalid(tmp_path):
+    with open(tmp_path / 'assembly.inp', 'w') as f:
+        f.write('*Assembly, name=Assembly\n'
+                '*Instance, name=global_1, part=global\n'
+                '*End Instance\n'
+                '*Instance, name=submodel_1, part=submodel\n'
+                '  <y_grid_position>, 0., 0.\n'
+                '*End Instance\n'
+                '*Submodel, type=NODE, exteriorTolerance=0.05, globalelset=global_1.solid\n'
+                '  submodel_1.driven_nodes,\n'
+                '*End Assembly\n')
+
+    for part_name,upper in (('global', 10.), ('submodel', 2.)):
+        with open(tmp_path / (part_name+'.inp'), 'w') as f:
+            f.write('*Part, name={0}\n*Node\n  1, 0., 0., 0.\n  2, {1}, {1}, {1}\n*End Part\n'.format(part_name, upper))
+
+    valid, errors = check_submodel_placements(str(tmp_path), {'x_grid_position' : np.arange(3)})
+
+    assert not np.any(valid)
+    assert 'y_grid_position' in errors[0]
+
+
+'''
+----------------------------------------
+    Object Storage
+----------------------------------------
+'''
+
+
+def test_library_is_ingested_in_one_pass(database_directory):
+    builder = load_builder(database_directory)
+    ingested = builder.ingest_library(os.path.join(REPOSITORY_FPATH, 'bin', 'materials'), workers=2)
+
+    assert sorted(ingested) == [('material', 'acoustic_water'), ('material', 'anisotropic_silicon')]
+
+    # The objects are saved, and a second ingest skips them
+    builder = load_builder(database_directory)
+    assert 'abaqus_acoustic.inp' in builder.data['material']['acoustic_water'].file_hashes
+    assert builder.ingest_library(os.path.join(REPOSITORY_FPATH, 'bin', 'materials')) == []
+
+
+def test_duplicated_folders_share_files_until_split(tmp_path):
+    os.makedirs(tmp_path / 'object' / 'mesh')
+    (tmp_path / 'object' / 'mesh' / 'part.inp').write_text('*Node\n')
+
+    assert link_folder(str(tmp_path / 'object'), str(tmp_path / 'duplicate')) == (1, 0)
+    assert os.path.samefile(tmp_path / 'object' / 'mesh' / 'part.inp', tmp_path / 'duplicate' / 'mesh' / 'part.inp')
+
+    # Only the split side is modified
+    assert split_file(str(tmp_path / 'duplicate' / 'mesh' / 'part.inp'))
+    (tmp_path / 'duplicate' / 'mesh' / 'part.inp').write_text('*Element\n')
+
+    assert (tmp_path / 'object' / 'mesh' / 'part.inp').read_text() == '*Node\n'
+
+    remove_folder(str(tmp_path / 'duplicate'))
+    assert (tmp_path / 'object' / 'mesh' / 'part.inp').exists()
+
+
+def test_trash_is_purged_in_the_background(tmp_path):
+    os.makedirs(tmp_path / 'model_files' / 'model_1' / 'abaqus')
+    (tmp_path / 'model_files' / 'model_1' / 'abaqus' / 'model_1.odb').write_bytes(b'0'*1000)
+
+    trash = Trash_Reaper(str(tmp_path / 'trash'))
+
+    # The folder is gone at once, and its contents are removed by the background thread
+    assert trash.move_to_trash(str(tmp_path / 'model_files' / 'model_1'))
+    assert not (tmp_path / 'model_files' / 'model_1').exists()
+
+    assert trash.wait(timeout=10)
+    assert trash.reclaimed == 1000
+
+
+def test_folder_hashes_follow_modified_files(tmp_path):
+    (tmp_path / 'assembly.inp').write_text('*Assembly, name=Assembly\n')
+    file_hashes = hash_folder(str(tmp_path))
+
+    assert hash_folder(str(tmp_path)) == file_hashes
+
+    # The cached hash is not used once the file changes
+    (tmp_path / 'assembly.inp').write_text('*Assembly, name=Assembly_2\n')
+    assert hash_folder(str(tmp_path))['assembly.inp'] != file_hashes['assembly.inp']
+
+
+def test_overlay_links_follow_renamed_objects(tmp_path):
+    object_fpath = tmp_path / 'geometry' / 'old_name'
+    os.makedirs(object_fpath / 'parts')
+    (object_fpath / 'geometry.inp').write_text('*Node\n')
+    (object_fpath / 'parts' / 'part.inp').write_text('*Part\n')
+
+    model = Model.__new__(Model)
+    model.name = 'overlay_model'
+    model.fpath = str(tmp_path / 'model' / 'overlay_model')
+    model.overlay = True
+    os.makedirs(os.path.join(model.fpath, 'parts'))
+
+    model.stage_file(str(object_fpath / 'geometry.inp'), os.path.join(model.fpath, 'geometry.inp'))
+    model.stage_file(str(object_fpath / 'parts' / 'part.inp'), os.path.join(model.fpath, 'parts', 'part.inp'))
+
+    new_fpath = tmp_path / 'geometry' / 'new_name'
+    os.rename(object_fpath, new_fpath)
+    assert len(model.get_broken_links()) == 2
+
+    assert model.relink(str(object_fpath), str(new_fpath)) == 2
+    assert not model.get_broken_links()
+    assert not os.path.isabs(os.readlink(os.path.join(model.fpath, 'parts', 'part.inp')))
+
+    with open(os.path.join(model.fpath, 'parts', 'part.inp')) as f:
+        assert f.read() == '*Part\n'
+
+
+def test_ingest_rejects_parameters_without_names(database_directory):
+    library_fpath = database_directory / 'library' / 'materials'
+    shutil.copytree(os.path.join(REPOSITORY_FPATH, 'bin', 'materials', 'acoustic_water'), library_fpath / 'water')
+
+    with open(library_fpath / 'water' / 'parameters.json', 'w') as f:
+        json.dump({'density' : {'dtype' : 'float', 'default_value' : 1000.0}}, f)
+
+    assert main(['--quiet', 'ingest', str(library_fpath)]) == EXIT_USAGE
+
+    builder = load_builder(database_directory)
+    assert 'water' not in builder.data['material']
+    assert not os.path.exists(os.path.join(builder.fpaths['material'], 'water'))
+
+
+def test_compressed_files_are_read_across_frame_boundaries(tmp_path):
+    data = ''.join(['{:08d}\n'.format(index) for index in range(5000)])
+    with open(tmp_path / 'mesh.inp', 'w') as f:
+        f.write(data)
+
+    compressed_fpath = compress_file(str(tmp_path / 'mesh.inp'), frame_size=4096)
+
+    assert compressed_fpath == str(tmp_path / 'mesh.inp.zst')
+    assert find_file(str(tmp_path / 'mesh.inp')) == compressed_fpath
+    with open(compressed_fpath, 'rb') as f:
+        assert len(read_seek_table(f)) == 11
+
+    # Reads that start in one frame and end in the next, then jump back
+    with open_file(str(tmp_path / 'mesh.inp'), 'rb') as f:
+        for start,length in ((4090, 12), (40950, 100), (0, 9), (len(data) - 5, 100), (len(data) + 10, 1)):
+            f.seek(start)
+            assert f.read(length) == data[start:start + length].encode()
+
+    with open_file(str(tmp_path / 'mesh.inp')) as f:
+        assert f.read() == data
+
+    decompress_file(compressed_fpath, str(tmp_path / 'copy.inp'))
+    with open(tmp_path / 'copy.inp') as f:
+        assert f.read() == data
+
+
+def test_truncated_or_corrupt_seek_tables_are_rejected(tmp_path):
+    with open(tmp_path / 'mesh.inp', 'w') as f:
+        f.write(''.join(['{:08d}\n'.format(index) for index in range(5000)]))
+
+    with open(compress_file(str(tmp_path / 'mesh.inp'), frame_size=4096), 'rb') as f:
+        compressed = f.read()
+
+    footer_start = len(compressed) - 9
+    broken_files = {'truncated' : compressed[:-3],
+                    'empty' : b'',
+                    'missing_frames' : compressed[200:],
+                    'too_many_frames' : compressed[:footer_start] + struct.pack('<IBI', 10**6, 0, 0x8F92EAB1),
+                    'wrong_frame_count' : compressed[:footer_start] + struct.pack('<IBI', 10, 0, 0x8F92EAB1)}
+
+    for name,contents in broken_files.items():
+        with open(tmp_path / (name+'.inp.zst'), 'wb') as f:
+            f.write(contents)
+
+        with pytest.raises(ValueError):
+            Seekable_Reader(str(tmp_path / (name+'.inp.zst')))
+
+
+'''
+----------------------------------------
+    Run Cache
+----------------------------------------
+'''
+
+
+def test_run_cache_links_outputs_and_evicts_least_recently_used(tmp_path):
+    run_cache = Run_Cache(str(tmp_path / 'run_cache'), max_size=1500)
+    command = ['abaqus', 'job={name}']
+
+    def run(model_name, inp):
+        model = Stub_Model(model_name, None)
+        model.fpath, model.parameters = str(tmp_path / model_name), {'vibration_frequency' : 20000}
+        os.makedirs(model.fpath)
+        (tmp_path / model_name / (model_name + '.inp')).write_text(inp)
+
+        key, inputs = run_cache.get_key(model, [argument.format(name=model_name) for argument in command])
+        if not run_cache.restore(key, model):
+            (tmp_path / model_name / (model_name + '.odb')).write_bytes(b'0'*1000)
+            run_cache.store(key, model, inputs)
+
+        return model
+
+    run('model_1', '*Heading\n')
+
+    # Models that only differ by name share the run
+    run('model_2', '*Heading\n')
+    assert (tmp_path / 'model_2' / 'model_2.odb').read_bytes() == b'0'*1000
+    assert list(run_cache.get_entries().values())[0]['hits'] == 1
+
+    # A new run over the size budget evicts the least recently used run
+    run('model_3', '*Heading\n** Other inputs\n')
+    assert [entry['model'] for entry in run_cache.get_entries().values()] == ['model_3']
+    assert (tmp_path / 'model_2' / 'model_2.odb').exists()
+
+
+def test_solving_a_restored_model_keeps_the_cached_outputs(tmp_path):
+    run_cache = Run_Cache(str(tmp_path / 'run_cache'))
+    models = {}
+
+    for model_name in ['model_1', 'model_2']:
+        model = Stub_Model(model_name, None)
+        model.fpath, model.parameters = str(tmp_path / model_name), {}
+        os.makedirs(model.fpath)
+        (tmp_path / model_name / (model_name + '.inp')).write_text('*Heading\n')
+
+        key, inputs = run_cache.get_key(model, ['abaqus', 'job=' + model_name])
+        if not run_cache.restore(key, model):
+            (tmp_path / model_name / (model_name + '.odb')).write_bytes(b'0'*1000)
+            run_cache.store(key, model, inputs)
+
+        models[model_name] = model
+
+    # Solving the restored model again (e.g. run --no-cache) writes a new output
+    assert release_outputs(models['model_2'].fpath) == 1
+    (tmp_path / 'model_2' / 'model_2.odb').write_bytes(b'1'*1000)
+
+    assert (tmp_path / 'model_1' / 'model_1.odb').read_bytes() == b'0'*1000
+    assert (tmp_path / 'run_cache' / key / 'files' / '{name}.odb').read_bytes() == b'0'*1000
+    assert not os.stat(tmp_path / 'model_1' / 'model_1.odb').st_mode & 0o222
+
+
+'''
+----------------------------------------
+    Licences
+----------------------------------------
+'''
+
+
+def test_licence_pool_serves_jobs_in_order():
+    async def run_jobs():
+        pool = Licence_Pool({'abaqus' : 4})
+        order = []
+        first_started = asyncio.Event()
+        release_first = asyncio.Event()
+
+        async def job(name, demand, started=None, finish=None):
+            async with pool.hold(demand):
+                order.append(name)
+                started and started.set()
+                finish and await finish.wait()
+
+        first = asyncio.create_task(job('first', {'abaqus' : 3}, first_started, release_first))
+        await first_started.wait()
+
+        # The small job fits in the free token, but waits behind the large job that asked first
+        large = asyncio.create_task(job('large', {'abaqus' : 2}))
+        await asyncio.sleep(0)
+        small = asyncio.create_task(job('small', {'abaqus' : 1}))
+        await asyncio.sleep(0.01)
+        assert order == ['first']
+
+        release_first.set()
+        await asyncio.gather(first, large, small)
+        return order, pool.available
+
+    order, available = asyncio.run(run_jobs())
+
+    assert order == ['first', 'large', 'small']
+    assert available == {'abaqus' : 4}
+
+
+def test_licence_pool_takes_every_token_at_once():
+    async def run_jobs():
+        pool = Licence_Pool({'fluent' : 2, 'anshpc' : 2})
+
+        await pool.acquire({'anshpc' : 2})
+        waiting = asyncio.create_task(pool.acquire({'fluent' : 1, 'anshpc' : 1}))
+        await asyncio.sleep(0.01)
+
+        # The waiting job holds none of its fluent tokens
+        held = dict(pool.available)
+
+        await pool.release({'anshpc' : 2})
+        await waiting
+        return held, pool.available
+
+    held, available = asyncio.run(run_jobs())
+
+    assert held == {'fluent' : 2, 'anshpc' : 0}
+    assert available == {'fluent' : 1, 'anshpc' : 1}
+
+    with pytest.raises(ValueError):
+        asyncio.run(Licence_Pool({'mpcci' : 1}).acquire({'mpcci' : 2}))
+
+
+def test_simulated_schedule_is_first_come_first_served():
+    start_times, makespan = simulate_schedule([{'abaqus' : 2}, {'abaqus' : 2}, {'abaqus' : 1}], [10.0, 5.0, 1.0], {'abaqus' : 3})
+
+    # The last job fits at the start, but only starts after the job before it
+    assert list(start_times) == [0.0, 10.0, 10.0]
+    assert makespan == 15.0
+
+    assert get_token_demand(DEFAULT_LICENCES['tokens'], {'fluent' : 8, 'mpcci' : 1}) == {'fluent' : 1, 'anshpc' : 4, 'mpcci' : 1}
+
+
+'''
+----------------------------------------
+    Build Orchestration
+----------------------------------------
+'''
+
+
+class Stub_Builder():
+    '''
+    Builder with only the settings the Build_Orchestrator reads, the solver is a python script
+    '''
+
+    def __init__(self, tmp_path, resource_limits, solver_script):
+        self.resource_limits = resource_limits
+        self.licences = DEFAULT_LICENCES
+        self.fpaths = {'run_cache' : str(tmp_path / 'run_cache')}
+        self.run_cache = {'enabled' : False, 'max_size' : 0}
+        self.solver_commands = {'abaqus' : [sys.executable, '-c', solver_script, '{name}', '{cpus}']}
+        self.data = {'model' : {}}
+
+
+class Stub_Monitor():
+    '''
+    Monitor that reports a stop reason once it has been updated
+    '''
+
+    def __init__(self, stop_reason):
+        self.stop_reason = stop_reason
+        self.status = 'running'
+        self.n_updates = 0
+
+    def update(self):
+        self.n_updates += 1
+        if self.stop_reason:
+            self.status = 'diverged'
+
+    def get_stop_reason(self):
+        return self.stop_reason if self.n_updates else None
+
+
+class Orchestrated_Model(Model):
+    '''
+    Abaqus model whose build stages and monitors are given
+    '''
+
+    def __init__(self, builder, name, stages=(), monitors=None):
+        self.builder = builder
+        self.name = name
+        self.fpath = os.path.join(os.path.dirname(builder.fpaths['run_cache']), 'model', name)
+        self.requirements = {'software' : {'abaqus' : True, 'fluent' : False, 'mpcci' : False},
+                             'analysis' : {'abaqus_global_odb' : False, 'abaqus_global_prt' : False}}
+        self.solver_fpaths = {'abaqus' : self.fpath}
+        self.solver_cpus = {'abaqus' : 2}
+        self.stages = list(stages)
+        self.monitors = monitors or {}
+
+    def get_build_stages(self):
+        return self.stages
+
+    def get_monitors(self):
+        return self.monitors
+
+
+def test_build_stages_respect_the_resource_limits(tmp_path):
+    builder = Stub_Builder(tmp_path, {'disk' : 2, 'fluent' : 1, 'abaqus' : 1}, '')
+    counter_lock = threading.Lock()
+    running = {'disk' : 0, 'fluent' : 0}
+    most_running = {'disk' : 0, 'fluent' : 0}
+
+    def stage(resource):
+        def run_stage():
+            with counter_lock:
+                running[resource] += 1
+                most_running[resource] = max(most_running[resource], running[resource])
+            time.sleep(0.05)
+            with counter_lock:
+                running[resource] -= 1
+        return run_stage
+
+    models = [Orchestrated_Model(builder, 'model_{}'.format(index), [(['disk'], stage('disk')), (['fluent'], stage('fluent'))]) for index in range(6)]
+    built = Build_Orchestrator(builder).build_models(models)
+
+    assert all(built.values())
+    assert most_running == {'disk' : 2, 'fluent' : 1}
+
+
+def test_failed_builds_remove_the_model_folder(tmp_path):
+    builder = Stub_Builder(tmp_path, {'disk' : 1}, '')
+
+    def write_files():
+        os.makedirs(model.fpath)
+        with open(os.path.join(model.fpath, 'main.inp'), 'w') as f:
+            f.write('*Heading\n')
+
+    def fail():
+        raise OSError('The disk is full')
+
+    model = Orchestrated_Model(builder, 'failed', [(['disk'], write_files), (['disk'], fail)])
+
+    assert Build_Orchestrator(builder).build_models([model]) == {'failed' : False}
+    assert not os.path.exists(model.fpath)
+
+
+def test_runs_are_terminated_when_a_monitor_stops_them(tmp_path):
+    # The solver writes its arguments to the log, then runs until it is terminated
+    builder = Stub_Builder(tmp_path, {'abaqus' : 2}, 'import sys, time; print(" ".join(sys.argv[1:]), flush=True); time.sleep(float(sys.argv[1] == "diverging")*60)')
+    models = [Orchestrated_Model(builder, 'converging', monitors={'abaqus' : Stub_Monitor(None)}),
+              Orchestrated_Model(builder, 'diverging', monitors={'abaqus' : Stub_Monitor('The residuals increased.')})]
+
+    for model in models:
+        os.makedirs(model.fpath)
+
+    start = time.monotonic()
+    return_codes = Build_Orchestrator(builder, monitor_interval=0.1).run_models(models)
+
+    assert return_codes['converging'] == 0
+    assert return_codes['diverging'] != 0
+    assert time.monotonic() - start < 30
+
+    with open(os.path.join(models[0].fpath, 'converging.log')) as f:
+        assert f.read().strip() == 'converging 2'
+
+
+'''
+----------------------------------------
+    Solver Monitoring
+----------------------------------------
+'''
+
+
+def test_abaqus_monitor_follows_the_sta_and_msg_files(tmp_path):
+    monitor = Abaqus_Monitor('job', str(tmp_path), target_time=4e-7)
+
+    with open(tmp_path / 'job.sta', 'w') as f:
+        f.write(' Abaqus/Explicit 2022\n'
+                '              STEP     TOTAL       CPU      STABLE    CRITICAL    KINETIC      TOTAL\n'
+                'INCREMENT     TIME      TIME      TIME   INCREMENT     ELEMENT     ENERGY     ENERGY\n'
+                '         0  0.000E+00  0.000E+00  00:00:00  1.000E-09       1  0.000E+00  0.000E+00\n'
+                '       100  1.000E-07  1.000E-07  00:00:01  1.000E-09       1  1.000E-03  1.000E-03\n'
+                '       200  2.000E-07  2.00')
+
+    with open(tmp_path / 'job.msg', 'w') as f:
+        f.write(' ***WARNING: 3 elements are distorted.\n ***ERROR: Too many attempts made for this increment\n')
+
+    monitor.update()
+
+    # The partially written increment is left for the next update
+    assert (monitor.increment, monitor.total_time, monitor.status) == (100, 1e-7, 'running')
+    assert monitor.get_progress() == pytest.approx(0.25)
+    assert (monitor.warnings, monitor.errors) == (1, 1)
+
+    with open(tmp_path / 'job.sta', 'a') as f:
+        f.write('0E-07  00:00:02  1.000E-09       1  1.000E-03  1.000E-03\n'
+                ' THE ANALYSIS HAS COMPLETED SUCCESSFULLY\n')
+
+    monitor.update()
+
+    assert monitor.increment == 200
+    assert monitor.status == 'completed'
+    assert monitor.get_progress() == 1.0
+
+
+def test_abaqus_monitor_parses_standard_increments(tmp_path):
+    monitor = Abaqus_Monitor('job', str(tmp_path))
+
+    with open(tmp_path / 'job.sta', 'w') as f:
+        f.write('  STEP  INC ATT SEVERE EQUIL TOTAL  TOTAL      STEP       INC OF       DOF    IF\n'
+                '    1     3   1     0     2     2  0.300      0.300      0.1000\n'
+                ' THE ANALYSIS HAS NOT BEEN COMPLETED\n')
+
+    monitor.update()
+
+    assert (monitor.increment, monitor.total_time, monitor.stable_increment) == (3, 0.3, 0.1)
+    assert monitor.status == 'failed'
+
+
+FLUENT_HEADER = '  iter  continuity  x-velocity  y-velocity  z-velocity     time/iter\n'
+
+
+def write_fluent_time_step(f, time_step, iterations, residual):
+    for iteration in iterations:
+        f.write('  {:4d}  {}  1.0000e-06  1.0000e-06  1.0000e-06  0:00:05  {}\n'.format(iteration, residual, 100 - iteration))
+    f.write('Flow time = {:.1e}s, time step = {}\n'.format(time_step*1e-7, time_step))
+
+
+def test_fluent_monitor_records_residuals_and_time_steps(tmp_path):
+    monitor = Fluent_Monitor('job', str(tmp_path), target_time=2e-7)
+
+    with open(tmp_path / 'job.log', 'w') as f:
+        f.write(FLUENT_HEADER)
+        write_fluent_time_step(f, 1, [1, 2], '1.0000e-06')
+        write_fluent_time_step(f, 2, [3, 4], '1.0000e-06')
+
+    monitor.update()
+
+    assert monitor.residual_names == ['continuity', 'x-velocity', 'y-velocity', 'z-velocity']
+    assert (monitor.time_step, monitor.iteration, monitor.status) == (2, 4, 'completed')
+    assert monitor.stable_increment == pytest.approx(1e-7)
+    assert list(monitor.get_history()['continuity']) == [1e-6]*4
+    assert monitor.get_stop_reason() is None
+
+
+def test_fluent_monitor_flags_diverged_runs(tmp_path):
+    monitor = Fluent_Monitor('job', str(tmp_path))
+
+    with open(tmp_path / 'job.log', 'w') as f:
+        f.write(FLUENT_HEADER)
+        write_fluent_time_step(f, 1, [1, 2], '1.0000e-03')
+        write_fluent_time_step(f, 2, [3], '-nan(ind)')
+        f.write('Divergence detected in AMG solver: pressure correction\n')
+
+    monitor.update()
+
+    assert monitor.status == 'diverged'
+    assert 'iteration 3' in monitor.get_stop_reason()
+    assert np.isnan(monitor.get_history()['continuity'][-1])
+
+    message_monitor = Fluent_Monitor('job', str(tmp_path), divergence_residual=np.inf)
+    with open(tmp_path / 'outFluent.out', 'w') as f:
+        f.write('Error: Divergence detected in AMG solver: pressure correction\n')
+    os.remove(tmp_path / 'job.log')
+
+    message_monitor.update()
+
+    assert message_monitor.status == 'diverged'
+    assert message_monitor.errors == 1
+
+
+def test_fluent_monitor_flags_stalled_runs(tmp_path):
+    monitor = Fluent_Monitor('job', str(tmp_path), max_iterations=2, stall_time_steps=2)
+
+    with open(tmp_path / 'job.log', 'w') as f:
+        f.write(FLUENT_HEADER)
+        write_fluent_time_step(f, 1, [1, 2], '1.0000e-03')
+
+    monitor.update()
+    assert monitor.status == 'running'
+
+    # A time step that reaches the residual criteria resets the count
+    with open(tmp_path / 'job.log', 'a') as f:
+        write_fluent_time_step(f, 2, [3], '1.0000e-06')
+        write_fluent_time_step(f, 3, [4, 5], '1.0000e-03')
+
+    monitor.update()
+    assert monitor.status == 'running'
+
+    with open(tmp_path / 'job.log', 'a') as f:
+        write_fluent_time_step(f, 4, [6, 7], '1.0000e-03')
+
+    monitor.update()
+    assert monitor.status == 'stalled'
+    assert monitor.get_stop_reason() == '2 time steps in a row did not converge in 2 iterations.'
+
+
+class Stub_Object():
+    '''
+    Object folder with no files but the ones a test writes
+    '''
+
+    def __init__(self, name, fpath):
+        self.name = name
+        self.fpath = fpath
+
+
+def test_coupled_monitors_follow_the_mpcci_log_and_solver_times(tmp_path):
+    builder = Stub_Builder(tmp_path, {'abaqus' : 1}, '')
+    builder.solver_commands = DEFAULT_SOLVER_COMMANDS
+
+    analysis_fpath = tmp_path / 'analysis' / 'coupled'
+    os.makedirs(analysis_fpath / 'abaqus')
+    with open(analysis_fpath / 'abaqus' / 'main.inp', 'w') as f:
+        f.write('*Parameter\n total_time = 2e-7\n')
+
+    model = Orchestrated_Model(builder, 'coupled')
+    model.requirements['software'] = {'abaqus' : True, 'fluent' : True, 'mpcci' : True}
+    model.solver_fpaths = {solver : os.path.join(model.fpath, solver) for solver in ('abaqus', 'fluent', 'mpcci')}
+    model.analysis = Stub_Object('coupled', str(analysis_fpath))
+    model.geometry = Stub_Object('grid', str(tmp_path / 'geometry' / 'grid'))
+    model.materials = {}
+    model.parameters = {}
+    model.derived_parameters = {'fluent_total_time' : {'default_value' : 3e-7}, 'total_time' : {'default_value' : 1e-6}}
+
+    # The monitors made by the Model, not the ones given to the stub
+    monitors = Model.get_monitors(model)
+
+    assert (monitors['abaqus'].name, monitors['abaqus'].target_time) == ('main', 2e-7)
+    assert monitors['fluent'].target_time == 3e-7
+
+    # mpcci runs fluent in the mpcci directory, so its transcript is the log written there
+    os.makedirs(model.solver_fpaths['mpcci'])
+    with open(os.path.join(model.solver_fpaths['mpcci'], 'coupled.log'), 'w') as f:
+        f.write(FLUENT_HEADER)
+        write_fluent_time_step(f, 1, [1, 2], '1.0000e-06')
+
+    monitors['fluent'].update()
+
+    assert monitors['fluent'].time_step == 1
+    assert monitors['fluent'].get_progress() == pytest.approx(1/3)
+
+
+'''
+----------------------------------------
+    Model Bundles
+----------------------------------------
+'''
+
+
+def write_model_folder(fpath, files):
+    for relative_fpath,contents in files.items():
+        os.makedirs(os.path.dirname(os.path.join(fpath, relative_fpath)), exist_ok=True)
+        with open(os.path.join(fpath, relative_fpath), 'w') as f:
+            f.write(contents)
+
+
+def test_bundles_round_trip_and_store_shared_files_once(tmp_path):
+    for index in range(3):
+        write_model_folder(tmp_path / 'model' / 'sweep_{}'.format(index), {'main.inp' : '*Heading\n', 'mesh/part.inp' : '*Node\n'*1000, 'run.sh' : 'abaqus job=sweep_{}\n'.format(index)})
+        os.chmod(tmp_path / 'model' / 'sweep_{}'.format(index) / 'run.sh', 0o755)
+
+    models = {'sweep_{}'.format(index) : {'fpath' : str(tmp_path / 'model' / 'sweep_{}'.format(index)), 'model' : {'name' : 'sweep_{}'.format(index)}, 'run' : {'command' : ['sh', 'run.sh']}} for index in range(3)}
+    manifest = write_bundle(str(tmp_path / 'sweep.tar.zst'), models)
+
+    # The main and part files are shared, each run script is different
+    assert len(manifest['blobs']) == 5
+    assert read_manifest(str(tmp_path / 'sweep.tar.zst'))['models']['sweep_1']['run'] == {'command' : ['sh', 'run.sh']}
+
+    for link in (False, True):
+        destination_fpath = tmp_path / 'unpacked_{}'.format(link)
+        unpack_bundle(str(tmp_path / 'sweep.tar.zst'), str(destination_fpath), link=link)
+
+        for index in range(3):
+            with open(destination_fpath / 'sweep_{}'.format(index) / 'run.sh') as f:
+                assert f.read() == 'abaqus job=sweep_{}\n'.format(index)
+            with open(destination_fpath / 'sweep_{}'.format(index) / 'mesh' / 'part.inp') as f:
+                assert f.read() == '*Node\n'*1000
+            assert os.access(destination_fpath / 'sweep_{}'.format(index) / 'run.sh', os.X_OK)
+
+        assert (os.stat(destination_fpath / 'sweep_0' / 'main.inp').st_nlink == 3) == link
+        assert not os.path.exists(destination_fpath / '.bundle_blobs')
+
+    # Model folders are never overwritten
+    with pytest.raises(FileExistsError):
+        unpack_bundle(str(tmp_path / 'sweep.tar.zst'), str(tmp_path / 'unpacked_False'))
+
+
+def test_corrupt_bundles_are_not_unpacked(tmp_path):
+    # A bundle whose blob does not match the sha256 it is stored under
+    blob = hashlib.sha256(b'*Heading\n').hexdigest()
+    manifest_bytes = json.dumps({'format' : 1, 'created' : 0, 'blobs' : {blob : 9}, 'models' : {'model' : {'files' : {'main.inp' : blob}, 'executables' : []}}}).encode()
+
+    with open(tmp_path / 'corrupt.tar.zst', 'wb') as f, zstandard.ZstdCompressor().stream_writer(f) as writer, tarfile.open(fileobj=writer, mode='w|') as tar:
+        for name,contents in (('manifest.json', manifest_bytes), ('blobs/'+blob, b'*Headinf\n')):
+            info = tarfile.TarInfo(name)
+            info.size = len(contents)
+            tar.addfile(info, fileobj=io.BytesIO(contents))
+
+    with pytest.raises(ValueError, match='corrupt'):
+        unpack_bundle(str(tmp_path / 'corrupt.tar.zst'), str(tmp_path / 'unpacked'))
+
+    assert not os.path.exists(tmp_path / 'unpacked' / 'model')
+
+
+'''
+----------------------------------------
+    Partition Plans
+----------------------------------------
+'''
+
+
+def load_partition_plan():
+    spec = spec_from_file_location('Partition_Plan', os.path.join(REPOSITORY_FPATH, 'scripts', 'Partition_Plan.py'))
+    partition_plan = module_from_spec(spec)
+    spec.loader.exec_module(partition_plan)
+    return partition_plan
+
+
+def get_plan_args(output, layout='grid', channel_width=0.02, grid_spacing=0.5):
+    return argparse.Namespace(layout=layout, initial_x_coord=0.0, initial_y_coord=0.0, n_partitions=15, channel_width=channel_width, grid_spacing=grid_spacing,
+                              model_name='Vibrating_Chip_Model', part_name='SOLID_GEOMETRY', set_name='PARTITION_CELLS', tolerance=1e-6, output=str(output))
+
+
+def test_partition_planes_are_merged_within_the_tolerance(tmp_path):
+    partition_plan = load_partition_plan()
+
+    assert list(partition_plan.merge_planes([1.0, 0.5, 0.5 + 5e-7, 1.0 - 5e-7, 2.0], 1e-6)) == [0.5, 1.0 - 5e-7, 2.0]
+    assert not len(partition_plan.merge_planes([], 1e-6))
+
+    # Channels as wide as the grid spacing put every channel wall on a grid line
+    plan_fpath = partition_plan.generate(get_plan_args(tmp_path, channel_width=0.5))
+    with open(plan_fpath) as f:
+        plan = json.load(f)
+
+    assert plan['n_planes_created'] == 60
+    assert plan['planes']['x'] == [0.5*(index + 1) for index in range(15)]
+    assert os.path.exists(plan_fpath.replace('.json', '_replay.py'))
+
+    # The same layout and inputs give the same plan, which is not written again
+    modified_time = os.path.getmtime(plan_fpath)
+    assert partition_plan.generate(get_plan_args(tmp_path, channel_width=0.5)) == plan_fpath
+    assert os.path.getmtime(plan_fpath) == modified_time
+
+
+def test_partition_plans_are_diffed_within_the_tolerance(tmp_path, capsys):
+    partition_plan = load_partition_plan()
+
+    first_fpath = partition_plan.generate(get_plan_args(tmp_path, layout='straight_channel'))
+    second_fpath = partition_plan.generate(get_plan_args(tmp_path, layout='straight_channel', channel_width=0.015))
+    capsys.readouterr()
+
+    assert partition_plan.diff([first_fpath, first_fpath], 1e-6)
+    assert not partition_plan.diff([first_fpath, second_fpath], 1e-6)
+
+    # Only the channel walls moved, the planes of the channel starts are shared
+    output = capsys.readouterr().out
+    assert 'Planes normal to x only in "{}": 0.02, 0.52'.format(first_fpath) in output
+    assert 'normal to y' not in output
+
+    # A tolerance larger than the change matches the plans
+    assert partition_plan.diff([first_fpath, second_fpath], 0.01)
+
+
+'''
+----------------------------------------
+    Stale Models
+----------------------------------------
+'''
+
+
+def test_edited_objects_make_models_stale_and_failed_rebuilds_are_restored(database_directory):
+    builder = load_builder(database_directory)
+
+    objects = {}
+    for object_type,name in (('analysis', 'vibration'), ('geometry', 'grid'), ('material', 'water')):
+        objects[object_type] = Stub_Object(name, os.path.join(builder.fpaths[object_type], name))
+        write_model_folder(objects[object_type].fpath, {name+'.inp' : '*Heading\n'})
+
+    model = Orchestrated_Model(builder, 'stale_model')
+    model.fpath = os.path.join(builder.fpaths['model'], model.name)
+    model.analysis, model.geometry, model.materials = objects['analysis'], objects['geometry'], {'water' : objects['material']}
+
+    def stage_files():
+        os.makedirs(model.fpath, exist_ok=True)
+        shutil.copy(os.path.join(model.geometry.fpath, 'grid.inp'), model.fpath)
+
+    def fail():
+        raise OSError('The disk is full')
+
+    model.stages = [(['disk'], model.record_provenance), (['disk'], stage_files)]
+    assert builder.build_models([model]) == {'stale_model' : True}
+    model.run_return_code = 0
+
+    assert model.get_stale_objects() == []
+    assert builder.rebuild_stale_models() == {}
+
+    with open(os.path.join(model.geometry.fpath, 'grid.inp'), 'w') as f:
+        f.write('*Heading\n*Node\n')
+
+    assert model.get_stale_objects() == ['geometry']
+
+    # The partially rebuilt folder is replaced by the previous build, and the model is still stale
+    model.stages = [(['disk'], model.record_provenance), (['disk'], stage_files), (['disk'], fail)]
+    assert builder.rebuild_stale_models() == {'stale_model' : False}
+
+    with open(os.path.join(model.fpath, 'grid.inp')) as f:
+        assert f.read() == '*Heading\n'
+    assert not os.path.exists(model.fpath + '.stale')
+    assert model.get_stale_objects() == ['geometry']
+    assert model.run_return_code == 0
+
+    model.stages = [(['disk'], model.record_provenance), (['disk'], stage_files)]
+    assert builder.rebuild_stale_models() == {'stale_model' : True}
+
+    with open(os.path.join(model.fpath, 'grid.inp')) as f:
+        assert f.read() == '*Heading\n*Node\n'
+    assert not os.path.exists(model.fpath + '.stale')
+    assert model.get_stale_objects() == []
+    assert not hasattr(model, 'run_return_code')